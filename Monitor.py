@@ -25,6 +25,9 @@ from PyQt6.QtWidgets import (QApplication, QWidget, QVBoxLayout, QLabel,
 from PyQt6.QtCore import QDate, Qt , QTimer
 from PyQt6.QtGui import QPixmap , QIcon , QTextCursor
 from executaWorkflow import executar_etl
+from scheduler.db import garantir_esquema
+from scheduler.disjuntores import ESTADO_FECHADO, religar
+from scheduler.duracoes import execucoes_excedidas
 
 load_dotenv()
 
@@ -33,6 +36,7 @@ DB_PATH = os.getenv("DB_PATH", "agendador.db")
 class AgendadorGUI(QWidget):
     def __init__(self):
         super().__init__()
+        garantir_esquema(DB_PATH)
         self.initUI()
 
     def initUI(self):
@@ -56,6 +60,16 @@ class AgendadorGUI(QWidget):
         self.tabela_agendamentos.setSortingEnabled(True)
         layout.addWidget(self.tabela_agendamentos)
 
+        # Execuções em andamento acima da duração habitual (p95 do histórico)
+        self.label_excedidas = QLabel("")
+        self.label_excedidas.setStyleSheet("color: #b36b00;")
+        layout.addWidget(self.label_excedidas)
+
+        self.excedidas_timer = QTimer()
+        self.excedidas_timer.setInterval(5000)
+        self.excedidas_timer.timeout.connect(self.carregar_excedidas)
+        self.excedidas_timer.start()
+
         # Linha de botoes
         hbox_atualizacao = QHBoxLayout()
 
@@ -63,6 +77,10 @@ class AgendadorGUI(QWidget):
         self.btn_executar.clicked.connect(self.executa_workflow)
         hbox_atualizacao.addWidget(self.btn_executar)
 
+        self.btn_religar = QPushButton("Religar disjuntor")
+        self.btn_religar.clicked.connect(self.religar_disjuntor)
+        hbox_atualizacao.addWidget(self.btn_religar)
+
         self.btn_atualizar = QPushButton("Atualizar Dados")
         self.btn_atualizar.clicked.connect(self.atualizar_tudo)
         hbox_atualizacao.addWidget(self.btn_atualizar)
@@ -138,6 +156,7 @@ class AgendadorGUI(QWidget):
 
     def atualizar_tudo(self):
         self.carregar_agendamentos()
+        self.carregar_excedidas()
         self.carregar_logs()
 
     def carregar_agendamentos(self):
@@ -146,10 +165,12 @@ class AgendadorGUI(QWidget):
             conn = sqlite3.connect(DB_PATH)
             cursor = conn.cursor()
             cursor.execute("""
-                SELECT id, arquivo, projeto, local_run, ultima_execucao, duracao_execucao, horario, intervalo, dias_semana, dias_mes, hora_inicio, hora_fim, ferramenta_etl,timeout_execucao
-                FROM agendamentos WHERE Status = 'Ativo' ORDER BY horario
+                SELECT id, arquivo, projeto, local_run, ultima_execucao, duracao_execucao, horario, intervalo, dias_semana, dias_mes, hora_inicio, hora_fim, ferramenta_etl,timeout_execucao,
+                       disjuntor_falhas, d.estado, d.falhas_consecutivas, d.proxima_sonda
+                FROM agendamentos LEFT JOIN disjuntores d ON d.id_agendamento = agendamentos.id
+                WHERE Status = 'Ativo' ORDER BY horario
             """)
-            agendamentos = cursor.fetchall()
+            agendamentos = [row[:14] + (self.descrever_disjuntor(*row[14:]),) for row in cursor.fetchall()]
             conn.close()
 
             filtrados = [row for row in agendamentos if termo_pesquisa in " ".join(map(str, row)).lower()]
@@ -158,9 +179,9 @@ class AgendadorGUI(QWidget):
             self.tabela_agendamentos.setSortingEnabled(False)
             self.tabela_agendamentos.clearContents()
             self.tabela_agendamentos.setRowCount(len(filtrados))
-            self.tabela_agendamentos.setColumnCount(14)
+            self.tabela_agendamentos.setColumnCount(15)
             self.tabela_agendamentos.setHorizontalHeaderLabels(
-                ["ID", "Arquivo", "Projeto", "Local_run", "Última Execução", "Duração", "Horário", "Intervalo", "Dias Semana", "Dias Mês", "Hora Início", "Hora Fim", "Execução","Timeout"]
+                ["ID", "Arquivo", "Projeto", "Local_run", "Última Execução", "Duração", "Horário", "Intervalo", "Dias Semana", "Dias Mês", "Hora Início", "Hora Fim", "Execução","Timeout", "Disjuntor"]
             )
 
             for i, row in enumerate(filtrados):
@@ -176,6 +197,45 @@ class AgendadorGUI(QWidget):
             self.label_agendamentos.setText(f"Erro ao carregar agendamentos: {str(e)}")
 
 
+    def carregar_excedidas(self):
+        """Atualiza a lista de execuções em andamento acima da duração habitual"""
+        try:
+            excedidas = execucoes_excedidas(DB_PATH)
+        except Exception as e:
+            self.label_excedidas.setText(f"Erro ao consultar execuções em andamento: {str(e)}")
+            return
+        if not excedidas:
+            self.label_excedidas.setText("")
+            return
+        itens = [
+            f"{os.path.basename(arquivo)} ({decorrido / 60:.0f} min, p95 {p95 / 60:.0f} min, {origem})"
+            for _, arquivo, origem, _, decorrido, p95 in excedidas
+        ]
+        self.label_excedidas.setText("⏳ Acima da duração habitual: " + "; ".join(itens))
+
+    def descrever_disjuntor(self, limite, estado, falhas, proxima_sonda):
+        """Texto da coluna Disjuntor: desativado, fechado ou aberto com a próxima sondagem"""
+        if not limite:
+            return "-"
+        if not estado or estado == ESTADO_FECHADO:
+            return f"FECHADO ({falhas or 0}/{limite} falhas)"
+        sonda = f", sondagem {proxima_sonda[11:16]}" if proxima_sonda else ", suspenso"
+        return f"{estado} ({falhas} falhas{sonda})"
+
+    def religar_disjuntor(self):
+        linha_selecionada = self.tabela_agendamentos.currentRow()
+        if linha_selecionada == -1:
+            QMessageBox.warning(self, "Seleção", "Por favor, selecione o agendamento cujo disjuntor deseja religar.")
+            return
+
+        id = self.tabela_agendamentos.item(linha_selecionada, 0).text()
+        arquivo = self.tabela_agendamentos.item(linha_selecionada, 1).text()
+        if religar(DB_PATH, int(id)):
+            QMessageBox.information(self, "Disjuntor", f"Disjuntor religado: '{arquivo}' volta a seguir o agendamento.")
+        else:
+            QMessageBox.information(self, "Disjuntor", f"O disjuntor de '{arquivo}' não está aberto.")
+        self.carregar_agendamentos()
+
     def carregar_logs(self):
         self.loading_bar.setText("Carregando logs...")
         QApplication.processEvents()
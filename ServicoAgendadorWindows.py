@@ -21,17 +21,46 @@ import sys
 import os
 import time
 import sqlite3
-import subprocess
 import datetime
 import locale
 import threading
-import multiprocessing
+import collections
 import logging
 from pathlib import Path
 import ctypes
-import unicodedata
 from dotenv import load_dotenv
-from notifications.notifier import notificar
+from notifications.notifier import aguardar_notificacoes, notificar_em_segundo_plano
+from scheduler.rules import compilar_regra, POLITICA_ENFILEIRAR
+from scheduler.engine import FilaAgendamentos
+from scheduler.cache import CacheAgendamentos
+from scheduler.ticker import RelogioMinutos
+from scheduler.metrics import Metricas
+from scheduler.pool import PoolExecucao, PedidoExecucao
+from scheduler.locks import (
+    RenovadorTravas, adquirir_trava, registrar_espera, remover_espera
+)
+from scheduler.recursos import ControleAdmissao, opcoes_heap_java
+from scheduler.supervisor import Comando, SupervisorProcessos, comando_script
+from scheduler.atributos import elevar_prioridade_servico
+from scheduler.memoria import CGROUP_MEMORIA, MOTIVO_MEMORIA, limpar_cgroups
+from scheduler.orfaos import ColetorOrfaos
+from scheduler.db import garantir_esquema
+from scheduler.dependencias import chave_dependencias, dependentes_prontos
+from scheduler.calendarios import calendarios_alterados
+from scheduler.duracoes import AMOSTRAS_DURACAO, alerta_duracao, atualizar_duracoes, timeout_efetivo
+from scheduler.disjuntores import (
+    ESTADO_ABERTO, ESTADO_FECHADO, cancelar_sondagem, cancelar_sondagens, liberar_disparo, registrar_resultado
+)
+from scheduler.perdidos import disparos_a_recuperar, gravar_ultimo_tick, ler_ultimo_tick
+from scheduler.execucoes import (
+    ESTADO_ABANDONADA, ESTADO_DESCARTADA, ESTADO_EXECUTANDO, execucao_com_sucesso, execucoes_na_fila, ler_data,
+    limpar_execucoes, motivo_fim, reconciliar_iniciadas, registrar_fim, registrar_inicio
+)
+from scheduler.nos import (
+    MOTIVO_CONCESSAO, NO_ID, CoordenadorNos, adotar_execucao, carga_no, devolver_execucao, publicar_execucao,
+    publicar_execucoes
+)
+from scheduler.processos import PRAZO_ENCERRAMENTO, criacao_processo
 
 # Configuração do diretório de trabalho
 SERVICE_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -49,6 +78,13 @@ PENTAHO_TRANSFORMATION = os.getenv("PENTAHO_TRANSFORMATION", r'C:\data-integrati
 # Configurações do aplicativo
 DB_PATH = os.path.join(SERVICE_DIR, "agendador.db")
 
+# Ao parar o serviço, tempo (segundos) que as execuções em andamento têm para terminar
+# antes de serem interrompidas (0 = interrompe imediatamente); a fila fica para o próximo início
+PRAZO_DRENAGEM = float(os.getenv("PRAZO_DRENAGEM_SEG", 0))
+
+# Ao parar o serviço, tempo (segundos) para enviar as notificações ainda na fila
+PRAZO_NOTIFICACOES = 15
+
 # Configuração de logging
 logging.basicConfig(
     level=logging.INFO,
@@ -77,20 +113,6 @@ except locale.Error:
     except locale.Error:
         pass
 
-DIAS_SEMANA_MAP = {
-    'mon': 'seg', 'tue': 'ter', 'wed': 'qua', 'thu': 'qui', 'fri': 'sex', 'sat': 'sab', 'sun': 'dom'
-}
-def remover_acentuacao(texto):
-    # Normaliza o texto para a forma NFD (decomposição de caracteres)
-    texto_normalizado = unicodedata.normalize('NFD', texto)
-    
-    # Filtra apenas caracteres que não são diacríticos (acentos)
-    texto_sem_acento = ''.join(
-        c for c in texto_normalizado 
-        if not unicodedata.combining(c)
-    )
-    
-    return texto_sem_acento
 def log_event(mensagem):
     """Registra mensagens no log diário e no Event Viewer"""
     timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
@@ -101,13 +123,13 @@ def log_event(mensagem):
             log_file.write(log_line + "\n")
     except Exception as e:
         logging.error(f"Erro ao escrever no log: {str(e)}")
-        notificar(f"[PyFlowT3] Erro ao executar o workflow: {str(e)}")
+        notificar_em_segundo_plano(f"[PyFlowT3] Erro ao executar o workflow: {str(e)}")
     
     try:
         servicemanager.LogInfoMsg(log_line)
     except Exception as e:
         logging.error(f"Erro ao registrar no Event Viewer: {str(e)}")
-        notificar(f"[PyFlowT3] Erro ao executar o workflow: {str(e)}")
+        notificar_em_segundo_plano(f"[PyFlowT3] Erro ao executar o workflow: {str(e)}")
 
 def atualizar_execucao_no_banco(id_agendamento, duracao_execucao, ultima_execucao):
     """Atualiza a duração e data/hora da última execução do agendamento"""
@@ -126,312 +148,187 @@ def atualizar_execucao_no_banco(id_agendamento, duracao_execucao, ultima_execuca
     except Exception as e:
         log_event(f"[ERRO] Falha ao atualizar execução no banco: {str(e)}")
 
-def executar_pentaho(id, arquivo_kjb, timeout):
-    """Executa jobs/transformações do Pentaho com tratamento especial para serviço Windows"""
-    try:
-        arquivo = os.path.abspath(os.path.normpath(arquivo_kjb))
-        extensao = Path(arquivo).suffix.lower()
-
-        if extensao == '.ktr':
-            comando = f'"{PENTAHO_TRANSFORMATION}" /file:"{arquivo}"'
-            diretorio = os.path.dirname(PENTAHO_TRANSFORMATION)
-        else:
-            comando = f'"{PENTAHO_JOB}" /file:"{arquivo}"'
-            diretorio = os.path.dirname(PENTAHO_JOB)
-
-        log_event(f"[PENTAHO] Iniciando execução do arquivo: {arquivo}")
-        log_event(f"[PENTAHO] Comando completo: {comando}")
-        log_event(f"[PENTAHO] Diretório de trabalho: {diretorio}")
-
-        startupinfo = subprocess.STARTUPINFO()
-        startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
-
-        env = os.environ.copy()
-        env.update({
-            'PENTAHO_DI_JAVA_OPTIONS': '-Xms1024m -Xmx2048m',
-            'KETTLE_HOME': diretorio,
-            'KETTLE_JNDI_ROOT': os.path.join(diretorio, 'simple-jndi'),
-            'TEMP': os.environ.get('TEMP', r'C:\Temp'),
-            'TMP': os.environ.get('TMP', r'C:\Temp')
-        })
-
-        os.makedirs(env['TEMP'], exist_ok=True)
-
-        log_event(f"[PENTAHO] Variáveis de ambiente configuradas")
-
-        linhas_erro = []
-
-        processo = subprocess.Popen(
-            comando,
-            cwd=diretorio,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,
-            stdin=subprocess.PIPE,
-            text=True,
-            encoding='utf-8',
-            errors='replace',
-            env=env,
-            startupinfo=startupinfo,
-            shell=True  # Necessário no Windows como serviço
-        )
-
-        start_time = time.time()
-        karaf_initialized = False
-        karaf_timeout = 300  # 5 minutos para o Karaf
-        log_path = get_daily_log_path()
-
-        while True:
-            output = processo.stdout.readline()
-            if output == '' and processo.poll() is not None:
-                break
-
-            if output:
-                # Rotaciona o log se o dia mudou
-                novo_log_path = get_daily_log_path()
-                if novo_log_path != log_path:
-                    log_path = novo_log_path
-
-                with open(log_path, "a", encoding='utf-8') as log_file:
-                    log_file.write(f"[PID {processo.pid}] {output}")
-                    log_file.flush()
-
-                if "ERROR" in output.upper():
-                    linhas_erro.append(output.strip())
-
-                if not karaf_initialized and "OSGI Service Port" in output:
-                    karaf_initialized = True
-                    log_event("[PENTAHO] Karaf inicializado com sucesso")
-
-                if not karaf_initialized and (time.time() - start_time) > karaf_timeout:
-                    raise subprocess.TimeoutExpired(comando, karaf_timeout)
-
-                if (time.time() - start_time) > timeout:
-                    raise subprocess.TimeoutExpired(comando, timeout)
-
-        return_code = processo.wait()
-
-        end_time = time.time()
-        duracao = round((end_time - start_time) / 60, 2)
-        ultima_execucao = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-
-        atualizar_execucao_no_banco(id, duracao, ultima_execucao)
-
-        if linhas_erro:
-            msg = (
-                f"[Pentaho] ⚠️ Erros detectados na execução do arquivo:\n"
-                f"📄 Arquivo: {os.path.basename(arquivo)}\n\n"
-                f"🧾 Erros:\n" + "\n".join(linhas_erro[-5:])
-            )
-            log_event(msg)
-            notificar(msg)
-
-        if return_code == 0 and not linhas_erro:
-            log_event("[PENTAHO] Executado com sucesso")
-        else:
-            log_event(f"[PENTAHO] Erro (Código: {return_code})")
-            notificar(f"[PENTAHO] Erro (Código: {return_code})")
-
-            if not karaf_initialized:
-                log_event("[PENTAHO] Falha na inicialização do Karaf")
-                notificar("[PENTAHO] Falha na inicialização do Karaf")
-
-        return return_code
-
-    except subprocess.TimeoutExpired as e:
-        processo.kill()
-        if not karaf_initialized:
+# Padrões que identificam linhas de erro na saída de cada ferramenta
+PADROES_ERRO_PENTAHO = ('ERROR',)
+PADROES_ERRO = ('ERROR', 'EXCEPTION', 'FATAL')
+
+# Tempo (segundos) para o Karaf do Pentaho inicializar
+KARAF_TIMEOUT = 300
+
+def comando_pentaho(arquivo_kjb, memoria_mb=None):
+    """Monta o comando do Kitchen (.kjb) ou Pan (.ktr) com o ambiente do Pentaho"""
+    arquivo = os.path.abspath(os.path.normpath(arquivo_kjb))
+    script = PENTAHO_TRANSFORMATION if Path(arquivo).suffix.lower() == '.ktr' else PENTAHO_JOB
+    diretorio = os.path.dirname(script)
+
+    env = os.environ.copy()
+    env.update({
+        'PENTAHO_DI_JAVA_OPTIONS': opcoes_heap_java(memoria_mb),
+        'KETTLE_HOME': diretorio,
+        'KETTLE_JNDI_ROOT': os.path.join(diretorio, 'simple-jndi'),
+        'TEMP': os.environ.get('TEMP', r'C:\Temp'),
+        'TMP': os.environ.get('TMP', r'C:\Temp')
+    })
+    os.makedirs(env['TEMP'], exist_ok=True)
+
+    comando = comando_script(script, f'/file:{arquivo}', cwd=diretorio, env=env)
+    log_event(f"[PENTAHO] Iniciando execução do arquivo: {arquivo}")
+    log_event(f"[PENTAHO] Comando completo: {comando}")
+    log_event(f"[PENTAHO] Diretório de trabalho: {diretorio}")
+    return comando
+
+def comando_hop(arquivo, projeto, ambiente, memoria_mb=None):
+    """Monta o comando do hop-run para um workflow/pipeline do Apache Hop"""
+    arquivo = os.path.abspath(os.path.normpath(arquivo))
+    env = os.environ.copy()
+    if memoria_mb:
+        env['HOP_OPTIONS'] = opcoes_heap_java(memoria_mb)
+
+    comando = comando_script(
+        APACHE_HOP, '-j', projeto, '-r', ambiente, '-f', arquivo,
+        cwd=os.path.dirname(APACHE_HOP), env=env
+    )
+    log_event(f"[HOP] Executando: {comando}")
+    log_event(f"[HOP] Diretório: {os.path.dirname(APACHE_HOP)}")
+    return comando
+
+def comando_terminal(comando, descricao):
+    """Comando ou script de terminal (.bat, .cmd, .sh, python, etc.), interpretado pelo shell"""
+    log_event(f"[CMD] Iniciando: {descricao}")
+    log_event(f"[CMD] Comando: {comando}")
+    return Comando(comando, shell=True)
+
+class AnaliseSaida:
+    """Acompanha a saída de uma execução: últimas linhas de erro e inicialização do Karaf"""
+
+    def __init__(self, padroes_erro, karaf_timeout=None):
+        self.padroes_erro = padroes_erro
+        self.linhas_erro = collections.deque(maxlen=5)
+        self.karaf_timeout = karaf_timeout
+        self.karaf_inicializado = karaf_timeout is None
+
+    def __call__(self, execucao, linha):
+        maiusculas = linha.upper()
+        if any(p in maiusculas for p in self.padroes_erro):
+            self.linhas_erro.append(linha.strip())
+
+        if not self.karaf_inicializado:
+            if "OSGI Service Port" in linha:
+                self.karaf_inicializado = True
+                log_event("[PENTAHO] Karaf inicializado com sucesso")
+            elif execucao.duracao > self.karaf_timeout:
+                execucao.interromper("timeout na inicialização do Karaf")
+
+def registrar_duracao(id, execucao):
+    ultima_execucao = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    atualizar_execucao_no_banco(id, round(execucao.duracao / 60, 2), ultima_execucao)
+
+def encerrada_por_memoria(prefixo, arquivo, execucao, avisar):
+    """Notifica a execução encerrada pelo teto de memória, em vez de um código de saída genérico"""
+    msg = (
+        f"{prefixo} ⛔ Encerrado: {execucao.memoria.descricao()}\n"
+        f"📄 Arquivo: {os.path.basename(arquivo)}"
+    )
+    log_event(msg)
+    avisar(msg)
+
+def encerrada_por_concessao(prefixo, arquivo):
+    """Execução interrompida porque outro nó a assumiu: não é uma falha e não é notificada"""
+    log_event(f"{prefixo} Interrompido ({MOTIVO_CONCESSAO}), a execução continua em outro nó: {os.path.basename(arquivo)}")
+
+def concluir_pentaho(id, arquivo, analise, execucao, avisar=notificar_em_segundo_plano):
+    """Registra o resultado de um job/transformação do Pentaho e notifica falhas"""
+    if execucao.motivo == MOTIVO_MEMORIA:
+        encerrada_por_memoria("[PENTAHO]", arquivo, execucao, avisar)
+        return
+    if execucao.motivo == MOTIVO_CONCESSAO:
+        encerrada_por_concessao("[PENTAHO]", arquivo)
+        return
+    if execucao.interrompida:
+        if not analise.karaf_inicializado:
             msg = "[PENTAHO] Timeout na inicialização do Karaf"
         else:
             msg = "[PENTAHO] Timeout na execução do job"
-
         log_event(msg)
-        notificar(msg)
-        return 1
+        avisar(msg)
+        return
 
-    except Exception as e:
-        log_event(f"[PENTAHO] Erro crítico: {str(e)}")
-        notificar(f"[PyFlowT3] Erro crítico: {str(e)}")
-        raise
+    registrar_duracao(id, execucao)
 
-def executar_hop(id, arquivo, projeto, ambiente, timeout):
-    """Executa workflows/pipelines do Apache Hop"""
-    try:
-        arquivo = os.path.abspath(os.path.normpath(arquivo))
-        comando = [
-            APACHE_HOP,
-            '-j', projeto,
-            '-r', ambiente,
-            '-f', arquivo
-        ]
-
-        log_event(f"[HOP] Executando: {' '.join(comando)}")
-        log_event(f"[HOP] Diretório: {os.path.dirname(APACHE_HOP)}")
-
-        erros_detectados = []
-
-        processo = subprocess.Popen(
-            comando,
-            cwd=os.path.dirname(APACHE_HOP),
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,
-            text=True,
-            encoding='utf-8',
-            errors='replace',
-            shell=True  # Necessário para execução como serviço no Windows
+    if analise.linhas_erro:
+        msg = (
+            f"[Pentaho] ⚠️ Erros detectados na execução do arquivo:\n"
+            f"📄 Arquivo: {os.path.basename(arquivo)}\n\n"
+            f"🧾 Erros:\n" + "\n".join(analise.linhas_erro)
         )
-
-        start_time = time.time()
-        log_path = get_daily_log_path()
-
-        while True:
-            linha = processo.stdout.readline()
-            if linha == '' and processo.poll() is not None:
-                break
-
-            if linha:
-                # Atualiza o caminho do log se o dia tiver mudado
-                novo_log_path = get_daily_log_path()
-                if novo_log_path != log_path:
-                    log_path = novo_log_path
-
-                with open(log_path, "a", encoding='utf-8') as log_file:
-                    log_file.write(f"[PID {processo.pid}] {linha}")
-                    log_file.flush()
-
-                if any(p in linha.upper() for p in ['ERROR', 'EXCEPTION', 'FATAL']):
-                    erros_detectados.append(linha.strip())
-
-            if time.time() - start_time > timeout:
-                raise subprocess.TimeoutExpired(comando, timeout)
-
-        processo.wait()
-
-        end_time = time.time()
-        duracao = round((end_time - start_time) / 60, 2)  # em minutos
-        ultima_execucao = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-
-        atualizar_execucao_no_banco(id, duracao, ultima_execucao)
-
-        if processo.returncode == 0 and not erros_detectados:
-            log_event("[HOP] Executado com sucesso")
-        else:
-            log_event(f"[HOP] Erro (Código: {processo.returncode})")
-            if erros_detectados:
-                msg = (
-                    f"[HOP] ⚠️ Erros detectados no arquivo:\n"
-                    f"📄 Arquivo: {os.path.basename(arquivo)}\n\n"
-                    f"🧾 Linhas de erro:\n" + "\n".join(erros_detectados[-5:])  # últimos 5 erros
-                )
-                log_event(msg)
-                notificar(msg)
-            else:
-                notificar(f"[HOP] Erro (Código: {processo.returncode})")
-
-        return processo.returncode
-
-    except subprocess.TimeoutExpired:
-        processo.kill()
-        msg = "[HOP] Timeout excedido - processo terminado"
         log_event(msg)
-        notificar(msg)
-        return 1
+        avisar(msg)
 
-    except Exception as e:
-        msg = f"[HOP] Erro inesperado: {str(e)}"
+    if execucao_com_sucesso(execucao, analise):
+        log_event("[PENTAHO] Executado com sucesso")
+    else:
+        log_event(f"[PENTAHO] Erro (Código: {execucao.exitcode})")
+        avisar(f"[PENTAHO] Erro (Código: {execucao.exitcode})")
+
+        if not analise.karaf_inicializado:
+            log_event("[PENTAHO] Falha na inicialização do Karaf")
+            avisar("[PENTAHO] Falha na inicialização do Karaf")
+
+def concluir_hop(id, arquivo, analise, execucao, avisar=notificar_em_segundo_plano):
+    """Registra o resultado de um workflow/pipeline do Apache Hop e notifica falhas"""
+    if execucao.motivo == MOTIVO_MEMORIA:
+        encerrada_por_memoria("[HOP]", arquivo, execucao, avisar)
+        return
+    if execucao.motivo == MOTIVO_CONCESSAO:
+        encerrada_por_concessao("[HOP]", arquivo)
+        return
+    if execucao.interrompida:
+        msg = "[HOP] Timeout excedido - processo terminado"
         log_event(msg)
-        notificar(f"[PyFlowT3] Erro ao executar o workflow: {str(e)}")
-        raise
-
-    
-def executar_comando_terminal(id, comando, timeout=1800, descricao="Comando genérico"):
-    """
-    Executa um comando ou script no terminal (por exemplo .bat, .cmd, .sh, python, etc.)
-
-    Args:
-        comando (str): Comando completo a ser executado.
-        timeout (int): Tempo máximo de execução em segundos.
-        descricao (str): Texto descritivo para logs e notificações.
-
-    Returns:
-        int: Código de retorno do processo.
-    """
-    try:
-        log_event(f"[CMD] Iniciando: {descricao}")
-        log_event(f"[CMD] Comando: {comando}")
-
-        erros_detectados = []
-
-        processo = subprocess.Popen(
-            comando,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,
-            stdin=subprocess.PIPE,
-            text=True,
-            encoding='utf-8',
-            errors='replace',
-            shell=True  # Necessário para .bat e comandos do terminal
-        )
-
-        start_time = time.time()
-        log_path = get_daily_log_path()
-
-        while True:
-            linha = processo.stdout.readline()
-            if linha == '' and processo.poll() is not None:
-                break
-
-            if linha:
-                # Rotaciona log se mudou o dia
-                novo_log_path = get_daily_log_path()
-                if novo_log_path != log_path:
-                    log_path = novo_log_path
-
-                with open(log_path, "a", encoding='utf-8') as log_file:
-                    log_file.write(f"[PID {processo.pid}] {linha}")
-                    log_file.flush()
-
-                if any(p in linha.upper() for p in ['ERROR', 'EXCEPTION', 'FATAL']):
-                    erros_detectados.append(linha.strip())
+        avisar(msg)
+        return
 
-            if time.time() - start_time > timeout:
-                raise subprocess.TimeoutExpired(comando, timeout)
+    registrar_duracao(id, execucao)
 
-        processo.wait()
-
-        end_time = time.time()
-        duracao = round((end_time - start_time) / 60, 2)
-        ultima_execucao = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-
-        atualizar_execucao_no_banco(id, duracao, ultima_execucao)
-
-        if processo.returncode == 0 and not erros_detectados:
-            log_event(f"[CMD] Finalizado com sucesso: {descricao}")
-        else:
-            msg = f"[CMD] Erro ao executar: {descricao} (Código: {processo.returncode})"
-            if erros_detectados:
-                msg += "\n🧾 Linhas com erro:\n" + "\n".join(erros_detectados[-5:])
+    if execucao_com_sucesso(execucao, analise):
+        log_event("[HOP] Executado com sucesso")
+    else:
+        log_event(f"[HOP] Erro (Código: {execucao.exitcode})")
+        if analise.linhas_erro:
+            msg = (
+                f"[HOP] ⚠️ Erros detectados no arquivo:\n"
+                f"📄 Arquivo: {os.path.basename(arquivo)}\n\n"
+                f"🧾 Linhas de erro:\n" + "\n".join(analise.linhas_erro)
+            )
             log_event(msg)
-            notificar(msg)
-
-        return processo.returncode
-
-    except subprocess.TimeoutExpired:
-        processo.kill()
+            avisar(msg)
+        else:
+            avisar(f"[HOP] Erro (Código: {execucao.exitcode})")
+
+def concluir_terminal(id, descricao, analise, execucao, avisar=notificar_em_segundo_plano):
+    """Registra o resultado de um comando de terminal e notifica falhas"""
+    if execucao.motivo == MOTIVO_MEMORIA:
+        encerrada_por_memoria("[CMD]", descricao, execucao, avisar)
+        return
+    if execucao.motivo == MOTIVO_CONCESSAO:
+        encerrada_por_concessao("[CMD]", descricao)
+        return
+    if execucao.interrompida:
         msg = f"[CMD] Timeout excedido na execução de: {descricao}"
         log_event(msg)
-        notificar(msg)
-        return 1
+        avisar(msg)
+        return
 
-    except Exception as e:
-        msg = f"[CMD] Erro inesperado ao executar '{descricao}': {str(e)}"
-        log_event(msg)
-        notificar(msg)
-        raise
+    registrar_duracao(id, execucao)
 
-def obter_dia_semana_ptbr():
-    """Retorna o dia da semana em português"""
-    dia_eng = datetime.datetime.now().strftime("%a").lower()[:3]
-    return DIAS_SEMANA_MAP.get(dia_eng, dia_eng)
+    if execucao_com_sucesso(execucao, analise):
+        log_event(f"[CMD] Finalizado com sucesso: {descricao}")
+    else:
+        msg = f"[CMD] Erro ao executar: {descricao} (Código: {execucao.exitcode})"
+        if analise.linhas_erro:
+            msg += "\n🧾 Linhas com erro:\n" + "\n".join(analise.linhas_erro)
+        log_event(msg)
+        avisar(msg)
 
 class AgendadorHopService(win32serviceutil.ServiceFramework):
     _svc_name_ = "AgendadorHopService"
@@ -444,6 +341,33 @@ class AgendadorHopService(win32serviceutil.ServiceFramework):
         self.stop_event = threading.Event()
         self.timeout = 30000  # 30 segundos
         self.main_thread = None
+        self.fila = FilaAgendamentos()
+        self.relogio = RelogioMinutos(self.stop_event)
+        # (id do agendamento, fim da execução) dos agendamentos em modo após término, aplicados pelo loop principal
+        self._reagendamentos = collections.deque()
+        # Execuções da fila compartilhada reivindicadas por este nó, entregues ao pool pelo loop principal
+        self._reivindicadas = collections.deque()
+        self.no = NO_ID
+        # Dia da última limpeza do diário de execuções
+        self._limpeza_em = None
+        # Nice aplicado ao serviço (NICE_SERVICO); None se a prioridade não foi alterada
+        self.nice_servico = None
+        self.metricas = Metricas()
+        self.cache = CacheAgendamentos(DB_PATH)
+        self.renovador = RenovadorTravas(DB_PATH)
+        self.admissao = ControleAdmissao(self.metricas)
+        self.pool = PoolExecucao(
+            self._iniciar_processo, self.metricas,
+            admitir=self._admitir, finalizar=self._finalizar
+        )
+        self.supervisor = SupervisorProcessos(get_daily_log_path, self.metricas, ao_encerrar=self.pool.acordar)
+        self.coletor = ColetorOrfaos(
+            self.metricas, protegidos=lambda: [execucao.pid for execucao in self.supervisor.ativas()]
+        )
+        self.coordenador = CoordenadorNos(
+            DB_PATH, self._carga_no, self._receber_reivindicadas, self._avisar_recolocadas, no=self.no,
+            proprias=self._execucoes_proprias, ao_perder=self._perder_concessao
+        )
         socket.setdefaulttimeout(60)
         self.criar_banco_dados()
         self.verificar_ambiente()
@@ -476,17 +400,17 @@ class AgendadorHopService(win32serviceutil.ServiceFramework):
         
         if 'ultima_execucao' not in colunas:
             cursor.execute("ALTER TABLE agendamentos ADD COLUMN ultima_execucao DATETIME")
-            conn.commit()
-            conn.close()
 
         if 'duracao_execucao' not in colunas:
             cursor.execute("ALTER TABLE agendamentos ADD COLUMN duracao_execucao REAL")
-            conn.commit()
-            conn.close()
 
         if 'timeout_execucao' not in colunas:
             cursor.execute("ALTER TABLE agendamentos ADD COLUMN timeout_execucao INTEGER DEFAULT 1800")
-            conn.commit()
+
+        conn.commit()
+        conn.close()
+
+        garantir_esquema(DB_PATH)
 
     def verificar_ambiente(self):
         """Verifica requisitos do ambiente antes de iniciar"""
@@ -498,14 +422,21 @@ class AgendadorHopService(win32serviceutil.ServiceFramework):
         log_event(f"Python: {sys.version}")
 
     def SvcStop(self):
-        """Para o serviço de forma controlada"""
-        self.ReportServiceStatus(win32service.SERVICE_STOP_PENDING)
+        """Para o serviço de forma controlada, aguardando a drenagem das execuções em andamento"""
+        prazo = PRAZO_DRENAGEM + PRAZO_ENCERRAMENTO + 10
+        self.ReportServiceStatus(win32service.SERVICE_STOP_PENDING, waitHint=int(prazo * 1000))
         log_event("Recebido comando para parar o serviço")
         self.stop_event.set()
+        self.relogio.acordar()
         win32event.SetEvent(self.hWaitStop)
         
-        if self.main_thread and self.main_thread.is_alive():
-            self.main_thread.join(timeout=10.0)
+        limite = time.monotonic() + prazo
+        while self.main_thread and self.main_thread.is_alive() and time.monotonic() < limite:
+            self.main_thread.join(timeout=5.0)
+            # Informa ao gerenciador de serviços que a parada continua em andamento
+            self.ReportServiceStatus(
+                win32service.SERVICE_STOP_PENDING, waitHint=int(max(limite - time.monotonic(), 1) * 1000)
+            )
             
         self.ReportServiceStatus(win32service.SERVICE_STOPPED)
         log_event("Serviço parado com sucesso")
@@ -529,149 +460,691 @@ class AgendadorHopService(win32serviceutil.ServiceFramework):
         win32event.WaitForSingleObject(self.hWaitStop, win32event.INFINITE)
 
     def _main_loop(self):
-        """Loop principal de verificação de agendamentos"""
+        """
+        Loop principal: dorme até a virada do minuto ou até o disparo mais
+        próximo (intervalos em segundos) e executa apenas os agendamentos vencidos
+        """
         log_event("Iniciando loop principal de verificação")
+        relogio = self.relogio
+        try:
+            self.coordenador.iniciar()
+        except RuntimeError as e:
+            # Dois processos com o mesmo NO_ID executariam as execuções um do outro
+            log_event(f"[ERRO] {str(e)}; serviço não iniciado")
+            notificar_em_segundo_plano(f"[PyFlowT3] 🖧 Serviço não iniciado: {str(e)}")
+            aguardar_notificacoes(PRAZO_NOTIFICACOES)
+            self.stop_event.set()
+            win32event.SetEvent(self.hWaitStop)
+            return
+        log_event(f"Nó {self.no} iniciado")
+        self.nice_servico = elevar_prioridade_servico()
+        if self.nice_servico is not None:
+            log_event(f"Prioridade do serviço ajustada para nice {self.nice_servico}")
+        removidos = limpar_cgroups()
+        if removidos:
+            log_event(f"{removidos} cgroup(s) de execuções anteriores removido(s) de {CGROUP_MEMORIA}")
+        self.renovador.iniciar()
+        self.supervisor.iniciar()
+        self.pool.iniciar()
+        self.coletor.iniciar()
         
         while not self.stop_event.is_set():
             try:
-                self._verificar_agendamentos()
-                
-                # Espera 60 segundos ou até receber sinal de parada
-                for _ in range(60):
-                    if self.stop_event.is_set():
-                        break
-                    time.sleep(1)
+                minutos = relogio.proximo_tick(self.fila.proximo_disparo())
+                if minutos is None:
+                    break
+
+                if not minutos:
+                    # Antes da virada do minuto: disparos em segundos, após término ou reivindicados
+                    self._aplicar_reivindicadas()
+                    self._aplicar_reagendamentos()
+                    self._disparar_vencidos(datetime.datetime.now())
+                    continue
+
+                self._carregar_agendamentos(minutos[0])
+                if relogio.ticks == 1:
+                    self._reconciliar_execucoes()
+                    self._reabrir_sondagens()
+                    self._restaurar_fila()
+                    self._recuperar_perdidos(minutos[0])
+                self._aplicar_reivindicadas()
+                self._aplicar_reagendamentos()
+
+                # Minutos perdidos por atraso do loop são avaliados em ordem, com atraso
+                for minuto in minutos:
+                    self._disparar_vencidos(minuto)
+
+                if len(minutos) > 1:
+                    log_event(f"Tick atrasado: {len(minutos) - 1} minuto(s) avaliado(s) com atraso")
+
+                # Referência para recuperar disparos perdidos se o serviço parar
+                try:
+                    gravar_ultimo_tick(DB_PATH, minutos[-1])
+                except Exception as e:
+                    log_event(f"[ERRO] Falha ao gravar último tick: {str(e)}")
+
+                self._limpar_execucoes(minutos[-1])
+                self.metricas.atualizar(relogio.contadores())
+                self.metricas.publicar(DB_PATH)
                     
             except Exception as e:
                 log_event(f"Erro no loop principal: {str(e)}")
-                notificar(f"[PyFlowT3] Erro ao executar o workflow: {str(e)}")
+                notificar_em_segundo_plano(f"[PyFlowT3] Erro ao executar o workflow: {str(e)}")
                 if not self.stop_event.is_set():
                     time.sleep(10)
         
+        self.coletor.parar()
+        self.coordenador.suspender()
+        self._drenar()
+        self.supervisor.parar()
+        self.pool.parar()
+        self.coordenador.parar()
+        self.renovador.parar()
+        self.cache.fechar()
+        aguardar_notificacoes(PRAZO_NOTIFICACOES)
         log_event("Loop principal finalizado")
 
-    def _verificar_agendamentos(self):
-        """Verifica agendamentos no banco de dados"""
-        if self.stop_event.is_set():
-            return
-            
+    def _carregar_agendamentos(self, agora):
+        """Recompila apenas os agendamentos alterados desde a última verificação"""
         try:
-            agora = datetime.datetime.now()
-            dia_semana = obter_dia_semana_ptbr()
-            dia_mes = str(agora.day)
-            hora_atual = agora.strftime("%H:%M")
-            minuto_atual = agora.minute
-            
-            with sqlite3.connect(DB_PATH) as conn:
-                cursor = conn.cursor()
-                cursor.execute("""
-                    SELECT arquivo, horario, intervalo, dias_semana, 
-                           dias_mes, hora_inicio, hora_fim, projeto, 
-                           local_run, ferramenta_etl,id, timeout_execucao
-                    FROM agendamentos
-                    WHERE status = 'Ativo'
-                """)
-                
-                for agendamento in cursor:
-                    if self.stop_event.is_set():
-                        break
-                    self._processar_agendamento(agendamento, hora_atual, dia_semana, dia_mes, agora, minuto_atual)
-                    
+            if calendarios_alterados():
+                # Feriados mudaram: todos os agendamentos são recompilados com os novos calendários
+                log_event("Calendários alterados, recarregando agendamentos")
+                self.cache.invalidar()
+            alteracoes = self.cache.alteracoes()
         except Exception as e:
             log_event(f"Erro ao verificar agendamentos: {str(e)}")
-            notificar(f"[PyFlowT3] Erro ao executar o workflow: {str(e)}")
+            notificar_em_segundo_plano(f"[PyFlowT3] Erro ao executar o workflow: {str(e)}")
+            return
 
-    def _processar_agendamento(self, agendamento, hora_atual, dia_semana, dia_mes, agora, minuto_atual):
-        """Processa um agendamento individual com todas as condições combinadas"""
-        
-        (arquivo, horario, intervalo, dias_semana_ag, dias_mes_ag, 
-        hora_inicio, hora_fim, projeto, local_run, ferramenta_etl,id ,timeout_execucao ) = agendamento
-        
-        timeout_execucao = int(timeout_execucao or 1800)
-        # Inicializa como False - só deve executar se TODAS as condições aplicáveis forem atendidas
-        deve_executar = False
-        
-        # Pré-processamento dos dados
-        intervalo = int(intervalo) if intervalo and str(intervalo).isdigit() else 0
-        dias_semana_list = [d.strip().lower() for d in dias_semana_ag.split(",")] if dias_semana_ag else []
-        dias_mes_list = [d.strip() for d in dias_mes_ag.split(",")] if dias_mes_ag else []
-        
-        # 1. Verificação de horário fixo (tem precedência sobre tudo)
-        if horario and horario.strip():
-            if horario == hora_atual:
-                deve_executar = True
+        if alteracoes is None:
+            return
+
+        linhas, removidos = alteracoes
+        for id_agendamento in removidos:
+            self.fila.remover(id_agendamento)
+        for linha in linhas:
+            self.fila.adicionar(compilar_regra(linha), agora)
+        # O coordenador só reivindica execuções de agendamentos já carregados por este nó
+        self.coordenador.conhecidos = frozenset(regra.id for regra in self.fila.regras())
+
+    def _disparar_vencidos(self, momento):
+        """Dispara os agendamentos com disparo previsto até `momento`"""
+        disparos = []
+        for regra, horario_previsto in self.fila.retirar_vencidos(momento):
+            if self.stop_event.is_set():
+                break
+            log_event(f"Agendamento cumpre condições para execução: {regra.arquivo} ({horario_previsto:%H:%M:%S})")
+            disparos.append(self._preparar_disparo(regra, horario_previsto, escalonar=True))
+        self._publicar_disparos(disparos)
+
+    def _aplicar_reagendamentos(self):
+        """Arma o próximo disparo dos agendamentos em modo após término cujas execuções terminaram"""
+        while self._reagendamentos:
+            id_agendamento, fim = self._reagendamentos.popleft()
+            self.fila.reagendar_apos_termino(id_agendamento, fim)
+
+    def _armar_apos_termino(self, regra):
+        """
+        Chamado pelo pool ao fim da execução: em modo após término, o próximo
+        início conta a partir de agora. A fila de agendamentos pertence ao loop
+        principal, que é acordado para armar o disparo.
+        """
+        if regra.apos_termino:
+            self._reagendamentos.append((regra.id, datetime.datetime.now()))
+            self.relogio.acordar()
+
+    def _recuperar_perdidos(self, agora):
+        """Dispara, conforme a política de cada agendamento, os horários perdidos com o serviço parado"""
+        try:
+            ultimo_tick = ler_ultimo_tick(DB_PATH)
+            recuperar = disparos_a_recuperar(DB_PATH, self.fila.regras(), ultimo_tick, agora)
+        except Exception as e:
+            log_event(f"[ERRO] Falha ao calcular disparos perdidos: {str(e)}")
+            return
+
+        if not recuperar:
+            return
+        log_event(f"Serviço parado desde {ultimo_tick:%d/%m %H:%M}: {len(recuperar)} disparo(s) perdido(s) serão recuperados")
+        disparos = []
+        for regra, horario_previsto in recuperar:
+            log_event(f"Recuperando disparo perdido ({regra.politica_perdidos}): {regra.arquivo} ({horario_previsto:%d/%m %H:%M})")
+            disparos.append(self._preparar_disparo(regra, horario_previsto, recuperacao=True))
+        self._publicar_disparos(disparos)
+
+    def _disparar(self, regra, horario_previsto=None, escalonar=False, recuperacao=False, chave=None):
+        """
+        Envia o agendamento para o pool, que respeita os limites de execução
+        simultânea; `chave` identifica entre os nós disparos sem horário previsto
+        """
+        self._publicar_disparos([self._preparar_disparo(regra, horario_previsto, escalonar, recuperacao, chave)])
+
+    def _preparar_disparo(self, regra, horario_previsto=None, escalonar=False, recuperacao=False, chave=None):
+        """(pedido, disponivel_em) do disparo, ou None se o disjuntor o suspendeu"""
+        permitido, sondagem = self._consultar_disjuntor(regra)
+        if not permitido:
+            # A cadeia do modo após término continua, para tentar de novo no próximo intervalo
+            self._armar_apos_termino(regra)
+            return None
+
+        # Escalonamento: o início é adiado pelo deslocamento fixo do agendamento,
+        # contado a partir do minuto previsto, para não subir todas as JVMs juntas
+        atraso, disponivel_em = 0.0, None
+        if escalonar and regra.deslocamento and horario_previsto is not None:
+            disponivel_em = horario_previsto + datetime.timedelta(seconds=regra.deslocamento)
+            atraso = max((disponivel_em - datetime.datetime.now()).total_seconds(), 0.0)
+            log_event(f"Início escalonado para {disponivel_em:%H:%M:%S} (+{regra.deslocamento}s): {regra.arquivo}")
+
+        pedido = PedidoExecucao(regra, horario_previsto, atraso=atraso)
+        pedido.recuperacao = recuperacao
+        pedido.chave = chave
+        pedido.sondagem = sondagem
+        return pedido, disponivel_em
+
+    def _publicar_disparos(self, disparos):
+        """
+        Registra os disparos na fila compartilhada em uma única transação e envia
+        ao pool os que ficam com este nó. Com vários nós, cada disparo fica com este
+        nó se ele é o menos carregado; senão vai para a fila compartilhada.
+        Sondagens ficam sempre com o nó que as liberou.
+        """
+        disparos = [disparo for disparo in disparos if disparo is not None]
+        if not disparos:
+            return
+        pedidos = [pedido for pedido, _ in disparos]
+        # A carga é medida uma vez por lote; cada disparo assumido conta na fila local
+        capacidade, em_execucao, fila, cpu = self._medir_no()
+        cargas, reivindicar = [], []
+        for pedido in pedidos:
+            carga = carga_no(capacidade, em_execucao, fila, cpu)
+            assumir = pedido.sondagem or self.coordenador.menos_carregado(carga)
+            if assumir:
+                fila += 1
+            cargas.append(carga)
+            reivindicar.append(assumir)
+
+        registrado = True
+        try:
+            ids = publicar_execucoes(DB_PATH, self.no, [dict(
+                id_agendamento=pedido.regra.id, prioridade=pedido.regra.prioridade,
+                horario_previsto=pedido.horario_previsto, disponivel_em=disponivel_em,
+                reivindicar=assumir, apos_termino=pedido.regra.apos_termino, chave=pedido.chave
+            ) for (pedido, disponivel_em), assumir in zip(disparos, reivindicar)])
+        except Exception as e:
+            log_event(f"[ERRO] Falha ao registrar execução na fila: {str(e)}")
+            # Sem o banco, o nó executa tudo localmente, como com um único nó
+            ids, reivindicar, registrado = [None] * len(pedidos), [True] * len(pedidos), False
+
+        for pedido, id_execucao, assumir, carga in zip(pedidos, ids, reivindicar, cargas):
+            regra = pedido.regra
+            if registrado and id_execucao is None:
+                log_event(f"Disparo já registrado por outro nó (ou execução anterior em andamento): {regra.arquivo}")
+                self._armar_apos_termino(regra)
+                continue
+            pedido.id_execucao = id_execucao
+            if not assumir:
+                log_event(f"Execução na fila compartilhada para um nó menos carregado (carga {carga:.0%}): {regra.arquivo}")
+                # O nó que executar continua a cadeia do modo após término; este volta a conferir no próximo intervalo
+                self._armar_apos_termino(regra)
+                continue
+            self.pool.submeter(pedido)
+
+    def _consultar_disjuntor(self, regra):
+        """Retorna (permitido, sondagem) conforme o disjuntor do agendamento"""
+        try:
+            permitido, sondagem = liberar_disparo(DB_PATH, regra)
+        except Exception as e:
+            log_event(f"[ERRO] Falha ao consultar disjuntor de {regra.arquivo}: {str(e)}")
+            return True, False
+        if not permitido:
+            log_event(f"Disparo suspenso pelo disjuntor aberto: {regra.arquivo}")
+        elif sondagem:
+            log_event(f"Disjuntor aberto, executando sondagem: {regra.arquivo}")
+        return permitido, sondagem
+
+    def _registrar_disjuntor(self, pedido, sucesso):
+        """Atualiza o disjuntor com o resultado final da execução e notifica apenas as transições"""
+        regra = pedido.regra
+        if not regra.disjuntor_falhas:
+            return
+        try:
+            anterior, novo = registrar_resultado(DB_PATH, regra, sucesso)
+        except Exception as e:
+            log_event(f"[ERRO] Falha ao atualizar disjuntor de {regra.arquivo}: {str(e)}")
+            return
+
+        if novo == ESTADO_ABERTO and anterior == ESTADO_FECHADO:
+            retorno = f"sondagem a cada {regra.disjuntor_sonda}s" if regra.disjuntor_sonda else "suspenso até ser religado"
+            msg = (
+                f"[PyFlowT3] 🔌 Disjuntor aberto após {regra.disjuntor_falhas} falha(s) seguida(s), "
+                f"agendamento {retorno}: {regra.arquivo}"
+            )
+            log_event(msg)
+            notificar_em_segundo_plano(msg)
+        elif novo == ESTADO_ABERTO and pedido.sondagem:
+            log_event(f"Sondagem falhou, disjuntor continua aberto: {regra.arquivo}")
+        elif novo == ESTADO_FECHADO and anterior != ESTADO_FECHADO:
+            msg = f"[PyFlowT3] ✅ Disjuntor fechado após execução com sucesso: {regra.arquivo}"
+            log_event(msg)
+            notificar_em_segundo_plano(msg)
+
+    def _reabrir_sondagens(self):
+        """Sondagens interrompidas pela parada do serviço voltam a aguardar o próximo disparo"""
+        try:
+            if cancelar_sondagens(DB_PATH):
+                log_event("Sondagens de disjuntor interrompidas pela parada serão refeitas")
+        except Exception as e:
+            log_event(f"[ERRO] Falha ao reabrir sondagens de disjuntor: {str(e)}")
+
+    def _drenar(self):
+        """Para de iniciar execuções e aguarda as que estão em andamento, até PRAZO_DRENAGEM"""
+        em_execucao = len(self.pool.em_execucao())
+        if em_execucao and PRAZO_DRENAGEM > 0:
+            log_event(f"Aguardando até {PRAZO_DRENAGEM:.0f}s o término de {em_execucao} execução(ões)")
+        restantes = self.pool.drenar(PRAZO_DRENAGEM)
+        if restantes:
+            log_event(f"{restantes} execução(ões) ainda em andamento serão interrompidas")
+
+    def _limpar_execucoes(self, agora):
+        """Uma vez por dia (e ao iniciar), remove do diário as execuções encerradas há mais tempo que a retenção"""
+        if self._limpeza_em == agora.date():
+            return
+        self._limpeza_em = agora.date()
+        try:
+            removidas = limpar_execucoes(DB_PATH, AMOSTRAS_DURACAO)
+        except Exception as e:
+            log_event(f"[ERRO] Falha ao limpar o diário de execuções: {str(e)}")
+            return
+        if removidas:
+            log_event(f"{removidas} execução(ões) antiga(s) removida(s) do diário")
+
+    def _reconciliar_execucoes(self):
+        """
+        Confere as execuções que constavam em andamento quando o serviço parou:
+        processos ainda vivos voltam a ser acompanhados (ocupando slot e trava),
+        os demais são marcados como abandonados.
+        """
+        try:
+            vivas, abandonadas = reconciliar_iniciadas(DB_PATH, self.no)
+        except Exception as e:
+            log_event(f"[ERRO] Falha ao ler execuções em andamento: {str(e)}")
+            return
+
+        for id_execucao, id_agendamento, _, _, _, pid, _ in abandonadas:
+            log_event(f"Execução {id_execucao} (agendamento {id_agendamento}, PID {pid}) abandonada durante a parada do serviço")
+
+        agora = datetime.datetime.now()
+        for id_execucao, id_agendamento, horario_previsto, iniciado_em, tentativa, pid, _ in vivas:
+            regra = self.fila.regra(id_agendamento)
+            if regra is None:
+                registrar_fim(DB_PATH, id_execucao, ESTADO_ABANDONADA)
+                log_event(f"Execução {id_execucao} (agendamento {id_agendamento}, PID {pid}) abandonada: agendamento removido")
+                continue
+
+            if not adotar_execucao(DB_PATH, id_execucao, self.no):
+                log_event(f"Execução {id_execucao} (agendamento {id_agendamento}) já assumida por outro nó; não reanexada")
+                continue
+
+            decorrido = (agora - ler_data(iniciado_em)).total_seconds() if iniciado_em else 0.0
+            pedido = PedidoExecucao(regra, ler_data(horario_previsto), tentativa=tentativa or 1)
+            pedido.id_execucao = id_execucao
+            pedido.trava = adquirir_trava(DB_PATH, regra.id, "servico", regra.max_paralelo)
+            if pedido.trava is not None:
+                self.renovador.adicionar(pedido.trava)
+            pedido.handle = self.supervisor.reanexar(
+                pid, rotulo=f"{Path(regra.arquivo).name} (reanexada)", timeout=self._timeout(regra) - decorrido,
+                ao_terminar=lambda execucao, arquivo=regra.arquivo: log_event(
+                    f"Execução reanexada terminou (PID {execucao.pid}, {execucao.duracao:.0f}s após o reinício): {arquivo}"
+                ),
+                aviso=self._aviso_duracao(regra, decorrido)
+            )
+            self.pool.adotar(pedido)
+            log_event(f"Execução em andamento reanexada após o reinício (PID {pid}): {regra.arquivo}")
+
+    def _restaurar_fila(self):
+        """Devolve ao pool as execuções que aguardavam na fila quando o serviço parou"""
+        try:
+            pendentes = execucoes_na_fila(DB_PATH, self.no)
+        except Exception as e:
+            log_event(f"[ERRO] Falha ao ler fila de execuções: {str(e)}")
+            return
+
+        self._submeter_pendentes(pendentes)
+        if pendentes:
+            log_event(f"{len(pendentes)} execução(ões) pendente(s) restaurada(s) da fila")
+
+    def _submeter_pendentes(self, pendentes):
+        """Envia ao pool execuções registradas na fila (restauradas ou reivindicadas de outros nós)"""
+        agora = datetime.datetime.now()
+        for id_execucao, id_agendamento, horario_previsto, enfileirado_em, tentativa, disponivel_em, chave in pendentes:
+            regra = self.fila.regra(id_agendamento)
+            if regra is None:
+                registrar_fim(DB_PATH, id_execucao, ESTADO_DESCARTADA)
+                continue
+            # Retentativas contam a espera a partir de quando podiam iniciar
+            referencia = ler_data(disponivel_em) or ler_data(enfileirado_em)
+            espera = (agora - referencia).total_seconds() if referencia else 0.0
+            pedido = PedidoExecucao(
+                regra, ler_data(horario_previsto),
+                espera_anterior=max(espera, 0.0), atraso=max(-espera, 0.0), tentativa=tentativa or 1
+            )
+            pedido.id_execucao = id_execucao
+            pedido.chave = chave
+            self.pool.submeter(pedido)
+
+    def _carga_no(self):
+        """(capacidade, em_execucao, fila, carga) deste nó, publicados no batimento"""
+        capacidade, em_execucao, fila, cpu = self._medir_no()
+        return capacidade, em_execucao, fila, carga_no(capacidade, em_execucao, fila, cpu)
+
+    def _medir_no(self):
+        """(capacidade, em_execucao, fila, uso de CPU) deste nó"""
+        estado = self.pool.estado()
+        capacidade = self.pool.limite_global or os.cpu_count() or 1
+        em_execucao = estado['pool_em_execucao']
+        fila = estado['pool_fila'] + estado['pool_aguardando_retentativa']
+        return capacidade, em_execucao, fila, self.admissao.cpu.uso()
+
+    def _receber_reivindicadas(self, linhas):
+        """Chamado pelo coordenador: a fila de agendamentos pertence ao loop principal, que é acordado"""
+        self._reivindicadas.extend(linhas)
+        self.relogio.acordar()
+
+    def _aplicar_reivindicadas(self):
+        linhas = []
+        while self._reivindicadas:
+            linhas.append(self._reivindicadas.popleft())
+        if linhas:
+            log_event(f"{len(linhas)} execução(ões) reivindicada(s) da fila compartilhada pelo nó {self.no}")
+            self._submeter_pendentes(linhas)
+
+    def _execucoes_proprias(self):
+        """Ids das execuções mantidas por este nó (pool e reivindicadas a aplicar), renovadas no batimento"""
+        ids = {pedido.id_execucao for pedido in self.pool.pedidos() if pedido.id_execucao is not None}
+        ids.update(linha[0] for linha in list(self._reivindicadas))
+        return ids
+
+    def _perder_concessao(self, ids):
+        """
+        Chamado pelo coordenador: outro nó assumiu (ou pode ter assumido) estas
+        execuções. As em andamento são interrompidas e as da fila descartadas
+        no despacho, sem registrar resultado, retentativa ou dependentes.
+        """
+        ids = set(ids)
+        for pedido in self.pool.pedidos():
+            if pedido.id_execucao not in ids or pedido.concessao_perdida:
+                continue
+            pedido.concessao_perdida = True
+            if pedido.handle is not None:
+                log_event(f"Concessão perdida, interrompendo execução {pedido.id_execucao} (PID {pedido.handle.pid}): {pedido.regra.arquivo}")
+                self.supervisor.interromper(pedido.handle, MOTIVO_CONCESSAO)
+        self.pool.acordar()
+
+    def _avisar_recolocadas(self, recolocadas):
+        """Execuções de nós sem batimento devolvidas à fila compartilhada"""
+        for id_execucao, id_agendamento, no, estado in recolocadas:
+            log_event(f"Concessão do nó {no} expirada: execução {id_execucao} (agendamento {id_agendamento}, {estado}) devolvida à fila")
+        em_andamento = [r for r in recolocadas if r[3] == ESTADO_EXECUTANDO]
+        if em_andamento:
+            nos = ", ".join(sorted({r[2] for r in em_andamento}))
+            notificar_em_segundo_plano(
+                f"[PyFlowT3] 🖧 Nó(s) {nos} sem batimento: {len(em_andamento)} execução(ões) em andamento "
+                f"devolvida(s) à fila para outro nó"
+            )
+
+    def _admitir(self, pedido):
+        """Aplica a política de sobreposição usando a trava compartilhada entre processos"""
+        regra = pedido.regra
+        if pedido.concessao_perdida:
+            return None
+        if pedido.trava is not None:
+            return True
+
+        # Segura a execução enquanto o servidor não tem memória/CPU para ela
+        if not self.admissao.admitir(pedido, self.pool.em_execucao()):
+            return False
+
+        pedido.trava = adquirir_trava(DB_PATH, regra.id, "servico", regra.max_paralelo)
+        if pedido.trava is not None:
+            self.renovador.adicionar(pedido.trava)
+            self._sair_da_espera(pedido)
+            return True
+
+        if pedido.aguardando_trava:
+            return False
+
+        # Disparos recuperados do mesmo agendamento executam um após o outro, sem descarte
+        if pedido.recuperacao:
+            return False
+
+        if regra.politica_sobreposicao == POLITICA_ENFILEIRAR and registrar_espera(DB_PATH, regra.id, "servico"):
+            pedido.aguardando_trava = True
+            self.renovador.adicionar_espera(regra.id)
+            log_event(f"Agendamento ainda em execução, nova execução aguardando: {regra.arquivo}")
+            return False
+
+        log_event(f"Agendamento ainda em execução, disparo ignorado ({regra.politica_sobreposicao}): {regra.arquivo}")
+        return None
+
+    def _sair_da_espera(self, pedido):
+        if pedido.aguardando_trava:
+            pedido.aguardando_trava = False
+            self.renovador.remover_espera(pedido.regra.id)
+            remover_espera(DB_PATH, pedido.regra.id)
+
+    def _finalizar(self, pedido):
+        """Libera a trava (ou a vaga de espera) ocupada pela execução, registra o término e dispara dependentes"""
+        self.admissao.esquecer(pedido)
+        self._sair_da_espera(pedido)
+        if pedido.trava is not None:
+            self.renovador.remover(pedido.trava)
+            pedido.trava.liberar()
+            pedido.trava = None
+
+        if pedido.concessao_perdida:
+            # Outro nó executa (ou executará) este disparo: nada é registrado por este nó.
+            # Se a execução ainda é deste nó (batimento falhou, mas ninguém a assumiu), volta à fila.
+            try:
+                if pedido.id_execucao is not None and devolver_execucao(DB_PATH, pedido.id_execucao, self.no):
+                    log_event(f"Execução {pedido.id_execucao} devolvida à fila compartilhada: {pedido.regra.arquivo}")
+            except Exception as e:
+                log_event(f"[ERRO] Falha ao devolver execução {pedido.id_execucao} à fila: {str(e)}")
+            return
+
+        # Gravado com o fim da execução: dependentes (em qualquer nó) leem o mesmo resultado do banco
+        sucesso = pedido.handle is not None and execucao_com_sucesso(pedido.handle, pedido.analise)
+        if pedido.id_execucao is not None:
+            if pedido.handle is None:
+                registrado = registrar_fim(DB_PATH, pedido.id_execucao, ESTADO_DESCARTADA, no=self.no)
             else:
-                return False  # Horário fixo não coincide - ignora todas outras condições
-        
-        # 2. Verificação de dias da semana (se especificado)
-        if dias_semana_list:
-            if remover_acentuacao(dia_semana.lower()) not in dias_semana_list:
-                #log_event(f"Dias da semana | hoje {dia_semana.lower()} | Agendado: {dias_semana_list}")
-                return False
-        
-        # 3. Verificação de dias do mês (se especificado)
-        if dias_mes_list:
-            if str(dia_mes) not in dias_mes_list:
-                return False
-        
-        # 4. Verificação de janela de horário e intervalo
-        if hora_inicio and hora_fim:
-            if not (hora_inicio <= hora_atual <= hora_fim):
-                return False
-            
-            # Se tem intervalo, verifica o minuto exato
-            if intervalo > 0:
-                hora_min = hora_inicio.split(':')
-                hora_min_ref = int(hora_min[0]) * 60 + int(hora_min[1])
-                hora_min_atual = agora.hour * 60 + agora.minute
-                delta_minutos = hora_min_atual - hora_min_ref
-                
-                if delta_minutos >= 0 and delta_minutos % intervalo == 0:
-                    deve_executar = True
-        elif intervalo > 0:
-            # Verifica apenas o intervalo sem janela de horário
-            if minuto_atual % intervalo == 0:
-                deve_executar = True
+                # Duração só é confiável para processos acompanhados desde o início (não reanexados)
+                duracao = pedido.handle.duracao if pedido.handle.exitcode is not None else None
+                registrado = registrar_fim(
+                    DB_PATH, pedido.id_execucao, codigo_retorno=pedido.handle.exitcode, duracao_seg=duracao,
+                    motivo=motivo_fim(pedido.handle, pedido.analise), no=self.no
+                )
+            if not registrado:
+                # Recolocada na fila por outro nó enquanto este estava sem batimento
+                log_event(f"Execução {pedido.id_execucao} assumida por outro nó; resultado deste nó descartado: {pedido.regra.arquivo}")
+                return
+
+        if pedido.handle is None or pedido.handle.exitcode is None:
+            if pedido.handle is not None:
+                # Execução reanexada: o código de saída de um processo que não é filho não pode ser lido
+                log_event(f"Resultado desconhecido para execução reanexada; sem retentativa nem dependentes: {pedido.regra.arquivo}")
+            if pedido.sondagem:
+                # Sondagem sem resultado (descartada ou reanexada): a próxima pode ser feita no disparo seguinte
+                cancelar_sondagem(DB_PATH, pedido.regra.id)
+        elif sucesso:
+            self._atualizar_duracoes(pedido)
+            self._registrar_disjuntor(pedido, sucesso=True)
+            self._disparar_dependentes(pedido.regra)
+        elif not pedido.sondagem and self._agendar_retentativa(pedido):
+            # Em modo após término o próximo início conta do fim da última tentativa
+            return
         else:
-            # Caso não tenha nem intervalo nem janela de horário
-            deve_executar = True
-        
-        # Execução se todas as condições foram atendidas
-        if deve_executar and not self.stop_event.is_set():
-            log_event(f"Agendamento cumpre condições para execução: {arquivo}")
-            
+            # Sondagens não têm retentativas: uma falha mantém o disjuntor aberto
+            self._registrar_disjuntor(pedido, sucesso=False)
+        self._armar_apos_termino(pedido.regra)
+
+    def _atualizar_duracoes(self, pedido):
+        """Recalcula os percentis de duração do agendamento com a execução que acabou de terminar"""
+        if pedido.id_execucao is None:
+            return
+        try:
+            atualizar_duracoes(DB_PATH, pedido.regra.id)
+        except Exception as e:
+            log_event(f"[ERRO] Falha ao atualizar durações de {pedido.regra.arquivo}: {str(e)}")
+
+    def _timeout(self, regra):
+        """Timeout da próxima execução: adaptativo pelo histórico, se configurado, ou o fixo"""
+        try:
+            timeout = timeout_efetivo(DB_PATH, regra)
+        except Exception as e:
+            log_event(f"[ERRO] Falha ao calcular timeout adaptativo de {regra.arquivo}: {str(e)}")
+            return regra.timeout
+        if timeout != regra.timeout:
+            log_event(f"Timeout adaptativo: {timeout}s (fixo {regra.timeout}s): {regra.arquivo}")
+        return timeout
+
+    def _aviso_duracao(self, regra, decorrido=0.0):
+        """
+        Aviso do supervisor para a execução que passar do limiar de duração do
+        agendamento; None sem histórico suficiente ou, em execuções reanexadas,
+        se o limiar já tinha passado antes do reinício (o aviso já foi enviado)
+        """
+        try:
+            alerta = alerta_duracao(DB_PATH, regra.id)
+        except Exception as e:
+            log_event(f"[ERRO] Falha ao ler durações de {regra.arquivo}: {str(e)}")
+            return None
+        if alerta is None or alerta[0] <= decorrido:
+            return None
+        limiar, p95 = alerta
+
+        def avisar(execucao):
+            msg = (
+                f"[PyFlowT3] ⏳ Execução mais demorada que o normal:\n"
+                f"📄 Arquivo: {Path(regra.arquivo).name}\n"
+                f"⏱️ Em execução há {(decorrido + execucao.duracao) / 60:.1f} min (p95: {p95 / 60:.1f} min)"
+            )
+            log_event(f"Execução acima da duração habitual ({limiar}s, p95 {p95:.0f}s): {regra.arquivo}")
+            notificar_em_segundo_plano(msg)
+
+        return limiar - decorrido, avisar
+
+    def _agendar_retentativa(self, pedido):
+        """
+        Devolve ao pool, após o backoff, uma execução que falhou e ainda tem
+        tentativas; retorna True se a retentativa foi agendada
+        """
+        regra = self.fila.regra(pedido.regra.id)
+        if regra is None or pedido.tentativa >= regra.max_tentativas:
+            if pedido.tentativa > 1:
+                log_event(f"Execução falhou após {pedido.tentativa} tentativa(s): {pedido.regra.arquivo}")
+            return False
+
+        tentativa = pedido.tentativa + 1
+        atraso = regra.atraso_retentativa(pedido.tentativa)
+        disponivel_em = datetime.datetime.now() + datetime.timedelta(seconds=atraso)
+        novo = PedidoExecucao(regra, pedido.horario_previsto, atraso=atraso, tentativa=tentativa)
+        novo.chave = pedido.chave
+        try:
+            novo.id_execucao = publicar_execucao(
+                DB_PATH, self.no, regra.id, regra.prioridade, pedido.horario_previsto,
+                tentativa=tentativa, disponivel_em=disponivel_em, chave=pedido.chave
+            )
+            if novo.id_execucao is None:
+                # Esta execução foi recolocada na fila e outro nó já registrou a retentativa
+                log_event(f"Retentativa {tentativa} já registrada por outro nó: {regra.arquivo}")
+                return True
+        except Exception as e:
+            log_event(f"[ERRO] Falha ao registrar retentativa na fila: {str(e)}")
+        motivo = motivo_fim(pedido.handle, pedido.analise)
+        log_event(
+            f"Tentativa {pedido.tentativa}/{regra.max_tentativas} falhou (código {pedido.handle.exitcode}"
+            f"{f', {motivo}' if motivo else ''}); nova tentativa em {atraso:.0f}s: {regra.arquivo}"
+        )
+        self.pool.submeter(novo)
+        return True
+
+    def _disparar_dependentes(self, regra):
+        """Dispara os agendamentos cujas dependências terminaram todas com sucesso"""
+        try:
+            prontos = dependentes_prontos(DB_PATH, regra.id)
+        except Exception as e:
+            log_event(f"[ERRO] Falha ao verificar dependentes de {regra.arquivo}: {str(e)}")
+            return
+
+        for id_dependente in prontos:
+            dependente = self.fila.regra(id_dependente)
+            if dependente is None:
+                continue
             try:
-                if ferramenta_etl == 'PENTAHO':
-                    processo = multiprocessing.Process(
-                        target=executar_pentaho,
-                        args=(id, arquivo),
-                        kwargs={'timeout': timeout_execucao},
-                        name=f"Pentaho_{Path(arquivo).name}"
-                    )
-                elif ferramenta_etl == 'APACHE_HOP':
-                    processo = multiprocessing.Process(
-                        target=executar_hop,
-                        args=(id, arquivo, projeto, local_run),
-                        kwargs={'timeout': timeout_execucao},
-                        name=f"Hop_{Path(arquivo).name}"
-                    )
-                else:
-                    processo = multiprocessing.Process(
-                        target=executar_comando_terminal,
-                        args=(id, arquivo),
-                        kwargs={'timeout': timeout_execucao, 'descricao': f"Execução terminal: {Path(arquivo).name}"},
-                        name=f"Terminal_{Path(arquivo).name}"
-                    )
-
-                processo.daemon = True
-                processo.start()
-                log_event(f"Processo iniciado (PID: {processo.pid})")
-                
+                chave = chave_dependencias(DB_PATH, id_dependente)
             except Exception as e:
-                log_event(f"Falha ao iniciar processo: {str(e)}")
-                notificar(f"[PyFlowT3] Erro ao executar o workflow: {str(e)}")
-        
-        return deve_executar
+                log_event(f"[ERRO] Falha ao calcular a chave do disparo de {dependente.arquivo}: {str(e)}")
+                chave = None
+            log_event(f"Dependências concluídas, disparando: {dependente.arquivo} (após {regra.arquivo})")
+            self._disparar(dependente, chave=chave)
+
+    def _iniciar_processo(self, pedido):
+        """Inicia a ferramenta do agendamento diretamente, acompanhada pelo supervisor"""
+        regra = pedido.regra
+        arquivo = regra.arquivo
+        # Falhas da sondagem não são notificadas: o disjuntor já avisou que está aberto
+        avisar = (lambda msg: None) if pedido.sondagem else notificar_em_segundo_plano
+        try:
+            if regra.ferramenta_etl == 'PENTAHO':
+                comando = comando_pentaho(arquivo, regra.memoria_mb)
+                analise = AnaliseSaida(PADROES_ERRO_PENTAHO, KARAF_TIMEOUT)
+                ao_terminar = lambda execucao: concluir_pentaho(regra.id, arquivo, analise, execucao, avisar)
+                rotulo = f"Pentaho_{Path(arquivo).name}"
+            elif regra.ferramenta_etl == 'APACHE_HOP':
+                comando = comando_hop(arquivo, regra.projeto, regra.local_run, regra.memoria_mb)
+                analise = AnaliseSaida(PADROES_ERRO)
+                ao_terminar = lambda execucao: concluir_hop(regra.id, arquivo, analise, execucao, avisar)
+                rotulo = f"Hop_{Path(arquivo).name}"
+            else:
+                descricao = f"Execução terminal: {Path(arquivo).name}"
+                comando = comando_terminal(arquivo, descricao)
+                analise = AnaliseSaida(PADROES_ERRO)
+                ao_terminar = lambda execucao: concluir_terminal(regra.id, descricao, analise, execucao, avisar)
+                rotulo = f"Terminal_{Path(arquivo).name}"
+
+            pedido.analise = analise
+            comando.atributos = regra.atributos
+            if self.nice_servico is not None:
+                # Sem nice próprio, a ferramenta não herda a prioridade elevada do serviço
+                comando.atributos = regra.atributos.com_nice_padrao(0)
+            execucao = self.supervisor.executar(
+                comando, timeout=self._timeout(regra), rotulo=rotulo,
+                analisar=analise, ao_terminar=ao_terminar,
+                aviso=None if pedido.sondagem else self._aviso_duracao(regra),
+                limite_memoria_mb=regra.limite_memoria_mb,
+                # Scripts também recebem o teto como rlimit; a JVM reserva mais memória virtual que o heap
+                limite_por_processo=regra.ferramenta_etl not in ('PENTAHO', 'APACHE_HOP')
+            )
+            if pedido.tentativa > 1:
+                log_event(f"Processo iniciado (PID: {execucao.pid}, tentativa {pedido.tentativa}/{regra.max_tentativas})")
+            else:
+                log_event(f"Processo iniciado (PID: {execucao.pid})")
+            # O handle fica visível antes da conferência abaixo: a concessão pode ser perdida
+            # (_perder_concessao, na thread do coordenador) enquanto a execução inicia
+            pedido.handle = execucao
+            if pedido.id_execucao is not None and not registrar_inicio(
+                DB_PATH, pedido.id_execucao, pedido.espera, execucao.pid, criacao_processo(execucao.pid), no=self.no
+            ):
+                # A execução foi recolocada na fila e assumida por outro nó antes de iniciar aqui
+                pedido.concessao_perdida = True
+            if pedido.concessao_perdida:
+                self.supervisor.interromper(execucao, MOTIVO_CONCESSAO)
+            return execucao
+
+        except Exception as e:
+            log_event(f"Falha ao iniciar processo: {str(e)}")
+            notificar_em_segundo_plano(f"[PyFlowT3] Erro ao executar o workflow: {str(e)}")
+            return None
 
 if __name__ == '__main__':
     if len(sys.argv) == 1:
@@ -23,6 +23,10 @@ import logging
 import time
 from dotenv import load_dotenv
 from executaWorkflow import executar_etl
+from scheduler.disjuntores import disjuntores_abertos, religar
+from scheduler.duracoes import execucoes_excedidas
+from scheduler.metrics import ler_metricas
+from scheduler.nos import listar_nos
 
 # Configuração de logging
 logging.basicConfig(
@@ -72,6 +76,91 @@ class TelegramBot:
         conn.close()
         return fluxos
 
+    def listar_disjuntores(self, chat_id):
+        """Envia os agendamentos com disjuntor aberto, com um botão para religar cada um"""
+        try:
+            abertos = disjuntores_abertos(DB_PATH)
+        except Exception as e:
+            self.enviar_resposta(chat_id, f"❌ Erro ao consultar disjuntores: {str(e)}")
+            return
+
+        if not abertos:
+            self.enviar_resposta(chat_id, "✅ Nenhum disjuntor aberto.")
+            return
+
+        linhas = []
+        for id_agendamento, arquivo, estado, falhas, aberto_em, proxima_sonda in abertos:
+            sonda = f"próxima sondagem {proxima_sonda}" if proxima_sonda else "suspenso até religar"
+            linhas.append(f"🔌 {os.path.basename(arquivo)} — {estado}, {falhas} falha(s) desde {aberto_em}, {sonda}")
+        botoes = [[{"text": f"Religar {os.path.basename(a[1])}", "callback_data": f"RELIGAR:{a[0]}"}] for a in abertos]
+        self.enviar_resposta(chat_id, "\n".join(linhas), {"inline_keyboard": botoes})
+
+    def listar_excedidas(self, chat_id):
+        """Envia as execuções em andamento acima da duração habitual do agendamento"""
+        try:
+            excedidas = execucoes_excedidas(DB_PATH)
+        except Exception as e:
+            self.enviar_resposta(chat_id, f"❌ Erro ao consultar execuções em andamento: {str(e)}")
+            return
+
+        if not excedidas:
+            self.enviar_resposta(chat_id, "✅ Nenhuma execução acima da duração habitual.")
+            return
+
+        linhas = [
+            f"⏳ {os.path.basename(arquivo)} — em execução há {decorrido / 60:.1f} min "
+            f"(p95 {p95 / 60:.1f} min, desde {adquirida_em}, {origem})"
+            for _, arquivo, origem, adquirida_em, decorrido, p95 in excedidas
+        ]
+        self.enviar_resposta(chat_id, "\n".join(linhas))
+
+    def listar_grupos(self, chat_id):
+        """Envia a utilização e a fila de cada grupo de recursos, publicadas pelo serviço"""
+        try:
+            metricas = ler_metricas(DB_PATH, "pool_grupo_")
+        except Exception as e:
+            self.enviar_resposta(chat_id, f"❌ Erro ao consultar métricas: {str(e)}")
+            return
+
+        campos = ("em_execucao", "fila", "limite", "peso", "utilizacao", "espera_media_seg")
+        grupos = {}
+        for nome, valor, _ in metricas:
+            campo = next((c for c in campos if nome.endswith(f"_{c}")), None)
+            if campo is not None:
+                grupos.setdefault(nome[len("pool_grupo_"):-len(campo) - 1], {})[campo] = valor
+        if not grupos:
+            self.enviar_resposta(chat_id, "ℹ️ Nenhuma métrica de grupo publicada pelo serviço.")
+            return
+
+        linhas = []
+        for grupo, v in sorted(grupos.items()):
+            limite = f"{v['limite']:.0f}" if v.get('limite') else "sem limite"
+            linhas.append(
+                f"📦 {grupo}: {v.get('em_execucao', 0):.0f} em execução ({limite}, peso {v.get('peso', 1):g}), "
+                f"{v.get('fila', 0):.0f} na fila, utilização {v.get('utilizacao', 0):.0%}, "
+                f"espera média {v.get('espera_media_seg', 0):.0f}s"
+            )
+        self.enviar_resposta(chat_id, "\n".join(linhas))
+
+    def listar_nos(self, chat_id):
+        """Envia os nós (serviços) que compartilham o banco, com a carga do último batimento"""
+        try:
+            nos = listar_nos(DB_PATH)
+        except Exception as e:
+            self.enviar_resposta(chat_id, f"❌ Erro ao consultar nós: {str(e)}")
+            return
+
+        if not nos:
+            self.enviar_resposta(chat_id, "ℹ️ Nenhum nó registrado.")
+            return
+
+        linhas = [
+            f"{'🟢' if ativo else '🔴'} {no} ({host}, PID {pid}) — {em_execucao} em execução, {fila} na fila, "
+            f"capacidade {capacidade}, carga {carga:.0%}, último batimento {renovado_em}"
+            for no, host, pid, capacidade, em_execucao, fila, carga, _, renovado_em, ativo in nos
+        ]
+        self.enviar_resposta(chat_id, "\n".join(linhas))
+
     def executar_fluxo(self, caminho):
         # Validação do tipo do caminho
         if isinstance(caminho, int):
@@ -192,6 +281,18 @@ class TelegramBot:
                             reply_markup = {"inline_keyboard": botoes}
                             self.enviar_resposta(chat_id, "Escolha uma agenda para executar:", reply_markup)
 
+                        elif texto == "/disjuntores":
+                            self.listar_disjuntores(chat_id)
+
+                        elif texto == "/demoradas":
+                            self.listar_excedidas(chat_id)
+
+                        elif texto == "/grupos":
+                            self.listar_grupos(chat_id)
+
+                        elif texto == "/nos":
+                            self.listar_nos(chat_id)
+
                         elif texto.startswith("/buscar "):
                             termo = texto.replace("/buscar", "", 1).strip()
                             if not termo:
@@ -224,6 +325,14 @@ class TelegramBot:
                                 self.enviar_resposta(chat_id, f"✅ Resultado:\n{output[:4000]}")
                             else:
                                 self.enviar_resposta(chat_id, "❌ Caminho não encontrado.")
+
+                        elif dados and dados.startswith("RELIGAR:") and chat_id == CHAT_ID:
+                            self.responder_callback(callback_id)
+                            id_agendamento = int(dados.split(":", 1)[1])
+                            if religar(DB_PATH, id_agendamento):
+                                self.enviar_resposta(chat_id, f"✅ Disjuntor do agendamento {id_agendamento} religado.")
+                            else:
+                                self.enviar_resposta(chat_id, f"ℹ️ O disjuntor do agendamento {id_agendamento} não está aberto.")
                 
                 time.sleep(1)
                 
@@ -13,6 +13,7 @@
 # limitations under the License.
 
 import sqlite3
+from scheduler.db import garantir_esquema
 
 DB_PATH = "agendador.db"
 
@@ -64,6 +65,9 @@ def criar_coluna_se_nao_existir(nome_coluna, tipo_coluna, valor_padrao=None):
 def limpar_banco():
     conn = sqlite3.connect(DB_PATH)
     cursor = conn.cursor()
+    # Agendamentos com dependentes não podem ser excluídos: as dependências saem antes
+    if cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'dependencias_agendamento'").fetchone():
+        cursor.execute("DELETE FROM dependencias_agendamento")
     cursor.execute("DELETE FROM agendamentos")
     cursor.execute("DELETE FROM sqlite_sequence WHERE name='agendamentos'")
     conn.commit()
@@ -78,5 +82,8 @@ if __name__ == "__main__":
     criar_coluna_se_nao_existir("ultima_execucao", "DATETIME")
     criar_coluna_se_nao_existir("duracao_execucao", "REAL")
 
+    # Tabelas, colunas e gatilhos usados pelo serviço agendador
+    garantir_esquema(DB_PATH)
+
     # Limpar banco (opcional - cuidado)
     #limpar_banco()
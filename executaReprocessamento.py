@@ -0,0 +1,267 @@
+# Copyright 2025 Thiago Luis de Lima
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Reprocessamento de um período: executa o workflow de um agendamento uma vez
+por data, passando a data como parâmetro nomeado, com várias datas em paralelo.
+
+    python executaReprocessamento.py <id_agendamento> <data_inicio> <data_fim> [--paralelo N]
+                                     [--parametro DATA_REFERENCIA] [--formato %Y-%m-%d]
+    python executaReprocessamento.py --retomar <id_reprocessamento> [--paralelo N]
+    python executaReprocessamento.py --listar
+"""
+
+import argparse
+import datetime
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from executaWorkflow import DB_PATH, aguardar_admissao, executar_etl, logger
+from notifications.notifier import notificar
+from scheduler.configuracao import ler_configuracao
+from scheduler.db import garantir_esquema
+from scheduler.locks import RenovadorTravas, adquirir_trava, ferramentas_em_execucao, ler_politica
+from scheduler.pool import FERRAMENTAS, LIMITE_GLOBAL, LIMITES_FERRAMENTA
+from scheduler.reprocessamentos import (
+    FORMATO_DIA, PARTICAO_FALHA, PARTICAO_SUCESSO, criar_reprocessamento, datas_do_periodo,
+    finalizar_reprocessamento, ler_reprocessamento, listar_reprocessamentos,
+    registrar_fim_particao, registrar_inicio_particao, retomar_reprocessamento
+)
+
+PARAMETRO_PADRAO = "DATA_REFERENCIA"
+
+# Intervalo (segundos) entre tentativas de obter uma trava ocupada por outra execução
+INTERVALO_TRAVA = 5
+
+
+def _ferramenta(ferramenta_etl):
+    """Ferramenta usada para contar slots, como no pool do serviço; desconhecidas contam como TERMINAL"""
+    ferramenta = (ferramenta_etl or '').upper()
+    return ferramenta if ferramenta in FERRAMENTAS else 'TERMINAL'
+
+
+def limitar_paralelo(paralelo, ferramenta):
+    """Paralelismo pedido, limitado pelos mesmos limites do pool do serviço (0 = sem limite)"""
+    limites = [paralelo, LIMITE_GLOBAL, LIMITES_FERRAMENTA.get(_ferramenta(ferramenta), 0)]
+    return max(min(limite for limite in limites if limite), 1)
+
+
+def executor_lotado(ferramenta):
+    """
+    Motivo, se as execuções em andamento nesta máquina (serviço, manuais e
+    reprocessamentos, incluindo a que acabou de obter a trava) excedem os
+    limites do pool; None se há vaga
+    """
+    ativas = [_ferramenta(f) for f in ferramentas_em_execucao(DB_PATH)]
+    if LIMITE_GLOBAL and len(ativas) > LIMITE_GLOBAL:
+        return f"{len(ativas) - 1} execução(ões) em andamento (limite {LIMITE_GLOBAL})"
+    ferramenta = _ferramenta(ferramenta)
+    limite = LIMITES_FERRAMENTA.get(ferramenta, 0)
+    mesmas = ativas.count(ferramenta)
+    if limite and mesmas > limite:
+        return f"{mesmas - 1} execução(ões) {ferramenta} em andamento (limite {limite})"
+    return None
+
+
+class Reprocessamento:
+    """Executa as partições (datas) pendentes de um reprocessamento, até `paralelo` por vez"""
+
+    def __init__(self, id_reprocessamento, id_agendamento, configuracao, parametro, formato, paralelo, slots=1):
+        self.id = id_reprocessamento
+        self.id_agendamento = id_agendamento
+        self.configuracao = configuracao
+        self.arquivo = configuracao.arquivo
+        self.ferramenta = configuracao.ferramenta_etl
+        self.timeout = configuracao.timeout or 1800
+        self.parametro = parametro
+        self.formato = formato
+        self.paralelo = paralelo
+        # Slots de trava do agendamento (max_paralelo da política de sobreposição), disputados com o serviço
+        self.slots = slots
+        self.parar = threading.Event()
+        self.renovador = RenovadorTravas(DB_PATH)
+
+    def executar(self, datas):
+        logger.info(
+            f"Reprocessamento {self.id}: {len(datas)} data(s) de {self.arquivo}, "
+            f"{self.paralelo} em paralelo, parâmetro {self.parametro}"
+        )
+        self.renovador.iniciar()
+        executor = ThreadPoolExecutor(max_workers=self.paralelo, thread_name_prefix="Reprocessamento")
+        try:
+            futuros = {executor.submit(self._executar_particao, data): data for data in datas}
+            for concluidas, futuro in enumerate(as_completed(futuros), 1):
+                data = futuros[futuro]
+                logger.info(
+                    f"Reprocessamento {self.id}: {data.strftime(FORMATO_DIA)} "
+                    f"{'ok' if futuro.result() else 'falhou'} ({concluidas}/{len(datas)})"
+                )
+        except KeyboardInterrupt:
+            # Partições em andamento terminam; as que não começaram ficam pendentes para a retomada
+            logger.warning(f"Reprocessamento {self.id} interrompido; aguardando partições em andamento")
+            self.parar.set()
+            executor.shutdown(wait=True, cancel_futures=True)
+        finally:
+            executor.shutdown(wait=True)
+            self.renovador.parar()
+        return finalizar_reprocessamento(DB_PATH, self.id)
+
+    def _executar_particao(self, data):
+        trava = self._obter_trava()
+        if trava is None:
+            return None
+        try:
+            # Interrompido aguardando memória/CPU: a data fica pendente para a retomada
+            if not aguardar_admissao(self.configuracao, self.arquivo, True, self.parar):
+                return None
+            registrar_inicio_particao(DB_PATH, self.id, data)
+            inicio = time.monotonic()
+            try:
+                sucesso = executar_etl(
+                    self.id_agendamento,
+                    arquivo_path=self.arquivo,
+                    projeto_hop=self.configuracao.projeto,
+                    local_run_hop=self.configuracao.local_run,
+                    timeout=self.timeout,
+                    memoria_mb=self.configuracao.memoria_mb,
+                    atributos=self.configuracao.atributos,
+                    limite_memoria_mb=self.configuracao.limite_memoria_mb,
+                    parametros={self.parametro: data.strftime(self.formato)}
+                )
+            except Exception as e:
+                logger.error(f"Reprocessamento {self.id}: erro na data {data.strftime(FORMATO_DIA)}: {str(e)}")
+                sucesso = False
+            registrar_fim_particao(DB_PATH, self.id, data, sucesso, time.monotonic() - inicio)
+            return sucesso
+        finally:
+            self.renovador.remover(trava)
+            trava.liberar()
+
+    def _obter_trava(self):
+        """
+        Ocupa um dos slots de trava do agendamento, os mesmos da execução
+        agendada do serviço, aguardando se estiverem ocupados ou se a máquina
+        já tiver tantas execuções quanto os limites do pool permitem
+        """
+        lotado_antes = None
+        while not self.parar.is_set():
+            trava = adquirir_trava(DB_PATH, self.id_agendamento, "reprocessamento", self.slots)
+            if trava is not None:
+                try:
+                    lotado = executor_lotado(self.ferramenta)
+                except Exception as e:
+                    logger.error(f"Reprocessamento {self.id}: falha ao contar execuções em andamento: {str(e)}")
+                    lotado = None
+                if lotado is None:
+                    self.renovador.adicionar(trava)
+                    return trava
+                trava.liberar()
+                if lotado != lotado_antes:
+                    logger.info(f"Reprocessamento {self.id}: aguardando vaga, {lotado}")
+                lotado_antes = lotado
+            self.parar.wait(INTERVALO_TRAVA)
+        return None
+
+
+def ler_data_argumento(texto):
+    try:
+        return datetime.datetime.strptime(texto, FORMATO_DIA).date()
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"data inválida (use AAAA-MM-DD): {texto}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reprocessa um agendamento para cada data de um período")
+    parser.add_argument("id_agendamento", nargs="?", type=int)
+    parser.add_argument("data_inicio", nargs="?", type=ler_data_argumento)
+    parser.add_argument("data_fim", nargs="?", type=ler_data_argumento)
+    parser.add_argument("--paralelo", type=int, default=None, help="datas executadas ao mesmo tempo (padrão 1)")
+    parser.add_argument("--parametro", default=PARAMETRO_PADRAO, help="nome do parâmetro que recebe a data")
+    parser.add_argument("--formato", default=FORMATO_DIA, help="formato da data passada ao workflow")
+    parser.add_argument("--retomar", type=int, metavar="ID", help="retoma um reprocessamento interrompido ou com falhas")
+    parser.add_argument("--listar", action="store_true", help="lista os reprocessamentos recentes")
+    args = parser.parse_args()
+
+    garantir_esquema(DB_PATH)
+
+    if args.listar:
+        for id_reprocessamento, arquivo, inicio, fim, estado, total, sucesso, falha in listar_reprocessamentos(DB_PATH):
+            print(f"{id_reprocessamento:>5}  {inicio} a {fim}  {estado:<13} {sucesso or 0}/{total} ok, "
+                  f"{falha or 0} falha(s)  {arquivo}")
+        return 0
+
+    if args.retomar is not None:
+        reprocessamento = ler_reprocessamento(DB_PATH, args.retomar)
+        if reprocessamento is None:
+            logger.error(f"Reprocessamento {args.retomar} não encontrado")
+            return 1
+        id_agendamento, _, _, parametro, formato, paralelo, _ = reprocessamento
+        paralelo = args.paralelo or paralelo
+        id_reprocessamento = args.retomar
+        datas = retomar_reprocessamento(DB_PATH, id_reprocessamento)
+    else:
+        if args.id_agendamento is None or args.data_inicio is None or args.data_fim is None:
+            parser.error("informe id_agendamento, data_inicio e data_fim, ou --retomar/--listar")
+        if args.data_fim < args.data_inicio:
+            parser.error("data_fim anterior a data_inicio")
+        id_agendamento, parametro, formato, paralelo = args.id_agendamento, args.parametro, args.formato, args.paralelo or 1
+        datas = datas_do_periodo(args.data_inicio, args.data_fim)
+        id_reprocessamento = None
+
+    configuracao = ler_configuracao(DB_PATH, id_agendamento)
+    if configuracao is None:
+        logger.error(f"Agendamento {id_agendamento} não encontrado")
+        return 1
+
+    permitido = limitar_paralelo(paralelo, configuracao.ferramenta_etl)
+    if permitido < paralelo:
+        logger.warning(f"Paralelismo reduzido de {paralelo} para {permitido} pelos limites do pool")
+    # As datas ocupam os mesmos slots da execução agendada: o reprocessamento não
+    # ultrapassa o max_paralelo nem a política de sobreposição do agendamento
+    politica, slots = ler_politica(DB_PATH, id_agendamento)
+    if slots < permitido:
+        logger.warning(
+            f"Paralelismo reduzido de {permitido} para {slots} pela política de sobreposição do agendamento "
+            f"({politica}, {slots} execução(ões) simultânea(s))"
+        )
+        permitido = slots
+    if id_reprocessamento is None:
+        id_reprocessamento = criar_reprocessamento(
+            DB_PATH, id_agendamento, args.data_inicio, args.data_fim, parametro, formato, permitido
+        )
+    if not datas:
+        logger.info(f"Reprocessamento {id_reprocessamento}: nenhuma data pendente")
+        finalizar_reprocessamento(DB_PATH, id_reprocessamento)
+        return 0
+
+    contagem = Reprocessamento(
+        id_reprocessamento, id_agendamento, configuracao, parametro, formato, permitido, slots
+    ).executar(datas)
+    total = sum(contagem.values())
+    sucesso = contagem.get(PARTICAO_SUCESSO, 0)
+    msg = (
+        f"[PyFlowT3] Reprocessamento {id_reprocessamento} de {configuracao.arquivo}: "
+        f"{sucesso}/{total} data(s) com sucesso, {contagem.get(PARTICAO_FALHA, 0)} com falha"
+    )
+    if sucesso < total:
+        msg += f". Para retomar: python executaReprocessamento.py --retomar {id_reprocessamento}"
+    logger.info(msg)
+    notificar(msg)
+    return 0 if sucesso == total else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -22,7 +22,16 @@ import platform
 import time
 import datetime
 import sqlite3
+import threading
 from notifications.notifier import notificar
+from scheduler.db import garantir_esquema
+from scheduler.duracoes import alerta_duracao
+from scheduler.locks import ferramentas_em_execucao, obter_trava
+from scheduler.atributos import aplicar_atributos, opcoes_processo
+from scheduler.configuracao import ConfiguracaoExecucao, ler_configuracao
+from scheduler.memoria import VigiaMemoria
+from scheduler.processos import LimiteTempo, ambiente_execucao, encerrar_arvore
+from scheduler.recursos import aguardar_recursos, opcoes_heap_java
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -82,7 +91,8 @@ def determinar_sistema_operacional():
 
 config_os = determinar_sistema_operacional()
 
-def executar_etl(id,arquivo_path, projeto_hop=None, local_run_hop=None, timeout=1800):
+def executar_etl(id,arquivo_path, projeto_hop=None, local_run_hop=None, timeout=1800, memoria_mb=None, parametros=None,
+                 atributos=None, limite_memoria_mb=None):
     """
     Executa jobs/transformações do Pentaho PDI, Apache Hop ou comandos genéricos de terminal
 
@@ -91,6 +101,10 @@ def executar_etl(id,arquivo_path, projeto_hop=None, local_run_hop=None, timeout=
         projeto_hop (str, optional): Nome do projeto Hop (apenas para Apache Hop)
         local_run_hop (str, optional): Nome do local_run (apenas para Apache Hop)
         timeout (int): Tempo máximo de execução em segundos
+        memoria_mb (int, optional): Heap máximo da JVM em MB (Pentaho/Apache Hop)
+        parametros (dict, optional): Parâmetros nomeados (Pentaho/Apache Hop) ou variáveis de ambiente (terminal)
+        atributos (AtributosProcesso, optional): Afinidade de CPU, nice e prioridade de I/O do processo
+        limite_memoria_mb (int, optional): Teto de memória da árvore de processos; acima dele a execução é encerrada
 
     Returns:
         bool: True se executou com sucesso, False caso contrário
@@ -107,10 +121,15 @@ def executar_etl(id,arquivo_path, projeto_hop=None, local_run_hop=None, timeout=
         logger.info(f"Iniciando execução do arquivo: {arquivo_path}")
 
         if ext in ('.kjb', '.ktr'):
-            return executar_job_pentaho(id,arquivo_path, timeout)
+            return executar_job_pentaho(
+                id,arquivo_path, timeout, memoria_mb, parametros, atributos, limite_memoria_mb
+            )
 
         elif ext in ('.hwf', '.hpl'):
-            return executar_hop(id,arquivo_path, projeto_hop, local_run_hop, timeout)
+            return executar_hop(
+                id,arquivo_path, projeto_hop, local_run_hop, timeout, memoria_mb, parametros, atributos,
+                limite_memoria_mb
+            )
 
         elif ext in ('.bat', '.cmd', '.sh', '.ps1', '.py', ''):
             return executar_comando_terminal(
@@ -119,7 +138,10 @@ def executar_etl(id,arquivo_path, projeto_hop=None, local_run_hop=None, timeout=
                 cwd=os.path.dirname(arquivo_path),
                 nome_arquivo=arquivo_path,
                 ferramenta="TERMINAL",
-                timeout=timeout
+                timeout=timeout,
+                parametros=parametros,
+                atributos=atributos,
+                limite_memoria_mb=limite_memoria_mb
             )
 
         else:
@@ -147,7 +169,66 @@ def atualizar_execucao_no_banco(id_agendamento, duracao_execucao, ultima_execuca
     except Exception as e:
         logger.error(f"[ERRO] Falha ao atualizar execução no banco: {str(e)}")
 
-def executar_job_pentaho(id, job_path, timeout):
+def ler_configuracao_agendamento(id_agendamento):
+    """Heap, teto de memória e atributos de processo do agendamento; vazia se não houver agendamento"""
+    try:
+        return ler_configuracao(DB_PATH, id_agendamento) or ConfiguracaoExecucao()
+    except Exception as e:
+        logger.error(f"[ERRO] Falha ao ler configuração do agendamento: {str(e)}")
+        return ConfiguracaoExecucao()
+
+def aguardar_admissao(configuracao, arquivo, com_trava, parar=None):
+    """
+    Aguarda memória/CPU livres antes de iniciar, como o controle de admissão do serviço.
+    As demais execuções da máquina (de qualquer origem) são contadas pelas travas;
+    `com_trava` indica que a trava desta execução já está entre elas.
+    """
+    def outras_execucoes():
+        try:
+            return len(ferramentas_em_execucao(DB_PATH)) - int(com_trava)
+        except Exception as e:
+            logger.error(f"[ERRO] Falha ao contar execuções em andamento: {str(e)}")
+            return 0
+
+    return aguardar_recursos(configuracao, outras_execucoes, os.path.basename(arquivo), parar)
+
+def encerrado_por_memoria(prefixo, arquivo, vigia):
+    """Notifica a execução encerrada pelo teto de memória, em vez de um código de saída genérico"""
+    msg = (
+        f"{prefixo} ⛔ Encerrado: {vigia.limite.descricao()}\n"
+        f"📄 Arquivo: {os.path.basename(arquivo)}"
+    )
+    logger.error(msg)
+    notificar(msg)
+    return False
+
+def iniciar_aviso_duracao(id_agendamento, arquivo):
+    """Timer que avisa, uma única vez, se a execução passar da duração habitual do agendamento"""
+    try:
+        alerta = alerta_duracao(DB_PATH, int(id_agendamento)) if str(id_agendamento).isdigit() else None
+    except Exception as e:
+        logger.error(f"[ERRO] Falha ao ler durações do agendamento: {str(e)}")
+        return None
+    if alerta is None:
+        return None
+    limiar, p95 = alerta
+
+    def avisar():
+        msg = (
+            f"[PyFlowT3] ⏳ Execução mais demorada que o normal:\n"
+            f"📄 Arquivo: {os.path.basename(arquivo)}\n"
+            f"⏱️ Em execução há {limiar / 60:.1f} min (p95: {p95 / 60:.1f} min)"
+        )
+        logger.warning(msg)
+        notificar(msg)
+
+    timer = threading.Timer(limiar, avisar)
+    timer.daemon = True
+    timer.start()
+    return timer
+
+def executar_job_pentaho(id, job_path, timeout, memoria_mb=None, parametros=None, atributos=None,
+                         limite_memoria_mb=None):
     """Executa um job ou transformação do Pentaho PDI e monitora erros"""
     try:
         kitchen_path = config_os['pentaho_kitchen']
@@ -156,9 +237,9 @@ def executar_job_pentaho(id, job_path, timeout):
 
         logger.info(f"Executando job Pentaho: {job_path} Timeout: {timeout}")
 
-        env = os.environ.copy()
+        env = ambiente_execucao()
         env.update({
-            'PENTAHO_DI_JAVA_OPTIONS': '-Xms1024m -Xmx2048m',
+            'PENTAHO_DI_JAVA_OPTIONS': opcoes_heap_java(memoria_mb),
             'KETTLE_HOME': pentaho_dir,
             'KETTLE_JNDI_ROOT': os.path.join(pentaho_dir, 'simple-jndi')
         })
@@ -170,6 +251,8 @@ def executar_job_pentaho(id, job_path, timeout):
             comando = f'"{pan_path}" /file:"{arquivo}"'
         else:
             comando = f'"{kitchen_path}" /file:"{arquivo}"'
+        for nome, valor in (parametros or {}).items():
+            comando += f' "/param:{nome}={valor}"'
 
         logger.debug(f"Comando Pentaho: {comando}")
         #notificar(f"Comando Pentaho: {comando}", canais=['telegram'])
@@ -180,6 +263,7 @@ def executar_job_pentaho(id, job_path, timeout):
             startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
 
         linhas_erro = []
+        vigia = VigiaMemoria(limite_memoria_mb) if limite_memoria_mb else None
 
         processo = subprocess.Popen(
             comando,
@@ -192,10 +276,17 @@ def executar_job_pentaho(id, job_path, timeout):
             errors='replace',
             env=env,
             startupinfo=startupinfo,
-            shell=config_os['shell']
+            shell=config_os['shell'],
+            preexec_fn=vigia.preexec_fn if vigia is not None else None,
+            **opcoes_processo(atributos)
         )
+        aplicar_atributos(processo.pid, atributos)
+        if vigia is not None:
+            vigia.iniciar(processo.pid)
 
         start_time = time.time()
+        limite = LimiteTempo(processo.pid, timeout)
+        aviso = iniciar_aviso_duracao(id, job_path)
 
         with open(get_daily_log_path(), 'a', encoding='utf-8') as output_file:
             for linha in processo.stdout:
@@ -205,7 +296,17 @@ def executar_job_pentaho(id, job_path, timeout):
                 if "ERROR" in linha.upper():
                     linhas_erro.append(linha.strip())
 
-        processo.wait(timeout=timeout)
+        # A leitura da saída só termina quando a árvore inteira encerra (ou é encerrada pelo limite)
+        processo.wait()
+        limite.cancelar()
+        if aviso is not None:
+            aviso.cancel()
+        if vigia is not None:
+            vigia.cancelar()
+            if vigia.excedeu:
+                return encerrado_por_memoria("[Pentaho]", job_path, vigia)
+        if limite.expirou:
+            raise subprocess.TimeoutExpired(comando, timeout)
 
         end_time = time.time()
         duracao = round((end_time - start_time) / 60, 2)  # em minutos
@@ -239,7 +340,8 @@ def executar_job_pentaho(id, job_path, timeout):
         notificar(f"Erro inesperado na execução do Pentaho: {str(e)}")
         return False
 
-def executar_hop(id, arquivo_hop, projeto, local_run, timeout):
+def executar_hop(id, arquivo_hop, projeto, local_run, timeout, memoria_mb=None, parametros=None, atributos=None,
+                 limite_memoria_mb=None):
     """Executa um job/transformação do Apache Hop e monitora erros"""
     try:
         hop_run_path = config_os['hop_run']
@@ -255,25 +357,40 @@ def executar_hop(id, arquivo_hop, projeto, local_run, timeout):
             '--runconfig', local_run,
             '--level', 'Basic'
         ]
+        if parametros:
+            comando += ['--parameters', ','.join(f"{nome}={valor}" for nome, valor in parametros.items())]
 
         logger.debug(f"Comando Hop: {' '.join(comando)}")
 
         erro_detectado = False
         linha_erro = ""
 
+        env = ambiente_execucao()
+        if memoria_mb:
+            env['HOP_OPTIONS'] = opcoes_heap_java(memoria_mb)
+        vigia = VigiaMemoria(limite_memoria_mb) if limite_memoria_mb else None
+
         processo = subprocess.Popen(
             comando,
             cwd=hop_dir,
+            env=env,
             stdout=subprocess.PIPE,
             stderr=subprocess.STDOUT,
             stdin=subprocess.PIPE,
             text=True,
             encoding='utf-8',
             errors='replace',
-            shell=config_os['shell']
+            shell=config_os['shell'],
+            preexec_fn=vigia.preexec_fn if vigia is not None else None,
+            **opcoes_processo(atributos)
         )
+        aplicar_atributos(processo.pid, atributos)
+        if vigia is not None:
+            vigia.iniciar(processo.pid)
 
         start_time = time.time()
+        limite = LimiteTempo(processo.pid, timeout)
+        aviso = iniciar_aviso_duracao(id, arquivo_hop)
 
         with open(get_daily_log_path(), 'a', encoding='utf-8') as output_file:
             for linha in processo.stdout:
@@ -284,7 +401,17 @@ def executar_hop(id, arquivo_hop, projeto, local_run, timeout):
                     erro_detectado = True
                     linha_erro = linha.strip()
 
-        processo.wait(timeout=timeout)
+        # A leitura da saída só termina quando a árvore inteira encerra (ou é encerrada pelo limite)
+        processo.wait()
+        limite.cancelar()
+        if aviso is not None:
+            aviso.cancel()
+        if vigia is not None:
+            vigia.cancelar()
+            if vigia.excedeu:
+                return encerrado_por_memoria("[HOP]", arquivo_hop, vigia)
+        if limite.expirou:
+            raise subprocess.TimeoutExpired(comando, timeout)
 
         end_time = time.time()
         duracao = round((end_time - start_time) / 60, 2)  # em minutos
@@ -318,13 +445,16 @@ def executar_hop(id, arquivo_hop, projeto, local_run, timeout):
         notificar(f"Erro inesperado na execução do Hop: {str(e)}")
         return False
     
-def executar_comando_terminal(id,comando, cwd, nome_arquivo, ferramenta="TERMINAL", timeout=1800):
+def executar_comando_terminal(id,comando, cwd, nome_arquivo, ferramenta="TERMINAL", timeout=1800, parametros=None,
+                              atributos=None, limite_memoria_mb=None):
     """Executa um comando genérico no terminal, monitora o log e envia notificações em caso de erro"""
     try:
         logger.info(f"[{ferramenta}] Executando comando: {' '.join(comando)} Timeout {timeout}")
         
         erro_detectado = False
         linhas_erro = []
+        # Scripts também recebem o teto como rlimit: uma alocação acima dele falha na hora
+        vigia = VigiaMemoria(limite_memoria_mb, por_processo=True) if limite_memoria_mb else None
 
         processo = subprocess.Popen(
             comando,
@@ -335,10 +465,18 @@ def executar_comando_terminal(id,comando, cwd, nome_arquivo, ferramenta="TERMINA
             text=True,
             encoding='utf-8',
             errors='replace',
-            shell=config_os.get('shell', False)
+            env=ambiente_execucao({**os.environ, **{nome: str(valor) for nome, valor in (parametros or {}).items()}}),
+            shell=config_os.get('shell', False),
+            preexec_fn=vigia.preexec_fn if vigia is not None else None,
+            **opcoes_processo(atributos)
         )
+        aplicar_atributos(processo.pid, atributos)
+        if vigia is not None:
+            vigia.iniciar(processo.pid)
 
         start_time = time.time()
+        limite = LimiteTempo(processo.pid, timeout)
+        aviso = iniciar_aviso_duracao(id, nome_arquivo)
 
         with open(get_daily_log_path(), 'a', encoding='utf-8') as output_file:
             for linha in processo.stdout:
@@ -349,7 +487,17 @@ def executar_comando_terminal(id,comando, cwd, nome_arquivo, ferramenta="TERMINA
                     erro_detectado = True
                     linhas_erro.append(linha.strip())
 
-        processo.wait(timeout=timeout)
+        # A leitura da saída só termina quando a árvore inteira encerra (ou é encerrada pelo limite)
+        processo.wait()
+        limite.cancelar()
+        if aviso is not None:
+            aviso.cancel()
+        if vigia is not None:
+            vigia.cancelar()
+            if vigia.excedeu:
+                return encerrado_por_memoria(f"[{ferramenta}]", nome_arquivo, vigia)
+        if limite.expirou:
+            raise subprocess.TimeoutExpired(comando, timeout)
 
         end_time = time.time()
         duracao = round((end_time - start_time) / 60, 2)  # em minutos
@@ -396,19 +544,19 @@ def monitorar_processo(processo, timeout):
             if (time.time() - start_time) > timeout:
                 logger.error(f"Timeout de {timeout} segundos excedido")
                 notificar(f"Timeout de {timeout} segundos excedido")
-                processo.kill()
+                encerrar_arvore(processo.pid)
                 return False
 
             time.sleep(5)
 
     except KeyboardInterrupt:
         logger.info("Execução interrompida pelo usuário")
-        processo.kill()
+        encerrar_arvore(processo.pid)
         return False
     except Exception as e:
         logger.error(f"Erro no monitoramento: {str(e)}")
         notificar(f"Erro no monitoramento: {str(e)}")
-        processo.kill()
+        encerrar_arvore(processo.pid)
         return False
 
 if __name__ == '__main__':
@@ -430,13 +578,33 @@ if __name__ == '__main__':
     except ValueError:
         timeout = 3600
 
-    success = executar_etl(
-        id_execucao,
-        arquivo_path=arquivo,
-        projeto_hop=projeto,
-        local_run_hop=local_run,
-        timeout=timeout
-    )
+    # Impede execuções simultâneas do mesmo agendamento (serviço, interface, monitor, bot)
+    trava, renovador = None, None
+    configuracao = ConfiguracaoExecucao()
+    if id_execucao.isdigit():
+        garantir_esquema(DB_PATH)
+        trava, renovador = obter_trava(DB_PATH, int(id_execucao), origem="manual")
+        if trava is None:
+            logger.error(f"Agendamento {id_execucao} já está em execução; execução descartada")
+            sys.exit(1)
+        configuracao = ler_configuracao_agendamento(int(id_execucao))
+
+    try:
+        aguardar_admissao(configuracao, arquivo, trava is not None)
+        success = executar_etl(
+            id_execucao,
+            arquivo_path=arquivo,
+            projeto_hop=projeto,
+            local_run_hop=local_run,
+            timeout=timeout,
+            memoria_mb=configuracao.memoria_mb,
+            atributos=configuracao.atributos,
+            limite_memoria_mb=configuracao.limite_memoria_mb
+        )
+    finally:
+        if trava is not None:
+            renovador.parar()
+            trava.liberar()
 
     if success:
         logger.info("Execução concluída com sucesso!")
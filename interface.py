@@ -23,6 +23,15 @@ import sqlite3
 import sys
 import os
 from executaWorkflow import executar_etl
+from scheduler.atributos import interpretar_afinidade
+from scheduler.calendarios import DIRETORIO_CALENDARIOS, listar_calendarios
+from scheduler.cron import compilar_cron
+from scheduler.db import garantir_esquema
+from scheduler.duracoes import MIN_AMOSTRAS_TIMEOUT, calcular_timeout, ler_duracoes
+from scheduler.rules import compilar_agenda, deslocamento_inicio
+from scheduler.dependencias import (
+    gravar_dependencias, interpretar_dependencias, ler_dependencias, ler_dependentes
+)
 import subprocess
 
 
@@ -167,8 +176,173 @@ class AgendadorGUI(QMainWindow):
         self.layout_grid.addWidget(QLabel("Timeout (segundos):"), 11, 0)
         self.entry_timeout = QLineEdit()
         self.entry_timeout.setValidator(QRegularExpressionValidator(QRegularExpression("[0-9]*")))
+        self.entry_timeout.textChanged.connect(self.atualizar_timeout_efetivo)
         self.layout_grid.addWidget(self.entry_timeout, 11, 1, 1, 2)
 
+        # Política para disparos que chegam com a execução anterior ainda em andamento
+        self.layout_grid.addWidget(QLabel("Se já em execução:"), 12, 0)
+        self.combo_sobreposicao = QComboBox()
+        self.combo_sobreposicao.addItems(["PULAR", "ENFILEIRAR", "PARALELO"])
+        self.layout_grid.addWidget(self.combo_sobreposicao, 12, 1)
+        self.entry_max_paralelo = QLineEdit()
+        self.entry_max_paralelo.setPlaceholderText("Máx. paralelo")
+        self.entry_max_paralelo.setValidator(QRegularExpressionValidator(QRegularExpression("[0-9]*")))
+        self.layout_grid.addWidget(self.entry_max_paralelo, 12, 2)
+
+        # Prioridade na fila quando o servidor está saturado (maior executa primeiro)
+        self.layout_grid.addWidget(QLabel("Prioridade:"), 13, 0)
+        self.entry_prioridade = QLineEdit()
+        self.entry_prioridade.setPlaceholderText("0")
+        self.entry_prioridade.setValidator(QRegularExpressionValidator(QRegularExpression("-?[0-9]*")))
+        self.layout_grid.addWidget(self.entry_prioridade, 13, 1, 1, 2)
+
+        # Heap máximo da JVM (Pentaho/Hop); também usado para segurar execuções sem memória livre
+        self.layout_grid.addWidget(QLabel("Memória JVM (MB):"), 14, 0)
+        self.entry_memoria = QLineEdit()
+        self.entry_memoria.setPlaceholderText("padrão do servidor")
+        self.entry_memoria.setValidator(QRegularExpressionValidator(QRegularExpression("[0-9]*")))
+        self.layout_grid.addWidget(self.entry_memoria, 14, 1, 1, 2)
+
+        # Encadeamento: executa após o sucesso de outros agendamentos, em vez de um horário
+        self.layout_grid.addWidget(QLabel("Depende de (IDs):"), 15, 0)
+        self.entry_dependencias = QLineEdit()
+        self.entry_dependencias.setPlaceholderText("ex.: 3, 7 — executa após o sucesso de todos (ignora horário/intervalo)")
+        self.entry_dependencias.setValidator(QRegularExpressionValidator(QRegularExpression("[0-9, ]*")))
+        self.layout_grid.addWidget(self.entry_dependencias, 15, 1, 1, 2)
+
+        # Retentativas após falha: backoff exponencial (atraso * fator^n) com variação aleatória
+        self.layout_grid.addWidget(QLabel("Tentativas / atraso (s):"), 16, 0)
+        self.entry_tentativas = QLineEdit()
+        self.entry_tentativas.setPlaceholderText("Máx. tentativas (1 = sem retentativa)")
+        self.entry_tentativas.setValidator(QRegularExpressionValidator(QRegularExpression("[0-9]*")))
+        self.layout_grid.addWidget(self.entry_tentativas, 16, 1)
+        self.entry_retry_atraso = QLineEdit()
+        self.entry_retry_atraso.setPlaceholderText("Atraso inicial (60)")
+        self.entry_retry_atraso.setValidator(QRegularExpressionValidator(QRegularExpression("[0-9]*")))
+        self.layout_grid.addWidget(self.entry_retry_atraso, 16, 2)
+
+        self.layout_grid.addWidget(QLabel("Backoff fator / jitter:"), 17, 0)
+        self.entry_retry_fator = QLineEdit()
+        self.entry_retry_fator.setPlaceholderText("Fator (2.0)")
+        self.entry_retry_fator.setValidator(QRegularExpressionValidator(QRegularExpression("[0-9]*[.,]?[0-9]*")))
+        self.layout_grid.addWidget(self.entry_retry_fator, 17, 1)
+        self.entry_retry_jitter = QLineEdit()
+        self.entry_retry_jitter.setPlaceholderText("Jitter 0-1 (0.1)")
+        self.entry_retry_jitter.setValidator(QRegularExpressionValidator(QRegularExpression("[0-9]*[.,]?[0-9]*")))
+        self.layout_grid.addWidget(self.entry_retry_jitter, 17, 2)
+
+        # Expressão cron: quando informada substitui horário, intervalo, janela e dias
+        self.layout_grid.addWidget(QLabel("Cron:"), 18, 0)
+        self.entry_cron = QLineEdit()
+        self.entry_cron.setPlaceholderText("ex.: */10 8-18 * * mon-fri; 55 23 L * *  (substitui horário/intervalo/dias)")
+        self.layout_grid.addWidget(self.entry_cron, 18, 1, 1, 2)
+
+        # Escalonamento: espalha o início dentro de uma janela para evitar que várias JVMs subam juntas
+        self.layout_grid.addWidget(QLabel("Escalonar início (janela s):"), 19, 0)
+        self.entry_escalonar = QLineEdit()
+        self.entry_escalonar.setPlaceholderText("0 = desativado")
+        self.entry_escalonar.setValidator(QRegularExpressionValidator(QRegularExpression("[0-9]*")))
+        self.entry_escalonar.textChanged.connect(self.atualizar_deslocamento)
+        self.layout_grid.addWidget(self.entry_escalonar, 19, 1)
+        self.label_deslocamento = QLabel("")
+        self.layout_grid.addWidget(self.label_deslocamento, 19, 2)
+
+        # Calendário de feriados (pasta calendarios/, arquivos .csv ou .ics) e n-ésimo dia útil do mês
+        self.layout_grid.addWidget(QLabel("Calendário / dia útil:"), 20, 0)
+        self.combo_calendario = QComboBox()
+        self.combo_calendario.setEditable(True)
+        self.combo_calendario.addItems([""] + listar_calendarios())
+        self.layout_grid.addWidget(self.combo_calendario, 20, 1)
+        self.entry_dia_util = QLineEdit()
+        self.entry_dia_util.setPlaceholderText("N-ésimo dia útil (1 = primeiro, -1 = último)")
+        self.entry_dia_util.setValidator(QRegularExpressionValidator(QRegularExpression("-?[0-9]*")))
+        self.layout_grid.addWidget(self.entry_dia_util, 20, 2)
+
+        # Disparos perdidos com o serviço parado: ignorar, executar uma vez ou executar cada um (até o máximo)
+        self.layout_grid.addWidget(QLabel("Se perder o horário:"), 21, 0)
+        self.combo_perdidos = QComboBox()
+        self.combo_perdidos.addItems(["PULAR", "UMA_VEZ", "TODOS"])
+        self.layout_grid.addWidget(self.combo_perdidos, 21, 1)
+        self.entry_max_perdidos = QLineEdit()
+        self.entry_max_perdidos.setPlaceholderText("Máx. recuperados (TODOS)")
+        self.entry_max_perdidos.setValidator(QRegularExpressionValidator(QRegularExpression("[0-9]*")))
+        self.layout_grid.addWidget(self.entry_max_perdidos, 21, 2)
+
+        # Intervalo em segundos: substitui horário/intervalo em minutos, respeitando janela, dias e cron
+        self.layout_grid.addWidget(QLabel("Intervalo (segundos):"), 22, 0)
+        self.entry_intervalo_seg = QLineEdit()
+        self.entry_intervalo_seg.setPlaceholderText("0 = desativado")
+        self.entry_intervalo_seg.setValidator(QRegularExpressionValidator(QRegularExpression("[0-9]*")))
+        self.entry_intervalo_seg.textChanged.connect(self.atualizar_deslocamento)
+        self.layout_grid.addWidget(self.entry_intervalo_seg, 22, 1)
+        self.combo_modo_intervalo = QComboBox()
+        self.combo_modo_intervalo.addItems(["FIXO", "APOS_TERMINO"])
+        self.combo_modo_intervalo.setToolTip(
+            "FIXO: dispara a cada N segundos do relógio\n"
+            "APOS_TERMINO: inicia N segundos após o fim da execução anterior"
+        )
+        self.layout_grid.addWidget(self.combo_modo_intervalo, 22, 2)
+
+        # Disjuntor: após N falhas seguidas o agendamento é suspenso ou passa a rodar só como sondagem
+        self.layout_grid.addWidget(QLabel("Disjuntor (falhas / sondagem):"), 23, 0)
+        self.entry_disjuntor_falhas = QLineEdit()
+        self.entry_disjuntor_falhas.setPlaceholderText("Falhas seguidas (0 = desativado)")
+        self.entry_disjuntor_falhas.setValidator(QRegularExpressionValidator(QRegularExpression("[0-9]*")))
+        self.layout_grid.addWidget(self.entry_disjuntor_falhas, 23, 1)
+        self.entry_disjuntor_sonda = QLineEdit()
+        self.entry_disjuntor_sonda.setPlaceholderText("Sondagem a cada N s (1800; 0 = suspender)")
+        self.entry_disjuntor_sonda.setValidator(QRegularExpressionValidator(QRegularExpression("[0-9]*")))
+        self.layout_grid.addWidget(self.entry_disjuntor_sonda, 23, 2)
+
+        # Timeout adaptativo: p99 das durações registradas × fator, entre o piso e o timeout fixo
+        self.layout_grid.addWidget(QLabel("Timeout adaptativo (fator / piso s):"), 24, 0)
+        self.entry_timeout_fator = QLineEdit()
+        self.entry_timeout_fator.setPlaceholderText("Fator sobre o p99 (0 = usar timeout fixo)")
+        self.entry_timeout_fator.setValidator(QRegularExpressionValidator(QRegularExpression("[0-9]*[.,]?[0-9]*")))
+        self.entry_timeout_fator.textChanged.connect(self.atualizar_timeout_efetivo)
+        self.layout_grid.addWidget(self.entry_timeout_fator, 24, 1)
+        self.entry_timeout_piso = QLineEdit()
+        self.entry_timeout_piso.setPlaceholderText("Piso em segundos (60)")
+        self.entry_timeout_piso.setValidator(QRegularExpressionValidator(QRegularExpression("[0-9]*")))
+        self.entry_timeout_piso.textChanged.connect(self.atualizar_timeout_efetivo)
+        self.layout_grid.addWidget(self.entry_timeout_piso, 24, 2)
+        self.label_timeout_efetivo = QLabel("")
+        self.layout_grid.addWidget(self.label_timeout_efetivo, 25, 1, 1, 2)
+
+        # Grupo de recursos: divide os slots do pool entre equipes/projetos (GRUPOS_RECURSO no .env)
+        self.layout_grid.addWidget(QLabel("Grupo de Recursos:"), 26, 0)
+        self.entry_grupo_recurso = QLineEdit()
+        self.entry_grupo_recurso.setPlaceholderText("Vazio = o projeto do agendamento")
+        self.layout_grid.addWidget(self.entry_grupo_recurso, 26, 1, 1, 2)
+
+        # Atributos do processo da ferramenta: núcleos de CPU, nice e prioridade de I/O
+        self.layout_grid.addWidget(QLabel("CPU (núcleos / nice):"), 27, 0)
+        self.entry_cpu_afinidade = QLineEdit()
+        self.entry_cpu_afinidade.setPlaceholderText("Núcleos, ex.: 0-3,6 (vazio = todos)")
+        self.entry_cpu_afinidade.setValidator(QRegularExpressionValidator(QRegularExpression("[0-9, -]*")))
+        self.layout_grid.addWidget(self.entry_cpu_afinidade, 27, 1)
+        self.entry_nice = QLineEdit()
+        self.entry_nice.setPlaceholderText("Nice -20 a 19 (vazio = normal)")
+        self.entry_nice.setValidator(QRegularExpressionValidator(QRegularExpression("-?[0-9]{0,2}")))
+        self.layout_grid.addWidget(self.entry_nice, 27, 2)
+
+        self.layout_grid.addWidget(QLabel("Prioridade de I/O (classe / nível):"), 28, 0)
+        self.combo_io_classe = QComboBox()
+        self.combo_io_classe.addItems(["", "NORMAL", "OCIOSA", "TEMPO_REAL"])
+        self.combo_io_classe.setToolTip("Vazio = padrão do sistema; OCIOSA só usa o disco quando ninguém mais usa")
+        self.layout_grid.addWidget(self.combo_io_classe, 28, 1)
+        self.entry_io_prioridade = QLineEdit()
+        self.entry_io_prioridade.setPlaceholderText("Nível 0 (maior) a 7 (menor)")
+        self.entry_io_prioridade.setValidator(QRegularExpressionValidator(QRegularExpression("[0-7]?")))
+        self.layout_grid.addWidget(self.entry_io_prioridade, 28, 2)
+
+        # Teto de memória da árvore de processos (ferramenta, JVM e filhos); acima dele a execução é encerrada
+        self.layout_grid.addWidget(QLabel("Limite de Memória (MB, árvore):"), 29, 0)
+        self.entry_limite_memoria = QLineEdit()
+        self.entry_limite_memoria.setPlaceholderText("Vazio = sem limite (deve ser maior que o heap)")
+        self.entry_limite_memoria.setValidator(QRegularExpressionValidator(QRegularExpression("[0-9]*")))
+        self.layout_grid.addWidget(self.entry_limite_memoria, 29, 1, 1, 2)
+
         # Botão de salvar/cancelar
         self.btn_salvar = QPushButton("Salvar Agendamento")
         self.btn_salvar.clicked.connect(self.salvar_no_banco)
@@ -181,11 +355,12 @@ class AgendadorGUI(QMainWindow):
 
         # Tabela de agendamentos
         self.tabela = QTableWidget()
-        self.tabela.setColumnCount(13)
+        self.tabela.setColumnCount(22)
         self.tabela.setHorizontalHeaderLabels([
             "ID", "Arquivo", "Projeto", "Local RUN HOP", "Horário", 
             "Intervalo", "Dias Semana", "Dias Mês", "Hora Início", 
-            "Hora Fim", "Status", "Execução", "Timeout"
+            "Hora Fim", "Status", "Execução", "Timeout", "Sobreposição", "Máx. Paralelo", "Prioridade", "Memória (MB)",
+            "Depende de", "Tentativas", "Cron", "Calendário", "Escalonamento"
         ])
         
         # Configurações de seleção (PyQt6)
@@ -333,6 +508,8 @@ class AgendadorGUI(QMainWindow):
             cursor.execute("ALTER TABLE agendamentos ADD COLUMN timeout_execucao INTEGER DEFAULT 1800")
             conn.commit()
 
+        garantir_esquema(DB_PATH)
+
     def listar_agendamentos(self, filtro=None):
         """Carrega os agendamentos do banco e exibe na tabela"""
         conn = sqlite3.connect(DB_PATH)
@@ -340,9 +517,15 @@ class AgendadorGUI(QMainWindow):
         
         if filtro:
             query = """
-                 SELECT id, arquivo, projeto, local_run, horario, intervalo, 
-                    dias_semana, dias_mes, hora_inicio, hora_fim, status, ferramenta_etl, timeout_execucao
-                FROM agendamentos
+                 SELECT id, arquivo, projeto, local_run, horario, intervalo,
+                    dias_semana, dias_mes, hora_inicio, hora_fim, status, ferramenta_etl, timeout_execucao,
+                    politica_sobreposicao, max_paralelo, prioridade, memoria_mb,
+                    (SELECT group_concat(d.id_dependencia, ', ') FROM dependencias_agendamento d WHERE d.id_agendamento = agendamentos.id),
+                    max_tentativas, cron,
+                    TRIM(COALESCE(calendario, '') || CASE WHEN dia_util THEN ' (dia útil ' || dia_util || ')' ELSE '' END),
+                    escalonar_seg, intervalo_seg, modo_intervalo, timeout_fator, timeout_piso_seg,
+                    du.amostras, du.p99_seg
+                FROM agendamentos LEFT JOIN duracoes_agendamento du ON du.id_agendamento = agendamentos.id
                 WHERE projeto LIKE ? OR arquivo LIKE ? OR local_run LIKE ? OR horario LIKE ? 
                       OR intervalo LIKE ? OR dias_semana LIKE ? OR dias_mes LIKE ? 
                       OR hora_inicio LIKE ? OR hora_fim LIKE ? OR status LIKE ? OR ferramenta_etl LIKE ? 
@@ -353,9 +536,15 @@ class AgendadorGUI(QMainWindow):
                                    ))
         else:
             query = """
-                 SELECT id, arquivo, projeto, local_run, horario, intervalo, 
-                     dias_semana, dias_mes, hora_inicio, hora_fim, status, ferramenta_etl, timeout_execucao
-                 FROM agendamentos
+                 SELECT id, arquivo, projeto, local_run, horario, intervalo,
+                     dias_semana, dias_mes, hora_inicio, hora_fim, status, ferramenta_etl, timeout_execucao,
+                     politica_sobreposicao, max_paralelo, prioridade, memoria_mb,
+                     (SELECT group_concat(d.id_dependencia, ', ') FROM dependencias_agendamento d WHERE d.id_agendamento = agendamentos.id),
+                    max_tentativas, cron,
+                    TRIM(COALESCE(calendario, '') || CASE WHEN dia_util THEN ' (dia útil ' || dia_util || ')' ELSE '' END),
+                    escalonar_seg, intervalo_seg, modo_intervalo, timeout_fator, timeout_piso_seg,
+                    du.amostras, du.p99_seg
+                 FROM agendamentos LEFT JOIN duracoes_agendamento du ON du.id_agendamento = agendamentos.id
             """
             cursor.execute(query)
             
@@ -364,6 +553,24 @@ class AgendadorGUI(QMainWindow):
 
         self.tabela.setRowCount(len(rows))
         for i, row in enumerate(rows):
+            row, extras = list(row[:-6]), row[-6:]
+            intervalo_seg, modo_intervalo, timeout_fator, timeout_piso, amostras, p99 = extras
+            apos_termino = modo_intervalo == "APOS_TERMINO"
+            # Escalonamento: mostra o deslocamento planejado do início dentro da janela
+            if row[-1]:
+                agenda = compilar_agenda(
+                    row[19], row[4], row[5], row[6], row[7], row[8], row[9],
+                    intervalo_seg=intervalo_seg, apos_termino=apos_termino
+                )
+                row[-1] = f"+{deslocamento_inicio(row[0], row[-1], agenda)}s (janela {row[-1]}s)"
+            # Timeout adaptativo: mostra o valor que o serviço aplica hoje, ao lado do fixo
+            if timeout_fator and row[12]:
+                efetivo = calcular_timeout(int(row[12]), timeout_fator, timeout_piso or 60, amostras, p99)
+                if efetivo != int(row[12]):
+                    row[12] = f"{row[12]} (efetivo {efetivo})"
+            # Intervalo em segundos aparece no lugar do intervalo em minutos
+            if intervalo_seg:
+                row[5] = f"{intervalo_seg}s" + (" após término" if apos_termino else "")
             for j, value in enumerate(row):
                 self.tabela.setItem(i, j, QTableWidgetItem(str(value) if value is not None else ""))
 
@@ -401,6 +608,33 @@ class AgendadorGUI(QMainWindow):
         self.limpar_dias_semana()
         self.agendamento_editando = None
         self.entry_timeout.clear()
+        self.combo_sobreposicao.setCurrentIndex(0)
+        self.entry_max_paralelo.clear()
+        self.entry_prioridade.clear()
+        self.entry_memoria.clear()
+        self.entry_dependencias.clear()
+        self.entry_tentativas.clear()
+        self.entry_retry_atraso.clear()
+        self.entry_retry_fator.clear()
+        self.entry_retry_jitter.clear()
+        self.entry_cron.clear()
+        self.entry_escalonar.clear()
+        self.combo_calendario.setCurrentText("")
+        self.entry_dia_util.clear()
+        self.combo_perdidos.setCurrentIndex(0)
+        self.entry_max_perdidos.clear()
+        self.entry_intervalo_seg.clear()
+        self.combo_modo_intervalo.setCurrentIndex(0)
+        self.entry_disjuntor_falhas.clear()
+        self.entry_disjuntor_sonda.clear()
+        self.entry_timeout_fator.clear()
+        self.entry_timeout_piso.clear()
+        self.entry_grupo_recurso.clear()
+        self.entry_cpu_afinidade.clear()
+        self.entry_nice.clear()
+        self.combo_io_classe.setCurrentIndex(0)
+        self.entry_io_prioridade.clear()
+        self.entry_limite_memoria.clear()
 
     def validar_campos(self):
         """Valida os campos obrigatórios e formatos"""
@@ -434,6 +668,54 @@ class AgendadorGUI(QMainWindow):
         
         return True
 
+    def atualizar_deslocamento(self):
+        """Mostra o deslocamento de início que o agendamento em edição terá na janela informada"""
+        janela = self.entry_escalonar.text().strip()
+        if not janela.isdigit() or int(janela) == 0:
+            self.label_deslocamento.setText("")
+        elif self.agendamento_editando:
+            agenda = compilar_agenda(
+                self.entry_cron.text(), self.entry_horario.text(), self.entry_intervalo.text(),
+                None, None, self.entry_hora_inicio.text(), self.entry_hora_fim.text(),
+                intervalo_seg=self.entry_intervalo_seg.text(),
+                apos_termino=self.combo_modo_intervalo.currentText() == "APOS_TERMINO"
+            )
+            self.label_deslocamento.setText(
+                f"início planejado: +{deslocamento_inicio(self.agendamento_editando, int(janela), agenda)}s"
+            )
+        else:
+            self.label_deslocamento.setText("deslocamento definido ao salvar")
+
+    def atualizar_timeout_efetivo(self):
+        """Mostra o timeout que o serviço aplicará ao agendamento em edição, conforme o histórico de durações"""
+        fator = self.ler_decimal(self.entry_timeout_fator, 0.0)
+        if not fator:
+            self.label_timeout_efetivo.setText("")
+            return
+        timeout = self.entry_timeout.text().strip()
+        timeout = int(timeout) if timeout.isdigit() else 1800
+        piso = self.entry_timeout_piso.text().strip()
+        piso = int(piso) if piso.isdigit() else 60
+        duracoes = ler_duracoes(DB_PATH, self.agendamento_editando) if self.agendamento_editando else None
+        amostras, _, _, p99 = duracoes or (0, None, None, None)
+        if amostras < MIN_AMOSTRAS_TIMEOUT:
+            self.label_timeout_efetivo.setText(
+                f"Timeout efetivo: {timeout}s (fixo até {MIN_AMOSTRAS_TIMEOUT} execuções com sucesso; {amostras} registradas)"
+            )
+        else:
+            self.label_timeout_efetivo.setText(
+                f"Timeout efetivo: {calcular_timeout(timeout, fator, piso, amostras, p99)}s "
+                f"(p99 {p99:.0f}s em {amostras} execuções)"
+            )
+
+    def ler_decimal(self, campo, padrao):
+        """Lê um número decimal de um campo, aceitando vírgula ou ponto"""
+        texto = campo.text().strip().replace(',', '.')
+        try:
+            return float(texto) if texto else padrao
+        except ValueError:
+            return padrao
+
     def salvar_no_banco(self):
         """Salva os dados no banco de dados"""
         if not self.validar_campos():
@@ -460,6 +742,66 @@ class AgendadorGUI(QMainWindow):
         etl = self.entry_etl.currentText() 
         timeout_execucao = self.entry_timeout.text().strip()
         timeout_execucao = int(timeout_execucao) if timeout_execucao.isdigit() else 1800
+        politica_sobreposicao = self.combo_sobreposicao.currentText()
+        max_paralelo = self.entry_max_paralelo.text().strip()
+        max_paralelo = int(max_paralelo) if max_paralelo.isdigit() and int(max_paralelo) > 0 else 1
+        prioridade = self.entry_prioridade.text().strip()
+        prioridade = int(prioridade) if prioridade.lstrip('-').isdigit() else 0
+        memoria_mb = self.entry_memoria.text().strip()
+        memoria_mb = int(memoria_mb) if memoria_mb.isdigit() and int(memoria_mb) > 0 else None
+        max_tentativas = self.entry_tentativas.text().strip()
+        max_tentativas = int(max_tentativas) if max_tentativas.isdigit() and int(max_tentativas) > 0 else 1
+        retry_atraso = self.entry_retry_atraso.text().strip()
+        retry_atraso = int(retry_atraso) if retry_atraso.isdigit() else 60
+        retry_fator = self.ler_decimal(self.entry_retry_fator, 2.0)
+        retry_jitter = min(self.ler_decimal(self.entry_retry_jitter, 0.1), 1.0)
+        cron = self.entry_cron.text().strip() or None
+        escalonar_seg = self.entry_escalonar.text().strip()
+        escalonar_seg = int(escalonar_seg) if escalonar_seg.isdigit() else 0
+        calendario = self.combo_calendario.currentText().strip() or None
+        dia_util = self.entry_dia_util.text().strip()
+        dia_util = int(dia_util) if dia_util.lstrip('-').isdigit() and int(dia_util) != 0 else None
+        politica_perdidos = self.combo_perdidos.currentText()
+        max_perdidos = self.entry_max_perdidos.text().strip()
+        max_perdidos = int(max_perdidos) if max_perdidos.isdigit() and int(max_perdidos) > 0 else 1
+        intervalo_seg = self.entry_intervalo_seg.text().strip()
+        intervalo_seg = int(intervalo_seg) if intervalo_seg.isdigit() else 0
+        modo_intervalo = self.combo_modo_intervalo.currentText()
+        disjuntor_falhas = self.entry_disjuntor_falhas.text().strip()
+        disjuntor_falhas = int(disjuntor_falhas) if disjuntor_falhas.isdigit() else 0
+        disjuntor_sonda = self.entry_disjuntor_sonda.text().strip()
+        disjuntor_sonda = int(disjuntor_sonda) if disjuntor_sonda.isdigit() else 1800
+        timeout_fator = self.ler_decimal(self.entry_timeout_fator, 0.0)
+        timeout_piso = self.entry_timeout_piso.text().strip()
+        timeout_piso = int(timeout_piso) if timeout_piso.isdigit() and int(timeout_piso) > 0 else 60
+        grupo_recurso = self.entry_grupo_recurso.text().strip() or None
+        cpu_afinidade = self.entry_cpu_afinidade.text().strip() or None
+        nice = self.entry_nice.text().strip()
+        nice = min(max(int(nice), -20), 19) if nice.lstrip('-').isdigit() else None
+        io_classe = self.combo_io_classe.currentText() or None
+        io_prioridade = self.entry_io_prioridade.text().strip()
+        io_prioridade = int(io_prioridade) if io_prioridade.isdigit() else None
+        limite_memoria_mb = self.entry_limite_memoria.text().strip()
+        limite_memoria_mb = int(limite_memoria_mb) if limite_memoria_mb.isdigit() and int(limite_memoria_mb) > 0 else None
+        try:
+            interpretar_afinidade(cpu_afinidade)
+        except ValueError as e:
+            QMessageBox.warning(self, "Afinidade de CPU Inválida", str(e))
+            return
+        if calendario and calendario not in listar_calendarios():
+            QMessageBox.warning(self, "Calendário Inválido", f"Calendário '{calendario}' não encontrado em {DIRETORIO_CALENDARIOS}")
+            return
+        if cron:
+            try:
+                compilar_cron(cron)
+            except ValueError as e:
+                QMessageBox.warning(self, "Cron Inválido", str(e))
+                return
+        try:
+            dependencias = interpretar_dependencias(self.entry_dependencias.text())
+        except ValueError as e:
+            QMessageBox.warning(self, "Dependências Inválidas", str(e))
+            return
 
         conn = sqlite3.connect(DB_PATH)
         cursor = conn.cursor()
@@ -470,10 +812,22 @@ class AgendadorGUI(QMainWindow):
                 UPDATE agendamentos SET
                     arquivo = ?, projeto = ?, local_run = ?, horario = ?, intervalo = ?,
                     dias_semana = ?, dias_mes = ?, hora_inicio = ?, hora_fim = ?,
-                    status = ?, ferramenta_etl = ?, timeout_execucao = ?
+                    status = ?, ferramenta_etl = ?, timeout_execucao = ?,
+                    politica_sobreposicao = ?, max_paralelo = ?, prioridade = ?, memoria_mb = ?,
+                    max_tentativas = ?, retry_atraso_seg = ?, retry_fator = ?, retry_jitter = ?, cron = ?,
+                    escalonar_seg = ?, calendario = ?, dia_util = ?,
+                    politica_perdidos = ?, max_perdidos = ?, intervalo_seg = ?, modo_intervalo = ?,
+                    disjuntor_falhas = ?, disjuntor_sonda_seg = ?, timeout_fator = ?, timeout_piso_seg = ?,
+                    grupo_recurso = ?, cpu_afinidade = ?, nice = ?, io_classe = ?, io_prioridade = ?,
+                    limite_memoria_mb = ?
                 WHERE id = ?
             """, (arquivo, projeto, local, horario, intervalo, dias_semana, dias_mes,
-                hora_inicio, hora_fim, status, etl, timeout_execucao, self.agendamento_editando))
+                hora_inicio, hora_fim, status, etl, timeout_execucao,
+                politica_sobreposicao, max_paralelo, prioridade, memoria_mb,
+                max_tentativas, retry_atraso, retry_fator, retry_jitter, cron, escalonar_seg, calendario, dia_util,
+                politica_perdidos, max_perdidos, intervalo_seg, modo_intervalo,
+                disjuntor_falhas, disjuntor_sonda, timeout_fator, timeout_piso, grupo_recurso,
+                cpu_afinidade, nice, io_classe, io_prioridade, limite_memoria_mb, self.agendamento_editando))
             mensagem = "Agendamento atualizado com sucesso!"
         else:
             # Insere um novo agendamento
@@ -481,14 +835,34 @@ class AgendadorGUI(QMainWindow):
                 INSERT INTO agendamentos (
                     arquivo, projeto, local_run, horario, intervalo, 
                     dias_semana, dias_mes, hora_inicio, hora_fim, 
-                    status, ferramenta_etl, timeout_execucao
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    status, ferramenta_etl, timeout_execucao,
+                    politica_sobreposicao, max_paralelo, prioridade, memoria_mb,
+                    max_tentativas, retry_atraso_seg, retry_fator, retry_jitter, cron, escalonar_seg,
+                    calendario, dia_util, politica_perdidos, max_perdidos, intervalo_seg, modo_intervalo,
+                    disjuntor_falhas, disjuntor_sonda_seg, timeout_fator, timeout_piso_seg, grupo_recurso,
+                    cpu_afinidade, nice, io_classe, io_prioridade, limite_memoria_mb
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
             """, (arquivo, projeto, local, horario, intervalo, dias_semana, dias_mes,
-                hora_inicio, hora_fim, status, etl, timeout_execucao))
+                hora_inicio, hora_fim, status, etl, timeout_execucao,
+                politica_sobreposicao, max_paralelo, prioridade, memoria_mb,
+                max_tentativas, retry_atraso, retry_fator, retry_jitter, cron, escalonar_seg,
+                calendario, dia_util, politica_perdidos, max_perdidos, intervalo_seg, modo_intervalo,
+                disjuntor_falhas, disjuntor_sonda, timeout_fator, timeout_piso, grupo_recurso,
+                cpu_afinidade, nice, io_classe, io_prioridade, limite_memoria_mb))
             mensagem = "Agendamento salvo com sucesso!"
-            
-        conn.commit()
-        conn.close()
+
+        # As dependências entram na mesma transação do agendamento: um dependente
+        # sem horário gravado sem elas dispararia a cada minuto
+        id_agendamento = self.agendamento_editando or cursor.lastrowid
+        try:
+            gravar_dependencias(conn, id_agendamento, dependencias)
+            conn.commit()
+        except ValueError as e:
+            conn.rollback()
+            QMessageBox.warning(self, "Dependências Inválidas", str(e))
+            return
+        finally:
+            conn.close()
 
         QMessageBox.information(self, "Sucesso", mensagem)
         self.limpar_campos()
@@ -509,7 +883,13 @@ class AgendadorGUI(QMainWindow):
         cursor = conn.cursor()
         cursor.execute("""
             SELECT arquivo, projeto, local_run, horario, intervalo, 
-                   dias_semana, dias_mes, hora_inicio, hora_fim, status,ferramenta_etl,timeout_execucao
+                   dias_semana, dias_mes, hora_inicio, hora_fim, status,ferramenta_etl,timeout_execucao,
+                   politica_sobreposicao, max_paralelo, prioridade, memoria_mb,
+                   max_tentativas, retry_atraso_seg, retry_fator, retry_jitter, cron,
+                   escalonar_seg, calendario, dia_util, politica_perdidos, max_perdidos,
+                   intervalo_seg, modo_intervalo, disjuntor_falhas, disjuntor_sonda_seg,
+                   timeout_fator, timeout_piso_seg, grupo_recurso, cpu_afinidade, nice, io_classe, io_prioridade,
+                   limite_memoria_mb
             FROM agendamentos WHERE id = ?
         """, (id_agendamento,))
         agendamento = cursor.fetchone()
@@ -530,6 +910,35 @@ class AgendadorGUI(QMainWindow):
             self.set_dias_semana(agendamento[5] or "")
             self.entry_timeout.setText(str(agendamento[11]) if agendamento[11] else "1800")
 
+            index_sobreposicao = self.combo_sobreposicao.findText(agendamento[12] or "PULAR")
+            self.combo_sobreposicao.setCurrentIndex(max(index_sobreposicao, 0))
+            self.entry_max_paralelo.setText(str(agendamento[13]) if agendamento[13] else "1")
+            self.entry_prioridade.setText(str(agendamento[14]) if agendamento[14] is not None else "0")
+            self.entry_memoria.setText(str(agendamento[15]) if agendamento[15] else "")
+            self.entry_tentativas.setText(str(agendamento[16]) if agendamento[16] else "1")
+            self.entry_retry_atraso.setText(str(agendamento[17]) if agendamento[17] is not None else "60")
+            self.entry_retry_fator.setText(str(agendamento[18]) if agendamento[18] is not None else "2.0")
+            self.entry_retry_jitter.setText(str(agendamento[19]) if agendamento[19] is not None else "0.1")
+            self.entry_cron.setText(agendamento[20] or "")
+            self.entry_escalonar.setText(str(agendamento[21]) if agendamento[21] else "")
+            self.combo_calendario.setCurrentText(agendamento[22] or "")
+            self.entry_dia_util.setText(str(agendamento[23]) if agendamento[23] else "")
+            self.combo_perdidos.setCurrentIndex(max(self.combo_perdidos.findText(agendamento[24] or "PULAR"), 0))
+            self.entry_max_perdidos.setText(str(agendamento[25]) if agendamento[25] else "1")
+            self.entry_intervalo_seg.setText(str(agendamento[26]) if agendamento[26] else "")
+            self.combo_modo_intervalo.setCurrentIndex(max(self.combo_modo_intervalo.findText(agendamento[27] or "FIXO"), 0))
+            self.entry_disjuntor_falhas.setText(str(agendamento[28]) if agendamento[28] else "")
+            self.entry_disjuntor_sonda.setText(str(agendamento[29]) if agendamento[29] is not None else "")
+            self.entry_timeout_fator.setText(str(agendamento[30]) if agendamento[30] else "")
+            self.entry_timeout_piso.setText(str(agendamento[31]) if agendamento[31] else "")
+            self.entry_grupo_recurso.setText(agendamento[32] or "")
+            self.entry_cpu_afinidade.setText(agendamento[33] or "")
+            self.entry_nice.setText(str(agendamento[34]) if agendamento[34] is not None else "")
+            self.combo_io_classe.setCurrentIndex(max(self.combo_io_classe.findText(agendamento[35] or ""), 0))
+            self.entry_io_prioridade.setText(str(agendamento[36]) if agendamento[36] is not None else "")
+            self.entry_limite_memoria.setText(str(agendamento[37]) if agendamento[37] else "")
+            self.entry_dependencias.setText(", ".join(str(d) for d in ler_dependencias(DB_PATH, id_agendamento)))
+
             # Define o status no combobox
             index = self.combo_status.findText(agendamento[9])
             if index >= 0:
@@ -588,6 +997,15 @@ class AgendadorGUI(QMainWindow):
         id_agendamento = int(self.tabela.item(linha_selecionada, 0).text())
         arquivo = self.tabela.item(linha_selecionada, 1).text()
 
+        dependentes = ler_dependentes(DB_PATH, id_agendamento)
+        if dependentes:
+            QMessageBox.warning(
+                self, "Exclusão",
+                "Os agendamentos " + ", ".join(str(d) for d in dependentes) +
+                " dependem deste. Remova as dependências antes de excluí-lo."
+            )
+            return
+
         resposta = QMessageBox.question(
             self, "Confirmar Exclusão", 
             f"Tem certeza que deseja excluir o agendamento do workflow: '{arquivo}'?",
@@ -596,10 +1014,16 @@ class AgendadorGUI(QMainWindow):
 
         if resposta == QMessageBox.StandardButton.Yes:
             conn = sqlite3.connect(DB_PATH)
-            cursor = conn.cursor()
-            cursor.execute("DELETE FROM agendamentos WHERE id = ?", (id_agendamento,))
-            conn.commit()
-            conn.close()
+            try:
+                cursor = conn.cursor()
+                cursor.execute("DELETE FROM agendamentos WHERE id = ?", (id_agendamento,))
+                conn.commit()
+            except sqlite3.IntegrityError:
+                # Uma dependência foi criada depois da verificação acima
+                QMessageBox.warning(self, "Exclusão", "Outros agendamentos dependem deste; ele não foi excluído.")
+                return
+            finally:
+                conn.close()
 
             QMessageBox.information(self, "Sucesso", "Agendamento excluído com sucesso!")
             self.listar_agendamentos()
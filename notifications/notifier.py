@@ -14,6 +14,9 @@
 
 import os
 import asyncio
+import queue
+import threading
+import time
 from dotenv import load_dotenv
 from .telegram_notify import enviar_telegram
 from .email import enviar_email
@@ -41,6 +44,41 @@ def notificar(mensagem: str, canais: list = None):
             if "Event loop is closed" not in str(e):
                 raise
 
+# Notificações enviadas por uma thread própria, para que quem notifica (pool,
+# supervisor, batimento dos nós) não espere pelo Telegram ou pelo SMTP
+_fila_envio = queue.Queue()
+_lock_envio = threading.Lock()
+_thread_envio = None
+
+
+def notificar_em_segundo_plano(mensagem: str, canais: list = None):
+    """Enfileira a notificação e retorna imediatamente; o envio é feito em ordem por uma única thread"""
+    global _thread_envio
+    with _lock_envio:
+        if _thread_envio is None:
+            _thread_envio = threading.Thread(target=_enviar_fila, name="Notificacoes", daemon=True)
+            _thread_envio.start()
+    _fila_envio.put((mensagem, canais))
+
+
+def aguardar_notificacoes(prazo: float):
+    """Aguarda até `prazo` segundos o envio das notificações enfileiradas (ao parar o serviço)"""
+    limite = time.monotonic() + prazo
+    while _fila_envio.unfinished_tasks and time.monotonic() < limite:
+        time.sleep(0.1)
+
+
+def _enviar_fila():
+    while True:
+        mensagem, canais = _fila_envio.get()
+        try:
+            notificar(mensagem, canais)
+        except Exception as e:
+            print(f"[Notificação] Falha ao enviar notificação: {e}")
+        finally:
+            _fila_envio.task_done()
+
+
 if sys.platform.startswith('win') and sys.version_info < (3, 9):
     # Evita o erro "Event loop is closed" ao encerrar no Windows
     import asyncio.proactor_events
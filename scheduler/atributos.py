@@ -0,0 +1,190 @@
+# Copyright 2025 Thiago Luis de Lima
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import logging
+import os
+import subprocess
+
+from .processos import WINDOWS, opcoes_novo_grupo, psutil
+
+logger = logging.getLogger(__name__)
+
+# Classes de prioridade de I/O de uma execução. No Linux correspondem às classes do
+# ionice (a prioridade 0-7 vale para NORMAL e TEMPO_REAL); no Windows, às prioridades
+# de I/O do processo (OCIOSA = muito baixa, NORMAL com prioridade >= 5 = baixa).
+IO_NORMAL = 'NORMAL'
+IO_OCIOSA = 'OCIOSA'
+IO_TEMPO_REAL = 'TEMPO_REAL'
+CLASSES_IO = (IO_NORMAL, IO_OCIOSA, IO_TEMPO_REAL)
+
+# Prioridade (nice) do próprio serviço, para que os ticks não atrasem com as
+# ferramentas ocupando a CPU; as ferramentas iniciadas por ele voltam ao nice 0
+# quando o agendamento não define outro. Vazio = não alterar.
+NICE_SERVICO = os.getenv("NICE_SERVICO", "-5").strip()
+
+
+def interpretar_afinidade(texto):
+    """
+    Converte "0-3,6" em (0, 1, 2, 3, 6); vazio retorna None (todos os núcleos).
+    Levanta ValueError para uma lista inválida.
+    """
+    texto = (texto or '').replace(' ', '')
+    if not texto:
+        return None
+    nucleos = set()
+    for parte in texto.split(','):
+        inicio, separador, fim = parte.partition('-')
+        if not inicio.isdigit() or (separador and not fim.isdigit()):
+            raise ValueError(f"Afinidade de CPU inválida: '{parte}' (use por exemplo 0-3,6)")
+        inicio, fim = int(inicio), int(fim) if separador else int(inicio)
+        if fim < inicio:
+            raise ValueError(f"Afinidade de CPU inválida: '{parte}' (intervalo invertido)")
+        nucleos.update(range(inicio, fim + 1))
+    return tuple(sorted(nucleos))
+
+
+def _classe_windows(nice):
+    """Classe de prioridade do Windows equivalente ao nice"""
+    if nice >= 15:
+        return subprocess.IDLE_PRIORITY_CLASS
+    if nice >= 5:
+        return subprocess.BELOW_NORMAL_PRIORITY_CLASS
+    if nice > -5:
+        return subprocess.NORMAL_PRIORITY_CLASS
+    if nice > -15:
+        return subprocess.ABOVE_NORMAL_PRIORITY_CLASS
+    return subprocess.HIGH_PRIORITY_CLASS
+
+
+class AtributosProcesso:
+    """Afinidade de CPU, nice e prioridade de I/O aplicados ao processo de uma execução"""
+
+    __slots__ = ("afinidade", "nice", "io_classe", "io_prioridade")
+
+    def __init__(self, afinidade=None, nice=None, io_classe=None, io_prioridade=None):
+        self.afinidade = afinidade
+        self.nice = nice
+        self.io_classe = io_classe
+        self.io_prioridade = io_prioridade
+
+    @classmethod
+    def da_linha(cls, afinidade, nice, io_classe, io_prioridade):
+        """Valores gravados no agendamento; os inválidos são ignorados (o processo fica com o padrão)"""
+        try:
+            afinidade = interpretar_afinidade(afinidade)
+        except ValueError:
+            afinidade = None
+        try:
+            nice = min(max(int(nice), -20), 19) if nice not in (None, '') else None
+        except (TypeError, ValueError):
+            nice = None
+        io_classe = (io_classe or '').strip().upper() or None
+        if io_classe not in CLASSES_IO:
+            io_classe = None
+        try:
+            io_prioridade = min(max(int(io_prioridade), 0), 7) if io_prioridade not in (None, '') else None
+        except (TypeError, ValueError):
+            io_prioridade = None
+        return cls(afinidade, nice, io_classe, io_prioridade)
+
+    def com_nice_padrao(self, nice):
+        """Cópia com `nice` quando o agendamento não define um"""
+        if self.nice is not None:
+            return self
+        return AtributosProcesso(self.afinidade, nice, self.io_classe, self.io_prioridade)
+
+    def __bool__(self):
+        return any(v is not None for v in (self.afinidade, self.nice, self.io_classe, self.io_prioridade))
+
+    def __repr__(self):
+        return (f"AtributosProcesso(afinidade={self.afinidade}, nice={self.nice}, "
+                f"io={self.io_classe}/{self.io_prioridade})")
+
+
+def opcoes_processo(atributos=None):
+    """
+    Argumentos do Popen: grupo próprio (opcoes_novo_grupo) e, no Windows, a
+    classe de prioridade já na criação, herdada pelos processos filhos (JVM).
+    """
+    opcoes = opcoes_novo_grupo()
+    if WINDOWS and atributos is not None and atributos.nice is not None:
+        opcoes['creationflags'] |= _classe_windows(atributos.nice)
+    return opcoes
+
+
+def _aplicar_io(processo, atributos):
+    if WINDOWS:
+        if atributos.io_classe == IO_OCIOSA:
+            processo.ionice(psutil.IOPRIO_VERYLOW)
+        elif atributos.io_classe == IO_TEMPO_REAL:
+            processo.ionice(psutil.IOPRIO_HIGH)
+        else:
+            baixa = atributos.io_prioridade is not None and atributos.io_prioridade >= 5
+            processo.ionice(psutil.IOPRIO_LOW if baixa else psutil.IOPRIO_NORMAL)
+    elif atributos.io_classe == IO_OCIOSA:
+        processo.ionice(psutil.IOPRIO_CLASS_IDLE)
+    else:
+        classe = psutil.IOPRIO_CLASS_RT if atributos.io_classe == IO_TEMPO_REAL else psutil.IOPRIO_CLASS_BE
+        processo.ionice(classe, value=4 if atributos.io_prioridade is None else atributos.io_prioridade)
+
+
+def aplicar_atributos(pid, atributos):
+    """
+    Aplica os atributos ao processo e aos descendentes já criados; os criados
+    depois os herdam (nice, afinidade e ionice no Linux; classe e afinidade no
+    Windows). Falhas (psutil ausente, permissão) são registradas e ignoradas.
+    """
+    if not atributos:
+        return
+    if psutil is None:
+        logger.warning(f"psutil indisponível: atributos de processo ignorados (PID {pid})")
+        return
+    try:
+        raiz = psutil.Process(pid)
+        processos = [raiz] + raiz.children(recursive=True)
+    except psutil.NoSuchProcess:
+        return
+
+    for processo in processos:
+        try:
+            if atributos.afinidade is not None and hasattr(processo, 'cpu_affinity'):
+                processo.cpu_affinity(list(atributos.afinidade))
+            if atributos.nice is not None:
+                processo.nice(_classe_windows(atributos.nice) if WINDOWS else atributos.nice)
+            if (atributos.io_classe or atributos.io_prioridade is not None) and hasattr(processo, 'ionice'):
+                _aplicar_io(processo, atributos)
+        except psutil.NoSuchProcess:
+            continue
+        except (psutil.AccessDenied, ValueError, OSError) as e:
+            logger.warning(f"Não foi possível aplicar {atributos} ao PID {processo.pid}: {str(e)}")
+
+
+def elevar_prioridade_servico():
+    """Aplica NICE_SERVICO ao processo atual; retorna o nice aplicado, ou None"""
+    if not NICE_SERVICO:
+        return None
+    try:
+        nice = min(max(int(NICE_SERVICO), -20), 19)
+    except ValueError:
+        logger.error(f"NICE_SERVICO inválido: {NICE_SERVICO}")
+        return None
+    if psutil is None:
+        logger.warning("psutil indisponível: prioridade do serviço não alterada")
+        return None
+    try:
+        psutil.Process().nice(_classe_windows(nice) if WINDOWS else nice)
+        return nice
+    except (psutil.AccessDenied, OSError) as e:
+        logger.warning(f"Não foi possível alterar a prioridade do serviço para nice {nice}: {str(e)}")
+        return None
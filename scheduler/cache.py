@@ -0,0 +1,104 @@
+# Copyright 2025 Thiago Luis de Lima
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import logging
+
+from .db import conectar
+from .rules import COLUNAS_REGRA, CONSULTA_DEPENDENCIAS
+
+logger = logging.getLogger(__name__)
+
+# Quantidade máxima de ids por consulta IN (...)
+TAMANHO_LOTE = 500
+
+
+class CacheAgendamentos:
+    """
+    Acompanha alterações na tabela agendamentos sem reler a tabela a cada tick.
+
+    `PRAGMA data_version` só muda quando outra conexão grava no banco; quando
+    muda, a versão global mantida pelos gatilhos indica se foram os
+    agendamentos que mudaram, e a coluna versao de cada linha indica quais.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._conn = None
+        self._data_version = None
+        self._versao_global = None
+        self._versoes = {}
+
+    def _conexao(self):
+        if self._conn is None:
+            self._conn = conectar(self.db_path)
+        return self._conn
+
+    def fechar(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def invalidar(self):
+        """Força uma releitura completa na próxima verificação"""
+        self._data_version = None
+        self._versao_global = None
+        self._versoes = {}
+
+    def alteracoes(self):
+        """
+        Retorna (linhas_alteradas, ids_removidos) desde a última chamada, ou
+        None se nada mudou. Na primeira chamada todas as linhas ativas vêm
+        como alteradas.
+        """
+        try:
+            return self._alteracoes()
+        except Exception:
+            # Conexão pode ter ficado inválida (banco recriado, disco, etc)
+            self.fechar()
+            self.invalidar()
+            raise
+
+    def _alteracoes(self):
+        conn = self._conexao()
+
+        data_version = conn.execute("PRAGMA data_version").fetchone()[0]
+        if data_version == self._data_version:
+            return None
+        self._data_version = data_version
+
+        linha = conn.execute("SELECT versao FROM controle_versao WHERE tabela = 'agendamentos'").fetchone()
+        versao_global = linha[0] if linha else None
+        if versao_global is not None and versao_global == self._versao_global:
+            return None
+        self._versao_global = versao_global
+
+        conn.execute("BEGIN")
+        versoes = dict(conn.execute("SELECT id, versao FROM agendamentos WHERE status = 'Ativo'"))
+        removidos = [id_ag for id_ag in self._versoes if id_ag not in versoes]
+        alterados = [id_ag for id_ag, versao in versoes.items() if self._versoes.get(id_ag) != versao]
+
+        linhas = []
+        colunas = ", ".join(COLUNAS_REGRA + (CONSULTA_DEPENDENCIAS,))
+        for i in range(0, len(alterados), TAMANHO_LOTE):
+            lote = alterados[i:i + TAMANHO_LOTE]
+            marcadores = ", ".join("?" * len(lote))
+            linhas.extend(conn.execute(
+                f"SELECT {colunas} FROM agendamentos WHERE id IN ({marcadores})", lote
+            ).fetchall())
+        conn.commit()
+
+        self._versoes = versoes
+        if alterados or removidos:
+            logger.info(f"Agendamentos recarregados: {len(alterados)} alterado(s), {len(removidos)} removido(s)")
+        return linhas, removidos
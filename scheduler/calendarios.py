@@ -0,0 +1,270 @@
+# Copyright 2025 Thiago Luis de Lima
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import csv
+import datetime
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+# Pasta com os calendários: <nome>.csv ou <nome>.ics, referenciados pelo nome no agendamento
+DIRETORIO_CALENDARIOS = os.getenv(
+    "DIRETORIO_CALENDARIOS",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "calendarios")
+)
+EXTENSOES = ('.csv', '.ics')
+
+
+def _ler_data(texto):
+    """Aceita AAAA-MM-DD, DD/MM/AAAA e AAAAMMDD; retorna None se não for uma data"""
+    texto = texto.strip()
+    for formato in ('%Y-%m-%d', '%d/%m/%Y', '%Y%m%d'):
+        try:
+            return datetime.datetime.strptime(texto, formato).date()
+        except ValueError:
+            continue
+    return None
+
+
+def _ler_dia_mes(texto):
+    """'25/12' = feriado fixo, repetido todo ano; retorna (mês, dia) ou None"""
+    dia, barra, mes = texto.strip().partition('/')
+    if not barra or not dia.isdigit() or not mes.isdigit():
+        return None
+    try:
+        datetime.date(2000, int(mes), int(dia))  # 2000 é bissexto: aceita 29/02
+    except ValueError:
+        return None
+    return int(mes), int(dia)
+
+
+def ler_csv(caminho):
+    """
+    Primeira coluna de cada linha: uma data (feriado daquele ano) ou DD/MM
+    (feriado fixo de todo ano); demais colunas e linhas sem data (cabeçalho,
+    comentários) são ignoradas. Retorna (datas, dias_fixos).
+    """
+    datas, fixos = set(), set()
+    with open(caminho, newline='', encoding='utf-8-sig') as arquivo:
+        conteudo = arquivo.read()
+    delimitador = ';' if conteudo.count(';') > conteudo.count(',') else ','
+    for linha in csv.reader(conteudo.splitlines(), delimiter=delimitador):
+        if not linha or not linha[0].strip() or linha[0].lstrip().startswith('#'):
+            continue
+        data = _ler_data(linha[0])
+        if data is not None:
+            datas.add(data)
+            continue
+        fixo = _ler_dia_mes(linha[0])
+        if fixo is not None:
+            fixos.add(fixo)
+    return datas, fixos
+
+
+def _linhas_ics(conteudo):
+    """Desfaz a quebra de linhas longas do iCalendar (continuação começa com espaço)"""
+    linhas = []
+    for linha in conteudo.splitlines():
+        if linha[:1] in (' ', '\t') and linhas:
+            linhas[-1] += linha[1:]
+        else:
+            linhas.append(linha)
+    return linhas
+
+
+def ler_ics(caminho):
+    """
+    Eventos (VEVENT) de um arquivo iCalendar: cada dia entre DTSTART e DTEND é
+    feriado; eventos com RRULE:FREQ=YEARLY viram feriados fixos. Retorna (datas, dias_fixos).
+    """
+    datas, fixos = set(), set()
+    with open(caminho, encoding='utf-8-sig') as arquivo:
+        linhas = _linhas_ics(arquivo.read())
+
+    evento = None
+    for linha in linhas:
+        nome, _, valor = linha.partition(':')
+        chave = nome.split(';')[0].upper()
+        if linha.upper() == 'BEGIN:VEVENT':
+            evento = {}
+        elif linha.upper() == 'END:VEVENT' and evento is not None:
+            inicio = _ler_data(evento.get('DTSTART', '')[:8])
+            if inicio is None:
+                evento = None
+                continue
+            fim = _ler_data(evento.get('DTEND', '')[:8]) or inicio + datetime.timedelta(days=1)
+            dias = [inicio + datetime.timedelta(days=i) for i in range(max((fim - inicio).days, 1))]
+            regra = evento.get('RRULE', '').upper()
+            if 'FREQ=YEARLY' in regra:
+                fixos.update((d.month, d.day) for d in dias)
+            else:
+                if regra:
+                    logger.warning(f"Recorrência não suportada ignorada em {caminho}: {regra}")
+                datas.update(dias)
+            evento = None
+        elif evento is not None and chave in ('DTSTART', 'DTEND', 'RRULE'):
+            evento[chave] = valor.strip()
+    return datas, fixos
+
+
+def _dia_do_ano(data):
+    return data.toordinal() - datetime.date(data.year, 1, 1).toordinal()
+
+
+class Calendario:
+    """
+    Feriados de um calendário, pré-calculados em máscaras de bits por ano
+    (bit n = n-ésimo dia do ano, a partir de 0), para consulta O(1) a cada disparo.
+    """
+
+    def __init__(self, nome, datas=(), fixos=(), caminho=None, modificado=None):
+        self.nome = nome
+        self.caminho = caminho
+        self.modificado = modificado
+        self.datas = frozenset(datas)
+        self.fixos = frozenset(fixos)
+        self.anos = frozenset(d.year for d in self.datas)
+        self._feriados = {}
+        self._uteis = {}
+        self._anos_avisados = set()
+
+    def feriados(self, ano):
+        """Máscara dos feriados do ano"""
+        mascara = self._feriados.get(ano)
+        if mascara is None:
+            if self.datas and ano not in self.anos and not self.fixos and ano not in self._anos_avisados:
+                self._anos_avisados.add(ano)
+                logger.warning(f"Calendário {self.nome!r} não tem feriados cadastrados para {ano}")
+            mascara = 0
+            for data in self.datas:
+                if data.year == ano:
+                    mascara |= 1 << _dia_do_ano(data)
+            for mes, dia in self.fixos:
+                try:
+                    mascara |= 1 << _dia_do_ano(datetime.date(ano, mes, dia))
+                except ValueError:
+                    continue  # 29/02 em ano não bissexto
+            self._feriados[ano] = mascara
+        return mascara
+
+    def feriado(self, data):
+        return bool((self.feriados(data.year) >> _dia_do_ano(data)) & 1)
+
+    def dia_util(self, data):
+        return data.weekday() < 5 and not self.feriado(data)
+
+    def enesimos_dias_uteis(self, ano, n):
+        """
+        Máscara, no ano, do n-ésimo dia útil de cada mês (n = 1 primeiro,
+        n = -1 último); meses com menos de |n| dias úteis ficam sem disparo.
+        """
+        mascara = self._uteis.get((ano, n))
+        if mascara is None:
+            mascara = 0
+            for mes in range(1, 13):
+                dia = datetime.date(ano, mes, 1)
+                uteis = []
+                while dia.month == mes:
+                    if self.dia_util(dia):
+                        uteis.append(dia)
+                    dia += datetime.timedelta(days=1)
+                if n and abs(n) <= len(uteis):
+                    mascara |= 1 << _dia_do_ano(uteis[n - 1 if n > 0 else n])
+            self._uteis[(ano, n)] = mascara
+        return mascara
+
+
+class FiltroCalendario:
+    """
+    Filtro de dias de um agendamento: sem `dia_util`, exclui os feriados do
+    calendário; com `dia_util` = n, só permite o n-ésimo dia útil do mês
+    (segunda a sexta, exceto feriados).
+    """
+
+    __slots__ = ("calendario", "dia_util")
+
+    def __init__(self, calendario, dia_util=None):
+        self.calendario = calendario
+        self.dia_util = dia_util
+
+    def permite(self, data):
+        if self.dia_util:
+            return bool((self.calendario.enesimos_dias_uteis(data.year, self.dia_util) >> _dia_do_ano(data)) & 1)
+        return not self.calendario.feriado(data)
+
+
+def _arquivo_calendario(nome, diretorio):
+    for extensao in EXTENSOES:
+        caminho = os.path.join(diretorio, nome + extensao)
+        if os.path.isfile(caminho):
+            return caminho
+    return None
+
+
+def carregar_calendario(nome, diretorio=None):
+    """Lê <nome>.csv ou <nome>.ics da pasta de calendários; retorna None se não existir"""
+    caminho = _arquivo_calendario(nome, diretorio or DIRETORIO_CALENDARIOS)
+    if caminho is None:
+        return None
+    modificado = os.path.getmtime(caminho)
+    if caminho.lower().endswith('.ics'):
+        datas, fixos = ler_ics(caminho)
+    else:
+        datas, fixos = ler_csv(caminho)
+    logger.info(f"Calendário {nome!r} carregado: {len(datas)} data(s) e {len(fixos)} feriado(s) fixo(s)")
+    return Calendario(nome, datas, fixos, caminho=caminho, modificado=modificado)
+
+
+def listar_calendarios(diretorio=None):
+    """Nomes dos calendários disponíveis na pasta"""
+    diretorio = diretorio or DIRETORIO_CALENDARIOS
+    if not os.path.isdir(diretorio):
+        return []
+    return sorted({
+        os.path.splitext(arquivo)[0] for arquivo in os.listdir(diretorio)
+        if arquivo.lower().endswith(EXTENSOES)
+    })
+
+
+# Calendários já lidos pelo processo, por nome (None = arquivo não encontrado)
+_carregados = {}
+
+
+def obter_calendario(nome):
+    """Calendário pelo nome, lido uma única vez até o arquivo mudar (ver calendarios_alterados)"""
+    if nome not in _carregados:
+        try:
+            _carregados[nome] = carregar_calendario(nome)
+        except (OSError, UnicodeDecodeError) as e:
+            logger.error(f"Falha ao ler calendário {nome!r}: {str(e)}")
+            _carregados[nome] = None
+    return _carregados[nome]
+
+
+def calendarios_alterados():
+    """
+    Descarta os calendários cujo arquivo foi criado, alterado ou removido
+    desde a leitura; retorna True se algum mudou (as regras devem ser recompiladas).
+    """
+    alterados = []
+    for nome, calendario in _carregados.items():
+        caminho = _arquivo_calendario(nome, DIRETORIO_CALENDARIOS)
+        atual = (caminho, os.path.getmtime(caminho)) if caminho else (None, None)
+        anterior = (calendario.caminho, calendario.modificado) if calendario else (None, None)
+        if atual != anterior:
+            alterados.append(nome)
+    for nome in alterados:
+        del _carregados[nome]
+    return bool(alterados)
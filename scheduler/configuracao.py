@@ -0,0 +1,67 @@
+# Copyright 2025 Thiago Luis de Lima
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from .atributos import AtributosProcesso
+from .db import conectar
+
+# Colunas do agendamento usadas fora do serviço (execução manual, bot, monitor e reprocessamento)
+COLUNAS_CONFIGURACAO = (
+    "arquivo", "projeto", "local_run", "ferramenta_etl", "timeout_execucao", "memoria_mb",
+    "limite_memoria_mb", "cpu_afinidade", "nice", "io_classe", "io_prioridade",
+)
+
+
+def _inteiro(valor):
+    return int(valor) if valor else None
+
+
+class ConfiguracaoExecucao:
+    """Configuração de execução de um agendamento; sem agendamento, todos os campos ficam vazios"""
+
+    __slots__ = (
+        "arquivo", "projeto", "local_run", "ferramenta_etl", "timeout", "memoria_mb", "limite_memoria_mb",
+        "atributos",
+    )
+
+    def __init__(self, arquivo=None, projeto=None, local_run=None, ferramenta_etl=None, timeout=None,
+                 memoria_mb=None, limite_memoria_mb=None, atributos=None):
+        self.arquivo = arquivo
+        self.projeto = projeto
+        self.local_run = local_run
+        self.ferramenta_etl = ferramenta_etl
+        self.timeout = timeout
+        self.memoria_mb = memoria_mb
+        self.limite_memoria_mb = limite_memoria_mb
+        self.atributos = atributos
+
+    @classmethod
+    def da_linha(cls, linha):
+        """Linha com as COLUNAS_CONFIGURACAO, na mesma ordem"""
+        arquivo, projeto, local_run, ferramenta, timeout, memoria, limite = linha[:7]
+        return cls(
+            arquivo, projeto, local_run, ferramenta, _inteiro(timeout), _inteiro(memoria), _inteiro(limite),
+            AtributosProcesso.da_linha(*linha[7:])
+        )
+
+
+def ler_configuracao(db_path, id_agendamento):
+    """ConfiguracaoExecucao do agendamento, lida em uma única consulta; None se não existir"""
+    conn = conectar(db_path)
+    try:
+        linha = conn.execute(
+            f"SELECT {', '.join(COLUNAS_CONFIGURACAO)} FROM agendamentos WHERE id = ?", (id_agendamento,)
+        ).fetchone()
+    finally:
+        conn.close()
+    return ConfiguracaoExecucao.da_linha(linha) if linha else None
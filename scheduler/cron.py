@@ -0,0 +1,341 @@
+# Copyright 2025 Thiago Luis de Lima
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import calendar
+import datetime
+
+MINUTOS_DIA = 24 * 60
+SEGUNDOS_DIA = MINUTOS_DIA * 60
+
+# Limite de dias pesquisados ao calcular o próximo disparo (cobre combinações
+# raras como "dia 31 numa segunda-feira")
+HORIZONTE_DIAS = 4 * 366
+
+UM_SEGUNDO = datetime.timedelta(seconds=1)
+UM_MINUTO = datetime.timedelta(minutes=1)
+UM_DIA = datetime.timedelta(days=1)
+
+# Máscaras "qualquer valor": bit n ligado = valor n permitido
+TODOS_DIAS_MES = ((1 << 32) - 1) & ~1      # dias 1..31
+TODOS_MESES = ((1 << 13) - 1) & ~1         # meses 1..12
+TODOS_DIAS_SEMANA = (1 << 7) - 1           # 0 = segunda ... 6 = domingo (datetime.weekday)
+
+MACROS = {
+    '@yearly': '0 0 1 1 *',
+    '@annually': '0 0 1 1 *',
+    '@monthly': '0 0 1 * *',
+    '@weekly': '0 0 * * 0',
+    '@daily': '0 0 * * *',
+    '@midnight': '0 0 * * *',
+    '@hourly': '0 * * * *',
+}
+
+NOMES_MESES = {
+    'jan': 1, 'feb': 2, 'fev': 2, 'mar': 3, 'apr': 4, 'abr': 4, 'may': 5, 'mai': 5, 'jun': 6,
+    'jul': 7, 'aug': 8, 'ago': 8, 'sep': 9, 'set': 9, 'oct': 10, 'out': 10, 'nov': 11, 'dec': 12, 'dez': 12,
+}
+
+# Numeração do cron: 0 (ou 7) = domingo
+NOMES_DIAS_SEMANA = {
+    'sun': 0, 'dom': 0, 'mon': 1, 'seg': 1, 'tue': 2, 'ter': 2, 'wed': 3, 'qua': 3,
+    'thu': 4, 'qui': 4, 'fri': 5, 'sex': 5, 'sat': 6, 'sab': 6,
+}
+
+
+def _proximo_bit(mascara, a_partir):
+    """Menor n >= a_partir com o bit n ligado em `mascara`, ou None"""
+    resto = mascara >> a_partir
+    if not resto:
+        return None
+    return a_partir + (resto & -resto).bit_length() - 1
+
+
+def _bits(valores):
+    mascara = 0
+    for valor in valores:
+        mascara |= 1 << valor
+    return mascara
+
+
+def _valor(texto, minimo, maximo, nomes):
+    texto = texto.strip().lower()
+    if nomes and texto in nomes:
+        return nomes[texto]
+    if not texto.isdigit():
+        raise ValueError(f"Valor inválido: '{texto}'")
+    valor = int(texto)
+    if not minimo <= valor <= maximo:
+        raise ValueError(f"Valor {valor} fora do intervalo {minimo}-{maximo}")
+    return valor
+
+
+def _campo(texto, minimo, maximo, nomes=None):
+    """
+    Converte um campo cron ('*', '*/10', '8-18', '1,15', 'mon-fri', '5/15')
+    na máscara de bits dos valores permitidos.
+    """
+    mascara = 0
+    for parte in texto.split(','):
+        faixa, barra, passo = parte.partition('/')
+        if barra:
+            if not passo.isdigit() or int(passo) == 0:
+                raise ValueError(f"Passo inválido: '{parte}'")
+            passo = int(passo)
+        else:
+            passo = 1
+
+        if faixa == '*':
+            inicio, fim = minimo, maximo
+        elif '-' in faixa:
+            inicio, _, fim = faixa.partition('-')
+            inicio, fim = _valor(inicio, minimo, maximo, nomes), _valor(fim, minimo, maximo, nomes)
+            if inicio > fim:
+                raise ValueError(f"Faixa invertida: '{faixa}'")
+        else:
+            inicio = _valor(faixa, minimo, maximo, nomes)
+            fim = maximo if barra else inicio
+
+        mascara |= _bits(range(inicio, fim + 1, passo))
+    return mascara
+
+
+class TermoAgenda:
+    """
+    Conjunto de disparos compilado em máscaras de bits: minutos do dia
+    (bit h*60+m), dias do mês, meses e dias da semana (0 = segunda).
+
+    Com `dias_ou` (cron com dia do mês e dia da semana restritos) o dia vale se
+    qualquer um dos dois filtros aceitar; caso contrário os dois precisam aceitar.
+    """
+
+    __slots__ = ("minutos", "dias_mes", "ultimo_dia", "meses", "dias_semana", "dias_ou")
+
+    def __init__(self, minutos, dias_mes=TODOS_DIAS_MES, meses=TODOS_MESES,
+                 dias_semana=TODOS_DIAS_SEMANA, ultimo_dia=False, dias_ou=False):
+        self.minutos = minutos
+        self.dias_mes = dias_mes
+        self.ultimo_dia = ultimo_dia
+        self.meses = meses
+        self.dias_semana = dias_semana
+        self.dias_ou = dias_ou
+
+    @classmethod
+    def de_minutos(cls, minutos, dias_semana=None, dias_mes=None):
+        """Termo dos campos legados: minutos do dia e filtros de dia (ambos precisam aceitar)"""
+        return cls(
+            _bits(minutos),
+            dias_mes=_bits(dias_mes) & TODOS_DIAS_MES if dias_mes is not None else TODOS_DIAS_MES,
+            dias_semana=_bits(dias_semana) if dias_semana is not None else TODOS_DIAS_SEMANA,
+        )
+
+    def dia_permitido(self, data):
+        if not (self.meses >> data.month) & 1:
+            return False
+        no_mes = (self.dias_mes >> data.day) & 1 or (
+            self.ultimo_dia and data.day == calendar.monthrange(data.year, data.month)[1]
+        )
+        na_semana = (self.dias_semana >> data.weekday()) & 1
+        return bool(no_mes or na_semana) if self.dias_ou else bool(no_mes and na_semana)
+
+    def cumpre(self, momento):
+        return bool((self.minutos >> (momento.hour * 60 + momento.minute)) & 1) and self.dia_permitido(momento)
+
+    def proxima(self, inicio):
+        """Primeiro minuto >= `inicio` (já truncado no minuto) em que o termo dispara"""
+        if not self.minutos:
+            return None
+        dia = inicio.date()
+        minuto = inicio.hour * 60 + inicio.minute
+        fim = dia.toordinal() + HORIZONTE_DIAS
+
+        while dia.toordinal() < fim:
+            if not (self.meses >> dia.month) & 1:
+                # Mês inteiro fora do filtro: pula para o dia 1 do mês seguinte
+                dia = (dia.replace(day=28) + 4 * UM_DIA).replace(day=1)
+                minuto = 0
+                continue
+            if self.dia_permitido(dia):
+                m = _proximo_bit(self.minutos, minuto)
+                if m is not None:
+                    return datetime.datetime(dia.year, dia.month, dia.day, m // 60, m % 60)
+            dia += UM_DIA
+            minuto = 0
+        return None
+
+
+class Agenda:
+    """
+    União de termos: dispara quando qualquer um deles dispara. `filtro`, se
+    informado, tem `permite(data)` e exclui dias inteiros (por exemplo feriados).
+    """
+
+    __slots__ = ("termos", "filtro")
+
+    def __init__(self, termos=(), filtro=None):
+        self.termos = tuple(t for t in termos if t.minutos)
+        self.filtro = filtro
+
+    def __bool__(self):
+        return bool(self.termos)
+
+    def menor_intervalo(self):
+        """Menor distância, em minutos, entre dois disparos consecutivos no dia (virada incluída)"""
+        mascara = 0
+        for termo in self.termos:
+            mascara |= termo.minutos
+        if not mascara:
+            return None
+        primeiro = anterior = _proximo_bit(mascara, 0)
+        menor = MINUTOS_DIA
+        atual = _proximo_bit(mascara, primeiro + 1)
+        while atual is not None:
+            menor = min(menor, atual - anterior)
+            anterior, atual = atual, _proximo_bit(mascara, atual + 1)
+        return min(menor, primeiro + MINUTOS_DIA - anterior)
+
+    def cumpre(self, momento):
+        if self.filtro is not None and not self.filtro.permite(momento.date()):
+            return False
+        return any(t.cumpre(momento) for t in self.termos)
+
+    def _proxima(self, inicio):
+        if len(self.termos) == 1:
+            return self.termos[0].proxima(inicio)
+        candidatos = [q for q in (t.proxima(inicio) for t in self.termos) if q is not None]
+        return min(candidatos) if candidatos else None
+
+    def proxima_execucao(self, apos):
+        """
+        Retorna o primeiro minuto estritamente posterior a `apos` em que a
+        agenda dispara, ou None se ela nunca dispara.
+        """
+        inicio = apos.replace(second=0, microsecond=0) + UM_MINUTO
+        quando = self._proxima(inicio)
+        if self.filtro is None:
+            return quando
+
+        fim = inicio.toordinal() + HORIZONTE_DIAS
+        while quando is not None and not self.filtro.permite(quando.date()):
+            # Dia excluído pelo filtro: continua a busca a partir do dia seguinte
+            inicio = datetime.datetime(quando.year, quando.month, quando.day) + UM_DIA
+            if inicio.toordinal() >= fim:
+                return None
+            quando = self._proxima(inicio)
+        return quando
+
+
+class AgendaSegundos:
+    """
+    Disparos a cada `intervalo` segundos, contados a partir da meia-noite,
+    restritos aos minutos em que `agenda` dispara (janela, dias, cron e calendário).
+    """
+
+    __slots__ = ("agenda", "intervalo")
+
+    def __init__(self, agenda, intervalo):
+        self.intervalo = intervalo
+        # Minutos do dia sem nenhum múltiplo do intervalo nunca disparam: saem das máscaras,
+        # de modo que todo minuto permitido pela agenda contém ao menos um disparo
+        com_disparo = _bits({s // 60 for s in range(0, SEGUNDOS_DIA, intervalo)})
+        self.agenda = Agenda(
+            [TermoAgenda(t.minutos & com_disparo, t.dias_mes, t.meses, t.dias_semana, t.ultimo_dia, t.dias_ou)
+             for t in agenda.termos],
+            agenda.filtro,
+        )
+
+    def __bool__(self):
+        return bool(self.agenda)
+
+    def menor_intervalo(self):
+        """Menor distância, em minutos (fracionários), entre dois disparos"""
+        return self.intervalo / 60 if self.agenda else None
+
+    def cumpre(self, momento):
+        segundo = momento.hour * 3600 + momento.minute * 60 + momento.second
+        return not momento.microsecond and segundo % self.intervalo == 0 and self.agenda.cumpre(momento)
+
+    def _multiplo(self, inicio):
+        """Primeiro múltiplo do intervalo >= `inicio` (sem microssegundos); a meia-noite recomeça a contagem"""
+        segundo = inicio.hour * 3600 + inicio.minute * 60 + inicio.second
+        segundo = -(-segundo // self.intervalo) * self.intervalo
+        meia_noite = datetime.datetime(inicio.year, inicio.month, inicio.day)
+        if segundo >= SEGUNDOS_DIA:
+            return meia_noite + UM_DIA
+        return meia_noite + datetime.timedelta(seconds=segundo)
+
+    def proxima_execucao(self, apos):
+        """Retorna o primeiro disparo estritamente posterior a `apos`, ou None se ela nunca dispara"""
+        quando = apos.replace(microsecond=0) + UM_SEGUNDO
+        while True:
+            minuto = quando.replace(second=0)
+            permitido = minuto if self.agenda.cumpre(minuto) else self.agenda.proxima_execucao(minuto)
+            if permitido is None:
+                return None
+            disparo = self._multiplo(max(quando, permitido))
+            if disparo - permitido < UM_MINUTO:
+                return disparo
+            # Já passou do último disparo do minuto permitido: continua no minuto seguinte
+            quando = permitido + UM_MINUTO
+
+
+def compilar_expressao(expressao):
+    """Compila uma expressão cron de 5 campos (minuto hora dia mês dia-da-semana) ou macro (@daily)"""
+    expressao = MACROS.get(expressao.strip().lower(), expressao)
+    campos = expressao.split()
+    if len(campos) != 5:
+        raise ValueError(f"Expressão cron deve ter 5 campos: '{expressao.strip()}'")
+    minuto, hora, dia_mes, mes, dia_semana = campos
+
+    minutos, horas = _campo(minuto, 0, 59), _campo(hora, 0, 23)
+    minutos_dia = 0
+    for h in range(24):
+        if (horas >> h) & 1:
+            minutos_dia |= minutos << (h * 60)
+
+    # 'L' = último dia do mês, combinável com outros dias ('15,L')
+    dias = [d for d in dia_mes.split(',') if d.strip().upper() != 'L']
+    ultimo_dia = len(dias) != len(dia_mes.split(','))
+    mascara_dias = _campo(','.join(dias), 1, 31) if dias else 0
+
+    # Cron numera de domingo (0 ou 7); datetime.weekday() começa na segunda
+    cron_semana = _campo(dia_semana, 0, 7, NOMES_DIAS_SEMANA)
+    mascara_semana = _bits((c + 6) % 7 for c in range(8) if (cron_semana >> c) & 1)
+
+    return TermoAgenda(
+        minutos_dia,
+        dias_mes=mascara_dias,
+        meses=_campo(mes, 1, 12, NOMES_MESES),
+        dias_semana=mascara_semana,
+        ultimo_dia=ultimo_dia,
+        # Como no cron (Vixie): com dia do mês e dia da semana restritos, basta um deles aceitar;
+        # campo que começa com '*' (inclusive '*/2') não conta como restrito
+        dias_ou=not dia_mes.strip().startswith('*') and not dia_semana.strip().startswith('*'),
+    )
+
+
+def compilar_cron(texto):
+    """
+    Compila uma ou mais expressões cron separadas por ';' ou quebra de linha,
+    por exemplo '*/10 8-18 * * mon-fri; 55 23 L * *'. Levanta ValueError se inválida.
+    """
+    expressoes = [e for e in texto.replace('\n', ';').split(';') if e.strip()]
+    if not expressoes:
+        raise ValueError("Expressão cron vazia")
+    termos = []
+    for expressao in expressoes:
+        try:
+            termos.append(compilar_expressao(expressao))
+        except ValueError as e:
+            raise ValueError(f"Cron inválido em '{expressao.strip()}': {e}") from None
+    return Agenda(termos)
@@ -0,0 +1,310 @@
+# Copyright 2025 Thiago Luis de Lima
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import sqlite3
+
+from .rules import COLUNAS_REGRA
+
+# Tempo (segundos) que uma conexão espera por um lock antes de falhar
+TIMEOUT_LOCK = 30
+
+TABELAS = (
+    """
+    CREATE TABLE IF NOT EXISTS metricas (
+        nome TEXT PRIMARY KEY,
+        valor REAL,
+        atualizado_em DATETIME
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS travas_execucao (
+        id_agendamento INTEGER NOT NULL,
+        slot INTEGER NOT NULL,
+        pid INTEGER,
+        host TEXT,
+        origem TEXT,
+        adquirida_em DATETIME,
+        renovada_em DATETIME,
+        PRIMARY KEY (id_agendamento, slot)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS travas_espera (
+        id_agendamento INTEGER PRIMARY KEY,
+        pid INTEGER,
+        host TEXT,
+        origem TEXT,
+        desde DATETIME,
+        renovada_em DATETIME
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS execucoes (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        id_agendamento INTEGER NOT NULL,
+        estado TEXT NOT NULL,
+        prioridade INTEGER DEFAULT 0,
+        horario_previsto DATETIME,
+        enfileirado_em DATETIME,
+        iniciado_em DATETIME,
+        finalizado_em DATETIME,
+        espera_seg REAL,
+        pid INTEGER,
+        codigo_retorno INTEGER
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_execucoes_estado ON execucoes (estado)",
+    "CREATE INDEX IF NOT EXISTS idx_execucoes_agendamento ON execucoes (id_agendamento, id)",
+    """
+    CREATE TABLE IF NOT EXISTS dependencias_agendamento (
+        id_agendamento INTEGER NOT NULL,
+        id_dependencia INTEGER NOT NULL,
+        PRIMARY KEY (id_agendamento, id_dependencia)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_dependencias_dependencia ON dependencias_agendamento (id_dependencia)",
+    """
+    CREATE TABLE IF NOT EXISTS estado_agendador (
+        chave TEXT PRIMARY KEY,
+        valor TEXT,
+        atualizado_em DATETIME
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS disjuntores (
+        id_agendamento INTEGER PRIMARY KEY,
+        estado TEXT NOT NULL DEFAULT 'FECHADO',
+        falhas_consecutivas INTEGER NOT NULL DEFAULT 0,
+        aberto_em DATETIME,
+        proxima_sonda DATETIME,
+        atualizado_em DATETIME
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS duracoes_agendamento (
+        id_agendamento INTEGER PRIMARY KEY,
+        amostras INTEGER NOT NULL DEFAULT 0,
+        p50_seg REAL,
+        p95_seg REAL,
+        p99_seg REAL,
+        atualizado_em DATETIME
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS reprocessamentos (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        id_agendamento INTEGER NOT NULL,
+        data_inicio DATE NOT NULL,
+        data_fim DATE NOT NULL,
+        parametro TEXT NOT NULL,
+        formato TEXT NOT NULL,
+        paralelo INTEGER NOT NULL DEFAULT 1,
+        estado TEXT NOT NULL,
+        criado_em DATETIME,
+        finalizado_em DATETIME
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS reprocessamento_particoes (
+        id_reprocessamento INTEGER NOT NULL,
+        data DATE NOT NULL,
+        estado TEXT NOT NULL,
+        tentativas INTEGER NOT NULL DEFAULT 0,
+        iniciado_em DATETIME,
+        finalizado_em DATETIME,
+        duracao_seg REAL,
+        PRIMARY KEY (id_reprocessamento, data)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS nos (
+        no TEXT PRIMARY KEY,
+        host TEXT,
+        pid INTEGER,
+        capacidade INTEGER,
+        em_execucao INTEGER,
+        fila INTEGER,
+        carga REAL,
+        iniciado_em DATETIME,
+        renovado_em DATETIME
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS controle_versao (
+        tabela TEXT PRIMARY KEY,
+        versao INTEGER NOT NULL DEFAULT 0
+    )
+    """,
+)
+
+# Colunas adicionadas à tabela agendamentos: (nome, tipo, valor padrão)
+COLUNAS_AGENDAMENTOS = (
+    ("versao", "INTEGER NOT NULL", 0),
+    ("politica_sobreposicao", "TEXT", "'PULAR'"),
+    ("max_paralelo", "INTEGER", 1),
+    ("prioridade", "INTEGER", 0),
+    ("memoria_mb", "INTEGER", None),
+    ("max_tentativas", "INTEGER", 1),
+    ("retry_atraso_seg", "INTEGER", 60),
+    ("retry_fator", "REAL", 2.0),
+    ("retry_jitter", "REAL", 0.1),
+    ("cron", "TEXT", None),
+    ("escalonar_seg", "INTEGER", 0),
+    ("calendario", "TEXT", None),
+    ("dia_util", "INTEGER", None),
+    ("politica_perdidos", "TEXT", "'PULAR'"),
+    ("max_perdidos", "INTEGER", 1),
+    ("intervalo_seg", "INTEGER", 0),
+    ("modo_intervalo", "TEXT", "'FIXO'"),
+    ("disjuntor_falhas", "INTEGER", 0),
+    ("disjuntor_sonda_seg", "INTEGER", 1800),
+    ("timeout_fator", "REAL", 0),
+    ("timeout_piso_seg", "INTEGER", 60),
+    ("grupo_recurso", "TEXT", None),
+    ("cpu_afinidade", "TEXT", None),
+    ("nice", "INTEGER", None),
+    ("io_classe", "TEXT", None),
+    ("io_prioridade", "INTEGER", None),
+    ("limite_memoria_mb", "INTEGER", None),
+)
+
+# Colunas adicionadas à tabela execucoes depois da sua criação
+COLUNAS_EXECUCOES = (
+    ("tentativa", "INTEGER", 1),
+    ("disponivel_em", "DATETIME", None),
+    ("pid_criado_em", "REAL", None),
+    ("duracao_seg", "REAL", None),
+    ("motivo_fim", "TEXT", None),
+    ("no", "TEXT", None),
+    ("concessao_ate", "DATETIME", None),
+    # Identifica disparos sem horário previsto (por dependências) para que só um nó os registre
+    ("chave_disparo", "TEXT", None),
+)
+
+
+# Índices da tabela execucoes, criados depois das colunas adicionadas. As consultas
+# por agendamento não podem percorrer o histórico inteiro: ele cresce a cada disparo.
+INDICES_EXECUCOES = (
+    # Deduplicação de disparos entre nós (por horário ou pela chave das dependências)
+    "CREATE INDEX IF NOT EXISTS idx_execucoes_horario ON execucoes (id_agendamento, horario_previsto, tentativa)",
+    "CREATE INDEX IF NOT EXISTS idx_execucoes_chave ON execucoes (id_agendamento, chave_disparo, tentativa)",
+    # Execuções em andamento do agendamento e términos recentes das dependências
+    "CREATE INDEX IF NOT EXISTS idx_execucoes_agendamento_estado ON execucoes (id_agendamento, estado, finalizado_em)",
+    # Último enfileiramento de um dependente
+    "CREATE INDEX IF NOT EXISTS idx_execucoes_enfileirado ON execucoes (id_agendamento, enfileirado_em)",
+)
+
+
+# Mensagem do gatilho que recusa excluir um agendamento do qual outros dependem
+ERRO_DEPENDENTES = "agendamento possui dependentes"
+
+
+def _gatilhos_versao():
+    """
+    Gatilhos que incrementam a versão do agendamento alterado e a versão global
+    da tabela, permitindo que o serviço recarregue só o que mudou. Recriados a
+    cada inicialização para acompanhar as colunas usadas pelas regras. Inclui
+    o gatilho que recusa excluir um agendamento do qual outros dependem.
+    """
+    colunas = ", ".join(c for c in COLUNAS_REGRA if c != "id")
+    incrementa_global = "UPDATE controle_versao SET versao = versao + 1 WHERE tabela = 'agendamentos';"
+    return (
+        "DROP TRIGGER IF EXISTS agendamentos_versao_insert",
+        "DROP TRIGGER IF EXISTS agendamentos_versao_update",
+        "DROP TRIGGER IF EXISTS agendamentos_versao_delete",
+        "DROP TRIGGER IF EXISTS agendamentos_dependentes_delete",
+        "DROP TRIGGER IF EXISTS dependencias_versao_insert",
+        "DROP TRIGGER IF EXISTS dependencias_versao_delete",
+        f"""
+        CREATE TRIGGER agendamentos_versao_insert AFTER INSERT ON agendamentos
+        BEGIN
+            {incrementa_global}
+        END
+        """,
+        f"""
+        CREATE TRIGGER agendamentos_versao_update AFTER UPDATE OF {colunas}, status ON agendamentos
+        BEGIN
+            UPDATE agendamentos SET versao = OLD.versao + 1 WHERE id = NEW.id;
+            {incrementa_global}
+        END
+        """,
+        # Sem a referência, os dependentes passariam a disparar pelo horário: a exclusão é recusada
+        f"""
+        CREATE TRIGGER agendamentos_dependentes_delete BEFORE DELETE ON agendamentos
+        WHEN EXISTS (SELECT 1 FROM dependencias_agendamento WHERE id_dependencia = OLD.id)
+        BEGIN
+            SELECT RAISE(ABORT, '{ERRO_DEPENDENTES}');
+        END
+        """,
+        f"""
+        CREATE TRIGGER agendamentos_versao_delete AFTER DELETE ON agendamentos
+        BEGIN
+            DELETE FROM dependencias_agendamento WHERE id_agendamento = OLD.id;
+            {incrementa_global}
+        END
+        """,
+        f"""
+        CREATE TRIGGER dependencias_versao_insert AFTER INSERT ON dependencias_agendamento
+        BEGIN
+            UPDATE agendamentos SET versao = versao + 1 WHERE id = NEW.id_agendamento;
+            {incrementa_global}
+        END
+        """,
+        f"""
+        CREATE TRIGGER dependencias_versao_delete AFTER DELETE ON dependencias_agendamento
+        BEGIN
+            UPDATE agendamentos SET versao = versao + 1 WHERE id = OLD.id_agendamento;
+            {incrementa_global}
+        END
+        """,
+    )
+
+
+def conectar(db_path):
+    """Abre uma conexão com o banco do agendador"""
+    return sqlite3.connect(db_path, timeout=TIMEOUT_LOCK)
+
+
+def adicionar_coluna_se_nao_existir(conn, tabela, nome_coluna, tipo_coluna, valor_padrao=None):
+    colunas = [col[1] for col in conn.execute(f"PRAGMA table_info({tabela})")]
+    if nome_coluna not in colunas:
+        comando = f"ALTER TABLE {tabela} ADD COLUMN {nome_coluna} {tipo_coluna}"
+        if valor_padrao is not None:
+            comando += f" DEFAULT {valor_padrao}"
+        conn.execute(comando)
+
+
+def garantir_esquema(db_path):
+    """Cria as tabelas, colunas e gatilhos auxiliares do agendador se não existirem"""
+    conn = conectar(db_path)
+    try:
+        # WAL permite que GUI, bot e serviço leiam enquanto outro processo grava
+        conn.execute("PRAGMA journal_mode=WAL")
+
+        for comando in TABELAS:
+            conn.execute(comando)
+
+        for nome, tipo, padrao in COLUNAS_AGENDAMENTOS:
+            adicionar_coluna_se_nao_existir(conn, "agendamentos", nome, tipo, padrao)
+        for nome, tipo, padrao in COLUNAS_EXECUCOES:
+            adicionar_coluna_se_nao_existir(conn, "execucoes", nome, tipo, padrao)
+        for comando in INDICES_EXECUCOES:
+            conn.execute(comando)
+
+        conn.execute("INSERT OR IGNORE INTO controle_versao (tabela, versao) VALUES ('agendamentos', 0)")
+        for comando in _gatilhos_versao():
+            conn.execute(comando)
+        conn.commit()
+    finally:
+        conn.close()
@@ -0,0 +1,192 @@
+# Copyright 2025 Thiago Luis de Lima
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from .db import conectar
+from .execucoes import ESTADO_FINALIZADA
+
+
+def interpretar_dependencias(texto):
+    """Converte '3, 7' em [3, 7]; levanta ValueError para ids inválidos"""
+    ids = []
+    for parte in (texto or "").replace(";", ",").split(","):
+        parte = parte.strip()
+        if not parte:
+            continue
+        if not parte.isdigit():
+            raise ValueError(f"Id de dependência inválido: '{parte}'")
+        if int(parte) not in ids:
+            ids.append(int(parte))
+    return ids
+
+
+def ler_dependencias(db_path, id_agendamento):
+    conn = conectar(db_path)
+    try:
+        return [d for (d,) in conn.execute(
+            "SELECT id_dependencia FROM dependencias_agendamento WHERE id_agendamento = ? ORDER BY id_dependencia",
+            (id_agendamento,)
+        )]
+    finally:
+        conn.close()
+
+
+def ler_dependentes(db_path, id_agendamento):
+    """Agendamentos que dependem de `id_agendamento`; enquanto houver algum, ele não pode ser excluído"""
+    conn = conectar(db_path)
+    try:
+        return [d for (d,) in conn.execute(
+            "SELECT id_agendamento FROM dependencias_agendamento WHERE id_dependencia = ? ORDER BY id_agendamento",
+            (id_agendamento,)
+        )]
+    finally:
+        conn.close()
+
+
+def _grafo(conn):
+    grafo = {}
+    for id_agendamento, id_dependencia in conn.execute(
+        "SELECT id_agendamento, id_dependencia FROM dependencias_agendamento"
+    ):
+        grafo.setdefault(id_agendamento, set()).add(id_dependencia)
+    return grafo
+
+
+def _validar(conn, id_agendamento, dependencias):
+    existentes = {i for (i,) in conn.execute("SELECT id FROM agendamentos")}
+    for id_dependencia in dependencias:
+        if id_dependencia == id_agendamento:
+            raise ValueError("Um agendamento não pode depender de si mesmo")
+        if id_dependencia not in existentes:
+            raise ValueError(f"Agendamento {id_dependencia} não existe")
+
+    if id_agendamento is None:
+        return  # agendamento novo: ninguém depende dele ainda
+
+    # Ciclo: alguma dependência (direta ou indireta) já depende deste agendamento
+    grafo = _grafo(conn)
+    grafo[id_agendamento] = set(dependencias)
+    pendentes, visitados = list(dependencias), set()
+    while pendentes:
+        atual = pendentes.pop()
+        if atual == id_agendamento:
+            raise ValueError("As dependências formam um ciclo; o agendamento nunca seria executado")
+        if atual in visitados:
+            continue
+        visitados.add(atual)
+        pendentes.extend(grafo.get(atual, ()))
+
+
+def validar_dependencias(db_path, id_agendamento, dependencias):
+    """Levanta ValueError se as dependências não existem ou formam um ciclo"""
+    conn = conectar(db_path)
+    try:
+        _validar(conn, id_agendamento, dependencias)
+    finally:
+        conn.close()
+
+
+def gravar_dependencias(conn, id_agendamento, dependencias):
+    """
+    Substitui as dependências do agendamento na transação aberta em `conn`,
+    validando antes; quem chama faz o commit (ou o rollback, em ValueError)
+    junto com a gravação do próprio agendamento.
+    """
+    _validar(conn, id_agendamento, dependencias)
+    atuais = {d for (d,) in conn.execute(
+        "SELECT id_dependencia FROM dependencias_agendamento WHERE id_agendamento = ?", (id_agendamento,)
+    )}
+    for id_dependencia in atuais - set(dependencias):
+        conn.execute(
+            "DELETE FROM dependencias_agendamento WHERE id_agendamento = ? AND id_dependencia = ?",
+            (id_agendamento, id_dependencia)
+        )
+    for id_dependencia in set(dependencias) - atuais:
+        conn.execute(
+            "INSERT INTO dependencias_agendamento (id_agendamento, id_dependencia) VALUES (?, ?)",
+            (id_agendamento, id_dependencia)
+        )
+
+
+def definir_dependencias(db_path, id_agendamento, dependencias):
+    """Substitui as dependências do agendamento, validando antes"""
+    conn = conectar(db_path)
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        gravar_dependencias(conn, id_agendamento, dependencias)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+def chave_dependencias(db_path, id_agendamento):
+    """
+    Chave do disparo de `id_agendamento` pelas dependências: a última execução
+    com sucesso de cada uma. Nós que reagem ao mesmo término calculam a mesma
+    chave, e só o primeiro registra o disparo.
+    """
+    conn = conectar(db_path)
+    try:
+        ultimas = [str(u) for (u,) in conn.execute(
+            """
+            SELECT MAX(e.id)
+            FROM dependencias_agendamento d
+            JOIN execucoes e ON e.id_agendamento = d.id_dependencia AND e.estado = ?
+                AND e.codigo_retorno = 0 AND e.motivo_fim IS NULL
+            WHERE d.id_agendamento = ?
+            GROUP BY d.id_dependencia
+            ORDER BY d.id_dependencia
+            """,
+            (ESTADO_FINALIZADA, id_agendamento)
+        )]
+    finally:
+        conn.close()
+    return "dependencias:" + ",".join(ultimas)
+
+
+def dependentes_prontos(db_path, id_agendamento):
+    """
+    Agendamentos ativos que dependem de `id_agendamento` e cujas dependências
+    terminaram todas com sucesso depois do último disparo do dependente.
+    Deve ser chamado após registrar o fim da execução de `id_agendamento`.
+    """
+    conn = conectar(db_path)
+    try:
+        return [d for (d,) in conn.execute(
+            """
+            SELECT d.id_agendamento
+            FROM dependencias_agendamento d
+            JOIN agendamentos a ON a.id = d.id_agendamento AND a.status = 'Ativo'
+            WHERE d.id_dependencia = ?
+              AND NOT EXISTS (
+                  SELECT 1 FROM dependencias_agendamento outra
+                  WHERE outra.id_agendamento = d.id_agendamento
+                    AND NOT EXISTS (
+                        SELECT 1 FROM execucoes e
+                        WHERE e.id_agendamento = outra.id_dependencia
+                          AND e.estado = ? AND e.codigo_retorno = 0 AND e.motivo_fim IS NULL
+                          AND e.finalizado_em > COALESCE(
+                              (SELECT MAX(x.enfileirado_em) FROM execucoes x WHERE x.id_agendamento = d.id_agendamento),
+                              ''
+                          )
+                    )
+              )
+            ORDER BY d.id_agendamento
+            """,
+            (id_agendamento, ESTADO_FINALIZADA)
+        )]
+    finally:
+        conn.close()
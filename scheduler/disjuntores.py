@@ -0,0 +1,173 @@
+# Copyright 2025 Thiago Luis de Lima
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import datetime
+
+from .db import conectar
+from .execucoes import FORMATO_DATA, ler_data
+
+# Estados do disjuntor de um agendamento. Aberto após disjuntor_falhas execuções
+# seguidas com falha: os disparos são suspensos ou reduzidos a uma sondagem a cada
+# disjuntor_sonda_seg segundos; uma sondagem com sucesso fecha o disjuntor.
+ESTADO_FECHADO = 'FECHADO'
+ESTADO_ABERTO = 'ABERTO'
+ESTADO_SONDANDO = 'SONDANDO'  # uma execução de sondagem em andamento
+
+
+def _texto(momento):
+    return momento.strftime(FORMATO_DATA) if momento is not None else None
+
+
+def _gravar(conn, id_agendamento, estado, falhas, aberto_em, proxima_sonda):
+    conn.execute(
+        """
+        INSERT INTO disjuntores (id_agendamento, estado, falhas_consecutivas, aberto_em, proxima_sonda, atualizado_em)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT(id_agendamento) DO UPDATE SET
+            estado = excluded.estado, falhas_consecutivas = excluded.falhas_consecutivas,
+            aberto_em = excluded.aberto_em, proxima_sonda = excluded.proxima_sonda,
+            atualizado_em = excluded.atualizado_em
+        """,
+        (id_agendamento, estado, falhas, aberto_em, proxima_sonda, _texto(datetime.datetime.now()))
+    )
+
+
+def liberar_disparo(db_path, regra, agora=None):
+    """
+    Consulta o disjuntor antes de um disparo. Retorna (permitido, sondagem):
+    fechado libera; aberto só libera, como sondagem, quando ela venceu; com
+    uma sondagem em andamento nada mais é liberado.
+    """
+    if not regra.disjuntor_falhas:
+        return True, False
+    agora = agora or datetime.datetime.now()
+    conn = conectar(db_path)
+    try:
+        linha = conn.execute(
+            "SELECT estado, proxima_sonda FROM disjuntores WHERE id_agendamento = ?", (regra.id,)
+        ).fetchone()
+        if linha is None or linha[0] == ESTADO_FECHADO:
+            return True, False
+        estado, proxima_sonda = linha
+        if estado != ESTADO_ABERTO or not proxima_sonda or ler_data(proxima_sonda) > agora:
+            return False, False
+        # Só um disparo vira sondagem, mesmo com outro processo consultando ao mesmo tempo
+        cursor = conn.execute(
+            "UPDATE disjuntores SET estado = ?, atualizado_em = ? WHERE id_agendamento = ? AND estado = ?",
+            (ESTADO_SONDANDO, _texto(agora), regra.id, ESTADO_ABERTO)
+        )
+        conn.commit()
+        return cursor.rowcount == 1, cursor.rowcount == 1
+    finally:
+        conn.close()
+
+
+def registrar_resultado(db_path, regra, sucesso, agora=None):
+    """
+    Registra o resultado final de uma execução (após as retentativas) e
+    retorna (estado anterior, estado novo) para que só as transições sejam notificadas.
+    """
+    agora = agora or datetime.datetime.now()
+    conn = conectar(db_path)
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        linha = conn.execute(
+            "SELECT estado, falhas_consecutivas, aberto_em, proxima_sonda FROM disjuntores WHERE id_agendamento = ?",
+            (regra.id,)
+        ).fetchone()
+        estado, falhas, aberto_em, proxima_sonda = linha or (ESTADO_FECHADO, 0, None, None)
+
+        if sucesso:
+            novo, falhas, aberto_em, proxima_sonda = ESTADO_FECHADO, 0, None, None
+        else:
+            falhas += 1
+            novo = estado
+            if estado == ESTADO_SONDANDO or (estado == ESTADO_FECHADO and falhas >= regra.disjuntor_falhas):
+                novo = ESTADO_ABERTO
+            if novo == ESTADO_ABERTO and estado != ESTADO_ABERTO:
+                aberto_em = aberto_em or _texto(agora)
+                proxima_sonda = _texto(agora + datetime.timedelta(seconds=regra.disjuntor_sonda)) \
+                    if regra.disjuntor_sonda else None
+
+        _gravar(conn, regra.id, novo, falhas, aberto_em, proxima_sonda)
+        conn.commit()
+        return estado, novo
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+def cancelar_sondagem(db_path, id_agendamento):
+    """Sondagem que não chegou a um resultado (descartada ou reanexada): a próxima vence já"""
+    conn = conectar(db_path)
+    try:
+        conn.execute(
+            "UPDATE disjuntores SET estado = ?, proxima_sonda = ?, atualizado_em = ? WHERE id_agendamento = ? AND estado = ?",
+            (ESTADO_ABERTO, _texto(datetime.datetime.now()), _texto(datetime.datetime.now()),
+             id_agendamento, ESTADO_SONDANDO)
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def cancelar_sondagens(db_path):
+    """Ao iniciar o serviço, sondagens interrompidas pela parada voltam a aguardar"""
+    conn = conectar(db_path)
+    try:
+        agora = _texto(datetime.datetime.now())
+        cursor = conn.execute(
+            "UPDATE disjuntores SET estado = ?, proxima_sonda = ?, atualizado_em = ? WHERE estado = ?",
+            (ESTADO_ABERTO, agora, agora, ESTADO_SONDANDO)
+        )
+        conn.commit()
+        return cursor.rowcount
+    finally:
+        conn.close()
+
+
+def religar(db_path, id_agendamento):
+    """Fecha manualmente o disjuntor (por exemplo, após corrigir a origem das falhas); retorna True se estava aberto"""
+    conn = conectar(db_path)
+    try:
+        cursor = conn.execute(
+            "UPDATE disjuntores SET estado = ?, falhas_consecutivas = 0, aberto_em = NULL, proxima_sonda = NULL, "
+            "atualizado_em = ? WHERE id_agendamento = ? AND estado != ?",
+            (ESTADO_FECHADO, _texto(datetime.datetime.now()), id_agendamento, ESTADO_FECHADO)
+        )
+        conn.commit()
+        return cursor.rowcount == 1
+    finally:
+        conn.close()
+
+
+def disjuntores_abertos(db_path):
+    """
+    Disjuntores abertos ou em sondagem:
+    (id_agendamento, arquivo, estado, falhas_consecutivas, aberto_em, proxima_sonda)
+    """
+    conn = conectar(db_path)
+    try:
+        return conn.execute(
+            """
+            SELECT d.id_agendamento, a.arquivo, d.estado, d.falhas_consecutivas, d.aberto_em, d.proxima_sonda
+            FROM disjuntores d JOIN agendamentos a ON a.id = d.id_agendamento
+            WHERE d.estado != ? AND a.disjuntor_falhas > 0 ORDER BY d.aberto_em
+            """,
+            (ESTADO_FECHADO,)
+        ).fetchall()
+    finally:
+        conn.close()
@@ -0,0 +1,157 @@
+# Copyright 2025 Thiago Luis de Lima
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import datetime
+import math
+import os
+
+from .db import conectar
+from .execucoes import ESTADO_FINALIZADA, FORMATO_DATA, ler_data
+
+# Execuções com sucesso mais recentes usadas nos percentis de duração de cada agendamento
+AMOSTRAS_DURACAO = int(os.getenv("AMOSTRAS_DURACAO", 100))
+
+# Mínimo de execuções registradas para o timeout adaptativo substituir o fixo
+# (e para o alerta de duração passar a valer)
+MIN_AMOSTRAS_TIMEOUT = int(os.getenv("MIN_AMOSTRAS_TIMEOUT", 10))
+
+# Execuções que passam de p95 × ALERTA_DURACAO_FATOR geram um aviso "mais demorada
+# que o normal" enquanto ainda estão em andamento (0 = desativado)
+ALERTA_DURACAO_FATOR = float(os.getenv("ALERTA_DURACAO_FATOR", 1.5))
+
+
+def percentil(ordenados, p):
+    """Percentil `p` (0-100) pelo posto mais próximo de uma lista já ordenada"""
+    if not ordenados:
+        return None
+    posto = max(math.ceil(p / 100 * len(ordenados)), 1)
+    return ordenados[posto - 1]
+
+
+def atualizar_duracoes(db_path, id_agendamento):
+    """
+    Recalcula os percentis de duração do agendamento a partir das últimas
+    AMOSTRAS_DURACAO execuções com sucesso; chamado a cada execução concluída,
+    custa uma consulta indexada limitada, qualquer que seja o histórico.
+    Retorna (amostras, p50, p95, p99) em segundos.
+    """
+    conn = conectar(db_path)
+    try:
+        duracoes = sorted(d for (d,) in conn.execute(
+            """
+            SELECT duracao_seg FROM execucoes
+            WHERE id_agendamento = ? AND estado = ? AND codigo_retorno = 0 AND motivo_fim IS NULL
+              AND duracao_seg IS NOT NULL
+            ORDER BY id DESC LIMIT ?
+            """,
+            (id_agendamento, ESTADO_FINALIZADA, AMOSTRAS_DURACAO)
+        ))
+        resumo = (len(duracoes), percentil(duracoes, 50), percentil(duracoes, 95), percentil(duracoes, 99))
+        conn.execute(
+            """
+            INSERT INTO duracoes_agendamento (id_agendamento, amostras, p50_seg, p95_seg, p99_seg, atualizado_em)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT(id_agendamento) DO UPDATE SET
+                amostras = excluded.amostras, p50_seg = excluded.p50_seg, p95_seg = excluded.p95_seg,
+                p99_seg = excluded.p99_seg, atualizado_em = excluded.atualizado_em
+            """,
+            (id_agendamento, *resumo, datetime.datetime.now().strftime(FORMATO_DATA))
+        )
+        conn.commit()
+        return resumo
+    finally:
+        conn.close()
+
+
+def ler_duracoes(db_path, id_agendamento):
+    """(amostras, p50, p95, p99) do agendamento, ou None sem histórico"""
+    conn = conectar(db_path)
+    try:
+        return conn.execute(
+            "SELECT amostras, p50_seg, p95_seg, p99_seg FROM duracoes_agendamento WHERE id_agendamento = ?",
+            (id_agendamento,)
+        ).fetchone()
+    finally:
+        conn.close()
+
+
+def calcular_timeout(timeout_fixo, fator, piso, amostras, p99):
+    """
+    Timeout adaptativo: p99 das durações × fator, entre o piso e o timeout
+    fixo (que passa a ser o teto). Sem fator ou com histórico insuficiente
+    retorna o timeout fixo.
+    """
+    if not fator or not p99 or (amostras or 0) < MIN_AMOSTRAS_TIMEOUT:
+        return timeout_fixo
+    return int(min(max(math.ceil(p99 * fator), piso), timeout_fixo))
+
+
+def limiar_alerta(amostras, p95):
+    """Segundos de execução a partir dos quais ela é considerada acima do normal, ou None"""
+    if ALERTA_DURACAO_FATOR <= 0 or not p95 or (amostras or 0) < MIN_AMOSTRAS_TIMEOUT:
+        return None
+    return math.ceil(p95 * ALERTA_DURACAO_FATOR)
+
+
+def alerta_duracao(db_path, id_agendamento):
+    """(limiar em segundos, p95) do agendamento, ou None sem histórico suficiente"""
+    duracoes = ler_duracoes(db_path, id_agendamento)
+    if duracoes is None:
+        return None
+    amostras, _, p95, _ = duracoes
+    limiar = limiar_alerta(amostras, p95)
+    return (limiar, p95) if limiar is not None else None
+
+
+def execucoes_excedidas(db_path, agora=None):
+    """
+    Execuções em andamento (serviço ou manuais, pelas travas) que já passaram do
+    limiar de alerta: (id_agendamento, arquivo, origem, adquirida_em, decorrido_seg, p95_seg),
+    das mais atrasadas em relação ao normal para as menos.
+    """
+    agora = agora or datetime.datetime.now()
+    conn = conectar(db_path)
+    try:
+        linhas = conn.execute(
+            """
+            SELECT t.id_agendamento, a.arquivo, t.origem, t.adquirida_em, du.amostras, du.p95_seg
+            FROM travas_execucao t
+            JOIN agendamentos a ON a.id = t.id_agendamento
+            JOIN duracoes_agendamento du ON du.id_agendamento = t.id_agendamento
+            """
+        ).fetchall()
+    finally:
+        conn.close()
+
+    excedidas = []
+    for id_agendamento, arquivo, origem, adquirida_em, amostras, p95 in linhas:
+        limiar = limiar_alerta(amostras, p95)
+        if limiar is None or not adquirida_em:
+            continue
+        decorrido = (agora - ler_data(adquirida_em)).total_seconds()
+        if decorrido >= limiar:
+            excedidas.append((id_agendamento, arquivo, origem, adquirida_em, decorrido, p95))
+    excedidas.sort(key=lambda e: e[4] / e[5], reverse=True)
+    return excedidas
+
+
+def timeout_efetivo(db_path, regra):
+    """Timeout (segundos) a aplicar na próxima execução da regra"""
+    if not regra.timeout_fator:
+        return regra.timeout
+    duracoes = ler_duracoes(db_path, regra.id)
+    if duracoes is None:
+        return regra.timeout
+    amostras, _, _, p99 = duracoes
+    return calcular_timeout(regra.timeout, regra.timeout_fator, regra.timeout_piso, amostras, p99)
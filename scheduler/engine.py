@@ -0,0 +1,118 @@
+# Copyright 2025 Thiago Luis de Lima
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import datetime
+import heapq
+import itertools
+
+
+class FilaAgendamentos:
+    """
+    Mantém as regras compiladas em um min-heap ordenado pelo próximo disparo.
+
+    Entradas de regras alteradas ou removidas não são retiradas do heap na hora:
+    cada regra tem uma geração e entradas de gerações antigas são descartadas
+    quando chegam ao topo.
+
+    Regras em modo após término não são reagendadas ao disparar: o próximo
+    disparo é armado por `reagendar` quando a execução termina.
+    """
+
+    def __init__(self):
+        self._heap = []
+        self._regras = {}
+        self._geracao = {}
+        self._ultimo_disparo = {}
+        self._contador = itertools.count()
+
+    def __len__(self):
+        return len(self._regras)
+
+    def __contains__(self, id_agendamento):
+        return id_agendamento in self._regras
+
+    def regra(self, id_agendamento):
+        return self._regras.get(id_agendamento)
+
+    def regras(self):
+        return list(self._regras.values())
+
+    def _agendar(self, regra, apos):
+        quando = regra.proxima_execucao(apos)
+        if quando is not None:
+            heapq.heappush(self._heap, (quando, next(self._contador), regra.id, self._geracao[regra.id]))
+
+    def adicionar(self, regra, agora):
+        """Adiciona ou substitui uma regra, calculando o disparo a partir do minuto atual"""
+        self._regras[regra.id] = regra
+        self._geracao[regra.id] = self._geracao.get(regra.id, 0) + 1
+
+        # Considera o minuto corrente como elegível, exceto se a regra já disparou nele
+        apos = agora.replace(second=0, microsecond=0) - datetime.timedelta(microseconds=1)
+        ultimo = self._ultimo_disparo.get(regra.id)
+        if ultimo is not None and ultimo > apos:
+            apos = ultimo
+        self._agendar(regra, apos)
+
+    def reagendar(self, id_agendamento, quando):
+        """Substitui o próximo disparo da regra por `quando` (None = nenhum); ignora regras removidas"""
+        regra = self._regras.get(id_agendamento)
+        if regra is None:
+            return
+        self._geracao[id_agendamento] += 1
+        if quando is not None:
+            heapq.heappush(self._heap, (quando, next(self._contador), id_agendamento, self._geracao[id_agendamento]))
+
+    def reagendar_apos_termino(self, id_agendamento, fim):
+        """Em modo após término, arma o próximo disparo a partir de `fim`, o término da execução"""
+        regra = self._regras.get(id_agendamento)
+        if regra is not None and regra.apos_termino:
+            self.reagendar(id_agendamento, regra.proxima_apos_termino(fim))
+
+    def remover(self, id_agendamento):
+        self._regras.pop(id_agendamento, None)
+        self._geracao[id_agendamento] = self._geracao.get(id_agendamento, 0) + 1
+        self._ultimo_disparo.pop(id_agendamento, None)
+
+    def _descartar_obsoletas(self):
+        while self._heap:
+            _, _, id_agendamento, geracao = self._heap[0]
+            if id_agendamento in self._regras and self._geracao[id_agendamento] == geracao:
+                return
+            heapq.heappop(self._heap)
+
+    def proximo_disparo(self):
+        """Momento do disparo mais próximo ou None se não há disparos previstos"""
+        self._descartar_obsoletas()
+        return self._heap[0][0] if self._heap else None
+
+    def retirar_vencidos(self, agora):
+        """
+        Retira do heap todos os disparos com horário <= agora e reagenda cada
+        regra para o primeiro disparo após `agora`, de modo que disparos
+        atrasados de uma mesma regra são executados uma única vez.
+        Retorna lista de (regra, horario_previsto).
+        """
+        vencidos = []
+        while True:
+            self._descartar_obsoletas()
+            if not self._heap or self._heap[0][0] > agora:
+                break
+            quando, _, id_agendamento, _ = heapq.heappop(self._heap)
+            regra = self._regras[id_agendamento]
+            self._ultimo_disparo[id_agendamento] = quando
+            vencidos.append((regra, quando))
+            if not regra.apos_termino:
+                self._agendar(regra, max(quando, agora))
+        return vencidos
@@ -0,0 +1,208 @@
+# Copyright 2025 Thiago Luis de Lima
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import datetime
+import os
+
+from .db import conectar
+from .processos import mesmo_processo
+
+# Estados de uma execução na tabela execucoes. Cada estado é gravado antes
+# (fila) ou logo depois (executando, finalizada) da ação correspondente, para
+# que o serviço saiba, ao reiniciar, o que estava pendente ou em andamento.
+ESTADO_FILA = 'fila'
+ESTADO_EXECUTANDO = 'executando'
+ESTADO_FINALIZADA = 'finalizada'
+ESTADO_DESCARTADA = 'descartada'
+ESTADO_ABANDONADA = 'abandonada'  # em andamento quando o serviço (nó) parou e o processo não existe mais
+
+# Motivo de fim de uma execução que saiu com código 0, mas registrou linhas de
+# erro na saída: é uma falha, como para a notificação, e não conta como sucesso
+# para dependentes, retentativas, disjuntor e durações
+MOTIVO_ERROS_LOG = "erros no log"
+
+# Execuções encerradas há mais de RETENCAO_EXECUCOES_DIAS dias são removidas do
+# diário (0 = mantém todas), exceto as que ainda são consultadas: a última de cada
+# agendamento e as últimas com sucesso usadas nos percentis de duração
+RETENCAO_EXECUCOES_DIAS = int(os.getenv("RETENCAO_EXECUCOES_DIAS", 30))
+
+FORMATO_DATA = "%Y-%m-%d %H:%M:%S"
+
+
+def _texto(momento):
+    return momento.strftime(FORMATO_DATA) if momento is not None else None
+
+
+def _agora():
+    return _texto(datetime.datetime.now())
+
+
+def _condicao_no(no):
+    """Restrição ao dono da execução: quem perdeu a concessão não altera a execução assumida por outro nó"""
+    return ("", ()) if no is None else (" AND no = ?", (no,))
+
+
+def motivo_fim(execucao, analise):
+    """
+    Motivo gravado com o fim da execução: o da interrupção (timeout, limite de
+    memória...) ou MOTIVO_ERROS_LOG se a saída teve linhas de erro; None se
+    terminou normalmente
+    """
+    if execucao.motivo is None and analise is not None and analise.linhas_erro:
+        return MOTIVO_ERROS_LOG
+    return execucao.motivo
+
+
+def execucao_com_sucesso(execucao, analise):
+    """Código 0 sem linhas de erro na saída; a mesma regra decide a notificação e o que vem depois da execução"""
+    return execucao.exitcode == 0 and motivo_fim(execucao, analise) is None
+
+
+def registrar_inicio(db_path, id_execucao, espera_seg, pid=None, pid_criado_em=None, no=None):
+    """
+    `pid_criado_em` identifica o processo ao reiniciar, mesmo que o PID tenha
+    sido reutilizado. Retorna False se a execução já não estava na fila (ou
+    não pertence mais a `no`).
+    """
+    condicao, valores = _condicao_no(no)
+    conn = conectar(db_path)
+    try:
+        cursor = conn.execute(
+            f"""
+            UPDATE execucoes SET estado = ?, iniciado_em = ?, espera_seg = ?, pid = ?, pid_criado_em = ?
+            WHERE id = ? AND estado = ?{condicao}
+            """,
+            (ESTADO_EXECUTANDO, _agora(), round(espera_seg, 3), pid, pid_criado_em, id_execucao, ESTADO_FILA,
+             *valores)
+        )
+        conn.commit()
+        return cursor.rowcount == 1
+    finally:
+        conn.close()
+
+
+def registrar_fim(db_path, id_execucao, estado=ESTADO_FINALIZADA, codigo_retorno=None, duracao_seg=None,
+                  motivo=None, no=None):
+    """
+    Fecha a execução; `motivo` registra por que ela foi encerrada (timeout,
+    limite de memória...). Execuções já fechadas (por exemplo abandonadas por
+    concessão expirada) não são sobrescritas; retorna False nesse caso.
+    """
+    condicao, valores = _condicao_no(no)
+    conn = conectar(db_path)
+    try:
+        cursor = conn.execute(
+            f"""
+            UPDATE execucoes SET estado = ?, finalizado_em = ?, codigo_retorno = ?, duracao_seg = ?, motivo_fim = ?
+            WHERE id = ? AND estado IN (?, ?){condicao}
+            """,
+            (estado, _agora(), codigo_retorno, round(duracao_seg, 3) if duracao_seg is not None else None, motivo,
+             id_execucao, ESTADO_FILA, ESTADO_EXECUTANDO, *valores)
+        )
+        conn.commit()
+        return cursor.rowcount == 1
+    finally:
+        conn.close()
+
+
+def execucoes_na_fila(db_path, no):
+    """
+    Execuções concedidas ao nó que aguardavam na fila, em ordem de chegada
+    (as sem dono são reivindicadas pelo CoordenadorNos):
+    (id, id_agendamento, horario_previsto, enfileirado_em, tentativa, disponivel_em, chave_disparo)
+    """
+    conn = conectar(db_path)
+    try:
+        return conn.execute(
+            """
+            SELECT id, id_agendamento, horario_previsto, enfileirado_em, tentativa, disponivel_em, chave_disparo
+            FROM execucoes WHERE estado = ? AND no = ? ORDER BY id
+            """,
+            (ESTADO_FILA, no)
+        ).fetchall()
+    finally:
+        conn.close()
+
+
+def execucoes_iniciadas(db_path, no):
+    """
+    Execuções do nó (ou sem nó, anteriores aos vários nós) que estavam em
+    andamento quando o serviço parou:
+    (id, id_agendamento, horario_previsto, iniciado_em, tentativa, pid, pid_criado_em)
+    """
+    conn = conectar(db_path)
+    try:
+        return conn.execute(
+            """
+            SELECT id, id_agendamento, horario_previsto, iniciado_em, tentativa, pid, pid_criado_em
+            FROM execucoes WHERE estado = ? AND (no = ? OR no IS NULL) ORDER BY id
+            """,
+            (ESTADO_EXECUTANDO, no)
+        ).fetchall()
+    finally:
+        conn.close()
+
+
+def reconciliar_iniciadas(db_path, no):
+    """
+    Ao reiniciar, marca como abandonadas as execuções em andamento do nó cujo
+    processo não existe mais (ou cujo PID foi reutilizado). Retorna
+    (vivas, abandonadas), com as linhas de execucoes_iniciadas; as vivas
+    podem ser reanexadas.
+    """
+    vivas, abandonadas = [], []
+    for linha in execucoes_iniciadas(db_path, no):
+        pid, pid_criado_em = linha[5], linha[6]
+        if mesmo_processo(pid, pid_criado_em):
+            vivas.append(linha)
+        else:
+            registrar_fim(db_path, linha[0], ESTADO_ABANDONADA)
+            abandonadas.append(linha)
+    return vivas, abandonadas
+
+
+def limpar_execucoes(db_path, amostras, dias=None, agora=None):
+    """
+    Remove do diário as execuções encerradas há mais de `dias` dias
+    (RETENCAO_EXECUCOES_DIAS), mantendo a última de cada agendamento e as
+    `amostras` mais recentes com sucesso. Retorna quantas foram removidas.
+    """
+    dias = RETENCAO_EXECUCOES_DIAS if dias is None else dias
+    if dias <= 0:
+        return 0
+    limite = _texto((agora or datetime.datetime.now()) - datetime.timedelta(days=dias))
+    conn = conectar(db_path)
+    try:
+        cursor = conn.execute(
+            """
+            DELETE FROM execucoes
+            WHERE estado IN (?, ?, ?) AND finalizado_em < ?
+              AND id NOT IN (SELECT MAX(id) FROM execucoes GROUP BY id_agendamento)
+              AND id NOT IN (
+                  SELECT id FROM (
+                      SELECT id, ROW_NUMBER() OVER (PARTITION BY id_agendamento ORDER BY id DESC) AS posicao
+                      FROM execucoes WHERE estado = ? AND codigo_retorno = 0 AND motivo_fim IS NULL
+                  ) WHERE posicao <= ?
+              )
+            """,
+            (ESTADO_FINALIZADA, ESTADO_DESCARTADA, ESTADO_ABANDONADA, limite, ESTADO_FINALIZADA, max(amostras, 1))
+        )
+        conn.commit()
+        return cursor.rowcount
+    finally:
+        conn.close()
+
+
+def ler_data(texto):
+    return datetime.datetime.strptime(texto, FORMATO_DATA) if texto else None
@@ -0,0 +1,294 @@
+# Copyright 2025 Thiago Luis de Lima
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import datetime
+import logging
+import os
+import threading
+import time
+
+from .db import conectar
+from .processos import HOST, processo_vivo
+from .rules import POLITICA_ENFILEIRAR, normalizar_politica
+
+logger = logging.getLogger(__name__)
+
+# Uma trava não renovada dentro deste prazo (segundos) é considerada abandonada
+TTL_TRAVA = int(os.getenv("TTL_TRAVA_EXECUCAO", 120))
+
+FORMATO_DATA = "%Y-%m-%d %H:%M:%S"
+
+
+def _agora():
+    return datetime.datetime.now()
+
+
+def _texto(momento):
+    return momento.strftime(FORMATO_DATA)
+
+
+def ler_politica(db_path, id_agendamento):
+    conn = conectar(db_path)
+    try:
+        linha = conn.execute(
+            "SELECT politica_sobreposicao, max_paralelo FROM agendamentos WHERE id = ?",
+            (id_agendamento,)
+        ).fetchone()
+    finally:
+        conn.close()
+    return normalizar_politica(*(linha or (None, None)))
+
+
+def _limpar_abandonadas(conn, tabela, id_agendamento):
+    """Remove travas/esperas cujo dono morreu ou parou de renovar"""
+    limite = _texto(_agora() - datetime.timedelta(seconds=TTL_TRAVA))
+    conn.execute(f"DELETE FROM {tabela} WHERE id_agendamento = ? AND renovada_em < ?", (id_agendamento, limite))
+    for rowid, pid in conn.execute(
+        f"SELECT rowid, pid FROM {tabela} WHERE id_agendamento = ? AND host = ?",
+        (id_agendamento, HOST)
+    ).fetchall():
+        if not processo_vivo(pid):
+            conn.execute(f"DELETE FROM {tabela} WHERE rowid = ?", (rowid,))
+
+
+class TravaExecucao:
+    """Slot ocupado por uma execução de um agendamento, compartilhado entre processos"""
+
+    def __init__(self, db_path, id_agendamento, slot, origem, pid):
+        self.db_path = db_path
+        self.id_agendamento = id_agendamento
+        self.slot = slot
+        self.origem = origem
+        self.pid = pid
+
+    def __repr__(self):
+        return f"TravaExecucao(id={self.id_agendamento}, slot={self.slot}, origem={self.origem!r})"
+
+    def renovar(self):
+        conn = conectar(self.db_path)
+        try:
+            conn.execute(
+                "UPDATE travas_execucao SET renovada_em = ? WHERE id_agendamento = ? AND slot = ? AND pid = ? AND host = ?",
+                (_texto(_agora()), self.id_agendamento, self.slot, self.pid, HOST)
+            )
+            conn.commit()
+        finally:
+            conn.close()
+
+    def liberar(self):
+        conn = conectar(self.db_path)
+        try:
+            conn.execute(
+                "DELETE FROM travas_execucao WHERE id_agendamento = ? AND slot = ? AND pid = ? AND host = ?",
+                (self.id_agendamento, self.slot, self.pid, HOST)
+            )
+            conn.commit()
+        finally:
+            conn.close()
+
+
+def adquirir_trava(db_path, id_agendamento, origem, limite=1, pid=None):
+    """Tenta ocupar um dos `limite` slots do agendamento; retorna TravaExecucao ou None"""
+    pid = pid or os.getpid()
+    agora = _texto(_agora())
+    conn = conectar(db_path)
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        _limpar_abandonadas(conn, "travas_execucao", id_agendamento)
+        ocupados = {slot for (slot,) in conn.execute(
+            "SELECT slot FROM travas_execucao WHERE id_agendamento = ?", (id_agendamento,)
+        )}
+        for slot in range(limite):
+            if slot not in ocupados:
+                conn.execute(
+                    """
+                    INSERT INTO travas_execucao
+                        (id_agendamento, slot, pid, host, origem, adquirida_em, renovada_em)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                    """,
+                    (id_agendamento, slot, pid, HOST, origem, agora, agora)
+                )
+                conn.commit()
+                return TravaExecucao(db_path, id_agendamento, slot, origem, pid)
+        conn.rollback()
+        return None
+    finally:
+        conn.close()
+
+
+def registrar_espera(db_path, id_agendamento, origem, pid=None):
+    """Reserva a única vaga de espera do agendamento; retorna False se já ocupada"""
+    pid = pid or os.getpid()
+    agora = _texto(_agora())
+    conn = conectar(db_path)
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        _limpar_abandonadas(conn, "travas_espera", id_agendamento)
+        dono = conn.execute(
+            "SELECT pid, host FROM travas_espera WHERE id_agendamento = ?", (id_agendamento,)
+        ).fetchone()
+        if dono is not None:
+            conn.rollback()
+            return tuple(dono) == (pid, HOST)
+        conn.execute(
+            "INSERT INTO travas_espera (id_agendamento, pid, host, origem, desde, renovada_em) VALUES (?, ?, ?, ?, ?, ?)",
+            (id_agendamento, pid, HOST, origem, agora, agora)
+        )
+        conn.commit()
+        return True
+    finally:
+        conn.close()
+
+
+def renovar_espera(db_path, id_agendamento, pid=None):
+    conn = conectar(db_path)
+    try:
+        conn.execute(
+            "UPDATE travas_espera SET renovada_em = ? WHERE id_agendamento = ? AND pid = ? AND host = ?",
+            (_texto(_agora()), id_agendamento, pid or os.getpid(), HOST)
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def remover_espera(db_path, id_agendamento, pid=None):
+    conn = conectar(db_path)
+    try:
+        conn.execute(
+            "DELETE FROM travas_espera WHERE id_agendamento = ? AND pid = ? AND host = ?",
+            (id_agendamento, pid or os.getpid(), HOST)
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def execucoes_em_andamento(db_path):
+    """Lista (id_agendamento, slot, pid, host, origem, adquirida_em) das travas ativas"""
+    conn = conectar(db_path)
+    try:
+        return conn.execute(
+            "SELECT id_agendamento, slot, pid, host, origem, adquirida_em FROM travas_execucao ORDER BY adquirida_em"
+        ).fetchall()
+    finally:
+        conn.close()
+
+
+def ferramentas_em_execucao(db_path, host=HOST):
+    """
+    ferramenta_etl de cada execução em andamento em `host`, de qualquer origem
+    (serviço, execução manual ou reprocessamento), pelas travas renovadas dentro de TTL_TRAVA
+    """
+    limite = _texto(_agora() - datetime.timedelta(seconds=TTL_TRAVA))
+    conn = conectar(db_path)
+    try:
+        return [ferramenta for (ferramenta,) in conn.execute(
+            """
+            SELECT a.ferramenta_etl FROM travas_execucao t
+            LEFT JOIN agendamentos a ON a.id = t.id_agendamento
+            WHERE t.host = ? AND t.renovada_em >= ?
+            """,
+            (host, limite)
+        )]
+    finally:
+        conn.close()
+
+
+class RenovadorTravas:
+    """Thread que renova periodicamente as travas e esperas mantidas por este processo"""
+
+    def __init__(self, db_path, intervalo=None):
+        self.db_path = db_path
+        self.intervalo = intervalo or max(TTL_TRAVA / 3, 1)
+        self._travas = set()
+        self._esperas = set()
+        self._lock = threading.Lock()
+        self._parar = threading.Event()
+        self._thread = None
+
+    def adicionar(self, trava):
+        with self._lock:
+            self._travas.add(trava)
+
+    def remover(self, trava):
+        with self._lock:
+            self._travas.discard(trava)
+
+    def adicionar_espera(self, id_agendamento):
+        with self._lock:
+            self._esperas.add(id_agendamento)
+
+    def remover_espera(self, id_agendamento):
+        with self._lock:
+            self._esperas.discard(id_agendamento)
+
+    def iniciar(self):
+        self._thread = threading.Thread(target=self._loop, name="RenovadorTravas", daemon=True)
+        self._thread.start()
+
+    def parar(self):
+        self._parar.set()
+
+    def _loop(self):
+        while not self._parar.wait(self.intervalo):
+            with self._lock:
+                travas = list(self._travas)
+                esperas = list(self._esperas)
+            for trava in travas:
+                try:
+                    trava.renovar()
+                except Exception as e:
+                    logger.error(f"Falha ao renovar {trava}: {str(e)}")
+            for id_agendamento in esperas:
+                try:
+                    renovar_espera(self.db_path, id_agendamento)
+                except Exception as e:
+                    logger.error(f"Falha ao renovar espera do agendamento {id_agendamento}: {str(e)}")
+
+
+def obter_trava(db_path, id_agendamento, origem, stop_event=None, intervalo_espera=5):
+    """
+    Aplica a política de sobreposição do agendamento para uma execução
+    disparada fora do serviço (interface, monitor, bot, terminal).
+
+    Retorna (TravaExecucao, RenovadorTravas) quando a execução pode seguir, ou
+    (None, None) quando deve ser descartada. Com a política ENFILEIRAR o
+    chamador bloqueia até a execução anterior terminar, se conseguir a vaga de espera.
+    """
+    politica, limite = ler_politica(db_path, id_agendamento)
+    renovador = RenovadorTravas(db_path)
+
+    trava = adquirir_trava(db_path, id_agendamento, origem, limite)
+    if trava is None and politica == POLITICA_ENFILEIRAR and registrar_espera(db_path, id_agendamento, origem):
+        logger.info(f"Agendamento {id_agendamento} em execução; aguardando para executar em seguida")
+        renovador.adicionar_espera(id_agendamento)
+        renovador.iniciar()
+        try:
+            while trava is None and not (stop_event and stop_event.is_set()):
+                time.sleep(intervalo_espera)
+                trava = adquirir_trava(db_path, id_agendamento, origem, limite)
+        finally:
+            renovador.remover_espera(id_agendamento)
+            remover_espera(db_path, id_agendamento)
+    elif trava is not None:
+        renovador.iniciar()
+
+    if trava is None:
+        renovador.parar()
+        logger.warning(f"Agendamento {id_agendamento} já está em execução (política {politica}); execução descartada")
+        return None, None
+
+    renovador.adicionar(trava)
+    return trava, renovador
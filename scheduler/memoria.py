@@ -0,0 +1,263 @@
+# Copyright 2025 Thiago Luis de Lima
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import logging
+import os
+import sys
+import threading
+
+from .processos import encerrar_arvore, psutil
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+# Motivo gravado no histórico quando a execução é encerrada pelo teto de memória
+MOTIVO_MEMORIA = "limite de memória"
+
+# Intervalo (segundos) entre medições da memória da árvore de processos de uma execução
+INTERVALO_MEMORIA = float(os.getenv("INTERVALO_VERIFICACAO_MEMORIA_SEG", 2))
+
+# Linux: cgroup v2 delegado ao usuário do serviço (por exemplo /sys/fs/cgroup/pyflowt3).
+# Com ele, cada execução roda em um cgroup filho com memory.max igual ao teto e o
+# kernel encerra a árvore inteira ao ultrapassá-lo; sem ele, a árvore é medida a
+# cada INTERVALO_MEMORIA segundos e encerrada pelo próprio agendador.
+CGROUP_MEMORIA = os.getenv("CGROUP_MEMORIA", "").strip()
+
+# Prefixo dos cgroups filhos, seguido do PID do processo da execução
+PREFIXO_CGROUP = "execucao-"
+
+LINUX = sys.platform.startswith('linux')
+
+
+def memoria_arvore_mb(pid):
+    """Memória residente (MB) do processo e de todos os descendentes, ou None se não for possível medir"""
+    if psutil is None:
+        return None
+    try:
+        raiz = psutil.Process(pid)
+        processos = [raiz] + raiz.children(recursive=True)
+    except psutil.NoSuchProcess:
+        return None
+    total = 0
+    for processo in processos:
+        try:
+            total += processo.memory_info().rss
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            pass
+    return total / (1024 * 1024)
+
+
+def _escrever(caminho, valor):
+    with open(caminho, 'w', encoding='utf-8') as arquivo:
+        arquivo.write(str(valor))
+
+
+def _cgroup_disponivel():
+    return LINUX and bool(CGROUP_MEMORIA) and os.path.isfile(os.path.join(CGROUP_MEMORIA, "cgroup.controllers"))
+
+
+def _configurar_cgroup(caminho, limite_mb, pid):
+    """Cria o cgroup `caminho` com o teto e move `pid` (0 = o processo que escreve) para ele"""
+    os.mkdir(caminho)
+    _escrever(os.path.join(caminho, "memory.max"), int(limite_mb) * 1024 * 1024)
+    # Ao estourar, o kernel encerra a árvore inteira, não só o maior processo
+    _escrever(os.path.join(caminho, "memory.oom.group"), 1)
+    try:
+        _escrever(os.path.join(caminho, "memory.swap.max"), 0)
+    except OSError:
+        pass  # swap não controlada neste sistema
+    _escrever(os.path.join(caminho, "cgroup.procs"), pid)
+
+
+def _preparar_filho(limite_mb, cgroup, rlimit):
+    """
+    preexec_fn: roda no processo filho, entre o fork e o exec. Entra no cgroup
+    antes que qualquer descendente seja criado e aplica o rlimit. Não registra
+    log (o filho de um processo com threads não pode tomar locks); falhas no
+    cgroup são detectadas pelo pai, que recorre à medição periódica.
+    """
+    if cgroup:
+        try:
+            _configurar_cgroup(os.path.join(CGROUP_MEMORIA, f"{PREFIXO_CGROUP}{os.getpid()}"), limite_mb, 0)
+        except OSError:
+            pass
+    if rlimit:
+        limite = int(limite_mb) * 1024 * 1024
+        for recurso in (resource.RLIMIT_AS, resource.RLIMIT_DATA):
+            try:
+                _, maximo = resource.getrlimit(recurso)
+                if maximo != resource.RLIM_INFINITY:
+                    limite = min(limite, maximo)
+                resource.setrlimit(recurso, (limite, limite))
+            except (OSError, ValueError):
+                pass
+
+
+def _no_cgroup(caminho, pid):
+    try:
+        with open(os.path.join(caminho, "cgroup.procs"), encoding='utf-8') as procs:
+            return str(pid) in procs.read().split()
+    except OSError:
+        return False
+
+
+def _criar_cgroup(pid, limite_mb):
+    """Cgroup filho de CGROUP_MEMORIA com o teto, contendo o processo já iniciado; None se indisponível"""
+    caminho = os.path.join(CGROUP_MEMORIA, f"{PREFIXO_CGROUP}{pid}")
+    if _no_cgroup(caminho, pid):
+        return caminho  # o próprio processo entrou antes do exec
+    try:
+        if os.path.isdir(caminho):
+            _escrever(os.path.join(caminho, "cgroup.procs"), pid)
+        else:
+            _configurar_cgroup(caminho, limite_mb, pid)
+        logger.warning(f"PID {pid} movido para {caminho} após iniciar; filhos criados antes podem ficar de fora")
+        return caminho
+    except OSError as e:
+        logger.warning(f"Cgroup de memória indisponível em {CGROUP_MEMORIA} ({str(e)}); usando medição periódica")
+        try:
+            os.rmdir(caminho)
+        except OSError:
+            pass
+        return None
+
+
+def limpar_cgroups():
+    """
+    Remove os cgroups de execuções que terminaram sem liberá-los (serviço
+    encerrado à força, exec que falhou). Cgroups com processos vivos, como os
+    de execuções reanexadas, continuam. Retorna a quantidade removida.
+    """
+    if not _cgroup_disponivel():
+        return 0
+    removidos = 0
+    try:
+        nomes = os.listdir(CGROUP_MEMORIA)
+    except OSError as e:
+        logger.warning(f"Falha ao listar {CGROUP_MEMORIA}: {str(e)}")
+        return 0
+    for nome in nomes:
+        caminho = os.path.join(CGROUP_MEMORIA, nome)
+        if not nome.startswith(PREFIXO_CGROUP) or not os.path.isdir(caminho):
+            continue
+        try:
+            os.rmdir(caminho)
+            removidos += 1
+        except OSError:
+            pass  # ainda há processos no cgroup
+    return removidos
+
+
+class LimiteMemoria:
+    """
+    Teto de memória (MB) da árvore de processos de uma execução: cgroup v2 no
+    Linux, se configurado, e medição periódica da árvore em todos os sistemas.
+
+    Criado antes do processo: `preexec_fn` (None fora do Linux) é passado ao
+    Popen para que o processo entre no cgroup antes do exec, e `acompanhar(pid)`
+    é chamado logo após o início. Com `por_processo`, o teto também vale como
+    RLIMIT_AS/RLIMIT_DATA de cada processo, de modo que uma alocação acima dele
+    falha na hora, mesmo entre duas medições e sem cgroup. Só serve para
+    scripts: a JVM reserva bem mais memória virtual do que usa.
+    """
+
+    def __init__(self, limite_mb, por_processo=False):
+        self.pid = None
+        self.limite_mb = limite_mb
+        self.pico_mb = 0.0
+        self._cgroup = None
+        self._usar_cgroup = _cgroup_disponivel()
+        if LINUX and CGROUP_MEMORIA and not self._usar_cgroup:
+            logger.warning(f"{CGROUP_MEMORIA} não é um cgroup v2; usando medição periódica")
+        rlimit = por_processo and resource is not None
+        if self._usar_cgroup or rlimit:
+            self.preexec_fn = lambda: _preparar_filho(limite_mb, self._usar_cgroup, rlimit)
+        else:
+            self.preexec_fn = None
+
+    def acompanhar(self, pid):
+        """Associa o processo iniciado; sem o cgroup criado pelo filho, move o processo agora"""
+        self.pid = pid
+        if self._usar_cgroup:
+            self._cgroup = _criar_cgroup(pid, self.limite_mb)
+
+    def excedido(self):
+        """Mede a árvore; True se ela passou do teto"""
+        uso = memoria_arvore_mb(self.pid)
+        if uso is None:
+            return False
+        self.pico_mb = max(self.pico_mb, uso)
+        return uso > self.limite_mb
+
+    def encerrada_pelo_kernel(self):
+        """True se o cgroup registrou um OOM kill (a execução estourou o teto entre as medições)"""
+        if self._cgroup is None:
+            return False
+        try:
+            with open(os.path.join(self._cgroup, "memory.events"), encoding='utf-8') as eventos:
+                return any(linha.split()[0] == "oom_kill" and int(linha.split()[1]) > 0 for linha in eventos)
+        except (OSError, ValueError, IndexError):
+            return False
+
+    def liberar(self):
+        """Remove o cgroup da execução (o kernel só permite depois que ela terminou)"""
+        if self._cgroup is not None:
+            try:
+                os.rmdir(self._cgroup)
+            except OSError as e:
+                logger.warning(f"Falha ao remover o cgroup {self._cgroup}: {str(e)}")
+            self._cgroup = None
+
+    def descricao(self):
+        pico = f", pico medido {self.pico_mb:.0f} MB" if self.pico_mb else ""
+        return f"{MOTIVO_MEMORIA} de {self.limite_mb} MB{pico}"
+
+
+class VigiaMemoria:
+    """
+    Versão em thread do LimiteMemoria, para execuções fora do serviço
+    (executaWorkflow): encerra a árvore se ela passar do teto, como o LimiteTempo.
+    Criada antes do Popen (que recebe `preexec_fn`); `iniciar(pid)` começa a vigiar.
+    """
+
+    def __init__(self, limite_mb, por_processo=False):
+        self.excedeu = False
+        self.limite = LimiteMemoria(limite_mb, por_processo)
+        self.preexec_fn = self.limite.preexec_fn
+        self._parar = threading.Event()
+        self._thread = None
+
+    def iniciar(self, pid):
+        self.limite.acompanhar(pid)
+        self._thread = threading.Thread(target=self._loop, name="VigiaMemoria", daemon=True)
+        self._thread.start()
+
+    def _loop(self):
+        while not self._parar.wait(INTERVALO_MEMORIA):
+            if self.limite.excedido():
+                self.excedeu = True
+                logger.error(f"PID {self.limite.pid} ultrapassou o {self.limite.descricao()}; encerrando")
+                encerrar_arvore(self.limite.pid)
+                return
+
+    def cancelar(self):
+        self._parar.set()
+        if self._thread is not None:
+            self._thread.join(timeout=INTERVALO_MEMORIA + 1)
+        self.excedeu = self.excedeu or self.limite.encerrada_pelo_kernel()
+        self.limite.liberar()
@@ -0,0 +1,74 @@
+# Copyright 2025 Thiago Luis de Lima
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import datetime
+import logging
+import threading
+
+from .db import conectar
+
+logger = logging.getLogger(__name__)
+
+
+class Metricas:
+    """Contadores e medidas do agendador, publicados na tabela metricas"""
+
+    def __init__(self):
+        self._valores = {}
+        self._lock = threading.Lock()
+
+    def incrementar(self, nome, valor=1):
+        with self._lock:
+            self._valores[nome] = self._valores.get(nome, 0) + valor
+
+    def definir(self, nome, valor):
+        with self._lock:
+            self._valores[nome] = valor
+
+    def atualizar(self, valores):
+        with self._lock:
+            self._valores.update(valores)
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._valores)
+
+    def publicar(self, db_path):
+        """Grava o snapshot atual para consulta pelo Monitor e pelo bot"""
+        agora = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        try:
+            conn = conectar(db_path)
+            try:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO metricas (nome, valor, atualizado_em) VALUES (?, ?, ?)",
+                    [(nome, valor, agora) for nome, valor in self.snapshot().items()]
+                )
+                conn.commit()
+            finally:
+                conn.close()
+        except Exception as e:
+            logger.error(f"Falha ao publicar métricas: {str(e)}")
+
+
+def ler_metricas(db_path, prefixo=""):
+    """Lê as métricas publicadas pelo serviço"""
+    conn = conectar(db_path)
+    try:
+        cursor = conn.execute(
+            "SELECT nome, valor, atualizado_em FROM metricas WHERE nome LIKE ? ORDER BY nome",
+            (f"{prefixo}%",)
+        )
+        return cursor.fetchall()
+    finally:
+        conn.close()
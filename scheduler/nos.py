@@ -0,0 +1,556 @@
+# Copyright 2025 Thiago Luis de Lima
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import datetime
+import logging
+import os
+import threading
+import time
+
+from .db import conectar
+from .execucoes import ESTADO_ABANDONADA, ESTADO_DESCARTADA, ESTADO_EXECUTANDO, ESTADO_FILA, FORMATO_DATA
+from .processos import HOST, mesmo_processo, processo_vivo
+
+logger = logging.getLogger(__name__)
+
+# Vários serviços (nós) podem usar o mesmo banco. Cada disparo é registrado uma
+# única vez na tabela execucoes, que funciona como fila compartilhada, e é
+# concedido a um único nó (colunas no/concessao_ate). O nó renova as concessões
+# das suas execuções a cada batimento; concessões não renovadas expiram e as
+# execuções voltam à fila para outro nó. Sem NO_ID, o nó é o nome da máquina.
+NO_ID = os.getenv("NO_ID", "").strip() or HOST
+
+# Prazo (segundos) de uma concessão sem batimento; deve cobrir um reinício do serviço
+TTL_CONCESSAO = int(os.getenv("TTL_CONCESSAO_SEG", 90))
+
+# Intervalo (segundos) entre batimentos: carga publicada, concessões renovadas e fila consultada
+INTERVALO_BATIMENTO = float(os.getenv("INTERVALO_BATIMENTO_SEG", 5))
+
+# Diferença de carga tolerada: nós até esta margem acima do menos carregado contam como empatados
+MARGEM_CARGA = float(os.getenv("MARGEM_CARGA_NO", 0.1))
+
+# Espera (segundos) por posição na ordem de carga antes de reivindicar uma execução da fila:
+# o nó menos carregado reivindica na hora, o segundo após esta espera, e assim por diante
+ESPERA_POR_POSICAO = float(os.getenv("ESPERA_NO_OCUPADO_SEG", 10))
+
+# Motivo da interrupção de uma execução cuja concessão o nó perdeu (outro nó a executa)
+MOTIVO_CONCESSAO = "concessão do nó expirada"
+
+
+def _texto(momento):
+    return momento.strftime(FORMATO_DATA) if momento is not None else None
+
+
+def _concessao(agora):
+    return _texto(agora + datetime.timedelta(seconds=TTL_CONCESSAO))
+
+
+def carga_no(capacidade, em_execucao, fila, cpu=None):
+    """Carga do nó: ocupação dos slots (execuções e fila local) ou uso de CPU, o maior; 1.0 = lotado"""
+    ocupacao = (em_execucao + fila) / capacidade if capacidade else 0.0
+    return round(max(ocupacao, (cpu or 0.0) / 100), 3)
+
+
+def publicar_execucao(db_path, no, id_agendamento, prioridade, horario_previsto=None, tentativa=1,
+                      disponivel_em=None, reivindicar=True, apos_termino=False, chave=None):
+    """
+    Registra uma execução na fila compartilhada, já concedida a `no` se
+    `reivindicar`; retorna o id, ou None se outro nó já registrou o mesmo disparo
+    (mesmo agendamento, horário previsto ou `chave` e tentativa). Disparos sem
+    horário previsto, como os por dependências, usam a `chave`. Em modo após
+    término, cujo horário depende de qual nó executou a anterior, o disparo também
+    é ignorado enquanto houver outra execução do agendamento na fila ou em andamento.
+    """
+    return publicar_execucoes(db_path, no, [dict(
+        id_agendamento=id_agendamento, prioridade=prioridade, horario_previsto=horario_previsto,
+        tentativa=tentativa, disponivel_em=disponivel_em, reivindicar=reivindicar,
+        apos_termino=apos_termino, chave=chave
+    )])[0]
+
+
+def publicar_execucoes(db_path, no, disparos):
+    """
+    Registra vários disparos (dicts com os argumentos de publicar_execucao) em
+    uma única transação, por exemplo todos os vencidos em um tick; retorna a
+    lista de ids, com None nos já registrados por outro nó
+    """
+    agora = datetime.datetime.now()
+    conn = conectar(db_path)
+    try:
+        # A escrita exclusiva garante que só um nó registra cada disparo
+        conn.execute("BEGIN IMMEDIATE")
+        ids = [_publicar(conn, no, agora, **disparo) for disparo in disparos]
+        conn.commit()
+        return ids
+    finally:
+        conn.close()
+
+
+def _publicar(conn, no, agora, id_agendamento, prioridade, horario_previsto=None, tentativa=1,
+              disponivel_em=None, reivindicar=True, apos_termino=False, chave=None):
+    if horario_previsto is not None and conn.execute(
+        "SELECT 1 FROM execucoes WHERE id_agendamento = ? AND horario_previsto = ? AND tentativa = ? LIMIT 1",
+        (id_agendamento, _texto(horario_previsto), tentativa)
+    ).fetchone():
+        return None
+    if chave is not None and conn.execute(
+        "SELECT 1 FROM execucoes WHERE id_agendamento = ? AND chave_disparo = ? AND tentativa = ? LIMIT 1",
+        (id_agendamento, chave, tentativa)
+    ).fetchone():
+        return None
+    if apos_termino and conn.execute(
+        "SELECT 1 FROM execucoes WHERE id_agendamento = ? AND estado IN (?, ?) LIMIT 1",
+        (id_agendamento, ESTADO_FILA, ESTADO_EXECUTANDO)
+    ).fetchone():
+        return None
+    cursor = conn.execute(
+        """
+        INSERT INTO execucoes
+            (id_agendamento, estado, prioridade, horario_previsto, enfileirado_em, tentativa, disponivel_em,
+             no, concessao_ate, chave_disparo)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """,
+        (id_agendamento, ESTADO_FILA, prioridade, _texto(horario_previsto), _texto(agora), tentativa,
+         _texto(disponivel_em), no if reivindicar else None, _concessao(agora) if reivindicar else None, chave)
+    )
+    return cursor.lastrowid
+
+
+def _recolocar_expiradas(conn, no, agora):
+    """
+    Devolve à fila as execuções de nós que pararam de renovar as concessões:
+    as que aguardavam voltam a ficar sem dono; as que estavam em andamento são
+    marcadas como abandonadas e registradas de novo na fila. Execuções de um nó
+    desta máquina cujo processo ainda está vivo (nó travado, não parado) ficam
+    com ele: ao voltar, o nó as encontra como suas. Retorna as recolocadas:
+    (id_execucao, id_agendamento, no anterior, estado anterior).
+    """
+    limite = _texto(agora)
+    expiradas = conn.execute(
+        """
+        SELECT e.id, e.id_agendamento, e.no, e.estado, e.prioridade, e.horario_previsto, e.tentativa,
+               e.chave_disparo, e.pid, e.pid_criado_em, n.host
+        FROM execucoes e LEFT JOIN nos n ON n.no = e.no
+        WHERE e.estado IN (?, ?) AND e.no IS NOT NULL AND e.no <> ? AND e.concessao_ate < ?
+        """,
+        (ESTADO_FILA, ESTADO_EXECUTANDO, no, limite)
+    ).fetchall()
+    recolocadas = []
+    for (id_execucao, id_agendamento, dono, estado, prioridade, horario_previsto, tentativa, chave,
+         pid, pid_criado_em, host) in expiradas:
+        if estado == ESTADO_FILA:
+            conn.execute("UPDATE execucoes SET no = NULL, concessao_ate = NULL WHERE id = ?", (id_execucao,))
+        elif host == HOST and mesmo_processo(pid, pid_criado_em):
+            continue
+        else:
+            _recolocar_em_andamento(
+                conn, (id_execucao, id_agendamento, prioridade, horario_previsto, tentativa, chave),
+                f"concessão do nó {dono} expirada", limite
+            )
+        recolocadas.append((id_execucao, id_agendamento, dono, estado))
+    return recolocadas
+
+
+def _recolocar_em_andamento(conn, linha, motivo, momento):
+    """Marca a execução em andamento como abandonada e registra uma nova, sem dono, na fila"""
+    id_execucao, id_agendamento, prioridade, horario_previsto, tentativa, chave = linha
+    conn.execute(
+        "UPDATE execucoes SET estado = ?, finalizado_em = ?, motivo_fim = ? WHERE id = ?",
+        (ESTADO_ABANDONADA, momento, motivo, id_execucao)
+    )
+    conn.execute(
+        """
+        INSERT INTO execucoes
+            (id_agendamento, estado, prioridade, horario_previsto, enfileirado_em, tentativa, chave_disparo)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        """,
+        (id_agendamento, ESTADO_FILA, prioridade, horario_previsto, momento, tentativa, chave)
+    )
+
+
+def devolver_execucao(db_path, id_execucao, no):
+    """
+    Devolve à fila compartilhada uma execução que o nó interrompeu (ou não
+    chegou a iniciar) por ter ficado sem batimento, se ela ainda for dele;
+    retorna True se devolvida
+    """
+    conn = conectar(db_path)
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        linha = conn.execute(
+            """
+            SELECT estado, id, id_agendamento, prioridade, horario_previsto, tentativa, chave_disparo FROM execucoes
+            WHERE id = ? AND no = ? AND estado IN (?, ?)
+            """,
+            (id_execucao, no, ESTADO_FILA, ESTADO_EXECUTANDO)
+        ).fetchone()
+        if linha is None:
+            conn.rollback()
+            return False
+        if linha[0] == ESTADO_FILA:
+            conn.execute("UPDATE execucoes SET no = NULL, concessao_ate = NULL WHERE id = ?", (id_execucao,))
+        else:
+            _recolocar_em_andamento(conn, linha[1:], MOTIVO_CONCESSAO, _texto(datetime.datetime.now()))
+        conn.commit()
+        return True
+    finally:
+        conn.close()
+
+
+def reivindicar_pendentes(db_path, no, limite, espera_minima=0.0, conhecidos=()):
+    """
+    Concede a `no` até `limite` execuções sem dono da fila compartilhada, por
+    prioridade e ordem de chegada, que aguardam há pelo menos `espera_minima`
+    segundos e cujo agendamento o nó já carregou (`conhecidos`).
+
+    Na mesma transação, recoloca na fila as execuções de nós sem batimento e
+    descarta as de agendamentos removidos ou inativos. Retorna (reivindicadas,
+    recolocadas), com as reivindicadas no formato de execucoes_na_fila.
+    """
+    agora = datetime.datetime.now()
+    conn = conectar(db_path)
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        recolocadas = _recolocar_expiradas(conn, no, agora)
+        conn.execute(
+            """
+            UPDATE execucoes SET estado = ?, finalizado_em = ?
+            WHERE estado = ? AND no IS NULL
+              AND id_agendamento NOT IN (SELECT id FROM agendamentos WHERE status = 'Ativo')
+            """,
+            (ESTADO_DESCARTADA, _texto(agora), ESTADO_FILA)
+        )
+
+        reivindicadas = []
+        if limite > 0 and conhecidos:
+            candidatas = conn.execute(
+                """
+                SELECT id, id_agendamento, horario_previsto, enfileirado_em, tentativa, disponivel_em, chave_disparo
+                FROM execucoes
+                WHERE estado = ? AND no IS NULL AND enfileirado_em <= ?
+                ORDER BY prioridade DESC, id
+                """,
+                (ESTADO_FILA, _texto(agora - datetime.timedelta(seconds=espera_minima)))
+            ).fetchall()
+            # Agendamentos criados há pouco podem ainda não ter sido carregados por este nó
+            reivindicadas = [linha for linha in candidatas if linha[1] in conhecidos][:limite]
+            conn.executemany(
+                "UPDATE execucoes SET no = ?, concessao_ate = ? WHERE id = ?",
+                [(no, _concessao(agora), linha[0]) for linha in reivindicadas]
+            )
+        conn.commit()
+        return reivindicadas, recolocadas
+    finally:
+        conn.close()
+
+
+def registrar_batimento(db_path, no, capacidade, em_execucao, fila, carga, proprias=None, pid=None):
+    """
+    Publica a carga do nó e renova as concessões das execuções que ele mantém
+    (`proprias`, ids; None renova todas as do nó, no primeiro batimento após
+    um reinício). Execuções interrompidas pelo nó deixam de ser renovadas e
+    voltam à fila quando a concessão expira.
+
+    Retorna (carga dos demais nós ativos, perdidas): perdidas são as
+    `proprias` que já não pertencem ao nó (recolocadas na fila por outro nó
+    enquanto este estava sem batimento); o nó deve interrompê-las sem
+    registrar o resultado. Se outro processo assumiu o NO_ID, retorna
+    (None, todas as `proprias`).
+    """
+    pid = pid or os.getpid()
+    agora = datetime.datetime.now()
+    conn = conectar(db_path)
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        cursor = conn.execute(
+            """
+            UPDATE nos SET capacidade = ?, em_execucao = ?, fila = ?, carga = ?, renovado_em = ?
+            WHERE no = ? AND host = ? AND pid = ?
+            """,
+            (capacidade, em_execucao, fila, carga, _texto(agora), no, HOST, pid)
+        )
+        if cursor.rowcount == 0:
+            if conn.execute("SELECT 1 FROM nos WHERE no = ?", (no,)).fetchone():
+                conn.rollback()
+                return None, list(proprias or ())
+            conn.execute(
+                """
+                INSERT INTO nos (no, host, pid, capacidade, em_execucao, fila, carga, iniciado_em, renovado_em)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (no, HOST, pid, capacidade, em_execucao, fila, carga, _texto(agora), _texto(agora))
+            )
+
+        perdidas = []
+        if proprias is None:
+            conn.execute(
+                "UPDATE execucoes SET concessao_ate = ? WHERE no = ? AND estado IN (?, ?)",
+                (_concessao(agora), no, ESTADO_FILA, ESTADO_EXECUTANDO)
+            )
+        elif proprias:
+            ids = list(proprias)
+            marcadores = ", ".join("?" * len(ids))
+            conn.execute(
+                f"UPDATE execucoes SET concessao_ate = ? WHERE id IN ({marcadores}) AND no = ? AND estado IN (?, ?)",
+                (_concessao(agora), *ids, no, ESTADO_FILA, ESTADO_EXECUTANDO)
+            )
+            # Finalizadas continuam do nó; recolocadas ficam sem dono (ou com outro) ou abandonadas
+            mantidas = {id_execucao for (id_execucao,) in conn.execute(
+                f"SELECT id FROM execucoes WHERE id IN ({marcadores}) AND no = ? AND estado <> ?",
+                (*ids, no, ESTADO_ABANDONADA)
+            )}
+            perdidas = [id_execucao for id_execucao in ids if id_execucao not in mantidas]
+        conn.commit()
+
+        outros = [carga for (carga,) in conn.execute(
+            "SELECT carga FROM nos WHERE no <> ? AND renovado_em >= ?",
+            (no, _texto(agora - datetime.timedelta(seconds=TTL_CONCESSAO)))
+        )]
+        return outros, perdidas
+    finally:
+        conn.close()
+
+
+def adotar_execucao(db_path, id_execucao, no):
+    """
+    Atribui ao nó uma execução em andamento sem dono (anterior aos vários nós),
+    ao reanexá-la após um reinício; False se ela já pertence a outro nó
+    """
+    conn = conectar(db_path)
+    try:
+        cursor = conn.execute(
+            "UPDATE execucoes SET no = ?, concessao_ate = ? WHERE id = ? AND (no IS NULL OR no = ?)",
+            (no, _concessao(datetime.datetime.now()), id_execucao, no)
+        )
+        conn.commit()
+        return cursor.rowcount == 1
+    finally:
+        conn.close()
+
+
+def registrar_no(db_path, no, pid=None):
+    """
+    Registra o processo como dono de `no` ao iniciar. Retorna (host, pid) de
+    outro processo ativo com o mesmo NO_ID, sem registrar, ou None se o nó foi
+    registrado. Na mesma máquina, um dono que parou sem liberar o nó (queda do
+    serviço) é substituído assim que o processo dele deixa de existir.
+    """
+    pid = pid or os.getpid()
+    agora = datetime.datetime.now()
+    conn = conectar(db_path)
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        linha = conn.execute("SELECT host, pid, renovado_em FROM nos WHERE no = ?", (no,)).fetchone()
+        if linha is not None and (linha[0], linha[1]) != (HOST, pid):
+            host, pid_dono, renovado_em = linha
+            ativo = renovado_em >= _texto(agora - datetime.timedelta(seconds=TTL_CONCESSAO))
+            if ativo and (host != HOST or processo_vivo(pid_dono)):
+                conn.rollback()
+                return host, pid_dono
+        conn.execute(
+            """
+            INSERT INTO nos (no, host, pid, capacidade, em_execucao, fila, carga, iniciado_em, renovado_em)
+            VALUES (?, ?, ?, 0, 0, 0, 0, ?, ?)
+            ON CONFLICT (no) DO UPDATE SET
+                host = excluded.host, pid = excluded.pid, iniciado_em = excluded.iniciado_em,
+                renovado_em = excluded.renovado_em
+            """,
+            (no, HOST, pid, _texto(agora), _texto(agora))
+        )
+        conn.commit()
+        return None
+    finally:
+        conn.close()
+
+
+def liberar_no(db_path, no):
+    """Parada do nó: as execuções que ele ainda não iniciou voltam à fila sem esperar a concessão expirar"""
+    conn = conectar(db_path)
+    try:
+        cursor = conn.execute(
+            "UPDATE execucoes SET no = NULL, concessao_ate = NULL WHERE no = ? AND estado = ?", (no, ESTADO_FILA)
+        )
+        conn.execute("DELETE FROM nos WHERE no = ?", (no,))
+        conn.commit()
+        return cursor.rowcount
+    finally:
+        conn.close()
+
+
+def listar_nos(db_path):
+    """Nós registrados: (no, host, pid, capacidade, em_execucao, fila, carga, iniciado_em, renovado_em, ativo)"""
+    limite = _texto(datetime.datetime.now() - datetime.timedelta(seconds=TTL_CONCESSAO))
+    conn = conectar(db_path)
+    try:
+        return conn.execute(
+            """
+            SELECT no, host, pid, capacidade, em_execucao, fila, carga, iniciado_em, renovado_em, renovado_em >= ?
+            FROM nos ORDER BY no
+            """,
+            (limite,)
+        ).fetchall()
+    finally:
+        conn.close()
+
+
+class CoordenadorNos:
+    """
+    Batimento do nó, em uma thread: a cada INTERVALO_BATIMENTO publica a carga
+    (`medir()` retorna (capacidade, em_execucao, fila, carga)), renova as
+    concessões das execuções do nó e reivindica execuções da fila compartilhada,
+    entregues a `ao_reivindicar(linhas)`. Os nós menos carregados reivindicam
+    primeiro; um nó mais carregado só reivindica o que continuou sem dono por
+    ESPERA_POR_POSICAO segundos por nó à sua frente, e um nó lotado só o que
+    nenhum outro assumiu.
+
+    `conhecidos` (ids dos agendamentos carregados) é atualizado pelo loop
+    principal; enquanto estiver vazio nada é reivindicado.
+
+    Só as execuções que o nó mantém (`proprias()`, ids) têm a concessão
+    renovada. As que ele perdeu são entregues a `ao_perder(ids)`, que deve
+    interrompê-las sem registrar o resultado: as recolocadas na fila por outro
+    nó enquanto este estava travado e, havendo outros nós, todas as suas
+    quando o batimento falha por mais de TTL_CONCESSAO segundos, pois a essa
+    altura outro nó pode tê-las assumido.
+    """
+
+    def __init__(self, db_path, medir, ao_reivindicar, ao_recolocar=None, no=NO_ID, proprias=None,
+                 ao_perder=None):
+        self.db_path = db_path
+        self.no = no
+        self.medir = medir
+        self.ao_reivindicar = ao_reivindicar
+        self.ao_recolocar = ao_recolocar
+        self.proprias = proprias
+        self.ao_perder = ao_perder
+        self.conhecidos = frozenset()
+        self._outros = []
+        self._suspenso = False
+        self._ultimo_batimento = time.monotonic()
+        self._concessoes_expiradas = False
+        self._parar = threading.Event()
+        self._thread = None
+
+    def iniciar(self):
+        """
+        Registra o nó e inicia o batimento. Gera RuntimeError, sem iniciar, se
+        outro processo ativo usa o mesmo NO_ID: os dois tratariam as execuções
+        um do outro como suas e as executariam em dobro.
+        """
+        outro = registrar_no(self.db_path, self.no)
+        if outro is not None:
+            raise RuntimeError(
+                f"NO_ID {self.no} já está em uso por {outro[0]} (PID {outro[1]}); defina um NO_ID diferente por nó"
+            )
+        # Primeiro batimento antes de tudo: renova as concessões de execuções anteriores a um reinício
+        self._batimento(reivindicar=False, todas=True)
+        self._thread = threading.Thread(target=self._loop, name="CoordenadorNos", daemon=True)
+        self._thread.start()
+
+    def suspender(self):
+        """Para de reivindicar execuções (o batimento continua, para as execuções em andamento)"""
+        self._suspenso = True
+
+    def parar(self):
+        if self._thread is None:
+            # Não iniciado (NO_ID em uso): o registro do nó pertence ao outro processo
+            return
+        self._parar.set()
+        self._thread.join(timeout=INTERVALO_BATIMENTO + 5)
+        try:
+            devolvidas = liberar_no(self.db_path, self.no)
+            if devolvidas:
+                logger.info(f"{devolvidas} execução(ões) na fila devolvida(s) aos demais nós")
+        except Exception as e:
+            logger.error(f"Falha ao liberar o nó {self.no}: {str(e)}")
+
+    def posicao(self, carga):
+        """Quantos nós ativos estão menos carregados que este (0 = o menos carregado, com a margem)"""
+        return sum(1 for outra in self._outros if outra < carga - MARGEM_CARGA)
+
+    def menos_carregado(self, carga):
+        return self.posicao(carga) == 0
+
+    def _loop(self):
+        while not self._parar.wait(INTERVALO_BATIMENTO):
+            self._batimento(reivindicar=not self._suspenso)
+
+    def _batimento(self, reivindicar=True, todas=False):
+        try:
+            capacidade, em_execucao, fila, carga = self.medir()
+            proprias = None if todas or self.proprias is None else set(self.proprias())
+            outros, perdidas = registrar_batimento(
+                self.db_path, self.no, capacidade, em_execucao, fila, carga, proprias
+            )
+        except Exception as e:
+            logger.error(f"Falha no batimento do nó {self.no}: {str(e)}")
+            self._verificar_expiracao()
+            return
+
+        self._ultimo_batimento = time.monotonic()
+        self._concessoes_expiradas = False
+        if outros is None:
+            # Outro processo assumiu o NO_ID enquanto este estava sem batimento
+            logger.error(f"NO_ID {self.no} foi assumido por outro processo; este nó para de reivindicar execuções")
+            self._suspenso, self._outros, reivindicar = True, [], False
+        else:
+            self._outros = outros
+        if perdidas:
+            logger.error(f"Nó {self.no} perdeu a concessão de {len(perdidas)} execução(ões), assumidas por outro nó")
+            self._perder(perdidas)
+        if not reivindicar:
+            return
+
+        try:
+            vagas = capacidade - em_execucao - fila
+            espera = self.posicao(carga) * ESPERA_POR_POSICAO
+            if vagas <= 0:
+                # Lotado: só assume, uma por vez, o que ficou sem dono depois de todos os outros
+                vagas, espera = 1, max(espera, (len(self._outros) + 1) * ESPERA_POR_POSICAO)
+            reivindicadas, recolocadas = reivindicar_pendentes(
+                self.db_path, self.no, vagas, espera, self.conhecidos
+            )
+        except Exception as e:
+            logger.error(f"Falha ao reivindicar execuções para o nó {self.no}: {str(e)}")
+            return
+
+        if recolocadas and self.ao_recolocar is not None:
+            self.ao_recolocar(recolocadas)
+        if reivindicadas:
+            self.ao_reivindicar(reivindicadas)
+
+    def _verificar_expiracao(self):
+        """
+        Sem batimento por mais de TTL_CONCESSAO, as concessões do nó expiraram e
+        outro nó pode estar executando as mesmas execuções: o nó interrompe as suas.
+        Sem outros nós conhecidos, nada é interrompido.
+        """
+        if self._concessoes_expiradas or not self._outros:
+            return
+        if time.monotonic() - self._ultimo_batimento <= TTL_CONCESSAO:
+            return
+        self._concessoes_expiradas = True
+        proprias = list(self.proprias()) if self.proprias is not None else []
+        logger.error(
+            f"Nó {self.no} sem batimento há mais de {TTL_CONCESSAO}s: "
+            f"{len(proprias)} execução(ões) interrompida(s) para não executarem em dobro"
+        )
+        self._perder(proprias)
+
+    def _perder(self, ids):
+        if ids and self.ao_perder is not None:
+            try:
+                self.ao_perder(ids)
+            except Exception as e:
+                logger.error(f"Falha ao interromper execuções sem concessão do nó {self.no}: {str(e)}")
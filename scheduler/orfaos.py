@@ -0,0 +1,148 @@
+# Copyright 2025 Thiago Luis de Lima
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import logging
+import os
+import threading
+import time
+
+from .processos import encerrar_arvore, mesmo_processo, origem_execucao, psutil
+
+logger = logging.getLogger(__name__)
+
+# Trechos da linha de comando que identificam as JVMs das ferramentas ETL
+PADROES_FERRAMENTA = tuple(
+    p.strip() for p in os.getenv(
+        "PADROES_PROCESSOS_ETL",
+        "org.pentaho.di.kitchen.Kitchen,org.pentaho.di.pan.Pan,org.apache.hop.run.HopRun,org.apache.hop.hop.Hop"
+    ).split(",") if p.strip()
+)
+
+# Intervalo (segundos) entre coletas de processos órfãos (0 = desativado)
+INTERVALO_COLETA = float(os.getenv("INTERVALO_COLETA_ORFAOS", 300))
+
+# Processos mais novos que isto (segundos) nunca são considerados órfãos
+IDADE_MINIMA = float(os.getenv("IDADE_MINIMA_ORFAO_SEG", 120))
+
+
+def processo_da_ferramenta(processo):
+    try:
+        linha = " ".join(processo.cmdline())
+    except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
+        return False
+    return any(p in linha for p in PADROES_FERRAMENTA)
+
+
+def orfao(processo):
+    """
+    A JVM foi iniciada pelo PyFlowT3 (marca de origem no ambiente, herdada da
+    execução) e o processo que a iniciou (serviço ou executaWorkflow) não existe
+    mais. JVMs sem a marca, como as iniciadas por outras equipes via systemd,
+    nohup ou setsid, nunca são órfãs, mesmo que o pai delas tenha morrido.
+    """
+    try:
+        origem = origem_execucao(processo.environ())
+    except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
+        return False
+    if origem is None:
+        return False
+    return not mesmo_processo(*origem)
+
+
+def _ancestrais(processo):
+    try:
+        return {p.pid for p in processo.parents()}
+    except (psutil.NoSuchProcess, psutil.AccessDenied):
+        return set()
+
+
+class ColetorOrfaos:
+    """
+    Thread que encontra e encerra processos das ferramentas ETL deixados para
+    trás por execuções que morreram (serviço reiniciado, executaWorkflow
+    finalizado à força), liberando a memória das JVMs. Só são coletados
+    processos iniciados pelo PyFlowT3 (ver orfao). Requer psutil.
+
+    `protegidos()`, se informado, retorna PIDs de execuções ativas cujos
+    descendentes nunca são coletados.
+    """
+
+    def __init__(self, metricas=None, protegidos=None, intervalo=None):
+        self.metricas = metricas
+        self._protegidos = protegidos
+        self.intervalo = INTERVALO_COLETA if intervalo is None else intervalo
+        self._parar = threading.Event()
+        self._thread = None
+        self._encerrados = 0
+        self._memoria_mb = 0.0
+
+    def iniciar(self):
+        if not self.intervalo:
+            return
+        if psutil is None:
+            logger.warning("psutil não instalado; coleta de processos órfãos desativada")
+            return
+        self._thread = threading.Thread(target=self._loop, name="ColetorOrfaos", daemon=True)
+        self._thread.start()
+
+    def parar(self):
+        self._parar.set()
+
+    def _loop(self):
+        while not self._parar.wait(self.intervalo):
+            try:
+                self.coletar()
+            except Exception as e:
+                logger.error(f"Falha na coleta de processos órfãos: {str(e)}")
+
+    def candidatos(self):
+        """Processos de ferramentas ETL órfãos há pelo menos IDADE_MINIMA segundos"""
+        protegidos = set(self._protegidos()) if self._protegidos else set()
+        limite = time.time() - IDADE_MINIMA
+        encontrados = []
+        for processo in psutil.process_iter(['create_time']):
+            if processo.info['create_time'] is None or processo.info['create_time'] > limite:
+                continue
+            if not processo_da_ferramenta(processo):
+                continue
+            if protegidos & (_ancestrais(processo) | {processo.pid}):
+                continue
+            if orfao(processo):
+                encontrados.append(processo)
+        return encontrados
+
+    def coletar(self):
+        """Encerra os órfãos encontrados; retorna (quantidade, memória liberada em MB)"""
+        encerrados, memoria = 0, 0.0
+        for processo in self.candidatos():
+            try:
+                linha = " ".join(processo.cmdline())[:200]
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                continue
+            liberada = encerrar_arvore(processo.pid) or 0.0
+            encerrados += 1
+            memoria += liberada
+            logger.warning(f"Processo órfão encerrado (PID {processo.pid}, {liberada:.0f} MB): {linha}")
+
+        if encerrados:
+            logger.warning(f"Coleta de órfãos: {encerrados} processo(s) encerrado(s), {memoria:.0f} MB liberados")
+        self._encerrados += encerrados
+        self._memoria_mb += memoria
+        if self.metricas is not None:
+            self.metricas.atualizar({
+                'orfaos_encerrados': self._encerrados,
+                'orfaos_memoria_liberada_mb': round(self._memoria_mb),
+                'orfaos_ultima_coleta_mb': round(memoria),
+            })
+        return encerrados, memoria
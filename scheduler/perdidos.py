@@ -0,0 +1,111 @@
+# Copyright 2025 Thiago Luis de Lima
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import datetime
+import logging
+import os
+
+from .db import conectar
+from .execucoes import FORMATO_DATA, ler_data
+from .rules import PERDIDOS_PULAR
+
+logger = logging.getLogger(__name__)
+
+# Disparos perdidos há mais tempo que isto (horas) nunca são recuperados
+JANELA_RECUPERACAO = float(os.getenv("JANELA_RECUPERACAO_HORAS", 24))
+
+CHAVE_ULTIMO_TICK = 'ultimo_tick'
+
+
+def ler_ultimo_tick(db_path):
+    """Último minuto avaliado pelo serviço, ou None se nunca registrado"""
+    conn = conectar(db_path)
+    try:
+        linha = conn.execute("SELECT valor FROM estado_agendador WHERE chave = ?", (CHAVE_ULTIMO_TICK,)).fetchone()
+    finally:
+        conn.close()
+    return ler_data(linha[0]) if linha else None
+
+
+def gravar_ultimo_tick(db_path, minuto):
+    agora = datetime.datetime.now().strftime(FORMATO_DATA)
+    conn = conectar(db_path)
+    try:
+        conn.execute(
+            """
+            INSERT INTO estado_agendador (chave, valor, atualizado_em) VALUES (?, ?, ?)
+            ON CONFLICT(chave) DO UPDATE SET valor = excluded.valor, atualizado_em = excluded.atualizado_em
+            """,
+            (CHAVE_ULTIMO_TICK, minuto.strftime(FORMATO_DATA), agora)
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def disparos_perdidos(regra, desde, ate):
+    """Disparos da regra estritamente entre `desde` e `ate`, em ordem"""
+    perdidos = []
+    quando = regra.proxima_execucao(desde)
+    while quando is not None and quando < ate:
+        perdidos.append(quando)
+        quando = regra.proxima_execucao(quando)
+    return perdidos
+
+
+def _ja_registrados(conn, id_agendamento, desde):
+    """Horários após `desde` que já têm execução registrada (disparados antes de o tick ser gravado)"""
+    return {ler_data(h) for (h,) in conn.execute(
+        "SELECT horario_previsto FROM execucoes WHERE id_agendamento = ? AND horario_previsto > ?",
+        (id_agendamento, desde.strftime(FORMATO_DATA))
+    )}
+
+
+def disparos_a_recuperar(db_path, regras, ultimo_tick, agora):
+    """
+    Aplica a política de disparos perdidos de cada regra ao período em que o
+    serviço ficou parado (entre `ultimo_tick` e o minuto de `agora`, exclusive).
+    Retorna lista de (regra, horario_previsto) em ordem de horário.
+    """
+    atual = agora.replace(second=0, microsecond=0)
+    if ultimo_tick is None or ultimo_tick >= atual:
+        return []
+    desde = max(ultimo_tick, atual - datetime.timedelta(hours=JANELA_RECUPERACAO))
+    if desde > ultimo_tick:
+        logger.warning(f"Parada maior que {JANELA_RECUPERACAO:.0f}h: disparos anteriores a {desde:%d/%m %H:%M} não serão recuperados")
+
+    recuperar = []
+    conn = conectar(db_path)
+    try:
+        for regra in regras:
+            # Em modo após término a cadeia de execuções recomeça sozinha no primeiro tick
+            if regra.politica_perdidos == PERDIDOS_PULAR or regra.apos_termino:
+                continue
+            perdidos = disparos_perdidos(regra, desde, atual)
+            if perdidos:
+                registrados = _ja_registrados(conn, regra.id, desde)
+                perdidos = [h for h in perdidos if h not in registrados]
+            if not perdidos:
+                continue
+            # Os mais recentes: disparos antigos demais para o limite são descartados
+            selecionados = perdidos[-regra.max_perdidos:]
+            if len(perdidos) > len(selecionados):
+                logger.warning(
+                    f"{len(perdidos) - len(selecionados)} disparo(s) perdido(s) descartado(s) "
+                    f"pelo limite de {regra.max_perdidos}: {regra.arquivo}"
+                )
+            recuperar.extend((regra, horario) for horario in selecionados)
+    finally:
+        conn.close()
+    return sorted(recuperar, key=lambda item: item[1])
@@ -0,0 +1,457 @@
+# Copyright 2025 Thiago Luis de Lima
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import collections
+import logging
+import os
+import re
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+FERRAMENTAS = ('PENTAHO', 'APACHE_HOP', 'TERMINAL')
+
+# Limites de execuções simultâneas (0 = sem limite)
+LIMITE_GLOBAL = int(os.getenv("POOL_MAX_GLOBAL", 8))
+LIMITES_FERRAMENTA = {
+    'PENTAHO': int(os.getenv("POOL_MAX_PENTAHO", 4)),
+    'APACHE_HOP': int(os.getenv("POOL_MAX_APACHE_HOP", 4)),
+    'TERMINAL': int(os.getenv("POOL_MAX_TERMINAL", 8)),
+}
+
+# Intervalo (segundos) entre verificações de execuções finalizadas
+INTERVALO_VERIFICACAO = 1.0
+
+# Grupos de recursos: cada agendamento pertence a um grupo (por padrão o seu projeto).
+# GRUPOS_RECURSO="nome=max_execucoes:peso,..." limita as execuções simultâneas de cada
+# grupo (0 = sem limite) e define o peso na divisão dos slots entre grupos com fila;
+# grupos não listados usam POOL_MAX_GRUPO e peso 1.
+GRUPO_PADRAO = 'padrao'
+LIMITE_GRUPO_PADRAO = int(os.getenv("POOL_MAX_GRUPO", 0))
+
+
+def ler_grupos(texto):
+    """Converte GRUPOS_RECURSO em {nome: (max_execucoes, peso)}; entradas inválidas são ignoradas"""
+    grupos = {}
+    for item in (texto or '').split(','):
+        nome, _, valores = item.partition('=')
+        limite, _, peso = valores.partition(':')
+        try:
+            grupos[nome.strip()] = (max(int(limite or 0), 0), max(float(peso or 1), 0.01))
+        except ValueError:
+            logger.error(f"Grupo de recursos inválido em GRUPOS_RECURSO: {item.strip()}")
+    grupos.pop('', None)
+    return grupos
+
+
+GRUPOS_RECURSO = ler_grupos(os.getenv("GRUPOS_RECURSO", ""))
+
+# A cada ENVELHECIMENTO_SEG segundos na fila a execução ganha +1 de prioridade,
+# garantindo que execuções de baixa prioridade não fiquem esperando para sempre
+ENVELHECIMENTO_SEG = float(os.getenv("FILA_ENVELHECIMENTO_SEG", 60))
+
+
+def ferramenta_da_regra(regra):
+    """Ferramenta usada para contar slots; desconhecidas rodam como TERMINAL"""
+    ferramenta = (regra.ferramenta_etl or '').upper()
+    return ferramenta if ferramenta in FERRAMENTAS else 'TERMINAL'
+
+
+def grupo_da_regra(regra):
+    """Grupo de recursos do agendamento: o configurado ou, sem ele, o projeto"""
+    return getattr(regra, 'grupo_recurso', None) or (regra.projeto or '').strip() or GRUPO_PADRAO
+
+
+def _nome_metrica(grupo):
+    return re.sub(r'\W+', '_', grupo).strip('_').lower() or GRUPO_PADRAO
+
+
+class PedidoExecucao:
+    """Execução aguardando ou ocupando um slot do pool"""
+
+    __slots__ = (
+        "regra", "ferramenta", "grupo", "prioridade", "horario_previsto", "enfileirado_em", "iniciado_em",
+        "handle", "trava", "aguardando_trava", "id_execucao", "tentativa", "recuperacao",
+        "sondagem", "adiamento", "concessao_perdida", "chave", "analise",
+    )
+
+    def __init__(self, regra, horario_previsto=None, espera_anterior=0.0, atraso=0.0, tentativa=1):
+        self.regra = regra
+        self.ferramenta = ferramenta_da_regra(regra)
+        self.grupo = grupo_da_regra(regra)
+        self.prioridade = getattr(regra, 'prioridade', 0)
+        self.horario_previsto = horario_previsto
+        # espera_anterior permite restaurar pedidos que já aguardavam antes de um reinício;
+        # atraso adia o pedido (retentativas), que só passa a disputar slots depois dele
+        self.enfileirado_em = time.monotonic() - espera_anterior + atraso
+        self.tentativa = tentativa
+        self.iniciado_em = None
+        self.handle = None
+        self.trava = None
+        self.aguardando_trava = False
+        self.id_execucao = None
+        self.recuperacao = False  # disparo perdido durante uma parada do serviço
+        self.sondagem = False  # execução de teste com o disjuntor do agendamento aberto
+        self.adiamento = None  # motivo ('memoria'/'cpu') enquanto o controle de admissão segura o pedido
+        self.concessao_perdida = False  # outro nó assumiu a execução: o resultado deste nó é descartado
+        self.chave = None  # identifica disparos sem horário previsto (por dependências) entre os nós
+        self.analise = None  # análise da saída (linhas de erro), definida por quem inicia o processo
+
+    @property
+    def espera(self):
+        fim = self.iniciado_em if self.iniciado_em is not None else time.monotonic()
+        return max(fim - self.enfileirado_em, 0.0)
+
+    def disponivel(self, agora=None):
+        return (time.monotonic() if agora is None else agora) >= self.enfileirado_em
+
+    def prioridade_efetiva(self, agora=None):
+        """Prioridade configurada acrescida do envelhecimento na fila"""
+        agora = time.monotonic() if agora is None else agora
+        envelhecimento = (agora - self.enfileirado_em) / ENVELHECIMENTO_SEG if ENVELHECIMENTO_SEG > 0 else 0
+        return self.prioridade + envelhecimento
+
+
+class PoolExecucao:
+    """
+    Limita execuções simultâneas no total, por ferramenta ETL e por grupo de recursos.
+
+    Pedidos que excedem os limites ficam em fila até um slot ser liberado.
+    Entre grupos, cada slot livre vai para o grupo com menos execuções em
+    relação ao seu peso (divisão justa ponderada); dentro do grupo, para a
+    maior prioridade efetiva (prioridade do agendamento mais envelhecimento
+    na fila) e, em empate, o mais antigo. `iniciar(pedido)` deve iniciar a execução e retornar o seu
+    handle, com `is_alive()` e `pid` (a ExecucaoSupervisionada do SupervisorProcessos).
+
+    `admitir(pedido)`, se informado, é consultado quando há slot livre e
+    retorna True (iniciar), False (manter na fila) ou None (descartar).
+    `finalizar(pedido)` é chamado quando a execução termina ou falha ao iniciar,
+    e pode submeter novos pedidos.
+
+    Os três callbacks gravam no banco e podem demorar; rodam na thread do pool
+    sem o lock: o slot é reservado com o lock, o pedido é admitido e iniciado
+    sem ele, e o resultado é registrado com o lock de novo. Assim `submeter()`,
+    chamado pelo loop principal, nunca espera por eles.
+    """
+
+    def __init__(self, iniciar, metricas=None, limite_global=None, limites=None, admitir=None, finalizar=None,
+                 grupos=None):
+        self._iniciar = iniciar
+        self._admitir = admitir
+        self._finalizar = finalizar
+        self.metricas = metricas
+        self.limite_global = LIMITE_GLOBAL if limite_global is None else limite_global
+        self.limites = dict(LIMITES_FERRAMENTA if limites is None else limites)
+        self.grupos = dict(GRUPOS_RECURSO if grupos is None else grupos)
+
+        self._fila = collections.deque()
+        self._em_execucao = []
+        # Pedidos com slot reservado, sendo admitidos e iniciados fora do lock
+        self._reservados = []
+        self._cond = threading.Condition()
+        self._parar = threading.Event()
+        self._thread = None
+        self._despachando = False
+        # Pedidos submetidos (ou execuções terminadas) durante um despacho: há mais uma rodada
+        self._pendente = False
+        self._drenando = False
+
+        self._iniciadas = 0
+        self._espera_total = 0.0
+        self._espera_max = 0.0
+        self._iniciadas_grupo = collections.Counter()
+        self._espera_grupo = collections.Counter()
+
+    # -- ciclo de vida -------------------------------------------------
+
+    def iniciar(self):
+        self._thread = threading.Thread(target=self._loop, name="PoolExecucao", daemon=True)
+        self._thread.start()
+
+    def parar(self, timeout=5.0):
+        """Encerra o despacho; execuções já terminadas ainda são finalizadas (registro e travas)"""
+        self._parar.set()
+        with self._cond:
+            self._drenando = True
+            self._cond.notify_all()
+        if self._thread and self._thread.is_alive():
+            self._thread.join(timeout=timeout)
+        self._despachar()
+
+    def drenar(self, prazo):
+        """
+        Para de iniciar pedidos da fila (que continuam registrados para o próximo
+        início do serviço) e aguarda até `prazo` segundos as execuções em
+        andamento terminarem. Retorna quantas continuam em execução.
+        """
+        limite = time.monotonic() + prazo
+        with self._cond:
+            self._drenando = True
+        while True:
+            self._despachar()
+            with self._cond:
+                ocupados = len(self._em_execucao) + len(self._reservados)
+                restante = limite - time.monotonic()
+                if not ocupados or restante <= 0:
+                    return ocupados
+                self._cond.wait(min(restante, INTERVALO_VERIFICACAO))
+
+    def _loop(self):
+        while not self._parar.is_set():
+            self._despachar()
+            with self._cond:
+                if not self._pendente and not self._parar.is_set():
+                    self._cond.wait(self._proxima_verificacao())
+
+    def _proxima_verificacao(self):
+        """Segundos até a próxima verificação: antecipada se um pedido adiado vence antes"""
+        agora = time.monotonic()
+        adiados = [p.enfileirado_em - agora for p in self._fila if not p.disponivel(agora)]
+        return min([INTERVALO_VERIFICACAO] + adiados)
+
+    # -- fila ----------------------------------------------------------
+
+    def acordar(self):
+        """Antecipa a verificação da fila, por exemplo quando uma execução termina"""
+        with self._cond:
+            self._pendente = True
+            self._cond.notify_all()
+
+    def em_execucao(self):
+        """Pedidos já iniciados (sem os que ainda estão sendo admitidos)"""
+        with self._cond:
+            return list(self._em_execucao)
+
+    def pedidos(self):
+        """Pedidos em execução, sendo iniciados e na fila"""
+        with self._cond:
+            return self._em_execucao + self._reservados + list(self._fila)
+
+    def adotar(self, pedido):
+        """Passa a acompanhar uma execução já iniciada (por exemplo reanexada após um reinício)"""
+        with self._cond:
+            pedido.iniciado_em = time.monotonic()
+            self._em_execucao.append(pedido)
+            self._publicar()
+
+    def submeter(self, pedido):
+        """Coloca o pedido na fila; a thread do pool o inicia assim que couber"""
+        with self._cond:
+            cabe = (pedido.disponivel() and self._slots_livres(pedido.ferramenta, self._ocupados_por_ferramenta())
+                    and self._grupo_livre(pedido.grupo, self._ocupados_por_grupo()))
+            self._fila.append(pedido)
+            if not cabe:
+                logger.info(
+                    f"Execução enfileirada: {pedido.regra.arquivo} "
+                    f"({pedido.ferramenta}, {len(self._fila)} na fila)"
+                )
+            self._pendente = True
+            self._cond.notify_all()
+
+    def _slots_livres(self, ferramenta, ocupados):
+        if self._lotado():
+            return False
+        limite = self.limites.get(ferramenta, 0)
+        return not limite or ocupados.get(ferramenta, 0) < limite
+
+    def _lotado(self):
+        return bool(self.limite_global) and len(self._em_execucao) + len(self._reservados) >= self.limite_global
+
+    def limite_grupo(self, grupo):
+        return self.grupos.get(grupo, (LIMITE_GRUPO_PADRAO, 1.0))[0]
+
+    def peso_grupo(self, grupo):
+        return self.grupos.get(grupo, (LIMITE_GRUPO_PADRAO, 1.0))[1]
+
+    def _grupo_livre(self, grupo, em_grupo):
+        limite = self.limite_grupo(grupo)
+        return not limite or em_grupo[grupo] < limite
+
+    def _ocupados_por_ferramenta(self):
+        return collections.Counter(p.ferramenta for p in self._em_execucao + self._reservados)
+
+    def _ocupados_por_grupo(self):
+        return collections.Counter(p.grupo for p in self._em_execucao + self._reservados)
+
+    def _despachar(self):
+        """
+        Libera slots de execuções finalizadas e inicia pedidos da fila que
+        couberem. Chamado sem o lock; se outra thread já está despachando, ela
+        faz mais uma rodada.
+        """
+        with self._cond:
+            if self._despachando:
+                self._pendente = True
+                return
+            self._despachando = True
+        try:
+            while True:
+                with self._cond:
+                    self._pendente = False
+                    em_execucao, terminadas = [], []
+                    for pedido in self._em_execucao:
+                        (em_execucao if pedido.handle.is_alive() else terminadas).append(pedido)
+                    self._em_execucao = em_execucao
+                for pedido in terminadas:
+                    self._encerrar(pedido)
+                self._atender()
+                # Pedidos submetidos pelos callbacks (por exemplo dependentes ou retentativas
+                # de uma execução que terminou) ganham mais uma rodada
+                with self._cond:
+                    if not self._pendente:
+                        break
+        finally:
+            with self._cond:
+                self._despachando = False
+                self._publicar()
+                self._cond.notify_all()
+
+    def _atender(self):
+        """Inicia, um slot por vez, os pedidos da fila que couberem nos slots"""
+        with self._cond:
+            if self._drenando:
+                return
+            agora = time.monotonic()
+            por_grupo = collections.defaultdict(collections.deque)
+            for pedido in sorted(self._fila, key=lambda p: (-p.prioridade_efetiva(agora), p.enfileirado_em)):
+                por_grupo[pedido.grupo].append(pedido)
+            ocupados = self._ocupados_por_ferramenta()
+            em_grupo = self._ocupados_por_grupo()
+
+        while por_grupo:
+            with self._cond:
+                if self._lotado() or self._drenando:
+                    return
+                # Próximo slot para o grupo menos servido em relação ao peso; em empate, o pedido mais prioritário
+                grupo = min(por_grupo, key=lambda g: (
+                    em_grupo[g] / self.peso_grupo(g),
+                    -por_grupo[g][0].prioridade_efetiva(agora), por_grupo[g][0].enfileirado_em
+                ))
+                pedido = por_grupo[grupo].popleft()
+                if not por_grupo[grupo]:
+                    del por_grupo[grupo]
+                if (not pedido.disponivel(agora) or not self._slots_livres(pedido.ferramenta, ocupados)
+                        or not self._grupo_livre(grupo, em_grupo)):
+                    continue
+                self._fila.remove(pedido)
+                self._reservados.append(pedido)
+                ocupados[pedido.ferramenta] += 1
+                em_grupo[grupo] += 1
+
+            iniciado = self._iniciar_reservado(pedido)
+
+            with self._cond:
+                self._reservados.remove(pedido)
+                if iniciado:
+                    pedido.iniciado_em = time.monotonic()
+                    self._em_execucao.append(pedido)
+                    self._registrar_espera(pedido)
+                    continue
+                ocupados[pedido.ferramenta] -= 1
+                em_grupo[grupo] -= 1
+                if iniciado is False:
+                    self._fila.append(pedido)
+            if iniciado is None:
+                self._encerrar(pedido)
+
+    def _iniciar_reservado(self, pedido):
+        """Admite e inicia o pedido (sem o lock): True se iniciado, False para manter na fila, None para descartar"""
+        if self._admitir is not None:
+            try:
+                admitido = self._admitir(pedido)
+            except Exception as e:
+                logger.error(f"Falha na admissão de {pedido.regra.arquivo}: {str(e)}")
+                admitido = False
+            if admitido is None:
+                return None
+            if not admitido:
+                return False
+        try:
+            pedido.handle = self._iniciar(pedido)
+        except Exception as e:
+            logger.error(f"Falha ao iniciar execução de {pedido.regra.arquivo}: {str(e)}")
+            pedido.handle = None
+        return None if pedido.handle is None else True
+
+    def _encerrar(self, pedido):
+        if self._finalizar is not None:
+            try:
+                self._finalizar(pedido)
+            except Exception as e:
+                logger.error(f"Falha ao finalizar execução de {pedido.regra.arquivo}: {str(e)}")
+
+    def _registrar_espera(self, pedido):
+        espera = pedido.espera
+        self._iniciadas += 1
+        self._espera_total += espera
+        self._espera_max = max(self._espera_max, espera)
+        self._iniciadas_grupo[pedido.grupo] += 1
+        self._espera_grupo[pedido.grupo] += espera
+        if espera >= INTERVALO_VERIFICACAO:
+            logger.info(f"Execução iniciada após {espera:.1f}s na fila: {pedido.regra.arquivo}")
+
+    # -- métricas ------------------------------------------------------
+
+    def estado(self):
+        with self._cond:
+            agora = time.monotonic()
+            fila = collections.Counter(p.ferramenta for p in self._fila if p.disponivel(agora))
+            execucao = self._ocupados_por_ferramenta()
+            valores = {
+                'pool_em_execucao': len(self._em_execucao) + len(self._reservados),
+                'pool_fila': sum(fila.values()),
+                'pool_aguardando_retentativa': len(self._fila) - sum(fila.values()),
+                'pool_iniciadas': self._iniciadas,
+                'pool_espera_media_seg': round(self._espera_total / self._iniciadas, 2) if self._iniciadas else 0.0,
+                'pool_espera_max_seg': round(self._espera_max, 2),
+                'pool_espera_mais_antiga_seg': round(max(p.espera for p in self._fila), 2) if self._fila else 0.0,
+            }
+            for ferramenta in FERRAMENTAS:
+                valores[f'pool_fila_{ferramenta}'] = fila.get(ferramenta, 0)
+                valores[f'pool_em_execucao_{ferramenta}'] = execucao.get(ferramenta, 0)
+            valores.update(self._estado_grupos(agora))
+            return valores
+
+    def _estado_grupos(self, agora):
+        """Utilização e fila de cada grupo com execuções, fila, histórico ou configuração"""
+        execucao = self._ocupados_por_grupo()
+        fila = collections.Counter(p.grupo for p in self._fila if p.disponivel(agora))
+        espera_antiga = {}
+        for pedido in self._fila:
+            if pedido.disponivel(agora):
+                espera_antiga[pedido.grupo] = max(espera_antiga.get(pedido.grupo, 0.0), pedido.espera)
+
+        valores = {}
+        for grupo in set(execucao) | set(fila) | set(self._iniciadas_grupo) | set(self.grupos):
+            prefixo = f'pool_grupo_{_nome_metrica(grupo)}'
+            limite = self.limite_grupo(grupo) or self.limite_global
+            iniciadas = self._iniciadas_grupo[grupo]
+            valores.update({
+                f'{prefixo}_em_execucao': execucao[grupo],
+                f'{prefixo}_fila': fila[grupo],
+                f'{prefixo}_limite': self.limite_grupo(grupo),
+                f'{prefixo}_peso': self.peso_grupo(grupo),
+                # Fração do limite do grupo (ou do global, sem limite próprio) em uso
+                f'{prefixo}_utilizacao': round(execucao[grupo] / limite, 3) if limite else 0.0,
+                f'{prefixo}_iniciadas': iniciadas,
+                f'{prefixo}_espera_media_seg': round(self._espera_grupo[grupo] / iniciadas, 2) if iniciadas else 0.0,
+                f'{prefixo}_espera_mais_antiga_seg': round(espera_antiga.get(grupo, 0.0), 2),
+            })
+        return valores
+
+    def _publicar(self):
+        if self.metricas is not None:
+            # Chamado com o lock já adquirido; Condition usa RLock
+            self.metricas.atualizar(self.estado())
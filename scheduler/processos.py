@@ -0,0 +1,227 @@
+# Copyright 2025 Thiago Luis de Lima
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+try:
+    import psutil
+except ImportError:  # psutil é opcional
+    psutil = None
+
+HOST = socket.gethostname()
+
+WINDOWS = sys.platform.startswith('win')
+
+# Tempo (segundos) entre o pedido de término e o kill forçado de uma árvore de processos
+PRAZO_ENCERRAMENTO = float(os.getenv("PRAZO_ENCERRAMENTO_SEG", 15))
+
+# Variável de ambiente com o processo (PID:criação) que iniciou a execução; herdada
+# pela árvore toda (shell, .bat e JVM), identifica os processos iniciados pelo PyFlowT3
+VARIAVEL_ORIGEM = "PYFLOWT3_ORIGEM"
+
+
+def processo_vivo(pid):
+    """Indica se existe um processo com o PID informado nesta máquina"""
+    if not pid:
+        return False
+    pid = int(pid)
+
+    if psutil is not None:
+        try:
+            return psutil.Process(pid).status() != psutil.STATUS_ZOMBIE
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            return psutil.pid_exists(pid)
+
+    if WINDOWS:
+        import ctypes
+        PROCESS_QUERY_LIMITED_INFORMATION = 0x1000
+        STILL_ACTIVE = 259
+        kernel32 = ctypes.windll.kernel32
+        handle = kernel32.OpenProcess(PROCESS_QUERY_LIMITED_INFORMATION, False, pid)
+        if not handle:
+            return False
+        try:
+            codigo = ctypes.c_ulong()
+            kernel32.GetExitCodeProcess(handle, ctypes.byref(codigo))
+            return codigo.value == STILL_ACTIVE
+        finally:
+            kernel32.CloseHandle(handle)
+
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def criacao_processo(pid):
+    """Momento de criação (epoch) do processo, para distinguir PIDs reutilizados; None se indisponível"""
+    if psutil is None or not pid:
+        return None
+    try:
+        return psutil.Process(int(pid)).create_time()
+    except (psutil.NoSuchProcess, psutil.AccessDenied):
+        return None
+
+
+def mesmo_processo(pid, criado_em):
+    """
+    Indica se o PID ainda pertence ao processo criado em `criado_em`; sem
+    psutil (ou sem o momento registrado) basta o PID estar vivo.
+    """
+    if not processo_vivo(pid):
+        return False
+    atual = criacao_processo(pid)
+    return criado_em is None or atual is None or abs(atual - criado_em) < 1.0
+
+
+def ambiente_execucao(env=None):
+    """Ambiente de um processo de execução: `env` (ou o do processo atual) com a marca de origem"""
+    ambiente = dict(os.environ if env is None else env)
+    criado_em = criacao_processo(os.getpid())
+    ambiente[VARIAVEL_ORIGEM] = f"{os.getpid()}:{'' if criado_em is None else criado_em}"
+    return ambiente
+
+
+def origem_execucao(ambiente):
+    """(pid, criado_em) de quem iniciou o processo, lidos da marca; None se não foi o PyFlowT3"""
+    pid, _, criado_em = (ambiente.get(VARIAVEL_ORIGEM) or '').partition(':')
+    try:
+        return int(pid), float(criado_em) if criado_em else None
+    except ValueError:
+        return None
+
+
+def opcoes_novo_grupo():
+    """
+    Argumentos do Popen que iniciam o processo em um grupo (Windows) ou sessão
+    (demais sistemas) próprios, para que a árvore inteira possa ser encerrada.
+    """
+    if WINDOWS:
+        return {'creationflags': subprocess.CREATE_NEW_PROCESS_GROUP}
+    return {'start_new_session': True}
+
+
+def _lider_de_grupo(pid):
+    if WINDOWS:
+        return False
+    try:
+        return os.getpgid(pid) == pid
+    except OSError:
+        return False
+
+
+def _sinalizar_grupo(pid, sinal):
+    try:
+        os.killpg(pid, sinal)
+        return True
+    except OSError:
+        return False
+
+
+def _aguardar(condicao, prazo):
+    limite = time.monotonic() + prazo
+    while condicao() and time.monotonic() < limite:
+        time.sleep(0.2)
+    return not condicao()
+
+
+def encerrar_arvore(pid, prazo=None):
+    """
+    Encerra o processo e todos os seus descendentes (shell, .bat e a JVM da
+    ferramenta): pede o término e, se algum ainda estiver vivo após `prazo`
+    segundos, força o kill. Retorna a memória (MB) ocupada pela árvore, ou None
+    se não for possível medir.
+    """
+    prazo = PRAZO_ENCERRAMENTO if prazo is None else prazo
+    grupo = _lider_de_grupo(pid)
+
+    if psutil is not None:
+        try:
+            raiz = psutil.Process(pid)
+            processos = [raiz] + raiz.children(recursive=True)
+        except psutil.NoSuchProcess:
+            processos = []
+        memoria = 0
+        for processo in processos:
+            try:
+                memoria += processo.memory_info().rss
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                pass
+
+        if grupo:
+            _sinalizar_grupo(pid, signal.SIGTERM)
+        for processo in processos:
+            try:
+                processo.terminate()
+            except psutil.NoSuchProcess:
+                pass
+        _, vivos = psutil.wait_procs(processos, timeout=prazo)
+        for processo in vivos:
+            try:
+                processo.kill()
+            except psutil.NoSuchProcess:
+                pass
+        if grupo:
+            # Descendentes que trocaram de pai continuam no grupo da execução
+            _sinalizar_grupo(pid, signal.SIGKILL)
+        return memoria / (1024 * 1024)
+
+    if WINDOWS:
+        resultado = subprocess.run(['taskkill', '/T', '/PID', str(pid)], capture_output=True)
+        # Processos de console ignoram o término gracioso do taskkill
+        if resultado.returncode != 0 or not _aguardar(lambda: processo_vivo(pid), prazo):
+            subprocess.run(['taskkill', '/T', '/F', '/PID', str(pid)], capture_output=True)
+        return None
+
+    if grupo:
+        _sinalizar_grupo(pid, signal.SIGTERM)
+        if not _aguardar(lambda: _sinalizar_grupo(pid, 0), prazo):
+            _sinalizar_grupo(pid, signal.SIGKILL)
+    else:
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except OSError:
+            return None
+        if not _aguardar(lambda: processo_vivo(pid), prazo):
+            try:
+                os.kill(pid, signal.SIGKILL)
+            except OSError:
+                pass
+    return None
+
+
+class LimiteTempo:
+    """Encerra a árvore de um processo se ele ultrapassar o tempo limite"""
+
+    def __init__(self, pid, timeout):
+        self.expirou = False
+        self._timer = threading.Timer(timeout, self._expirar, args=(pid,))
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _expirar(self, pid):
+        self.expirou = True
+        encerrar_arvore(pid)
+
+    def cancelar(self):
+        self._timer.cancel()
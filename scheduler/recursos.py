@@ -0,0 +1,233 @@
+# Copyright 2025 Thiago Luis de Lima
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import logging
+import os
+import sys
+import threading
+import time
+
+from .processos import psutil
+
+logger = logging.getLogger(__name__)
+
+# Heap (MB) assumido para execuções Java sem memoria_mb configurada
+HEAP_PADRAO_MB = int(os.getenv("HEAP_PADRAO_MB", 2048))
+
+# Memória (MB) que deve continuar livre após iniciar uma execução
+MEMORIA_RESERVA_MB = int(os.getenv("MEMORIA_RESERVA_MB", 512))
+
+# Uso de CPU (%) acima do qual novas execuções aguardam
+CPU_MAX_PERCENT = float(os.getenv("CPU_MAX_PERCENT", 90))
+
+# Tempo (segundos) em que a memória de uma execução recém-iniciada é considerada
+# reservada, já que a JVM ainda não alocou o heap
+AQUECIMENTO_SEG = float(os.getenv("JVM_AQUECIMENTO_SEG", 60))
+
+# Intervalo (segundos) entre verificações de uma execução fora do serviço que aguarda recursos
+INTERVALO_ADMISSAO = float(os.getenv("INTERVALO_ADMISSAO_SEG", 5))
+
+FERRAMENTAS_JVM = ('PENTAHO', 'APACHE_HOP')
+
+
+def memoria_da_regra(regra):
+    """Memória (MB) que a execução deve precisar; 0 se desconhecida"""
+    if getattr(regra, 'memoria_mb', None):
+        return regra.memoria_mb
+    if (regra.ferramenta_etl or '').upper() in FERRAMENTAS_JVM:
+        return HEAP_PADRAO_MB
+    return 0
+
+
+def opcoes_heap_java(memoria_mb):
+    """Opções de heap da JVM: -Xmx conforme a memória do agendamento, -Xms até 1 GB"""
+    memoria_mb = memoria_mb or HEAP_PADRAO_MB
+    return f"-Xms{min(1024, memoria_mb)}m -Xmx{memoria_mb}m"
+
+
+def memoria_livre_mb():
+    """Memória física disponível em MB, ou None se não for possível medir"""
+    if psutil is not None:
+        return psutil.virtual_memory().available / (1024 * 1024)
+
+    if sys.platform.startswith('win'):
+        import ctypes
+
+        class MEMORYSTATUSEX(ctypes.Structure):
+            _fields_ = [
+                ("dwLength", ctypes.c_ulong),
+                ("dwMemoryLoad", ctypes.c_ulong),
+                ("ullTotalPhys", ctypes.c_ulonglong),
+                ("ullAvailPhys", ctypes.c_ulonglong),
+                ("ullTotalPageFile", ctypes.c_ulonglong),
+                ("ullAvailPageFile", ctypes.c_ulonglong),
+                ("ullTotalVirtual", ctypes.c_ulonglong),
+                ("ullAvailVirtual", ctypes.c_ulonglong),
+                ("sullAvailExtendedVirtual", ctypes.c_ulonglong),
+            ]
+
+        estado = MEMORYSTATUSEX()
+        estado.dwLength = ctypes.sizeof(MEMORYSTATUSEX)
+        if ctypes.windll.kernel32.GlobalMemoryStatusEx(ctypes.byref(estado)):
+            return estado.ullAvailPhys / (1024 * 1024)
+        return None
+
+    try:
+        with open('/proc/meminfo', encoding='utf-8') as meminfo:
+            for linha in meminfo:
+                if linha.startswith('MemAvailable:'):
+                    return int(linha.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def motivo_adiamento(regra, livre, uso_cpu, reservado_mb=lambda: 0):
+    """
+    None se `regra` pode iniciar com `livre` MB de memória e `uso_cpu` % de CPU, ou
+    (recurso, descrição) do que falta; `reservado_mb()` é a memória já prometida a
+    execuções que ainda não a alocaram
+    """
+    necessaria = memoria_da_regra(regra)
+    if necessaria and livre is not None:
+        disponivel = livre - reservado_mb()
+        if disponivel - necessaria < MEMORIA_RESERVA_MB:
+            return ('memoria', f"memória insuficiente: {disponivel:.0f} MB disponíveis, "
+                               f"{necessaria} MB necessários + {MEMORIA_RESERVA_MB} MB de reserva")
+
+    if uso_cpu is not None and uso_cpu > CPU_MAX_PERCENT:
+        return ('cpu', f"CPU em {uso_cpu:.0f}% (limite {CPU_MAX_PERCENT:.0f}%)")
+
+    return None
+
+
+class MedidorCpu:
+    """Uso de CPU (%) amostrado no máximo uma vez por segundo"""
+
+    def __init__(self):
+        self._valor = None
+        self._medido_em = 0.0
+        if psutil is not None:
+            psutil.cpu_percent(interval=None)  # primeira leitura só inicializa o contador
+
+    def uso(self):
+        agora = time.monotonic()
+        if agora - self._medido_em >= 1.0:
+            self._medido_em = agora
+            if psutil is not None:
+                self._valor = psutil.cpu_percent(interval=None)
+            elif hasattr(os, 'getloadavg'):
+                self._valor = min(os.getloadavg()[0] / (os.cpu_count() or 1) * 100, 100.0)
+            else:
+                self._valor = None
+        return self._valor
+
+
+class ControleAdmissao:
+    """
+    Segura execuções enquanto o servidor não tem memória ou CPU para elas,
+    em vez de deixar o sistema entrar em swap ou matar uma JVM por falta de memória.
+    """
+
+    def __init__(self, metricas=None):
+        self.metricas = metricas
+        self.cpu = MedidorCpu()
+        self._adiadas = 0
+
+    def _reservado_mb(self, em_execucao):
+        """Memória de execuções recém-iniciadas que ainda não aparece como usada"""
+        agora = time.monotonic()
+        return sum(
+            memoria_da_regra(p.regra) for p in em_execucao
+            if p.iniciado_em is not None and agora - p.iniciado_em < AQUECIMENTO_SEG
+        )
+
+    def avaliar(self, pedido, em_execucao, livre, uso_cpu):
+        """Retorna None se a execução pode iniciar, ou o motivo do adiamento"""
+        return motivo_adiamento(pedido.regra, livre, uso_cpu, lambda: self._reservado_mb(em_execucao))
+
+    def admitir(self, pedido, em_execucao):
+        """True se a execução pode iniciar agora; registra e conta os adiamentos"""
+        livre, uso_cpu = memoria_livre_mb(), self.cpu.uso()
+        motivo = self.avaliar(pedido, em_execucao, livre, uso_cpu)
+
+        if motivo is not None and not em_execucao:
+            # Nada em execução para liberar recursos: aguardar não resolveria
+            logger.warning(f"Iniciando {pedido.regra.arquivo} apesar de {motivo[1]} (nenhuma execução ativa)")
+            motivo = None
+
+        # O motivo do adiamento fica no próprio pedido, para registrar só as mudanças
+        anterior = pedido.adiamento
+        if motivo is None:
+            if anterior is not None:
+                self.esquecer(pedido)
+                logger.info(f"Recursos liberados, iniciando: {pedido.regra.arquivo}")
+            self._publicar(livre, uso_cpu)
+            return True
+
+        if anterior != motivo[0]:
+            if anterior is None:
+                self._adiadas += 1
+            pedido.adiamento = motivo[0]
+            logger.warning(f"Execução adiada ({motivo[1]}): {pedido.regra.arquivo}")
+            if self.metricas is not None:
+                self.metricas.incrementar('admissao_adiamentos')
+                self.metricas.incrementar(f'admissao_adiamentos_{motivo[0]}')
+        self._publicar(livre, uso_cpu)
+        return False
+
+    def esquecer(self, pedido):
+        if pedido.adiamento is not None:
+            pedido.adiamento = None
+            self._adiadas -= 1
+
+    def _publicar(self, livre, uso_cpu):
+        if self.metricas is None:
+            return
+        valores = {'admissao_adiadas_agora': self._adiadas}
+        if livre is not None:
+            valores['memoria_livre_mb'] = round(livre)
+        if uso_cpu is not None:
+            valores['cpu_uso_percent'] = round(uso_cpu, 1)
+        self.metricas.atualizar(valores)
+
+
+def aguardar_recursos(regra, outras_execucoes, descricao=None, parar=None, medidor=None):
+    """
+    Admissão das execuções iniciadas fora do serviço (manual, bot, monitor e
+    reprocessamento), com os critérios do ControleAdmissao: aguarda enquanto faltar
+    memória ou CPU e houver outras execuções na máquina que possam liberá-los.
+
+    `outras_execucoes()` conta as execuções em andamento na máquina, sem esta.
+    Retorna True para iniciar, ou False se `parar` for sinalizado durante a espera.
+    """
+    descricao = descricao or regra.arquivo
+    parar = parar or threading.Event()
+    medidor = medidor or MedidorCpu()
+    anterior = None
+    while True:
+        motivo = motivo_adiamento(regra, memoria_livre_mb(), medidor.uso())
+        if motivo is not None and not outras_execucoes():
+            # Nada em execução para liberar recursos: aguardar não resolveria
+            logger.warning(f"Iniciando {descricao} apesar de {motivo[1]} (nenhuma outra execução ativa)")
+            motivo = None
+        if motivo is None:
+            if anterior is not None:
+                logger.info(f"Recursos liberados, iniciando: {descricao}")
+            return True
+        if motivo[0] != anterior:
+            logger.warning(f"Execução adiada ({motivo[1]}): {descricao}")
+            anterior = motivo[0]
+        if parar.wait(INTERVALO_ADMISSAO):
+            return False
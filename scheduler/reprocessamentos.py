@@ -0,0 +1,180 @@
+# Copyright 2025 Thiago Luis de Lima
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import datetime
+
+from .db import conectar
+from .execucoes import FORMATO_DATA
+
+# Reprocessamento de um período: uma partição (execução) por data, cada uma
+# gravada antes e depois de executar, para que um reprocessamento interrompido
+# possa ser retomado executando só as partições que não terminaram com sucesso.
+ESTADO_EM_ANDAMENTO = 'em_andamento'
+ESTADO_CONCLUIDO = 'concluido'
+ESTADO_INCOMPLETO = 'incompleto'  # terminou ou foi interrompido com partições sem sucesso
+
+PARTICAO_PENDENTE = 'pendente'
+PARTICAO_EXECUTANDO = 'executando'
+PARTICAO_SUCESSO = 'sucesso'
+PARTICAO_FALHA = 'falha'
+
+FORMATO_DIA = "%Y-%m-%d"
+
+
+def _agora():
+    return datetime.datetime.now().strftime(FORMATO_DATA)
+
+
+def datas_do_periodo(inicio, fim):
+    """Datas de `inicio` a `fim` (inclusive), em ordem cronológica"""
+    return [inicio + datetime.timedelta(days=n) for n in range((fim - inicio).days + 1)]
+
+
+def criar_reprocessamento(db_path, id_agendamento, inicio, fim, parametro, formato, paralelo):
+    """Registra o reprocessamento e uma partição pendente por data; retorna o id"""
+    conn = conectar(db_path)
+    try:
+        cursor = conn.execute(
+            """
+            INSERT INTO reprocessamentos
+                (id_agendamento, data_inicio, data_fim, parametro, formato, paralelo, estado, criado_em)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            (id_agendamento, inicio.strftime(FORMATO_DIA), fim.strftime(FORMATO_DIA), parametro, formato,
+             paralelo, ESTADO_EM_ANDAMENTO, _agora())
+        )
+        id_reprocessamento = cursor.lastrowid
+        conn.executemany(
+            "INSERT INTO reprocessamento_particoes (id_reprocessamento, data, estado) VALUES (?, ?, ?)",
+            [(id_reprocessamento, data.strftime(FORMATO_DIA), PARTICAO_PENDENTE)
+             for data in datas_do_periodo(inicio, fim)]
+        )
+        conn.commit()
+        return id_reprocessamento
+    finally:
+        conn.close()
+
+
+def ler_reprocessamento(db_path, id_reprocessamento):
+    """(id_agendamento, data_inicio, data_fim, parametro, formato, paralelo, estado), ou None"""
+    conn = conectar(db_path)
+    try:
+        return conn.execute(
+            """
+            SELECT id_agendamento, data_inicio, data_fim, parametro, formato, paralelo, estado
+            FROM reprocessamentos WHERE id = ?
+            """,
+            (id_reprocessamento,)
+        ).fetchone()
+    finally:
+        conn.close()
+
+
+def retomar_reprocessamento(db_path, id_reprocessamento):
+    """
+    Prepara a retomada: partições interrompidas ou com falha voltam a pendentes.
+    Retorna as datas a executar, em ordem cronológica.
+    """
+    conn = conectar(db_path)
+    try:
+        conn.execute(
+            "UPDATE reprocessamento_particoes SET estado = ? WHERE id_reprocessamento = ? AND estado IN (?, ?)",
+            (PARTICAO_PENDENTE, id_reprocessamento, PARTICAO_EXECUTANDO, PARTICAO_FALHA)
+        )
+        conn.execute(
+            "UPDATE reprocessamentos SET estado = ?, finalizado_em = NULL WHERE id = ?",
+            (ESTADO_EM_ANDAMENTO, id_reprocessamento)
+        )
+        conn.commit()
+        return [
+            datetime.datetime.strptime(data, FORMATO_DIA).date() for (data,) in conn.execute(
+                "SELECT data FROM reprocessamento_particoes WHERE id_reprocessamento = ? AND estado = ? ORDER BY data",
+                (id_reprocessamento, PARTICAO_PENDENTE)
+            )
+        ]
+    finally:
+        conn.close()
+
+
+def registrar_inicio_particao(db_path, id_reprocessamento, data):
+    conn = conectar(db_path)
+    try:
+        conn.execute(
+            """
+            UPDATE reprocessamento_particoes
+            SET estado = ?, tentativas = tentativas + 1, iniciado_em = ?, finalizado_em = NULL, duracao_seg = NULL
+            WHERE id_reprocessamento = ? AND data = ?
+            """,
+            (PARTICAO_EXECUTANDO, _agora(), id_reprocessamento, data.strftime(FORMATO_DIA))
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def registrar_fim_particao(db_path, id_reprocessamento, data, sucesso, duracao_seg):
+    conn = conectar(db_path)
+    try:
+        conn.execute(
+            """
+            UPDATE reprocessamento_particoes SET estado = ?, finalizado_em = ?, duracao_seg = ?
+            WHERE id_reprocessamento = ? AND data = ?
+            """,
+            (PARTICAO_SUCESSO if sucesso else PARTICAO_FALHA, _agora(), round(duracao_seg, 3),
+             id_reprocessamento, data.strftime(FORMATO_DIA))
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def finalizar_reprocessamento(db_path, id_reprocessamento):
+    """Fecha o reprocessamento conforme as partições e retorna a contagem por estado"""
+    conn = conectar(db_path)
+    try:
+        contagem = dict(conn.execute(
+            "SELECT estado, COUNT(*) FROM reprocessamento_particoes WHERE id_reprocessamento = ? GROUP BY estado",
+            (id_reprocessamento,)
+        ).fetchall())
+        pendentes = sum(n for estado, n in contagem.items() if estado != PARTICAO_SUCESSO)
+        conn.execute(
+            "UPDATE reprocessamentos SET estado = ?, finalizado_em = ? WHERE id = ?",
+            (ESTADO_INCOMPLETO if pendentes else ESTADO_CONCLUIDO, _agora(), id_reprocessamento)
+        )
+        conn.commit()
+        return contagem
+    finally:
+        conn.close()
+
+
+def listar_reprocessamentos(db_path, limite=20):
+    """
+    Reprocessamentos mais recentes com o progresso:
+    (id, arquivo, data_inicio, data_fim, estado, total, sucesso, falha)
+    """
+    conn = conectar(db_path)
+    try:
+        return conn.execute(
+            """
+            SELECT r.id, a.arquivo, r.data_inicio, r.data_fim, r.estado, COUNT(p.data),
+                   SUM(p.estado = ?), SUM(p.estado = ?)
+            FROM reprocessamentos r
+            LEFT JOIN agendamentos a ON a.id = r.id_agendamento
+            LEFT JOIN reprocessamento_particoes p ON p.id_reprocessamento = r.id
+            GROUP BY r.id ORDER BY r.id DESC LIMIT ?
+            """,
+            (PARTICAO_SUCESSO, PARTICAO_FALHA, limite)
+        ).fetchall()
+    finally:
+        conn.close()
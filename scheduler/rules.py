@@ -0,0 +1,359 @@
+# Copyright 2025 Thiago Luis de Lima
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import datetime
+import logging
+import os
+import random
+import unicodedata
+import zlib
+
+from .atributos import AtributosProcesso
+from .calendarios import Calendario, FiltroCalendario, obter_calendario
+from .cron import Agenda, AgendaSegundos, TermoAgenda, compilar_cron
+
+logger = logging.getLogger(__name__)
+
+# Colunas lidas da tabela agendamentos por compilar_regra (a regra lê cada campo pelo nome)
+COLUNAS_REGRA = (
+    "id", "arquivo", "projeto", "local_run", "ferramenta_etl", "timeout_execucao",
+    "horario", "intervalo", "dias_semana", "dias_mes", "hora_inicio", "hora_fim",
+    "politica_sobreposicao", "max_paralelo", "prioridade", "memoria_mb",
+    "max_tentativas", "retry_atraso_seg", "retry_fator", "retry_jitter", "cron",
+    "escalonar_seg", "calendario", "dia_util", "politica_perdidos", "max_perdidos",
+    "intervalo_seg", "modo_intervalo", "disjuntor_falhas", "disjuntor_sonda_seg",
+    "timeout_fator", "timeout_piso_seg", "grupo_recurso",
+    "cpu_afinidade", "nice", "io_classe", "io_prioridade", "limite_memoria_mb",
+)
+
+# Ids dos agendamentos dos quais este depende, lidos após COLUNAS_REGRA
+CONSULTA_DEPENDENCIAS = (
+    "(SELECT group_concat(d.id_dependencia) FROM dependencias_agendamento d "
+    "WHERE d.id_agendamento = agendamentos.id)"
+)
+
+# Políticas para um disparo que chega enquanto a execução anterior ainda roda
+POLITICA_PULAR = 'PULAR'            # descarta o novo disparo
+POLITICA_ENFILEIRAR = 'ENFILEIRAR'  # mantém um único disparo aguardando
+POLITICA_PARALELO = 'PARALELO'      # permite até max_paralelo execuções simultâneas
+POLITICAS = (POLITICA_PULAR, POLITICA_ENFILEIRAR, POLITICA_PARALELO)
+
+# Políticas para disparos perdidos enquanto o serviço estava parado
+PERDIDOS_PULAR = 'PULAR'      # ignora os disparos perdidos
+PERDIDOS_UMA_VEZ = 'UMA_VEZ'  # executa uma vez, pelo disparo perdido mais recente
+PERDIDOS_TODOS = 'TODOS'      # executa cada disparo perdido, até max_perdidos
+POLITICAS_PERDIDOS = (PERDIDOS_PULAR, PERDIDOS_UMA_VEZ, PERDIDOS_TODOS)
+
+# Modos do intervalo em segundos
+INTERVALO_FIXO = 'FIXO'                  # disparos alinhados ao relógio, a cada N segundos
+INTERVALO_APOS_TERMINO = 'APOS_TERMINO'  # próximo início N segundos após o fim da execução anterior
+MODOS_INTERVALO = (INTERVALO_FIXO, INTERVALO_APOS_TERMINO)
+
+DIAS_SEMANA_INDICE = {
+    'seg': 0, 'ter': 1, 'qua': 2, 'qui': 3, 'sex': 4, 'sab': 5, 'dom': 6
+}
+
+# Maior atraso (segundos) entre tentativas, qualquer que seja o fator de backoff
+RETRY_ATRASO_MAX = int(os.getenv("RETRY_ATRASO_MAX_SEG", 3600))
+
+
+def _inteiro(valor, padrao):
+    try:
+        return int(valor) if valor is not None and str(valor).strip() != '' else padrao
+    except (TypeError, ValueError):
+        return padrao
+
+
+def _decimal(valor, padrao):
+    try:
+        return float(str(valor).replace(',', '.')) if valor is not None and str(valor).strip() != '' else padrao
+    except (TypeError, ValueError):
+        return padrao
+
+
+def _normalizar_dia(texto):
+    """Remove acentuação e espaços de um dia da semana ('Sáb' -> 'sab')"""
+    texto = unicodedata.normalize('NFD', texto.strip().lower())
+    return ''.join(c for c in texto if not unicodedata.combining(c))[:3]
+
+
+def _hora_para_minutos(valor):
+    """Converte 'HH:MM' em minutos desde a meia-noite; retorna None se inválido"""
+    if not valor or not str(valor).strip():
+        return None
+    horas, _, minutos = str(valor).strip().partition(':')
+    try:
+        horas, minutos = int(horas), int(minutos)
+    except ValueError:
+        return None
+    if not (0 <= horas <= 23 and 0 <= minutos <= 59):
+        return None
+    return horas * 60 + minutos
+
+
+def _minutos_do_dia(horario, intervalo, hora_inicio, hora_fim):
+    """
+    Calcula os minutos do dia em que o agendamento dispara, seguindo as mesmas
+    regras que eram avaliadas a cada minuto pelo serviço:
+
+    - horário fixo tem precedência e só vale dentro da janela, se houver janela;
+    - janela com intervalo conta o intervalo a partir da hora de início;
+    - janela sem intervalo (e sem horário fixo) nunca dispara;
+    - intervalo sem janela usa o minuto da hora (minuto % intervalo == 0);
+    - sem horário, janela e intervalo, dispara em todos os minutos.
+    """
+    inicio = _hora_para_minutos(hora_inicio)
+    fim = _hora_para_minutos(hora_fim)
+    tem_janela = bool(hora_inicio and hora_fim)
+
+    if horario and str(horario).strip():
+        minuto = _hora_para_minutos(horario)
+        if minuto is None:
+            logger.warning(f"Horário fixo inválido ignorado: {horario!r}")
+            return ()
+        if tem_janela and (inicio is None or fim is None or not inicio <= minuto <= fim):
+            return ()
+        return (minuto,)
+
+    if tem_janela:
+        if inicio is None or fim is None or intervalo <= 0:
+            return ()
+        return tuple(range(inicio, fim + 1, intervalo))
+
+    if intervalo > 0:
+        return tuple(m for m in range(24 * 60) if (m % 60) % intervalo == 0)
+
+    return tuple(range(24 * 60))
+
+
+def deslocamento_inicio(id_agendamento, janela, agenda=None):
+    """
+    Atraso (segundos) do início dentro da janela de escalonamento: derivado do
+    id, é o mesmo a cada disparo e espalha agendamentos que vencem no mesmo minuto.
+    Com `agenda`, a janela não passa do intervalo entre disparos, para que o
+    início atrasado não alcance o disparo seguinte.
+    """
+    janela = _inteiro(janela, 0)
+    if agenda:
+        janela = min(janela, int(agenda.menor_intervalo() * 60))
+    if janela <= 0:
+        return 0
+    return zlib.crc32(str(id_agendamento).encode()) % janela
+
+
+def normalizar_politica(politica, max_paralelo):
+    """Retorna (politica, limite de execuções simultâneas) com valores válidos"""
+    politica = (politica or POLITICA_PULAR).strip().upper()
+    if politica not in POLITICAS:
+        politica = POLITICA_PULAR
+    limite = 1
+    if politica == POLITICA_PARALELO:
+        try:
+            limite = max(int(max_paralelo or 1), 1)
+        except (TypeError, ValueError):
+            limite = 1
+    return politica, limite
+
+
+def filtro_calendario(calendario, dia_util):
+    """
+    Filtro de dias do agendamento. Retorna None sem calendário nem dia útil e
+    levanta ValueError se o calendário não existe.
+    """
+    nome = (calendario or '').strip()
+    dia_util = _inteiro(dia_util, 0)
+    if not nome and not dia_util:
+        return None
+    if nome:
+        encontrado = obter_calendario(nome)
+        if encontrado is None:
+            raise ValueError(f"Calendário {nome!r} não encontrado")
+    else:
+        encontrado = Calendario('')  # apenas fins de semana
+    return FiltroCalendario(encontrado, dia_util or None)
+
+
+def _agenda_legada(horario, intervalo, dias_semana, dias_mes, hora_inicio, hora_fim):
+    """Traduz horário/intervalo/janela/dias para a mesma agenda em bits usada pelo cron"""
+    intervalo = int(intervalo) if intervalo and str(intervalo).isdigit() else 0
+    minutos = _minutos_do_dia(horario, intervalo, hora_inicio, hora_fim)
+
+    dias = [_normalizar_dia(d) for d in dias_semana.split(",") if d.strip()] if dias_semana else []
+    semana = {DIAS_SEMANA_INDICE[d] for d in dias if d in DIAS_SEMANA_INDICE} if dias else None
+
+    dias = [d.strip() for d in dias_mes.split(",") if d.strip()] if dias_mes else []
+    mes = {int(d) for d in dias if d.isdigit()} if dias else None
+
+    return Agenda([TermoAgenda.de_minutos(minutos, dias_semana=semana, dias_mes=mes)])
+
+
+def compilar_agenda(cron, horario, intervalo, dias_semana, dias_mes, hora_inicio, hora_fim,
+                    calendario=None, dia_util=None, intervalo_seg=None, apos_termino=False):
+    """
+    Agenda do agendamento: a expressão cron, quando informada, substitui
+    horário, intervalo, janela e filtros de dia. O calendário (feriados e
+    n-ésimo dia útil) vale para as duas formas.
+
+    Com `intervalo_seg`, horário fixo e intervalo em minutos são ignorados e a
+    agenda dispara a cada `intervalo_seg` segundos nos minutos permitidos pela
+    janela, pelos dias ou pelo cron; com `apos_termino` ela apenas indica os
+    minutos em que um novo início é permitido.
+    """
+    intervalo_seg = _inteiro(intervalo_seg, 0)
+    if intervalo_seg > 0:
+        horario, intervalo = None, 1
+
+    try:
+        filtro = filtro_calendario(calendario, dia_util)
+    except ValueError as e:
+        logger.warning(f"{e}; agendamento não será disparado")
+        return Agenda()
+
+    if cron and str(cron).strip():
+        try:
+            agenda = compilar_cron(str(cron))
+        except ValueError as e:
+            logger.warning(f"Expressão cron inválida ignorada: {e}")
+            return Agenda()
+    else:
+        agenda = _agenda_legada(horario, intervalo, dias_semana, dias_mes, hora_inicio, hora_fim)
+    agenda.filtro = filtro
+    if intervalo_seg > 0 and not apos_termino:
+        return AgendaSegundos(agenda, intervalo_seg)
+    return agenda
+
+
+def normalizar_perdidos(politica, maximo):
+    """Retorna (politica, quantidade máxima de disparos recuperados) com valores válidos"""
+    politica = (politica or PERDIDOS_PULAR).strip().upper().replace(' ', '_')
+    if politica not in POLITICAS_PERDIDOS:
+        politica = PERDIDOS_PULAR
+    if politica == PERDIDOS_PULAR:
+        return politica, 0
+    if politica == PERDIDOS_UMA_VEZ:
+        return politica, 1
+    return politica, max(_inteiro(maximo, 1), 1)
+
+
+def normalizar_intervalo(intervalo_seg, modo):
+    """Retorna (intervalo em segundos, True se o intervalo conta a partir do fim da execução)"""
+    intervalo_seg = max(_inteiro(intervalo_seg, 0), 0)
+    modo = (modo or INTERVALO_FIXO).strip().upper().replace(' ', '_')
+    return intervalo_seg, bool(intervalo_seg) and modo == INTERVALO_APOS_TERMINO
+
+
+class RegraAgendamento:
+    """Agendamento compilado: sabe se deve disparar e quando é o próximo disparo"""
+
+    __slots__ = (
+        "id", "arquivo", "projeto", "local_run", "ferramenta_etl", "timeout",
+        "cron", "agenda", "politica_sobreposicao", "max_paralelo", "prioridade", "memoria_mb",
+        "max_tentativas", "retry_atraso", "retry_fator", "retry_jitter", "dependencias", "deslocamento",
+        "politica_perdidos", "max_perdidos", "intervalo_seg", "apos_termino",
+        "disjuntor_falhas", "disjuntor_sonda", "timeout_fator", "timeout_piso", "grupo_recurso", "atributos",
+        "limite_memoria_mb", "linha",
+    )
+
+    def __init__(self, linha):
+        if len(linha) != len(COLUNAS_REGRA) + 1:
+            raise ValueError(f"Linha de agendamento com {len(linha)} colunas; esperadas {len(COLUNAS_REGRA) + 1}")
+        # Campos lidos pelo nome: a ordem das colunas só precisa coincidir com a consulta
+        campos = dict(zip(COLUNAS_REGRA, linha))
+        dependencias = linha[-1]
+
+        self.id = campos['id']
+        self.arquivo = campos['arquivo']
+        self.projeto = campos['projeto']
+        self.local_run = campos['local_run']
+        self.linha = tuple(linha)
+        self.ferramenta_etl = campos['ferramenta_etl'] or ''
+        self.timeout = int(campos['timeout_execucao'] or 1800)
+        # Timeout adaptativo: p99 das durações × fator (0 = desativado), com piso e teto no timeout fixo
+        self.timeout_fator = max(_decimal(campos['timeout_fator'], 0.0), 0.0)
+        self.timeout_piso = max(_inteiro(campos['timeout_piso_seg'], 60), 1)
+        self.politica_sobreposicao, self.max_paralelo = normalizar_politica(
+            campos['politica_sobreposicao'], campos['max_paralelo']
+        )
+        self.prioridade = int(campos['prioridade'] or 0)
+        self.memoria_mb = int(campos['memoria_mb']) if campos['memoria_mb'] else None
+        self.max_tentativas = max(_inteiro(campos['max_tentativas'], 1), 1)
+        self.retry_atraso = max(_inteiro(campos['retry_atraso_seg'], 60), 0)
+        self.retry_fator = max(_decimal(campos['retry_fator'], 2.0), 1.0)
+        self.retry_jitter = min(max(_decimal(campos['retry_jitter'], 0.1), 0.0), 1.0)
+        self.politica_perdidos, self.max_perdidos = normalizar_perdidos(
+            campos['politica_perdidos'], campos['max_perdidos']
+        )
+        self.intervalo_seg, self.apos_termino = normalizar_intervalo(campos['intervalo_seg'], campos['modo_intervalo'])
+        # Disjuntor: 0 falhas = desativado; sonda 0 = suspenso até ser religado manualmente
+        self.disjuntor_falhas = max(_inteiro(campos['disjuntor_falhas'], 0), 0)
+        self.disjuntor_sonda = max(_inteiro(campos['disjuntor_sonda_seg'], 1800), 0)
+        # Grupo de recursos para a divisão dos slots do pool; vazio = o projeto
+        self.grupo_recurso = (campos['grupo_recurso'] or '').strip() or None
+        # Afinidade de CPU, nice e prioridade de I/O do processo da ferramenta
+        self.atributos = AtributosProcesso.da_linha(
+            campos['cpu_afinidade'], campos['nice'], campos['io_classe'], campos['io_prioridade']
+        )
+        # Teto de memória da árvore de processos (ferramenta, JVM e filhos); acima dele a execução é encerrada
+        self.limite_memoria_mb = max(_inteiro(campos['limite_memoria_mb'], 0), 0) or None
+        self.dependencias = frozenset(int(d) for d in str(dependencias).split(",") if d.strip()) if dependencias else frozenset()
+
+        self.cron = (campos['cron'] or '').strip() or None
+
+        # Agendamentos com dependências são disparados pelo sucesso delas, não pelo relógio
+        self.agenda = Agenda() if self.dependencias else compilar_agenda(
+            self.cron, campos['horario'], campos['intervalo'], campos['dias_semana'], campos['dias_mes'],
+            campos['hora_inicio'], campos['hora_fim'], campos['calendario'], campos['dia_util'],
+            self.intervalo_seg, self.apos_termino
+        )
+        self.deslocamento = deslocamento_inicio(self.id, campos['escalonar_seg'], self.agenda)
+
+    def __repr__(self):
+        return f"RegraAgendamento(id={self.id}, arquivo={self.arquivo!r})"
+
+    def atraso_retentativa(self, tentativa):
+        """
+        Segundos até a próxima tentativa após a falha da tentativa `tentativa`:
+        backoff exponencial com variação aleatória de ±retry_jitter, para que
+        execuções que falharam juntas não voltem todas no mesmo instante.
+        """
+        atraso = min(self.retry_atraso * self.retry_fator ** (tentativa - 1), RETRY_ATRASO_MAX)
+        return max(atraso * (1 + random.uniform(-self.retry_jitter, self.retry_jitter)), 0.0)
+
+    def cumpre(self, momento):
+        """Indica se o agendamento dispara em `momento` (minuto, ou segundo com intervalo em segundos)"""
+        return self.agenda.cumpre(momento)
+
+    def proxima_execucao(self, apos):
+        """
+        Retorna o primeiro disparo estritamente posterior a `apos`, ou None se
+        o agendamento nunca dispara. Em modo após término este é apenas o
+        primeiro início; os seguintes vêm de proxima_apos_termino.
+        """
+        return self.agenda.proxima_execucao(apos)
+
+    def proxima_apos_termino(self, fim):
+        """
+        Próximo início em modo após término: `intervalo_seg` segundos depois de
+        `fim` ou, se esse momento cair fora da janela/dias, o início do próximo
+        minuto permitido. None se o agendamento não dispara pelo relógio.
+        """
+        quando = fim + datetime.timedelta(seconds=self.intervalo_seg)
+        if self.agenda.cumpre(quando):
+            return quando
+        return self.agenda.proxima_execucao(quando)
+
+
+def compilar_regra(linha):
+    """Compila uma linha da tabela agendamentos (COLUNAS_REGRA seguidas de CONSULTA_DEPENDENCIAS)"""
+    return RegraAgendamento(linha)
@@ -0,0 +1,453 @@
+# Copyright 2025 Thiago Luis de Lima
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import concurrent.futures
+import datetime
+import logging
+import os
+import queue
+import subprocess
+import threading
+import time
+
+from .atributos import aplicar_atributos, opcoes_processo
+from .memoria import INTERVALO_MEMORIA, MOTIVO_MEMORIA, LimiteMemoria
+from .processos import PRAZO_ENCERRAMENTO, WINDOWS, ambiente_execucao, encerrar_arvore, processo_vivo
+
+logger = logging.getLogger(__name__)
+
+# Tamanho máximo (bytes) de uma linha de saída; linhas maiores são descartadas
+LIMITE_LINHA = 1024 * 1024
+
+# Tempo (segundos) que o chamador aguarda o processo ser criado
+TIMEOUT_INICIO = 60
+
+# Intervalo (segundos) entre verificações de processos reanexados, que não são filhos do serviço
+INTERVALO_REANEXADA = 5.0
+
+# Encerramentos de árvores simultâneos. Cada um ocupa uma thread até PRAZO_ENCERRAMENTO
+# esperando a árvore terminar, por isso têm executor próprio: uma rajada de timeouts não
+# atrasa as medições de memória nem as conclusões (ao_terminar), que usam outros executores.
+MAX_ENCERRAMENTOS = int(os.getenv("SUPERVISOR_MAX_ENCERRAMENTOS", 32))
+
+# Threads das medições de memória: cada medição é rápida, mas há uma a cada
+# INTERVALO_MEMORIA segundos por execução com teto
+MAX_MEDICOES = int(os.getenv("SUPERVISOR_MAX_MEDICOES", 4))
+
+
+class Comando:
+    """
+    Linha de comando de uma ferramenta: lista de argumentos ou texto para o
+    shell; `atributos` (AtributosProcesso) define afinidade de CPU e prioridades
+    """
+
+    __slots__ = ("args", "cwd", "env", "shell", "atributos")
+
+    def __init__(self, args, cwd=None, env=None, shell=False, atributos=None):
+        self.args = args
+        self.cwd = cwd
+        self.env = env
+        self.shell = shell
+        self.atributos = atributos
+
+    def __str__(self):
+        return self.args if isinstance(self.args, str) else subprocess.list2cmdline(self.args)
+
+
+def comando_script(script, *argumentos, cwd=None, env=None):
+    """Batch files do Windows precisam do cmd.exe; os demais executáveis são iniciados diretamente"""
+    if WINDOWS and script.lower().endswith(('.bat', '.cmd')):
+        return Comando(subprocess.list2cmdline([script, *argumentos]), cwd=cwd, env=env, shell=True)
+    return Comando([script, *argumentos], cwd=cwd, env=env)
+
+
+class ExecucaoSupervisionada:
+    """
+    Processo de ferramenta acompanhado pelo supervisor. Expõe `pid`,
+    `is_alive()` e `exitcode`, usados pelo PoolExecucao.
+
+    Execuções reanexadas (iniciadas antes de um reinício do serviço) não têm
+    `_processo`: o término é detectado pelo PID e `exitcode` fica None, pois o
+    código de saída de um processo que não é filho não pode ser lido.
+    """
+
+    __slots__ = (
+        "rotulo", "pid", "exitcode", "motivo", "inicio", "fim", "memoria", "_processo", "_timers", "_tarefa",
+        "_encerramentos"
+    )
+
+    def __init__(self, rotulo, processo, pid=None, encerramentos=None):
+        self.rotulo = rotulo
+        self.pid = processo.pid if processo is not None else pid
+        self.exitcode = None
+        self.motivo = None
+        self.inicio = time.monotonic()
+        self.fim = None
+        self.memoria = None  # LimiteMemoria, se a execução tem teto de memória
+        self._processo = processo
+        self._timers = []
+        self._tarefa = None
+        self._encerramentos = encerramentos  # executor dos encerramentos; None = o padrão do event loop
+
+    def __repr__(self):
+        return f"ExecucaoSupervisionada({self.rotulo!r}, pid={self.pid})"
+
+    def is_alive(self):
+        return self.fim is None
+
+    @property
+    def reanexada(self):
+        return self._processo is None
+
+    @property
+    def duracao(self):
+        return (self.fim if self.fim is not None else time.monotonic()) - self.inicio
+
+    @property
+    def interrompida(self):
+        return self.motivo is not None
+
+    def interromper(self, motivo):
+        """
+        Encerra o processo e toda a sua árvore (shell, .bat e JVM), com kill
+        forçado após PRAZO_ENCERRAMENTO; deve ser chamado na thread do supervisor.
+        """
+        if self.exitcode is not None or self.motivo is not None:
+            return
+        self.motivo = motivo
+        logger.warning(f"Interrompendo {self.rotulo} (PID {self.pid}): {motivo}")
+        asyncio.get_running_loop().run_in_executor(self._encerramentos, encerrar_arvore, self.pid)
+
+
+class SupervisorProcessos:
+    """
+    Inicia e acompanha os processos das ferramentas ETL em um único event loop
+    asyncio, sem um interpretador Python por execução.
+
+    A saída de todos os processos é lida concorrentemente e gravada no log
+    diário (`caminho_log()` retorna o arquivo do dia) por uma thread de
+    escrita, em lotes, sem I/O de disco no event loop. Timeouts são timers do
+    event loop, assim como a medição periódica do teto de memória
+    (`limite_memoria_mb`) e o `aviso=(segundos, funcao)` opcional, que chama
+    `funcao(execucao)` uma única vez, em uma thread auxiliar, se a execução
+    ainda estiver ativa após `segundos`. `analisar(execucao, linha)` é chamado a cada linha de saída, na
+    thread do supervisor, e deve ser rápido; `ao_terminar(execucao)` roda em
+    uma thread auxiliar e pode gravar no banco ou notificar. `ao_encerrar()` é
+    chamado logo que uma execução termina, por exemplo para acordar o pool.
+    """
+
+    def __init__(self, caminho_log, metricas=None, ao_encerrar=None):
+        self._caminho_log = caminho_log
+        self.metricas = metricas
+        self._ao_encerrar = ao_encerrar
+        self._loop = None
+        self._thread = None
+        self._ativas = set()
+        self._log = None
+        self._log_path = None
+        self._log_dia = None
+        self._fila_log = queue.SimpleQueue()
+        self._escritor = None
+        self._encerramentos = None
+        self._medicoes = None
+
+        self._iniciadas = 0
+        self._interrompidas = 0
+        self._tempo_inicio_total = 0.0
+
+    # -- ciclo de vida -------------------------------------------------
+
+    def iniciar(self):
+        self._encerramentos = concurrent.futures.ThreadPoolExecutor(
+            max_workers=MAX_ENCERRAMENTOS, thread_name_prefix="SupervisorEncerramento"
+        )
+        self._medicoes = concurrent.futures.ThreadPoolExecutor(
+            max_workers=MAX_MEDICOES, thread_name_prefix="SupervisorMemoria"
+        )
+        self._escritor = threading.Thread(target=self._gravar_logs, name="SupervisorLog", daemon=True)
+        self._escritor.start()
+        self._loop = asyncio.new_event_loop()
+        pronto = threading.Event()
+        self._thread = threading.Thread(
+            target=self._executar_loop, args=(pronto,), name="SupervisorProcessos", daemon=True
+        )
+        self._thread.start()
+        pronto.wait()
+
+    def _executar_loop(self, pronto):
+        asyncio.set_event_loop(self._loop)
+        self._loop.call_soon(pronto.set)
+        try:
+            self._loop.run_forever()
+        finally:
+            self._loop.close()
+            # Sinaliza o fim à thread de escrita, que grava o que restou e fecha o log
+            self._fila_log.put(None)
+            self._escritor.join(timeout=5)
+
+    def parar(self, timeout=PRAZO_ENCERRAMENTO + 5):
+        """Interrompe as execuções ainda ativas e encerra o event loop"""
+        if self._loop is None or not self._loop.is_running():
+            return
+        try:
+            asyncio.run_coroutine_threadsafe(self._interromper_todas(timeout), self._loop).result(timeout + 1)
+        except Exception as e:
+            logger.error(f"Falha ao interromper execuções ativas: {str(e)}")
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=timeout)
+        for executor in (self._encerramentos, self._medicoes):
+            executor.shutdown(wait=False)
+
+    async def _interromper_todas(self, timeout):
+        ativas = list(self._ativas)
+        for execucao in ativas:
+            execucao.interromper("serviço parando")
+        tarefas = [e._tarefa for e in ativas if e._tarefa is not None]
+        if tarefas:
+            await asyncio.wait(tarefas, timeout=timeout)
+
+    # -- execuções -----------------------------------------------------
+
+    def executar(self, comando, timeout=None, rotulo="", analisar=None, ao_terminar=None, aviso=None,
+                 limite_memoria_mb=None, limite_por_processo=False):
+        """
+        Inicia o processo (chamável de qualquer thread) e retorna a ExecucaoSupervisionada.
+        `limite_por_processo` aplica o teto de memória também como rlimit (ver LimiteMemoria).
+        """
+        futuro = asyncio.run_coroutine_threadsafe(
+            self._iniciar(comando, timeout, rotulo, analisar, ao_terminar, aviso, limite_memoria_mb,
+                          limite_por_processo),
+            self._loop
+        )
+        return futuro.result(TIMEOUT_INICIO)
+
+    def reanexar(self, pid, rotulo="", timeout=None, ao_terminar=None, aviso=None):
+        """
+        Volta a acompanhar um processo iniciado antes de um reinício do serviço
+        (chamável de qualquer thread). A saída dele não é mais capturada.
+        """
+        futuro = asyncio.run_coroutine_threadsafe(
+            self._reanexar(pid, rotulo, timeout, ao_terminar, aviso), self._loop
+        )
+        return futuro.result(TIMEOUT_INICIO)
+
+    def ativas(self):
+        return list(self._ativas)
+
+    def interromper(self, execucao, motivo):
+        """Interrompe a execução a partir de qualquer thread"""
+        self._loop.call_soon_threadsafe(execucao.interromper, motivo)
+
+    async def _iniciar(self, comando, timeout, rotulo, analisar, ao_terminar, aviso, limite_memoria_mb,
+                       limite_por_processo):
+        opcoes = dict(
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            cwd=comando.cwd,
+            env=ambiente_execucao(comando.env),
+            limit=LIMITE_LINHA,
+            **opcoes_processo(comando.atributos)
+        )
+        if WINDOWS:
+            opcoes['creationflags'] |= subprocess.CREATE_NO_WINDOW
+        # O teto é preparado antes do processo: no Linux ele entra no cgroup antes do exec
+        memoria = LimiteMemoria(limite_memoria_mb, limite_por_processo) if limite_memoria_mb else None
+        if memoria is not None and memoria.preexec_fn is not None:
+            opcoes['preexec_fn'] = memoria.preexec_fn
+
+        antes = time.perf_counter()
+        if comando.shell:
+            processo = await asyncio.create_subprocess_shell(str(comando), **opcoes)
+        else:
+            processo = await asyncio.create_subprocess_exec(*comando.args, **opcoes)
+        self._iniciadas += 1
+        self._tempo_inicio_total += time.perf_counter() - antes
+        aplicar_atributos(processo.pid, comando.atributos)
+
+        execucao = ExecucaoSupervisionada(rotulo or str(comando), processo, encerramentos=self._encerramentos)
+        if timeout:
+            execucao._timers.append(self._loop.call_later(timeout, execucao.interromper, "timeout"))
+        self._armar_aviso(execucao, aviso)
+        if memoria is not None:
+            memoria.acompanhar(execucao.pid)
+            execucao.memoria = memoria
+            self._loop.call_later(INTERVALO_MEMORIA, self._medir_memoria, execucao)
+        self._ativas.add(execucao)
+        self._publicar()
+        execucao._tarefa = self._loop.create_task(self._acompanhar(execucao, analisar, ao_terminar))
+        return execucao
+
+    async def _reanexar(self, pid, rotulo, timeout, ao_terminar, aviso):
+        execucao = ExecucaoSupervisionada(rotulo or f"PID {pid}", None, pid=pid, encerramentos=self._encerramentos)
+        if timeout is not None:
+            execucao._timers.append(self._loop.call_later(max(timeout, 0), execucao.interromper, "timeout"))
+        self._armar_aviso(execucao, aviso)
+        self._ativas.add(execucao)
+        self._publicar()
+        execucao._tarefa = self._loop.create_task(self._vigiar(execucao, ao_terminar))
+        return execucao
+
+    def _armar_aviso(self, execucao, aviso):
+        if aviso is None:
+            return
+        segundos, funcao = aviso
+        # Cancelado com os demais timers quando a execução termina antes
+        execucao._timers.append(self._loop.call_later(
+            max(segundos, 0), lambda: self._loop.run_in_executor(None, self._concluir, funcao, execucao)
+        ))
+
+    def _medir_memoria(self, execucao):
+        """Mede a árvore fora do event loop; interrompe a execução acima do teto ou agenda a próxima medição"""
+        if execucao.fim is not None or execucao.interrompida:
+            return
+
+        def medir():
+            excedido = execucao.memoria.excedido()
+            self._loop.call_soon_threadsafe(concluir, excedido)
+
+        def concluir(excedido):
+            if excedido:
+                logger.warning(f"{execucao.rotulo} (PID {execucao.pid}) ultrapassou o {execucao.memoria.descricao()}")
+                execucao.interromper(MOTIVO_MEMORIA)
+            elif execucao.fim is None:
+                self._loop.call_later(INTERVALO_MEMORIA, self._medir_memoria, execucao)
+
+        self._loop.run_in_executor(self._medicoes, medir)
+
+    async def _vigiar(self, execucao, ao_terminar):
+        while processo_vivo(execucao.pid):
+            await asyncio.sleep(INTERVALO_REANEXADA)
+        self._encerrar(execucao, 1 if execucao.interrompida else None, ao_terminar)
+
+    async def _acompanhar(self, execucao, analisar, ao_terminar):
+        processo = execucao._processo
+        try:
+            while True:
+                try:
+                    bruto = await processo.stdout.readline()
+                except ValueError:
+                    continue  # linha acima de LIMITE_LINHA: já descartada pelo StreamReader
+                if not bruto:
+                    break
+                linha = bruto.decode('utf-8', errors='replace').rstrip('\r\n')
+                self._escrever_log(f"[PID {execucao.pid}] {linha}\n")
+                if analisar is not None:
+                    try:
+                        analisar(execucao, linha)
+                    except Exception as e:
+                        logger.error(f"Falha ao analisar saída de {execucao.rotulo}: {str(e)}")
+            codigo = await processo.wait()
+        except Exception as e:
+            logger.error(f"Falha ao acompanhar {execucao.rotulo}: {str(e)}")
+            execucao.interromper(f"erro no supervisor: {str(e)}")
+            codigo = await processo.wait()
+
+        if execucao.interrompida:
+            codigo = codigo or 1
+        self._encerrar(execucao, codigo, ao_terminar)
+
+    def _encerrar(self, execucao, codigo, ao_terminar):
+        for timer in execucao._timers:
+            timer.cancel()
+        if execucao.memoria is not None:
+            if not execucao.interrompida and execucao.memoria.encerrada_pelo_kernel():
+                execucao.motivo = MOTIVO_MEMORIA
+                logger.warning(
+                    f"{execucao.rotulo} (PID {execucao.pid}) encerrada pelo kernel: {execucao.memoria.descricao()}"
+                )
+            execucao.memoria.liberar()
+        if execucao.interrompida:
+            self._interrompidas += 1
+        # exitcode antes de fim: quem vê is_alive() falso já encontra o código
+        execucao.exitcode = codigo
+        execucao.fim = time.monotonic()
+        self._ativas.discard(execucao)
+        self._publicar()
+
+        if self._ao_encerrar is not None:
+            try:
+                self._ao_encerrar()
+            except Exception as e:
+                logger.error(f"Falha ao sinalizar término de {execucao.rotulo}: {str(e)}")
+
+        if ao_terminar is not None:
+            # Gravação no banco e notificações não podem bloquear o event loop
+            self._loop.run_in_executor(None, self._concluir, ao_terminar, execucao)
+
+    @staticmethod
+    def _concluir(ao_terminar, execucao):
+        try:
+            ao_terminar(execucao)
+        except Exception as e:
+            logger.error(f"Falha ao concluir {execucao.rotulo}: {str(e)}")
+
+    # -- log diário ----------------------------------------------------
+
+    def _escrever_log(self, texto):
+        """Chamado no event loop: só enfileira a linha para a thread de escrita"""
+        self._fila_log.put(texto)
+
+    def _gravar_logs(self):
+        """Thread de escrita: grava de uma vez as linhas acumuladas, com um flush por lote, até receber None"""
+        while True:
+            lote = [self._fila_log.get()]
+            try:
+                while True:
+                    lote.append(self._fila_log.get_nowait())
+            except queue.Empty:
+                pass
+            textos = [texto for texto in lote if texto is not None]
+            if textos:
+                self._gravar_lote(textos)
+            if len(textos) < len(lote):
+                break
+        self._fechar_log()
+
+    def _gravar_lote(self, textos):
+        try:
+            hoje = datetime.date.today()
+            if hoje != self._log_dia:
+                # O caminho do log só é recalculado quando o dia muda (rotação diária)
+                caminho = self._caminho_log()
+                if caminho != self._log_path:
+                    self._fechar_log()
+                    self._log = open(caminho, "a", encoding='utf-8')
+                    self._log_path = caminho
+                self._log_dia = hoje
+            self._log.write(''.join(textos))
+            self._log.flush()
+        except Exception as e:
+            logger.error(f"Erro ao escrever no log: {str(e)}")
+
+    def _fechar_log(self):
+        if self._log is not None:
+            self._log.close()
+            self._log = None
+            self._log_path = None
+            self._log_dia = None
+
+    # -- métricas ------------------------------------------------------
+
+    def _publicar(self):
+        if self.metricas is None:
+            return
+        self.metricas.atualizar({
+            'supervisor_em_execucao': len(self._ativas),
+            'supervisor_iniciadas': self._iniciadas,
+            'supervisor_interrompidas': self._interrompidas,
+            'supervisor_inicio_medio_ms': round(self._tempo_inicio_total / self._iniciadas * 1000, 2)
+            if self._iniciadas else 0.0,
+        })
@@ -0,0 +1,147 @@
+# Copyright 2025 Thiago Luis de Lima
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import datetime
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Quantos minutos perdidos são avaliados com atraso; acima disso são descartados
+MAX_MINUTOS_RECUPERACAO = int(os.getenv("MAX_MINUTOS_RECUPERACAO", 10))
+
+# Atraso (segundos) após a virada do minuto a partir do qual o tick conta como atrasado
+TOLERANCIA_ATRASO = float(os.getenv("TOLERANCIA_ATRASO_TICK", 5))
+
+
+def inicio_do_minuto(momento):
+    return momento.replace(second=0, microsecond=0)
+
+
+class RelogioMinutos:
+    """
+    Fonte de ticks alinhada à virada de cada minuto.
+
+    A espera é feita contra o relógio monotônico (imune a ajustes do relógio de
+    parede durante o sono), e cada tick devolve todos os minutos que passaram
+    desde o último tick, para que minutos perdidos por atraso do loop sejam
+    avaliados com atraso em vez de ignorados.
+
+    A espera também termina antes da virada no prazo informado a `proximo_tick`
+    (disparos em segundos) ou quando `acordar()` é chamado; quem sinaliza
+    `stop_event` deve chamar `acordar()` para interromper a espera.
+    """
+
+    def __init__(self, stop_event, agora=datetime.datetime.now, monotonic=time.monotonic):
+        self.stop_event = stop_event
+        self._sinal = threading.Event()
+        self._agora = agora
+        self._monotonic = monotonic
+        self.ultimo_minuto = None
+        self.ticks = 0
+        self.ticks_atrasados = 0
+        self.minutos_recuperados = 0
+        self.minutos_descartados = 0
+
+    def acordar(self):
+        """Interrompe a espera em andamento (por exemplo, quando um disparo mais próximo foi armado)"""
+        self._sinal.set()
+
+    def _esperar_virada(self, ate=None):
+        """
+        Dorme até a próxima virada de minuto ou até `ate` (relógio de parede), o
+        que vier primeiro. Retorna True na virada, False se acordou antes dela
+        e None se o serviço foi parado.
+        """
+        agora = self._agora()
+        falta = 60.0 - (agora.second + agora.microsecond / 1_000_000)
+        if ate is not None:
+            falta = min(falta, (ate - agora).total_seconds())
+        prazo = self._monotonic() + falta
+
+        while not self.stop_event.is_set():
+            restante = prazo - self._monotonic()
+            if restante <= 0:
+                # O relógio de parede pode estar levemente atrás do monotônico;
+                # se voltou para antes do último minuto (horário de verão, NTP),
+                # proximo_tick reposiciona a referência em vez de esperar alcançá-lo
+                agora = self._agora()
+                if inicio_do_minuto(agora) != self.ultimo_minuto:
+                    return True
+                if ate is not None and agora >= ate:
+                    return False
+                restante = 0.05
+            if self._sinal.wait(restante):
+                self._sinal.clear()
+                if self.stop_event.is_set():
+                    break
+                return inicio_do_minuto(self._agora()) != self.ultimo_minuto
+        return None
+
+    def proximo_tick(self, ate=None):
+        """
+        Bloqueia até o próximo minuto e retorna a lista de minutos a avaliar,
+        em ordem. O primeiro tick retorna o minuto corrente imediatamente.
+        Retorna lista vazia se acordou antes da virada (em `ate` ou por
+        `acordar()`) e None se o serviço foi parado.
+        """
+        if self.ultimo_minuto is None:
+            self.ultimo_minuto = inicio_do_minuto(self._agora())
+            self.ticks += 1
+            return [self.ultimo_minuto]
+
+        virada = self._esperar_virada(ate)
+        if virada is None:
+            return None
+        if not virada:
+            return []
+
+        agora = self._agora()
+        atual = inicio_do_minuto(agora)
+        self.ticks += 1
+
+        passados = int((atual - self.ultimo_minuto).total_seconds() // 60)
+        if passados > 1 or (agora - atual).total_seconds() > TOLERANCIA_ATRASO:
+            self.ticks_atrasados += 1
+
+        if passados <= 0:
+            # Relógio de parede voltou no tempo: reavalia apenas o minuto corrente
+            logger.warning(f"Relógio do sistema retrocedeu de {self.ultimo_minuto:%H:%M} para {atual:%H:%M}")
+            self.ultimo_minuto = atual
+            return [atual]
+
+        minutos = [self.ultimo_minuto + datetime.timedelta(minutes=i) for i in range(1, passados + 1)]
+        if len(minutos) > 1:
+            descartados = max(len(minutos) - 1 - MAX_MINUTOS_RECUPERACAO, 0)
+            recuperados = len(minutos) - 1 - descartados
+            self.minutos_recuperados += recuperados
+            self.minutos_descartados += descartados
+            if descartados:
+                logger.warning(f"{descartados} minuto(s) descartado(s) entre {self.ultimo_minuto:%H:%M} e {atual:%H:%M}")
+                minutos = minutos[-(recuperados + 1):]
+            if recuperados:
+                logger.warning(f"{recuperados} minuto(s) perdido(s) serão avaliados com atraso")
+
+        self.ultimo_minuto = atual
+        return minutos
+
+    def contadores(self):
+        return {
+            'ticks': self.ticks,
+            'ticks_atrasados': self.ticks_atrasados,
+            'minutos_recuperados': self.minutos_recuperados,
+            'minutos_descartados': self.minutos_descartados,
+        }
@@ -0,0 +1,156 @@
+# Copyright 2025 Thiago Luis de Lima
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import datetime
+import os
+import shutil
+import tempfile
+import unittest
+
+from scheduler.cache import CacheAgendamentos
+from scheduler.db import conectar, garantir_esquema
+from scheduler.dependencias import definir_dependencias
+from scheduler.engine import FilaAgendamentos
+from scheduler.rules import compilar_regra
+
+AGORA = datetime.datetime(2030, 1, 7, 8, 0)
+
+
+class TestCacheAgendamentos(unittest.TestCase):
+    """Outra conexão (GUI, bot) grava; o cache do serviço devolve só o que mudou"""
+
+    def setUp(self):
+        self.pasta = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.pasta, "agendador.db")
+        conn = conectar(self.db_path)
+        # Colunas originais da tabela, como criadas pelo serviço
+        conn.execute(
+            """
+            CREATE TABLE agendamentos (
+                id INTEGER PRIMARY KEY AUTOINCREMENT, arquivo TEXT NOT NULL, projeto TEXT, local_run TEXT,
+                horario TEXT, intervalo INTEGER, dias_semana TEXT, dias_mes TEXT, hora_inicio TEXT, hora_fim TEXT,
+                status TEXT NOT NULL DEFAULT 'Ativo', ferramenta_etl TEXT, timeout_execucao INTEGER DEFAULT 1800,
+                ultima_execucao DATETIME
+            )
+            """
+        )
+        conn.executemany(
+            "INSERT INTO agendamentos (id, arquivo, horario) VALUES (?, ?, ?)",
+            [(1, "job1.kjb", "08:10"), (2, "job2.kjb", "08:20"), (3, "job3.kjb", "08:30")]
+        )
+        conn.commit()
+        conn.close()
+        garantir_esquema(self.db_path)
+        self.cache = CacheAgendamentos(self.db_path)
+
+    def tearDown(self):
+        self.cache.fechar()
+        shutil.rmtree(self.pasta, ignore_errors=True)
+
+    def gravar(self, comando, valores=()):
+        """Grava por outra conexão, como a interface faria"""
+        conn = conectar(self.db_path)
+        try:
+            conn.execute(comando, valores)
+            conn.commit()
+        finally:
+            conn.close()
+
+    def aplicar(self, fila):
+        """O que o serviço faz com o resultado do cache a cada tick"""
+        resultado = self.cache.alteracoes()
+        if resultado is None:
+            return None
+        linhas, removidos = resultado
+        for id_agendamento in removidos:
+            fila.remover(id_agendamento)
+        for linha in linhas:
+            fila.adicionar(compilar_regra(linha), AGORA)
+        return sorted(linha[0] for linha in linhas), sorted(removidos)
+
+    def test_primeira_leitura_e_sem_alteracoes(self):
+        linhas, removidos = self.cache.alteracoes()
+        self.assertEqual(sorted(linha[0] for linha in linhas), [1, 2, 3])
+        self.assertEqual(removidos, [])
+        # data_version não mudou: nem chega a consultar a tabela
+        self.assertIsNone(self.cache.alteracoes())
+
+    def test_gravacao_em_outra_tabela(self):
+        self.cache.alteracoes()
+        self.gravar("INSERT INTO execucoes (id_agendamento, estado) VALUES (1, 'fila')")
+        # data_version mudou, mas a versão global dos agendamentos não
+        self.assertIsNone(self.cache.alteracoes())
+
+    def test_so_a_linha_alterada(self):
+        fila = FilaAgendamentos()
+        self.aplicar(fila)
+        self.gravar("UPDATE agendamentos SET horario = '09:00' WHERE id = 2")
+        self.assertEqual(self.aplicar(fila), ([2], []))
+        self.assertEqual(fila.regra(2).proxima_execucao(AGORA), datetime.datetime(2030, 1, 7, 9, 0))
+        # Colunas que não entram na regra não recarregam nada
+        self.gravar("UPDATE agendamentos SET ultima_execucao = '2030-01-07 08:10:00' WHERE id = 1")
+        self.assertIsNone(self.aplicar(fila))
+
+    def test_alteracao_so_das_dependencias(self):
+        fila = FilaAgendamentos()
+        self.aplicar(fila)
+        self.assertIsNotNone(fila.regra(3).proxima_execucao(AGORA))
+
+        definir_dependencias(self.db_path, 3, [1])
+        self.assertEqual(self.aplicar(fila), ([3], []))
+        # Com dependência, a regra deixa de disparar pelo relógio
+        self.assertEqual(fila.regra(3).dependencias, frozenset({1}))
+        self.assertEqual([r.id for r, _ in fila.retirar_vencidos(AGORA.replace(hour=9))], [1, 2])
+
+        definir_dependencias(self.db_path, 3, [])
+        self.assertEqual(self.aplicar(fila), ([3], []))
+        self.assertEqual(fila.regra(3).dependencias, frozenset())
+        self.assertEqual(fila.proximo_disparo(), datetime.datetime(2030, 1, 7, 8, 30))
+
+    def test_inativado_sai_do_heap(self):
+        fila = FilaAgendamentos()
+        self.aplicar(fila)
+        self.gravar("UPDATE agendamentos SET status = 'Inativo' WHERE id = 1")
+        self.assertEqual(self.aplicar(fila), ([], [1]))
+        self.assertNotIn(1, fila)
+        self.assertEqual(fila.proximo_disparo(), datetime.datetime(2030, 1, 7, 8, 20))
+
+        self.gravar("UPDATE agendamentos SET status = 'Ativo' WHERE id = 1")
+        self.assertEqual(self.aplicar(fila), ([1], []))
+        self.assertEqual(fila.proximo_disparo(), datetime.datetime(2030, 1, 7, 8, 10))
+
+    def test_excluido_sai_do_heap(self):
+        fila = FilaAgendamentos()
+        self.aplicar(fila)
+        self.gravar("DELETE FROM agendamentos WHERE id = 1")
+        self.assertEqual(self.aplicar(fila), ([], [1]))
+        self.assertNotIn(1, fila)
+        self.assertEqual([r.id for r, _ in fila.retirar_vencidos(AGORA.replace(hour=9))], [2, 3])
+
+    def test_novo_agendamento(self):
+        fila = FilaAgendamentos()
+        self.aplicar(fila)
+        self.gravar("INSERT INTO agendamentos (id, arquivo, horario) VALUES (4, 'job4.kjb', '08:05')")
+        self.assertEqual(self.aplicar(fila), ([4], []))
+        self.assertEqual(fila.proximo_disparo(), datetime.datetime(2030, 1, 7, 8, 5))
+
+    def test_invalidar_rele_tudo(self):
+        self.cache.alteracoes()
+        self.cache.invalidar()
+        linhas, _ = self.cache.alteracoes()
+        self.assertEqual(sorted(linha[0] for linha in linhas), [1, 2, 3])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,139 @@
+# Copyright 2025 Thiago Luis de Lima
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import datetime
+import os
+import shutil
+import tempfile
+import unittest
+
+from scheduler.calendarios import Calendario, FiltroCalendario, carregar_calendario, listar_calendarios
+from scheduler.cron import compilar_cron
+
+# Feriados fixos de novembro e dezembro, mais uma data avulsa
+FIXOS = {(11, 2), (11, 15), (11, 20), (12, 25), (2, 29)}
+DATAS = {datetime.date(2026, 12, 31)}
+
+
+def d(texto):
+    return datetime.date.fromisoformat(texto)
+
+
+def dias_da_mascara(ano, mascara):
+    inicio = datetime.date(ano, 1, 1)
+    return [inicio + datetime.timedelta(days=n) for n in range(366) if (mascara >> n) & 1]
+
+
+class TestCalendario(unittest.TestCase):
+
+    def setUp(self):
+        self.calendario = Calendario("teste", DATAS, FIXOS)
+
+    def test_mascara_de_feriados(self):
+        self.assertEqual(
+            dias_da_mascara(2026, self.calendario.feriados(2026)),
+            [d("2026-11-02"), d("2026-11-15"), d("2026-11-20"), d("2026-12-25"), d("2026-12-31")],
+        )
+        # 29/02 só existe em ano bissexto; a data avulsa só vale no próprio ano
+        self.assertEqual(
+            dias_da_mascara(2028, self.calendario.feriados(2028)),
+            [d("2028-02-29"), d("2028-11-02"), d("2028-11-15"), d("2028-11-20"), d("2028-12-25")],
+        )
+        self.assertTrue(self.calendario.feriado(d("2026-12-31")))
+        self.assertFalse(self.calendario.feriado(d("2027-12-31")))
+
+    def test_dia_util(self):
+        self.assertTrue(self.calendario.dia_util(d("2026-11-03")))
+        self.assertFalse(self.calendario.dia_util(d("2026-11-02")))  # feriado numa segunda
+        self.assertFalse(self.calendario.dia_util(d("2026-11-07")))  # sábado
+
+    def test_enesimo_dia_util(self):
+        # (n, mês de 2026, dia esperado; None = mês sem o n-ésimo dia útil)
+        casos = [
+            (1, 11, d("2026-11-03")),    # dia 1 é domingo e dia 2 é feriado
+            (5, 11, d("2026-11-09")),
+            (19, 11, d("2026-11-30")),   # 21 dias de semana menos 2 feriados
+            (20, 11, None),
+            (-1, 11, d("2026-11-30")),
+            (-1, 12, d("2026-12-30")),   # 31/12 cadastrado como feriado
+            (-2, 12, d("2026-12-29")),
+            (1, 1, d("2026-01-01")),
+        ]
+        for n, mes, esperado in casos:
+            with self.subTest(n=n, mes=mes):
+                dias = [
+                    dia for dia in dias_da_mascara(2026, self.calendario.enesimos_dias_uteis(2026, n))
+                    if dia.month == mes
+                ]
+                self.assertEqual(dias, [esperado] if esperado else [])
+
+    def test_filtro_com_cron(self):
+        diario = compilar_cron("0 9 * * *")
+        diario.filtro = FiltroCalendario(self.calendario)
+        self.assertEqual(diario.proxima_execucao(datetime.datetime(2026, 11, 1, 10)),
+                         datetime.datetime(2026, 11, 3, 9))
+
+        mensal = compilar_cron("0 9 * * *")
+        mensal.filtro = FiltroCalendario(self.calendario, dia_util=-1)
+        self.assertEqual(mensal.proxima_execucao(datetime.datetime(2026, 11, 30, 9)),
+                         datetime.datetime(2026, 12, 30, 9))
+
+    def test_sem_feriados_apenas_fins_de_semana(self):
+        filtro = FiltroCalendario(Calendario(""), dia_util=1)
+        self.assertTrue(filtro.permite(d("2026-11-02")))
+        self.assertFalse(filtro.permite(d("2026-11-03")))
+
+
+class TestLeituraCalendarios(unittest.TestCase):
+
+    def setUp(self):
+        self.pasta = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.pasta, ignore_errors=True)
+
+    def _escrever(self, nome, conteudo):
+        with open(os.path.join(self.pasta, nome), "w", encoding="utf-8") as arquivo:
+            arquivo.write(conteudo)
+
+    def test_csv(self):
+        self._escrever("br.csv", "data;descricao\n# comentário\n25/12;Natal\n2026-04-03;Sexta-feira Santa\n"
+                                 "21/04/2027;Tiradentes\n20270326;Sexta-feira Santa\n31/02;inválida\n")
+        calendario = carregar_calendario("br", self.pasta)
+        self.assertEqual(calendario.fixos, {(12, 25)})
+        self.assertEqual(calendario.datas, {d("2026-04-03"), d("2027-04-21"), d("2027-03-26")})
+
+    def test_ics(self):
+        self._escrever("eventos.ics", "\r\n".join([
+            "BEGIN:VCALENDAR",
+            "BEGIN:VEVENT", "DTSTART;VALUE=DATE:20261224", "DTEND;VALUE=DATE:20261227", "END:VEVENT",
+            "BEGIN:VEVENT", "DTSTART;VALUE=DATE:20250101", "RRULE:FREQ=YEA", " RLY", "END:VEVENT",
+            "BEGIN:VEVENT", "DTSTART:20261102T000000", "END:VEVENT",
+            "END:VCALENDAR",
+        ]))
+        calendario = carregar_calendario("eventos", self.pasta)
+        # DTEND é exclusivo; a linha dobrada da RRULE é reconstituída
+        self.assertEqual(calendario.datas, {d("2026-12-24"), d("2026-12-25"), d("2026-12-26"), d("2026-11-02")})
+        self.assertEqual(calendario.fixos, {(1, 1)})
+
+    def test_listar_e_inexistente(self):
+        self._escrever("a.csv", "")
+        self._escrever("b.ics", "")
+        self._escrever("leia-me.txt", "")
+        self.assertEqual(listar_calendarios(self.pasta), ["a", "b"])
+        self.assertIsNone(carregar_calendario("c", self.pasta))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,86 @@
+# Copyright 2025 Thiago Luis de Lima
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from scheduler.configuracao import ler_configuracao
+from scheduler.db import conectar, garantir_esquema
+
+
+class TestLerConfiguracao(unittest.TestCase):
+
+    def setUp(self):
+        self.pasta = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.pasta, "agendador.db")
+        conn = conectar(self.db_path)
+        conn.execute(
+            """
+            CREATE TABLE agendamentos (
+                id INTEGER PRIMARY KEY AUTOINCREMENT, arquivo TEXT NOT NULL, projeto TEXT, local_run TEXT,
+                horario TEXT, ferramenta_etl TEXT, timeout_execucao INTEGER DEFAULT 1800
+            )
+            """
+        )
+        conn.execute("INSERT INTO agendamentos (id, arquivo, ferramenta_etl) VALUES (1, 'job.kjb', 'PENTAHO')")
+        conn.commit()
+        conn.close()
+        garantir_esquema(self.db_path)
+
+    def tearDown(self):
+        shutil.rmtree(self.pasta, ignore_errors=True)
+
+    def test_padroes(self):
+        configuracao = ler_configuracao(self.db_path, 1)
+        self.assertEqual(
+            (configuracao.arquivo, configuracao.ferramenta_etl, configuracao.timeout),
+            ("job.kjb", "PENTAHO", 1800)
+        )
+        self.assertIsNone(configuracao.memoria_mb)
+        self.assertIsNone(configuracao.limite_memoria_mb)
+        self.assertFalse(configuracao.atributos)
+
+    def test_todos_os_campos_em_uma_linha(self):
+        conn = conectar(self.db_path)
+        conn.execute(
+            """
+            UPDATE agendamentos SET projeto = 'dw', local_run = 'local', timeout_execucao = 600,
+                memoria_mb = 4096, limite_memoria_mb = 6144, cpu_afinidade = '0-1', nice = 5,
+                io_classe = 'ociosa', io_prioridade = 9
+            WHERE id = 1
+            """
+        )
+        conn.commit()
+        conn.close()
+
+        configuracao = ler_configuracao(self.db_path, 1)
+        self.assertEqual(
+            (configuracao.projeto, configuracao.local_run, configuracao.timeout,
+             configuracao.memoria_mb, configuracao.limite_memoria_mb),
+            ("dw", "local", 600, 4096, 6144)
+        )
+        atributos = configuracao.atributos
+        self.assertEqual(
+            (atributos.afinidade, atributos.nice, atributos.io_classe, atributos.io_prioridade),
+            ((0, 1), 5, "OCIOSA", 7)
+        )
+
+    def test_agendamento_inexistente(self):
+        self.assertIsNone(ler_configuracao(self.db_path, 99))
+
+
+if __name__ == "__main__":
+    unittest.main()
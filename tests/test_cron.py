@@ -0,0 +1,137 @@
+# Copyright 2025 Thiago Luis de Lima
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import datetime
+import unittest
+
+from scheduler.cron import compilar_cron
+from scheduler.rules import compilar_agenda
+
+
+def dt(texto):
+    return datetime.datetime.fromisoformat(texto)
+
+
+# (expressão, após, próximo disparo esperado)
+PROXIMOS_CRON = [
+    # Passos e faixas
+    ("*/15 * * * *", "2026-10-17 10:07", "2026-10-17 10:15"),
+    ("5/20 * * * *", "2026-10-17 10:26", "2026-10-17 10:45"),
+    ("0 8-18/5 * * *", "2026-10-17 13:00", "2026-10-17 18:00"),
+    ("0 8-18/5 * * *", "2026-10-17 18:00", "2026-10-18 08:00"),
+    ("30 9 * * mon-fri", "2026-10-17 10:00", "2026-10-19 09:30"),
+    ("0 6 1,15 jan,jul *", "2026-10-17 00:00", "2027-01-01 06:00"),
+    # Domingo como 0 ou 7
+    ("0 0 * * 7", "2026-10-17 12:00", "2026-10-18 00:00"),
+    ("0 0 * * 0", "2026-10-17 12:00", "2026-10-18 00:00"),
+    # Último dia do mês, virada de mês e de ano
+    ("0 0 L * *", "2026-10-17 00:00", "2026-10-31 00:00"),
+    ("0 0 L * *", "2026-10-31 00:00", "2026-11-30 00:00"),
+    ("0 0 15,L * *", "2026-11-15 00:00", "2026-11-30 00:00"),
+    ("0 0 31 * *", "2026-10-31 00:00", "2026-12-31 00:00"),
+    ("0 0 1 1 *", "2026-10-17 00:00", "2027-01-01 00:00"),
+    ("59 23 * * *", "2026-12-31 23:59", "2027-01-01 23:59"),
+    # Anos bissextos
+    ("0 12 29 2 *", "2026-03-01 00:00", "2028-02-29 12:00"),
+    ("0 0 L 2 *", "2026-01-01 00:00", "2026-02-28 00:00"),
+    ("0 0 L 2 *", "2027-03-01 00:00", "2028-02-29 00:00"),
+    # Dia do mês e dia da semana restritos: basta um aceitar
+    ("0 9 13 * 1", "2026-10-20 00:00", "2026-10-26 09:00"),
+    ("0 9 13 * 1", "2026-11-10 00:00", "2026-11-13 09:00"),
+    # Campo que começa com '*' não é restrito: os dois filtros precisam aceitar
+    ("0 9 */2 * 1", "2026-10-12 09:00", "2026-10-19 09:00"),
+    ("0 9 1 * */2", "2026-10-17 00:00", "2026-11-01 09:00"),
+    # Macros e várias expressões
+    ("@monthly", "2026-10-17 00:00", "2026-11-01 00:00"),
+    ("0 8 * * *; 30 17 * * *", "2026-10-17 09:00", "2026-10-17 17:30"),
+]
+
+# (expressão, momento, dispara?)
+CUMPRE_CRON = [
+    ("0 9 */2 * 1", "2026-10-13 09:00", False),  # terça, dia ímpar
+    ("0 9 */2 * 1", "2026-10-12 09:00", False),  # segunda, dia par
+    ("0 9 */2 * 1", "2026-10-19 09:00", True),   # segunda, dia ímpar
+    ("0 9 13 * 1", "2026-11-13 09:00", True),    # dia 13, sexta-feira
+    ("0 9 13 * 1", "2026-10-19 09:00", True),    # segunda-feira
+    ("0 9 13 * 1", "2026-10-20 09:00", False),
+    ("0 0 L * *", "2028-02-28 00:00", False),
+    ("0 0 L * *", "2028-02-29 00:00", True),
+]
+
+INVALIDAS = ["", "* * * *", "60 * * * *", "* 24 * * *", "*/0 * * * *", "5-1 * * * *", "x * * * *", "0 0 32 * *"]
+
+
+class TestCron(unittest.TestCase):
+
+    def test_proxima_execucao(self):
+        for expressao, apos, esperado in PROXIMOS_CRON:
+            with self.subTest(expressao=expressao, apos=apos):
+                self.assertEqual(compilar_cron(expressao).proxima_execucao(dt(apos)), dt(esperado))
+
+    def test_cumpre(self):
+        for expressao, momento, esperado in CUMPRE_CRON:
+            with self.subTest(expressao=expressao, momento=momento):
+                self.assertEqual(compilar_cron(expressao).cumpre(dt(momento)), esperado)
+
+    def test_expressoes_invalidas(self):
+        for expressao in INVALIDAS:
+            with self.subTest(expressao=expressao):
+                with self.assertRaises(ValueError):
+                    compilar_cron(expressao)
+
+    def test_nunca_dispara(self):
+        self.assertIsNone(compilar_cron("0 0 30 2 *").proxima_execucao(dt("2026-10-17 00:00")))
+
+
+# (cron, horario, intervalo, dias_semana, dias_mes, hora_inicio, hora_fim, após, próximo esperado)
+PROXIMOS_LEGADO = [
+    (None, "10:30", "", "", "", "", "", "2026-10-17 10:30", "2026-10-18 10:30"),
+    (None, "", "15", "", "", "", "", "2026-10-17 10:07", "2026-10-17 10:15"),
+    (None, "", "20", "", "", "08:00", "09:00", "2026-10-17 08:40", "2026-10-17 09:00"),
+    (None, "", "20", "", "", "08:00", "09:00", "2026-10-17 09:00", "2026-10-18 08:00"),
+    (None, "08:30", "", "", "", "08:00", "09:00", "2026-10-17 09:00", "2026-10-18 08:30"),
+    (None, "10:00", "", "Seg,Qua", "", "", "", "2026-10-17 00:00", "2026-10-19 10:00"),
+    (None, "10:00", "", "Sáb", "", "", "", "2026-10-17 10:00", "2026-10-24 10:00"),
+    (None, "10:00", "", "", "1,15", "", "", "2026-10-17 00:00", "2026-11-01 10:00"),
+    # Legado exige os dois filtros de dia
+    (None, "10:00", "", "Dom", "1", "", "", "2026-10-17 00:00", "2026-11-01 10:00"),
+    # Sem horário, janela e intervalo: todo minuto
+    (None, "", "", "", "", "", "", "2026-10-17 10:00", "2026-10-17 10:01"),
+    # Cron substitui os campos legados
+    ("0 7 * * *", "10:30", "15", "Seg", "1", "", "", "2026-10-17 10:00", "2026-10-18 07:00"),
+]
+
+
+class TestAgendaLegada(unittest.TestCase):
+
+    def test_proxima_execucao(self):
+        for *campos, apos, esperado in PROXIMOS_LEGADO:
+            with self.subTest(campos=campos, apos=apos):
+                self.assertEqual(compilar_agenda(*campos).proxima_execucao(dt(apos)), dt(esperado))
+
+    def test_nunca_dispara(self):
+        # Horário fixo fora da janela, janela sem intervalo e cron inválido
+        for campos in [
+            (None, "10:00", "", "", "", "08:00", "09:00"),
+            (None, "", "", "", "", "08:00", "09:00"),
+            ("0 25 * * *", "10:00", "", "", "", "", ""),
+        ]:
+            with self.subTest(campos=campos):
+                agenda = compilar_agenda(*campos)
+                self.assertFalse(agenda)
+                self.assertIsNone(agenda.proxima_execucao(dt("2026-10-17 00:00")))
+
+
+if __name__ == "__main__":
+    unittest.main()
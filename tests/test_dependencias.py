@@ -0,0 +1,195 @@
+# Copyright 2025 Thiago Luis de Lima
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+from scheduler.db import ERRO_DEPENDENTES, conectar, garantir_esquema
+from scheduler.dependencias import (
+    chave_dependencias, definir_dependencias, dependentes_prontos, ler_dependencias, ler_dependentes
+)
+from scheduler.execucoes import ESTADO_FINALIZADA, MOTIVO_ERROS_LOG
+from scheduler.nos import publicar_execucoes
+
+AGENDAMENTOS = (1, 2, 3, 4)
+
+
+class BancoDependencias(unittest.TestCase):
+
+    def setUp(self):
+        self.pasta = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.pasta, "agendador.db")
+        conn = conectar(self.db_path)
+        conn.execute(
+            """
+            CREATE TABLE agendamentos (
+                id INTEGER PRIMARY KEY AUTOINCREMENT, arquivo TEXT NOT NULL, status TEXT NOT NULL DEFAULT 'Ativo'
+            )
+            """
+        )
+        conn.executemany(
+            "INSERT INTO agendamentos (id, arquivo) VALUES (?, ?)",
+            [(id_agendamento, f"job{id_agendamento}.kjb") for id_agendamento in AGENDAMENTOS]
+        )
+        conn.commit()
+        conn.close()
+        garantir_esquema(self.db_path)
+        self.segundo = 0
+
+    def tearDown(self):
+        shutil.rmtree(self.pasta, ignore_errors=True)
+
+    def momento(self):
+        """Instantes crescentes, para ordenar enfileiramentos e términos sem depender do relógio"""
+        self.segundo += 1
+        return f"2030-01-01 10:00:{self.segundo:02d}"
+
+    def executar(self, id_agendamento, codigo_retorno=0, motivo=None):
+        """Registra uma execução finalizada de `id_agendamento`; retorna o id"""
+        conn = conectar(self.db_path)
+        try:
+            cursor = conn.execute(
+                """
+                INSERT INTO execucoes (id_agendamento, estado, enfileirado_em, finalizado_em, codigo_retorno, motivo_fim)
+                VALUES (?, ?, ?, ?, ?, ?)
+                """,
+                (id_agendamento, ESTADO_FINALIZADA, self.momento(), self.momento(), codigo_retorno, motivo)
+            )
+            conn.commit()
+            return cursor.lastrowid
+        finally:
+            conn.close()
+
+
+class TestValidacao(BancoDependencias):
+
+    def test_ciclos_sao_recusados(self):
+        definir_dependencias(self.db_path, 2, [1])
+        definir_dependencias(self.db_path, 3, [2])
+        for id_agendamento, dependencias in ((1, [3]), (1, [2]), (2, [2]), (3, [4, 3])):
+            with self.subTest(id_agendamento=id_agendamento, dependencias=dependencias):
+                with self.assertRaisesRegex(ValueError, "ciclo|si mesmo"):
+                    definir_dependencias(self.db_path, id_agendamento, dependencias)
+        # Nada foi gravado pelas tentativas recusadas
+        self.assertEqual([ler_dependencias(self.db_path, i) for i in AGENDAMENTOS], [[], [1], [2], []])
+
+    def test_dependencia_inexistente(self):
+        with self.assertRaisesRegex(ValueError, "99"):
+            definir_dependencias(self.db_path, 2, [1, 99])
+        self.assertEqual(ler_dependencias(self.db_path, 2), [])
+
+    def test_exclusao_com_dependentes_e_recusada(self):
+        definir_dependencias(self.db_path, 2, [1])
+        definir_dependencias(self.db_path, 3, [1])
+        self.assertEqual(ler_dependentes(self.db_path, 1), [2, 3])
+
+        conn = conectar(self.db_path)
+        try:
+            with self.assertRaisesRegex(sqlite3.IntegrityError, ERRO_DEPENDENTES):
+                conn.execute("DELETE FROM agendamentos WHERE id = 1")
+            conn.rollback()
+
+            # Excluir os dependentes leva as dependências deles junto e libera a exclusão
+            conn.execute("DELETE FROM agendamentos WHERE id IN (2, 3)")
+            conn.execute("DELETE FROM agendamentos WHERE id = 1")
+            conn.commit()
+            self.assertEqual(conn.execute("SELECT COUNT(*) FROM dependencias_agendamento").fetchone()[0], 0)
+        finally:
+            conn.close()
+
+
+class TestResultadoDasDependencias(BancoDependencias):
+
+    def test_erros_no_log_nao_contam_como_sucesso(self):
+        definir_dependencias(self.db_path, 2, [1])
+        # Código 0, mas com linhas de erro na saída: o usuário foi avisado de uma falha
+        self.executar(1, codigo_retorno=0, motivo=MOTIVO_ERROS_LOG)
+        self.assertEqual(dependentes_prontos(self.db_path, 1), [])
+        self.assertEqual(chave_dependencias(self.db_path, 2), "dependencias:")
+
+        sucesso = self.executar(1)
+        self.assertEqual(dependentes_prontos(self.db_path, 1), [2])
+        self.assertEqual(chave_dependencias(self.db_path, 2), f"dependencias:{sucesso}")
+
+    def test_codigo_diferente_de_zero_nao_conta(self):
+        definir_dependencias(self.db_path, 2, [1])
+        self.executar(1, codigo_retorno=1)
+        self.assertEqual(dependentes_prontos(self.db_path, 1), [])
+
+    def test_varias_dependencias(self):
+        definir_dependencias(self.db_path, 3, [1, 2])
+        definir_dependencias(self.db_path, 4, [1])
+        self.assertEqual(dependentes_prontos(self.db_path, 1), [])
+        self.executar(1)
+        self.assertEqual(dependentes_prontos(self.db_path, 1), [4])
+        self.executar(2)
+        self.assertEqual(dependentes_prontos(self.db_path, 2), [3])
+
+        # Depois do disparo do dependente, cada dependência precisa terminar de novo
+        self.executar(3)
+        self.executar(1)
+        self.assertEqual(dependentes_prontos(self.db_path, 1), [4])
+        self.executar(2, codigo_retorno=1)
+        self.assertEqual(dependentes_prontos(self.db_path, 2), [])
+        self.executar(2)
+        self.assertEqual(dependentes_prontos(self.db_path, 2), [3])
+
+    def test_dependente_inativo(self):
+        definir_dependencias(self.db_path, 2, [1])
+        conn = conectar(self.db_path)
+        conn.execute("UPDATE agendamentos SET status = 'Inativo' WHERE id = 2")
+        conn.commit()
+        conn.close()
+        self.executar(1)
+        self.assertEqual(dependentes_prontos(self.db_path, 1), [])
+
+
+class TestChaveDependencias(BancoDependencias):
+    """Nós que reagem ao mesmo término registram um único disparo do dependente"""
+
+    def publicar(self, no, chave):
+        return publicar_execucoes(self.db_path, no, [dict(id_agendamento=3, prioridade=0, chave=chave)])[0]
+
+    def test_mesma_chave_para_o_mesmo_termino(self):
+        definir_dependencias(self.db_path, 3, [2, 1])
+        primeira = self.executar(1)
+        segunda = self.executar(2)
+        chave = chave_dependencias(self.db_path, 3)
+        self.assertEqual(chave, f"dependencias:{primeira},{segunda}")
+        self.assertEqual(chave_dependencias(self.db_path, 3), chave)
+
+        self.assertIsNotNone(self.publicar("no-a", chave))
+        self.assertIsNone(self.publicar("no-b", chave))
+
+    def test_novo_termino_muda_a_chave(self):
+        definir_dependencias(self.db_path, 3, [1, 2])
+        self.executar(1)
+        self.executar(2)
+        anterior = chave_dependencias(self.db_path, 3)
+        self.assertIsNotNone(self.publicar("no-a", anterior))
+
+        # Falhas não mudam a chave; um novo sucesso muda
+        self.executar(1, codigo_retorno=1)
+        self.assertEqual(chave_dependencias(self.db_path, 3), anterior)
+        self.executar(1)
+        chave = chave_dependencias(self.db_path, 3)
+        self.assertNotEqual(chave, anterior)
+        self.assertIsNotNone(self.publicar("no-b", chave))
+
+
+if __name__ == "__main__":
+    unittest.main()
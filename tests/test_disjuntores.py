@@ -0,0 +1,126 @@
+# Copyright 2025 Thiago Luis de Lima
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import datetime
+import os
+import shutil
+import tempfile
+import types
+import unittest
+
+from scheduler.db import conectar, garantir_esquema
+from scheduler.disjuntores import (
+    ESTADO_ABERTO, ESTADO_FECHADO, ESTADO_SONDANDO, cancelar_sondagem, cancelar_sondagens,
+    disjuntores_abertos, liberar_disparo, registrar_resultado, religar
+)
+
+INICIO = datetime.datetime(2026, 10, 17, 10, 0)
+SONDA = 600
+
+
+def regra(falhas=3, sonda=SONDA):
+    return types.SimpleNamespace(id=1, disjuntor_falhas=falhas, disjuntor_sonda=sonda)
+
+
+def depois(segundos):
+    return INICIO + datetime.timedelta(seconds=segundos)
+
+
+class TestDisjuntor(unittest.TestCase):
+
+    def setUp(self):
+        self.pasta = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.pasta, "agendador.db")
+        conn = conectar(self.db_path)
+        conn.execute("CREATE TABLE agendamentos (id INTEGER PRIMARY KEY AUTOINCREMENT, arquivo TEXT NOT NULL)")
+        conn.execute("INSERT INTO agendamentos (id, arquivo) VALUES (1, 'job.kjb')")
+        conn.commit()
+        conn.close()
+        garantir_esquema(self.db_path)
+        self.regra = regra()
+
+    def tearDown(self):
+        shutil.rmtree(self.pasta, ignore_errors=True)
+
+    def falhar(self, vezes, agora=INICIO):
+        return [registrar_resultado(self.db_path, self.regra, False, agora) for _ in range(vezes)]
+
+    def abrir(self):
+        self.falhar(self.regra.disjuntor_falhas)
+
+    def test_abre_apos_falhas_consecutivas(self):
+        self.assertEqual(self.falhar(3), [
+            (ESTADO_FECHADO, ESTADO_FECHADO), (ESTADO_FECHADO, ESTADO_FECHADO), (ESTADO_FECHADO, ESTADO_ABERTO)
+        ])
+        self.assertEqual(liberar_disparo(self.db_path, self.regra, depois(SONDA - 1)), (False, False))
+        # Falhas enquanto aberto (execução já em andamento) não mudam o estado
+        self.assertEqual(self.falhar(1), [(ESTADO_ABERTO, ESTADO_ABERTO)])
+
+    def test_sucesso_zera_a_contagem(self):
+        self.falhar(2)
+        self.assertEqual(registrar_resultado(self.db_path, self.regra, True, INICIO), (ESTADO_FECHADO, ESTADO_FECHADO))
+        self.assertEqual(self.falhar(2)[-1], (ESTADO_FECHADO, ESTADO_FECHADO))
+        self.assertEqual(liberar_disparo(self.db_path, self.regra, INICIO), (True, False))
+
+    def test_sondagem_com_sucesso_fecha(self):
+        self.abrir()
+        self.assertEqual(liberar_disparo(self.db_path, self.regra, depois(SONDA)), (True, True))
+        # Uma única sondagem por vez
+        self.assertEqual(liberar_disparo(self.db_path, self.regra, depois(SONDA)), (False, False))
+        self.assertEqual(registrar_resultado(self.db_path, self.regra, True, depois(SONDA + 60)),
+                         (ESTADO_SONDANDO, ESTADO_FECHADO))
+        self.assertEqual(liberar_disparo(self.db_path, self.regra, depois(SONDA + 60)), (True, False))
+
+    def test_sondagem_com_falha_reabre_e_adia(self):
+        self.abrir()
+        liberar_disparo(self.db_path, self.regra, depois(SONDA))
+        self.assertEqual(registrar_resultado(self.db_path, self.regra, False, depois(SONDA + 60)),
+                         (ESTADO_SONDANDO, ESTADO_ABERTO))
+        # A próxima sondagem conta a partir do fim da sondagem que falhou
+        self.assertEqual(liberar_disparo(self.db_path, self.regra, depois(2 * SONDA + 59)), (False, False))
+        self.assertEqual(liberar_disparo(self.db_path, self.regra, depois(2 * SONDA + 60)), (True, True))
+
+    def test_sondagem_cancelada_vence_imediatamente(self):
+        self.abrir()
+        liberar_disparo(self.db_path, self.regra, depois(SONDA))
+        cancelar_sondagem(self.db_path, self.regra.id)
+        self.assertEqual(liberar_disparo(self.db_path, self.regra), (True, True))
+        self.assertEqual(cancelar_sondagens(self.db_path), 1)
+        self.assertEqual(cancelar_sondagens(self.db_path), 0)
+
+    def test_sem_sonda_fica_suspenso_ate_religar(self):
+        self.regra = regra(sonda=0)
+        self.abrir()
+        self.assertEqual(liberar_disparo(self.db_path, self.regra, depois(365 * 86400)), (False, False))
+        self.assertEqual([linha[:3] for linha in disjuntores_abertos(self.db_path)], [])  # agendamento sem disjuntor
+
+        conn = conectar(self.db_path)
+        conn.execute("UPDATE agendamentos SET disjuntor_falhas = 3")
+        conn.commit()
+        conn.close()
+        self.assertEqual([linha[:4] for linha in disjuntores_abertos(self.db_path)],
+                         [(1, 'job.kjb', ESTADO_ABERTO, 3)])
+
+        self.assertTrue(religar(self.db_path, self.regra.id))
+        self.assertFalse(religar(self.db_path, self.regra.id))
+        self.assertEqual(liberar_disparo(self.db_path, self.regra), (True, False))
+        self.assertEqual(disjuntores_abertos(self.db_path), [])
+
+    def test_desativado_depois_de_aberto(self):
+        self.abrir()
+        self.assertEqual(liberar_disparo(self.db_path, regra(falhas=0)), (True, False))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,120 @@
+# Copyright 2025 Thiago Luis de Lima
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import shutil
+import tempfile
+import types
+import unittest
+
+from scheduler import duracoes
+from scheduler.db import conectar, garantir_esquema
+from scheduler.duracoes import atualizar_duracoes, calcular_timeout, percentil, timeout_efetivo
+from scheduler.execucoes import ESTADO_ABANDONADA, ESTADO_FINALIZADA, MOTIVO_ERROS_LOG
+
+UM_A_DEZ = list(range(1, 11))
+UM_A_CEM = list(range(1, 101))
+
+
+class TestPercentil(unittest.TestCase):
+
+    def test_posto_mais_proximo(self):
+        # (amostras ordenadas, p, esperado)
+        casos = [
+            ([], 50, None),
+            ([7], 0, 7),
+            ([7], 99, 7),
+            (UM_A_DEZ, 0, 1),
+            (UM_A_DEZ, 10, 1),
+            (UM_A_DEZ, 11, 2),
+            (UM_A_DEZ, 50, 5),
+            (UM_A_DEZ, 95, 10),
+            (UM_A_DEZ, 100, 10),
+            (UM_A_CEM, 99, 99),
+            ([1.5, 2.5, 30.0], 50, 2.5),
+        ]
+        for ordenados, p, esperado in casos:
+            with self.subTest(amostras=len(ordenados), p=p):
+                self.assertEqual(percentil(ordenados, p), esperado)
+
+
+class TestCalcularTimeout(unittest.TestCase):
+
+    def test_limites(self):
+        minimo = duracoes.MIN_AMOSTRAS_TIMEOUT
+        # (timeout fixo, fator, piso, amostras, p99, esperado)
+        casos = [
+            (1800, 1.5, 60, minimo, 100, 150),
+            (1800, 1.5, 1, minimo, 33.3, 50),        # arredonda para cima
+            (1800, 1.5, 60, minimo, 10, 60),         # piso
+            (1800, 3.0, 60, minimo, 1000, 1800),     # teto no timeout fixo
+            (1800, 0.0, 60, minimo, 100, 1800),      # desativado
+            (1800, 1.5, 60, minimo - 1, 100, 1800),  # histórico insuficiente
+            (1800, 1.5, 60, None, 100, 1800),
+            (1800, 1.5, 60, minimo, None, 1800),
+        ]
+        for fixo, fator, piso, amostras, p99, esperado in casos:
+            with self.subTest(fator=fator, piso=piso, amostras=amostras, p99=p99):
+                self.assertEqual(calcular_timeout(fixo, fator, piso, amostras, p99), esperado)
+
+
+class TestHistoricoDuracoes(unittest.TestCase):
+
+    def setUp(self):
+        self.pasta = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.pasta, "agendador.db")
+        conn = conectar(self.db_path)
+        conn.execute("CREATE TABLE agendamentos (id INTEGER PRIMARY KEY AUTOINCREMENT, arquivo TEXT NOT NULL)")
+        conn.commit()
+        conn.close()
+        garantir_esquema(self.db_path)
+
+    def tearDown(self):
+        shutil.rmtree(self.pasta, ignore_errors=True)
+
+    def registrar(self, id_agendamento, duracoes_seg, estado=ESTADO_FINALIZADA, codigo_retorno=0, motivo=None):
+        conn = conectar(self.db_path)
+        conn.executemany(
+            "INSERT INTO execucoes (id_agendamento, estado, codigo_retorno, duracao_seg, motivo_fim) VALUES (?, ?, ?, ?, ?)",
+            [(id_agendamento, estado, codigo_retorno, duracao, motivo) for duracao in duracoes_seg]
+        )
+        conn.commit()
+        conn.close()
+
+    def test_percentis_das_execucoes_com_sucesso(self):
+        self.registrar(1, UM_A_CEM)
+        # Falhas e outros agendamentos não entram nas amostras
+        self.registrar(1, [5000], codigo_retorno=1)
+        self.registrar(1, [5000], motivo=MOTIVO_ERROS_LOG)
+        self.registrar(1, [5000], estado=ESTADO_ABANDONADA)
+        self.registrar(2, [5000])
+        self.assertEqual(atualizar_duracoes(self.db_path, 1), (100, 50, 95, 99))
+
+    def test_apenas_as_amostras_mais_recentes(self):
+        self.registrar(1, [1000] * duracoes.AMOSTRAS_DURACAO)
+        self.registrar(1, [10] * duracoes.AMOSTRAS_DURACAO)
+        self.assertEqual(atualizar_duracoes(self.db_path, 1), (duracoes.AMOSTRAS_DURACAO, 10, 10, 10))
+
+    def test_timeout_efetivo(self):
+        regra = types.SimpleNamespace(id=1, timeout=1800, timeout_fator=2.0, timeout_piso=60)
+        self.assertEqual(timeout_efetivo(self.db_path, regra), 1800)
+        self.registrar(1, UM_A_CEM)
+        atualizar_duracoes(self.db_path, 1)
+        self.assertEqual(timeout_efetivo(self.db_path, regra), 198)
+        regra.timeout_fator = 0
+        self.assertEqual(timeout_efetivo(self.db_path, regra), 1800)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,259 @@
+# Copyright 2025 Thiago Luis de Lima
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import datetime
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from scheduler.db import conectar, garantir_esquema
+from scheduler.execucoes import (
+    ESTADO_ABANDONADA, ESTADO_DESCARTADA, ESTADO_EXECUTANDO, ESTADO_FILA, ESTADO_FINALIZADA, MOTIVO_ERROS_LOG,
+    execucao_com_sucesso, execucoes_na_fila, limpar_execucoes, motivo_fim, reconciliar_iniciadas, registrar_fim,
+    registrar_inicio
+)
+from scheduler.memoria import MOTIVO_MEMORIA
+from scheduler.nos import publicar_execucoes
+from scheduler.processos import criacao_processo
+from scheduler.supervisor import ExecucaoSupervisionada
+
+NO = "no-teste"
+HORARIO = datetime.datetime(2030, 1, 1, 10, 0)
+
+
+def pid_encerrado():
+    """PID de um processo que já terminou"""
+    processo = subprocess.Popen([sys.executable, "-c", "pass"])
+    processo.wait()
+    return processo.pid
+
+
+class TestDiarioExecucoes(unittest.TestCase):
+    """O diário gravado por um serviço, lido de novo como após um reinício"""
+
+    def setUp(self):
+        self.pasta = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.pasta, "agendador.db")
+        conn = conectar(self.db_path)
+        conn.execute("CREATE TABLE agendamentos (id INTEGER PRIMARY KEY AUTOINCREMENT, arquivo TEXT NOT NULL)")
+        conn.commit()
+        conn.close()
+        garantir_esquema(self.db_path)
+
+    def tearDown(self):
+        shutil.rmtree(self.pasta, ignore_errors=True)
+
+    def enfileirar(self, *ids_agendamento):
+        return publicar_execucoes(self.db_path, NO, [
+            dict(id_agendamento=id_agendamento, prioridade=0, horario_previsto=HORARIO)
+            for id_agendamento in ids_agendamento
+        ])
+
+    def estados(self):
+        conn = conectar(self.db_path)
+        try:
+            return dict(conn.execute("SELECT id, estado FROM execucoes").fetchall())
+        finally:
+            conn.close()
+
+    def test_transicoes(self):
+        finalizada, descartada, repetida = self.enfileirar(1, 2, 3)
+        self.assertEqual(set(self.estados().values()), {ESTADO_FILA})
+
+        self.assertTrue(registrar_inicio(self.db_path, finalizada, 1.5, pid=os.getpid(), no=NO))
+        # Só uma execução na fila pode ser iniciada
+        self.assertFalse(registrar_inicio(self.db_path, finalizada, 1.5, pid=os.getpid(), no=NO))
+        self.assertEqual(self.estados()[finalizada], ESTADO_EXECUTANDO)
+        self.assertTrue(registrar_fim(self.db_path, finalizada, codigo_retorno=0, duracao_seg=2.0, no=NO))
+
+        self.assertTrue(registrar_fim(self.db_path, descartada, ESTADO_DESCARTADA))
+        # Execuções já fechadas não são sobrescritas
+        self.assertFalse(registrar_fim(self.db_path, descartada, ESTADO_ABANDONADA))
+        # Nem alteradas por outro nó
+        self.assertFalse(registrar_inicio(self.db_path, repetida, 0.0, pid=os.getpid(), no="outro-no"))
+
+        self.assertEqual(
+            self.estados(),
+            {finalizada: ESTADO_FINALIZADA, descartada: ESTADO_DESCARTADA, repetida: ESTADO_FILA}
+        )
+
+    def test_reinicio_abandona_execucoes_sem_processo(self):
+        morta, viva, reutilizada = self.enfileirar(1, 2, 3)
+        registrar_inicio(self.db_path, morta, 0.0, pid=pid_encerrado(), no=NO)
+        registrar_inicio(self.db_path, viva, 0.0, pid=os.getpid(), pid_criado_em=criacao_processo(os.getpid()), no=NO)
+        # O PID existe, mas foi criado em outro momento: é outro processo
+        registrar_inicio(self.db_path, reutilizada, 0.0, pid=os.getpid(), pid_criado_em=1.0, no=NO)
+
+        vivas, abandonadas = reconciliar_iniciadas(self.db_path, NO)
+
+        self.assertEqual([linha[0] for linha in vivas], [viva])
+        esperadas = [morta] if criacao_processo(os.getpid()) is None else [morta, reutilizada]
+        self.assertEqual([linha[0] for linha in abandonadas], esperadas)
+        estados = self.estados()
+        self.assertEqual(estados[morta], ESTADO_ABANDONADA)
+        self.assertEqual(estados[viva], ESTADO_EXECUTANDO)
+        # Um segundo reinício não encontra de novo as abandonadas
+        self.assertEqual(reconciliar_iniciadas(self.db_path, NO)[1], [])
+
+    def test_reinicio_restaura_a_fila_em_ordem(self):
+        ids = self.enfileirar(3, 1, 2)
+        registrar_inicio(self.db_path, ids[1], 0.0, pid=pid_encerrado(), no=NO)
+        ids += self.enfileirar(4)
+        reconciliar_iniciadas(self.db_path, NO)
+
+        fila = execucoes_na_fila(self.db_path, NO)
+        self.assertEqual([linha[0] for linha in fila], [ids[0], ids[2], ids[3]])
+        self.assertEqual([linha[1] for linha in fila], [3, 2, 4])
+        self.assertEqual(fila[0][2], "2030-01-01 10:00:00")
+        # A fila de outro nó não é restaurada por este
+        self.assertEqual(execucoes_na_fila(self.db_path, "outro-no"), [])
+
+
+class Analise:
+    def __init__(self, *linhas_erro):
+        self.linhas_erro = list(linhas_erro)
+
+
+class TestMotivoFim(unittest.TestCase):
+    """Como o fim de uma execução é classificado antes de ser gravado no diário"""
+
+    def test_classificacao(self):
+        # (código de saída, motivo da interrupção, linhas de erro na saída, motivo gravado, sucesso)
+        casos = [
+            (0, None, (), None, True),
+            (0, None, ("ERROR conexão recusada",), MOTIVO_ERROS_LOG, False),
+            (1, None, (), None, False),
+            (1, None, ("FATAL",), MOTIVO_ERROS_LOG, False),
+            (1, "timeout", ("ERROR",), "timeout", False),
+            (1, MOTIVO_MEMORIA, (), MOTIVO_MEMORIA, False),
+            (0, MOTIVO_MEMORIA, (), MOTIVO_MEMORIA, False),
+        ]
+        for codigo, motivo, linhas, esperado, sucesso in casos:
+            with self.subTest(codigo=codigo, motivo=motivo, linhas=linhas):
+                execucao = ExecucaoSupervisionada("teste", None, pid=1)
+                execucao.exitcode, execucao.motivo = codigo, motivo
+                self.assertEqual(motivo_fim(execucao, Analise(*linhas)), esperado)
+                self.assertEqual(execucao_com_sucesso(execucao, Analise(*linhas)), sucesso)
+
+    def test_sem_analise_da_saida(self):
+        # Execuções reanexadas não têm a saída acompanhada
+        execucao = ExecucaoSupervisionada("teste", None, pid=1)
+        execucao.exitcode = 0
+        self.assertIsNone(motivo_fim(execucao, None))
+        self.assertTrue(execucao_com_sucesso(execucao, None))
+        execucao.exitcode = None
+        self.assertFalse(execucao_com_sucesso(execucao, None))
+
+
+class TestHistoricoExecucoes(unittest.TestCase):
+    """O diário cresce a cada disparo: consultas por agendamento usam índices e execuções antigas são removidas"""
+
+    AGORA = datetime.datetime(2030, 6, 1, 12, 0)
+
+    def setUp(self):
+        self.pasta = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.pasta, "agendador.db")
+        conn = conectar(self.db_path)
+        conn.execute("CREATE TABLE agendamentos (id INTEGER PRIMARY KEY AUTOINCREMENT, arquivo TEXT NOT NULL)")
+        conn.commit()
+        conn.close()
+        garantir_esquema(self.db_path)
+
+    def tearDown(self):
+        shutil.rmtree(self.pasta, ignore_errors=True)
+
+    def registrar(self, id_agendamento, dias_atras, estado=ESTADO_FINALIZADA, codigo_retorno=0, motivo=None):
+        finalizado_em = (self.AGORA - datetime.timedelta(days=dias_atras)).strftime("%Y-%m-%d %H:%M:%S")
+        conn = conectar(self.db_path)
+        try:
+            cursor = conn.execute(
+                """
+                INSERT INTO execucoes (id_agendamento, estado, enfileirado_em, finalizado_em, codigo_retorno, motivo_fim)
+                VALUES (?, ?, ?, ?, ?, ?)
+                """,
+                (id_agendamento, estado, finalizado_em, finalizado_em, codigo_retorno, motivo)
+            )
+            conn.commit()
+            return cursor.lastrowid
+        finally:
+            conn.close()
+
+    def ids(self):
+        conn = conectar(self.db_path)
+        try:
+            return {i for (i,) in conn.execute("SELECT id FROM execucoes")}
+        finally:
+            conn.close()
+
+    def plano(self, consulta, valores):
+        conn = conectar(self.db_path)
+        try:
+            return " ".join(linha[-1] for linha in conn.execute(f"EXPLAIN QUERY PLAN {consulta}", valores))
+        finally:
+            conn.close()
+
+    def test_deduplicacao_usa_indices(self):
+        casos = [
+            ("SELECT 1 FROM execucoes WHERE id_agendamento = ? AND horario_previsto = ? AND tentativa = ? LIMIT 1",
+             (1, "2030-01-01 10:00:00", 1), "idx_execucoes_horario"),
+            ("SELECT 1 FROM execucoes WHERE id_agendamento = ? AND chave_disparo = ? AND tentativa = ? LIMIT 1",
+             (1, "dependencias:1", 1), "idx_execucoes_chave"),
+            ("SELECT 1 FROM execucoes WHERE id_agendamento = ? AND estado IN (?, ?) LIMIT 1",
+             (1, ESTADO_FILA, ESTADO_EXECUTANDO), "idx_execucoes_agendamento_estado"),
+            ("SELECT MAX(enfileirado_em) FROM execucoes WHERE id_agendamento = ?",
+             (1,), "idx_execucoes_enfileirado"),
+        ]
+        for consulta, valores, indice in casos:
+            with self.subTest(indice=indice):
+                self.assertIn(indice, self.plano(consulta, valores))
+
+    def test_remove_encerradas_antigas(self):
+        antiga = self.registrar(1, 40, codigo_retorno=1)
+        descartada = self.registrar(1, 40, ESTADO_DESCARTADA, codigo_retorno=None)
+        abandonada = self.registrar(1, 40, ESTADO_ABANDONADA, codigo_retorno=None)
+        recente = self.registrar(1, 5, codigo_retorno=1)
+
+        self.assertEqual(limpar_execucoes(self.db_path, 10, dias=30, agora=self.AGORA), 3)
+        self.assertEqual(self.ids(), {recente})
+        self.assertFalse({antiga, descartada, abandonada} & self.ids())
+
+    def test_mantem_a_ultima_e_as_amostras_de_duracao(self):
+        sucessos = [self.registrar(1, 60 - n) for n in range(5)]
+        com_erros = self.registrar(1, 50, motivo=MOTIVO_ERROS_LOG)
+        ultima = self.registrar(1, 45, codigo_retorno=1)
+        unica = self.registrar(2, 90, codigo_retorno=1)
+
+        limpar_execucoes(self.db_path, 3, dias=30, agora=self.AGORA)
+        # As 3 últimas com sucesso (percentis) e a última do agendamento (dependentes)
+        self.assertEqual(self.ids(), set(sucessos[-3:]) | {ultima, unica})
+        self.assertNotIn(com_erros, self.ids())
+
+    def test_em_andamento_e_retencao_desativada(self):
+        conn = conectar(self.db_path)
+        conn.execute("INSERT INTO execucoes (id_agendamento, estado) VALUES (1, ?)", (ESTADO_FILA,))
+        conn.commit()
+        conn.close()
+        self.registrar(1, 400, codigo_retorno=1)
+        self.registrar(1, 400, codigo_retorno=1)
+        self.assertEqual(limpar_execucoes(self.db_path, 10, dias=0, agora=self.AGORA), 0)
+        # A execução na fila fica; das encerradas, só a última do agendamento
+        self.assertEqual(limpar_execucoes(self.db_path, 10, dias=30, agora=self.AGORA), 1)
+        self.assertEqual(len(self.ids()), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,93 @@
+# Copyright 2025 Thiago Luis de Lima
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import platform
+import shutil
+import stat
+import tempfile
+import unittest
+
+import executaWorkflow
+from executaWorkflow import executar_etl
+from scheduler.db import conectar, garantir_esquema
+
+WINDOWS = platform.system().lower() == 'windows'
+
+
+class TestExecucaoTerminal(unittest.TestCase):
+    """Scripts de terminal executados como na interface, no bot ou pela linha de comando"""
+
+    def setUp(self):
+        self.pasta = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.pasta, "agendador.db")
+        conn = conectar(self.db_path)
+        conn.execute(
+            """
+            CREATE TABLE agendamentos (
+                id INTEGER PRIMARY KEY AUTOINCREMENT, arquivo TEXT NOT NULL,
+                ultima_execucao DATETIME, duracao_execucao REAL
+            )
+            """
+        )
+        conn.execute("INSERT INTO agendamentos (id, arquivo) VALUES (1, 'script')")
+        conn.commit()
+        conn.close()
+        garantir_esquema(self.db_path)
+
+        self.db_original = executaWorkflow.DB_PATH
+        executaWorkflow.DB_PATH = self.db_path
+        self.saida = os.path.join(self.pasta, "saida.txt")
+
+    def tearDown(self):
+        executaWorkflow.DB_PATH = self.db_original
+        shutil.rmtree(self.pasta, ignore_errors=True)
+
+    def script(self, variavel):
+        """Script que grava em `saida.txt` o valor da variável de ambiente `variavel`"""
+        if WINDOWS:
+            caminho = os.path.join(self.pasta, "script.bat")
+            conteudo = f'@echo off\r\necho %{variavel}%> "{self.saida}"\r\n'
+        else:
+            caminho = os.path.join(self.pasta, "script.sh")
+            conteudo = f'#!/bin/sh\necho "${variavel}" > "{self.saida}"\n'
+        with open(caminho, "w", encoding="utf-8") as arquivo:
+            arquivo.write(conteudo)
+        os.chmod(caminho, os.stat(caminho).st_mode | stat.S_IXUSR)
+        return caminho
+
+    def ler_saida(self):
+        with open(self.saida, encoding="utf-8") as arquivo:
+            return arquivo.read().strip()
+
+    def test_sem_parametros(self):
+        # Execução manual, pela interface ou pelo bot: parametros fica como None
+        self.assertTrue(executar_etl(1, self.script("PATH"), timeout=60))
+        self.assertTrue(os.path.exists(self.saida))
+
+    def test_parametros_viram_variaveis_de_ambiente(self):
+        caminho = self.script("DATA_REFERENCIA")
+        self.assertTrue(executar_etl(1, caminho, timeout=60, parametros={"DATA_REFERENCIA": "2025-01-31"}))
+        self.assertEqual(self.ler_saida(), "2025-01-31")
+
+    def test_registra_a_execucao(self):
+        self.assertTrue(executar_etl(1, self.script("PATH"), timeout=60))
+        conn = conectar(self.db_path)
+        ultima_execucao, = conn.execute("SELECT ultima_execucao FROM agendamentos WHERE id = 1").fetchone()
+        conn.close()
+        self.assertIsNotNone(ultima_execucao)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,166 @@
+# Copyright 2025 Thiago Luis de Lima
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import datetime
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+from scheduler import locks
+from scheduler.db import conectar, garantir_esquema
+from scheduler.locks import (
+    RenovadorTravas, adquirir_trava, execucoes_em_andamento, ler_politica, obter_trava, registrar_espera
+)
+
+# Dois donos vivos nesta máquina, como o serviço e uma execução manual
+PID_SERVICO = os.getpid()
+PID_MANUAL = os.getppid()
+
+PRAZO_TESTE = 10
+
+
+def pid_encerrado():
+    """PID de um processo que já terminou"""
+    processo = subprocess.Popen([sys.executable, "-c", "pass"])
+    processo.wait()
+    return processo.pid
+
+
+class TestTravas(unittest.TestCase):
+
+    def setUp(self):
+        self.pasta = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.pasta, "agendador.db")
+        conn = conectar(self.db_path)
+        conn.execute("CREATE TABLE agendamentos (id INTEGER PRIMARY KEY AUTOINCREMENT, arquivo TEXT NOT NULL)")
+        conn.execute("INSERT INTO agendamentos (id, arquivo) VALUES (1, 'job.kjb')")
+        conn.commit()
+        conn.close()
+        garantir_esquema(self.db_path)
+
+    def tearDown(self):
+        shutil.rmtree(self.pasta, ignore_errors=True)
+
+    def politica(self, politica, max_paralelo=1):
+        conn = conectar(self.db_path)
+        conn.execute(
+            "UPDATE agendamentos SET politica_sobreposicao = ?, max_paralelo = ? WHERE id = 1",
+            (politica, max_paralelo)
+        )
+        conn.commit()
+        conn.close()
+
+    def renovada_em(self, tabela, momento=None):
+        """Lê (ou, com `momento`, regrava) a última renovação registrada em `tabela` por outra conexão"""
+        conn = conectar(self.db_path)
+        try:
+            if momento is not None:
+                conn.execute(f"UPDATE {tabela} SET renovada_em = ?", (locks._texto(momento),))
+                conn.commit()
+            return [valor for (valor,) in conn.execute(f"SELECT renovada_em FROM {tabela}")]
+        finally:
+            conn.close()
+
+    def test_slot_unico(self):
+        trava = adquirir_trava(self.db_path, 1, "servico", 1, pid=PID_SERVICO)
+        self.assertIsNotNone(trava)
+        self.assertIsNone(adquirir_trava(self.db_path, 1, "manual", 1, pid=PID_MANUAL))
+        # Outro agendamento não disputa o mesmo slot
+        self.assertIsNotNone(adquirir_trava(self.db_path, 2, "manual", 1, pid=PID_MANUAL))
+
+        trava.liberar()
+        outra = adquirir_trava(self.db_path, 1, "manual", 1, pid=PID_MANUAL)
+        self.assertIsNotNone(outra)
+        self.assertEqual((outra.slot, outra.origem), (0, "manual"))
+
+    def test_paralelo_ocupa_slots_distintos(self):
+        self.politica('PARALELO', 2)
+        _, limite = ler_politica(self.db_path, 1)
+        travas = [adquirir_trava(self.db_path, 1, "servico", limite, pid=PID_SERVICO) for _ in range(2)]
+        self.assertEqual(sorted(trava.slot for trava in travas), [0, 1])
+        self.assertIsNone(adquirir_trava(self.db_path, 1, "manual", limite, pid=PID_MANUAL))
+        self.assertEqual(len(execucoes_em_andamento(self.db_path)), 2)
+
+    def test_trava_expirada_e_assumida(self):
+        self.assertIsNotNone(adquirir_trava(self.db_path, 1, "servico", 1, pid=PID_SERVICO))
+        expirada = datetime.datetime.now() - datetime.timedelta(seconds=locks.TTL_TRAVA + 1)
+        self.renovada_em("travas_execucao", expirada)
+
+        trava = adquirir_trava(self.db_path, 1, "manual", 1, pid=PID_MANUAL)
+        self.assertIsNotNone(trava)
+        self.assertEqual([linha[2] for linha in execucoes_em_andamento(self.db_path)], [PID_MANUAL])
+
+    def test_dono_morto_libera_a_trava(self):
+        self.assertIsNotNone(adquirir_trava(self.db_path, 1, "manual", 1, pid=pid_encerrado()))
+        self.assertIsNotNone(adquirir_trava(self.db_path, 1, "servico", 1, pid=PID_SERVICO))
+
+    def test_renovador_mantem_a_trava(self):
+        trava = adquirir_trava(self.db_path, 1, "servico", 1)
+        antiga = datetime.datetime.now() - datetime.timedelta(seconds=locks.TTL_TRAVA - 1)
+        self.renovada_em("travas_execucao", antiga)
+
+        renovador = RenovadorTravas(self.db_path, intervalo=0.05)
+        renovador.adicionar(trava)
+        renovador.iniciar()
+        try:
+            limite = time.monotonic() + PRAZO_TESTE
+            while self.renovada_em("travas_execucao") == [locks._texto(antiga)] and time.monotonic() < limite:
+                time.sleep(0.05)
+        finally:
+            renovador.parar()
+        self.assertNotEqual(self.renovada_em("travas_execucao"), [locks._texto(antiga)])
+        self.assertIsNone(adquirir_trava(self.db_path, 1, "manual", 1, pid=PID_MANUAL))
+
+    def test_pular_descarta(self):
+        self.politica('PULAR')
+        anterior = adquirir_trava(self.db_path, 1, "servico", 1, pid=PID_MANUAL)
+        self.assertIsNotNone(anterior)
+        self.assertEqual(obter_trava(self.db_path, 1, "manual", intervalo_espera=0.05), (None, None))
+        self.assertEqual(self.renovada_em("travas_espera"), [])
+
+    def test_enfileirar_aguarda_a_execucao_anterior(self):
+        self.politica('ENFILEIRAR')
+        anterior = adquirir_trava(self.db_path, 1, "servico", 1, pid=PID_MANUAL)
+        resultado = []
+        espera = threading.Thread(
+            target=lambda: resultado.append(obter_trava(self.db_path, 1, "manual", intervalo_espera=0.05))
+        )
+        espera.start()
+
+        # O disparo fica registrado como espera em vez de ser descartado
+        limite = time.monotonic() + PRAZO_TESTE
+        while not self.renovada_em("travas_espera") and time.monotonic() < limite:
+            time.sleep(0.02)
+        self.assertEqual(len(self.renovada_em("travas_espera")), 1)
+        self.assertTrue(espera.is_alive())
+        # Só há uma vaga de espera por agendamento
+        self.assertFalse(registrar_espera(self.db_path, 1, "bot", pid=PID_MANUAL))
+
+        anterior.liberar()
+        espera.join(PRAZO_TESTE)
+        self.assertFalse(espera.is_alive())
+        trava, renovador = resultado[0]
+        renovador.parar()
+        self.assertIsNotNone(trava)
+        self.assertEqual(trava.origem, "manual")
+        self.assertEqual(self.renovada_em("travas_espera"), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,90 @@
+# Copyright 2025 Thiago Luis de Lima
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from scheduler import memoria
+from scheduler.memoria import LimiteMemoria, limpar_cgroups
+
+# Aloca 512 MB de uma vez; com teto de 256 MB por processo a alocação falha
+ALOCAR = "import sys\ntry:\n    bytearray(512 * 1024 * 1024)\nexcept MemoryError:\n    sys.exit(3)\n"
+
+
+@unittest.skipUnless(memoria.LINUX, "rlimit e cgroups só existem no Linux")
+class TestLimiteMemoriaLinux(unittest.TestCase):
+
+    def setUp(self):
+        self.cgroup = memoria.CGROUP_MEMORIA
+        self.pasta = tempfile.mkdtemp()
+        memoria.CGROUP_MEMORIA = ""
+
+    def tearDown(self):
+        memoria.CGROUP_MEMORIA = self.cgroup
+        shutil.rmtree(self.pasta, ignore_errors=True)
+
+    def executar(self, limite):
+        processo = subprocess.Popen([sys.executable, "-c", ALOCAR], preexec_fn=limite.preexec_fn)
+        limite.acompanhar(processo.pid)
+        return processo.wait(timeout=60), processo.pid
+
+    def test_rlimit_por_processo(self):
+        codigo, _ = self.executar(LimiteMemoria(256, por_processo=True))
+        self.assertEqual(codigo, 3)
+        # Sem rlimit (ferramentas Java) a alocação passa; o teto da árvore fica com a medição e o cgroup
+        limite = LimiteMemoria(256)
+        self.assertIsNone(limite.preexec_fn)
+        self.assertEqual(self.executar(limite)[0], 0)
+
+    def cgroup_falso(self):
+        """Diretório com a aparência de um cgroup v2 delegado; os arquivos de controle são arquivos comuns"""
+        memoria.CGROUP_MEMORIA = self.pasta
+        open(os.path.join(self.pasta, "cgroup.controllers"), "w").close()
+
+    def test_processo_entra_no_cgroup_antes_do_exec(self):
+        self.cgroup_falso()
+        limite = LimiteMemoria(64)
+        processo = subprocess.Popen([sys.executable, "-c", "pass"], preexec_fn=limite.preexec_fn)
+        processo.wait(timeout=60)
+        # Criado pelo próprio filho, antes de acompanhar(): nenhum descendente nasce fora dele
+        caminho = os.path.join(self.pasta, f"execucao-{processo.pid}")
+        with open(os.path.join(caminho, "memory.max"), encoding="utf-8") as arquivo:
+            self.assertEqual(arquivo.read(), str(64 * 1024 * 1024))
+        with open(os.path.join(caminho, "cgroup.procs"), encoding="utf-8") as arquivo:
+            self.assertEqual(arquivo.read(), "0")
+
+    def test_limpeza_na_inicializacao(self):
+        self.cgroup_falso()
+        for nome in ("execucao-10", "execucao-11", "outro"):
+            os.mkdir(os.path.join(self.pasta, nome))
+        # Um cgroup com processos não pode ser removido: fica como está
+        open(os.path.join(self.pasta, "execucao-11", "cgroup.procs"), "w").close()
+
+        self.assertEqual(limpar_cgroups(), 1)
+        self.assertEqual(sorted(os.listdir(self.pasta)), ["cgroup.controllers", "execucao-11", "outro"])
+
+    def test_sem_cgroup_configurado(self):
+        os.mkdir(os.path.join(self.pasta, "execucao-10"))
+        self.assertEqual(limpar_cgroups(), 0)
+        memoria.CGROUP_MEMORIA = self.pasta  # sem cgroup.controllers: não é um cgroup v2
+        self.assertEqual(limpar_cgroups(), 0)
+        self.assertIsNone(LimiteMemoria(64).preexec_fn)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,240 @@
+# Copyright 2025 Thiago Luis de Lima
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import collections
+import datetime
+import multiprocessing
+import os
+import queue
+import shutil
+import tempfile
+import time
+import unittest
+
+from scheduler import nos
+from scheduler.db import conectar, garantir_esquema
+from scheduler.execucoes import (
+    ESTADO_ABANDONADA, ESTADO_EXECUTANDO, ESTADO_FINALIZADA, registrar_fim, registrar_inicio
+)
+
+# Prazos curtos para o teste: concessões expiram em segundos, batimento contínuo
+TTL_TESTE = 2
+INTERVALO_TESTE = 0.1
+
+AGENDAMENTOS = (1, 2, 3, 4)
+HORARIOS = tuple(datetime.datetime(2030, 1, 1, 10, minuto) for minuto in range(3))
+PRAZO_TESTE = 60
+
+
+def _disparos():
+    """Os mesmos disparos, avaliados por todos os nós; metade já concedida a quem registrar"""
+    return [
+        dict(id_agendamento=id_agendamento, prioridade=0, horario_previsto=horario, reivindicar=indice % 2 == 0)
+        for indice, (id_agendamento, horario) in enumerate(
+            (id_agendamento, horario) for horario in HORARIOS for id_agendamento in AGENDAMENTOS
+        )
+    ]
+
+
+def _trabalhador(db_path, no, eventos, fim, travar=False):
+    """
+    Nó simulado em outro processo: registra os disparos, reivindica pelo
+    CoordenadorNos e "executa" uma execução por vez. Com `travar`, fica parado
+    na primeira execução iniciada até ser morto pelo teste, sem usar `eventos`
+    nem `fim`: morto com um lock deles adquirido, travaria os demais processos.
+    """
+    nos.TTL_CONCESSAO = TTL_TESTE
+    nos.INTERVALO_BATIMENTO = INTERVALO_TESTE
+    nos.ESPERA_POR_POSICAO = 0
+
+    pendentes = collections.deque()
+    proprias = set()
+    em_execucao = []
+
+    def medir():
+        fila = len(pendentes)
+        return 1, len(em_execucao), fila, nos.carga_no(1, len(em_execucao), fila)
+
+    def receber(linhas):
+        for linha in linhas:
+            proprias.add(linha[0])
+            pendentes.append(linha[0])
+
+    def perder(ids):
+        for id_execucao in ids:
+            eventos.put(("perdida", no, id_execucao))
+
+    coordenador = nos.CoordenadorNos(
+        db_path, medir, receber, no=no, proprias=lambda: list(proprias), ao_perder=perder
+    )
+    coordenador.conhecidos = frozenset(AGENDAMENTOS)
+    coordenador.iniciar()
+
+    disparos = _disparos()
+    ids = nos.publicar_execucoes(db_path, no, disparos)
+    for disparo, id_execucao in zip(disparos, ids):
+        if id_execucao is not None and disparo["reivindicar"]:
+            receber([(id_execucao,)])
+
+    while not fim.is_set():
+        try:
+            id_execucao = pendentes.popleft()
+        except IndexError:
+            time.sleep(0.02)
+            continue
+        if not registrar_inicio(db_path, id_execucao, 0.0, pid=os.getpid(), no=no):
+            proprias.discard(id_execucao)
+            continue
+        em_execucao.append(id_execucao)
+        while travar:
+            time.sleep(1)
+        eventos.put(("inicio", no, id_execucao))
+        time.sleep(0.05)
+        if registrar_fim(db_path, id_execucao, codigo_retorno=0, duracao_seg=0.05, no=no):
+            eventos.put(("fim", no, id_execucao))
+        em_execucao.remove(id_execucao)
+        proprias.discard(id_execucao)
+    coordenador.parar()
+
+
+class TestVariosNos(unittest.TestCase):
+    """Vários processos dividindo o mesmo banco SQLite, como nós em máquinas diferentes"""
+
+    NOS = 3
+
+    def setUp(self):
+        self.pasta = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.pasta, "agendador.db")
+        conn = conectar(self.db_path)
+        conn.execute(
+            """
+            CREATE TABLE agendamentos (
+                id INTEGER PRIMARY KEY AUTOINCREMENT, arquivo TEXT NOT NULL, projeto TEXT, local_run TEXT,
+                horario TEXT, intervalo INTEGER, dias_semana TEXT, dias_mes TEXT, hora_inicio TEXT,
+                hora_fim TEXT, status TEXT NOT NULL DEFAULT 'Ativo', ferramenta_etl TEXT,
+                ultima_execucao DATETIME, duracao_execucao REAL
+            )
+            """
+        )
+        conn.executemany(
+            "INSERT INTO agendamentos (id, arquivo, horario) VALUES (?, ?, '')",
+            [(id_agendamento, f"job{id_agendamento}.kjb") for id_agendamento in AGENDAMENTOS]
+        )
+        conn.commit()
+        conn.close()
+        garantir_esquema(self.db_path)
+
+        self.contexto = multiprocessing.get_context("spawn")
+        self.eventos = self.contexto.Queue()
+        self.fim = self.contexto.Event()
+        self.processos = []
+
+    def tearDown(self):
+        self.fim.set()
+        for processo in self.processos:
+            processo.join(timeout=10)
+            if processo.is_alive():
+                processo.kill()
+                processo.join()
+        shutil.rmtree(self.pasta, ignore_errors=True)
+
+    def _iniciar(self, no, travar=False):
+        processo = self.contexto.Process(
+            target=_trabalhador, args=(self.db_path, no, self.eventos, self.fim, travar), daemon=True
+        )
+        processo.start()
+        self.processos.append(processo)
+        return processo
+
+    def _consultar(self, sql, parametros=()):
+        conn = conectar(self.db_path)
+        try:
+            return conn.execute(sql, parametros).fetchall()
+        finally:
+            conn.close()
+
+    def _esperar_inicio(self, no):
+        limite = time.monotonic() + PRAZO_TESTE
+        while time.monotonic() < limite:
+            linhas = self._consultar("SELECT id FROM execucoes WHERE estado = ? AND no = ?", (ESTADO_EXECUTANDO, no))
+            if linhas:
+                return linhas[0][0]
+            time.sleep(0.1)
+        self.fail(f"{no} não iniciou nenhuma execução")
+
+    def _encerrar(self, processos):
+        """Encerra os nós lendo os eventos: um processo só termina depois de entregar os que enviou"""
+        self.fim.set()
+        recebidos = []
+        limite = time.monotonic() + PRAZO_TESTE
+        while any(processo.is_alive() for processo in processos) and time.monotonic() < limite:
+            try:
+                recebidos.append(self.eventos.get(timeout=0.1))
+            except queue.Empty:
+                pass
+        while True:
+            try:
+                recebidos.append(self.eventos.get(timeout=0.5))
+            except queue.Empty:
+                return recebidos
+
+    def _finalizadas(self):
+        return self._consultar(
+            "SELECT id_agendamento, horario_previsto, no FROM execucoes WHERE estado = ?", (ESTADO_FINALIZADA,)
+        )
+
+    def test_cada_disparo_executado_uma_vez_e_no_morto_recolocado(self):
+        # O primeiro nó registra todos os disparos, inicia uma execução e trava nela
+        vitima = self._iniciar("vitima", travar=True)
+        id_travada = self._esperar_inicio("vitima")
+        nos_ativos = [self._iniciar(f"no{indice}") for indice in range(self.NOS)]
+
+        vitima.kill()
+        vitima.join()
+
+        total = len(AGENDAMENTOS) * len(HORARIOS)
+        limite = time.monotonic() + PRAZO_TESTE
+        while len(self._finalizadas()) < total and time.monotonic() < limite:
+            time.sleep(0.2)
+        # Tempo para uma execução em dobro, se houvesse, aparecer
+        time.sleep(TTL_TESTE)
+        recebidos = self._encerrar(nos_ativos)
+
+        finalizadas = self._finalizadas()
+        disparos = collections.Counter((id_agendamento, horario) for id_agendamento, horario, _ in finalizadas)
+        self.assertEqual(len(disparos), total)
+        self.assertEqual(set(disparos.values()), {1}, "disparo executado mais de uma vez")
+        self.assertNotIn("vitima", {no for _, _, no in finalizadas})
+        # Cada execução é iniciada por um único nó
+        inicios = collections.Counter(id_execucao for tipo, _, id_execucao in recebidos if tipo == "inicio")
+        self.assertEqual(len(inicios), total)
+        self.assertEqual(set(inicios.values()), {1})
+        self.assertEqual([evento for evento in recebidos if evento[0] == "perdida"], [])
+
+        abandonadas = self._consultar(
+            "SELECT id, no, motivo_fim, id_agendamento, horario_previsto FROM execucoes WHERE estado = ?",
+            (ESTADO_ABANDONADA,)
+        )
+        total_linhas = self._consultar("SELECT COUNT(*) FROM execucoes")[0][0]
+        # Só a execução travada do nó morto é abandonada, e recolocada uma única vez
+        self.assertEqual(len(abandonadas), 1)
+        id_abandonada, dono, motivo, id_agendamento, horario = abandonadas[0]
+        self.assertEqual((id_abandonada, dono), (id_travada, "vitima"))
+        self.assertEqual(motivo, "concessão do nó vitima expirada")
+        self.assertEqual(disparos[(id_agendamento, horario)], 1)
+        self.assertEqual(total_linhas, total + 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
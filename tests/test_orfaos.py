@@ -0,0 +1,92 @@
+# Copyright 2025 Thiago Luis de Lima
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import subprocess
+import sys
+import unittest
+
+from scheduler.orfaos import orfao
+from scheduler.processos import (
+    VARIAVEL_ORIGEM, ambiente_execucao, criacao_processo, origem_execucao, psutil
+)
+
+
+class ProcessoFalso:
+    """Processo de ferramenta ETL visto pelo coletor, com o ambiente informado"""
+
+    def __init__(self, ambiente=None, erro=None):
+        self.ambiente = ambiente or {}
+        self.erro = erro
+
+    def environ(self):
+        if self.erro:
+            raise self.erro
+        return self.ambiente
+
+
+def pid_encerrado():
+    """PID de um processo que já terminou"""
+    processo = subprocess.Popen([sys.executable, "-c", "pass"])
+    processo.wait()
+    return processo.pid
+
+
+@unittest.skipIf(psutil is None, "requer psutil")
+class TestOrfao(unittest.TestCase):
+
+    def test_sem_marca_nunca_e_orfao(self):
+        # JVM de outra equipe (systemd, nohup, setsid): pai morto, mas sem a marca do PyFlowT3
+        self.assertFalse(orfao(ProcessoFalso({"PATH": "/usr/bin"})))
+        self.assertFalse(orfao(ProcessoFalso({VARIAVEL_ORIGEM: "lixo"})))
+
+    def test_origem_viva_nao_e_orfao(self):
+        self.assertFalse(orfao(ProcessoFalso(ambiente_execucao({}))))
+
+    def test_origem_morta_e_orfao(self):
+        self.assertTrue(orfao(ProcessoFalso({VARIAVEL_ORIGEM: f"{pid_encerrado()}:"})))
+
+    def test_pid_reutilizado_e_orfao(self):
+        # O PID da origem existe, mas é de outro processo (criado em outro momento)
+        criado_em = criacao_processo(os.getpid()) - 3600
+        self.assertTrue(orfao(ProcessoFalso({VARIAVEL_ORIGEM: f"{os.getpid()}:{criado_em}"})))
+
+    def test_ambiente_inacessivel_nao_e_orfao(self):
+        self.assertFalse(orfao(ProcessoFalso(erro=psutil.AccessDenied(1))))
+        self.assertFalse(orfao(ProcessoFalso(erro=psutil.NoSuchProcess(1))))
+
+
+class TestMarcaOrigem(unittest.TestCase):
+
+    def test_marca_identifica_o_processo_atual(self):
+        ambiente = ambiente_execucao({"PARAM": "1"})
+        self.assertEqual(ambiente["PARAM"], "1")
+        pid, criado_em = origem_execucao(ambiente)
+        self.assertEqual(pid, os.getpid())
+        self.assertEqual(criado_em, criacao_processo(os.getpid()))
+
+    def test_herda_o_ambiente_atual_sem_altera_lo(self):
+        ambiente = ambiente_execucao()
+        self.assertEqual(ambiente.get("PATH"), os.environ.get("PATH"))
+        self.assertNotIn(VARIAVEL_ORIGEM, os.environ)
+
+    def test_marca_invalida_ou_ausente(self):
+        self.assertIsNone(origem_execucao({}))
+        self.assertIsNone(origem_execucao({VARIAVEL_ORIGEM: ""}))
+        self.assertIsNone(origem_execucao({VARIAVEL_ORIGEM: "abc:1"}))
+        self.assertEqual(origem_execucao({VARIAVEL_ORIGEM: "42:"}), (42, None))
+
+
+if __name__ == "__main__":
+    unittest.main()
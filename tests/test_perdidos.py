@@ -0,0 +1,123 @@
+# Copyright 2025 Thiago Luis de Lima
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import datetime
+import os
+import shutil
+import tempfile
+import unittest
+
+from scheduler import perdidos
+from scheduler.db import conectar, garantir_esquema
+from scheduler.execucoes import FORMATO_DATA
+from scheduler.perdidos import disparos_a_recuperar, gravar_ultimo_tick, ler_ultimo_tick
+from scheduler.rules import COLUNAS_REGRA, compilar_regra
+
+ULTIMO_TICK = datetime.datetime(2026, 10, 17, 10, 0)
+AGORA = datetime.datetime(2026, 10, 17, 10, 35, 20)
+
+
+def regra(id_agendamento, cron, politica, maximo=1, dependencias=None, **campos):
+    campos = dict(
+        id=id_agendamento, arquivo=f"job{id_agendamento}.kjb", cron=cron,
+        politica_perdidos=politica, max_perdidos=maximo, **campos
+    )
+    return compilar_regra(tuple(campos.get(coluna) for coluna in COLUNAS_REGRA) + (dependencias,))
+
+
+def minutos(*horarios):
+    return [datetime.datetime(2026, 10, 17, hora, minuto) for hora, minuto in horarios]
+
+
+class TestDisparosPerdidos(unittest.TestCase):
+
+    def setUp(self):
+        self.pasta = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.pasta, "agendador.db")
+        conn = conectar(self.db_path)
+        conn.execute("CREATE TABLE agendamentos (id INTEGER PRIMARY KEY AUTOINCREMENT, arquivo TEXT NOT NULL)")
+        conn.commit()
+        conn.close()
+        garantir_esquema(self.db_path)
+
+    def tearDown(self):
+        shutil.rmtree(self.pasta, ignore_errors=True)
+
+    def recuperar(self, regras, ultimo_tick=ULTIMO_TICK, agora=AGORA):
+        return [(r.id, horario) for r, horario in disparos_a_recuperar(self.db_path, regras, ultimo_tick, agora)]
+
+    def test_politicas(self):
+        # Perdidos: 10:10, 10:20 e 10:30; o minuto corrente (10:35) fica para o tick normal
+        casos = [
+            ("PULAR", 5, []),
+            ("UMA_VEZ", 5, minutos((10, 30))),
+            ("TODOS", 2, minutos((10, 20), (10, 30))),
+            ("TODOS", 5, minutos((10, 10), (10, 20), (10, 30))),
+            ("desconhecida", 5, []),
+        ]
+        for politica, maximo, esperado in casos:
+            with self.subTest(politica=politica, maximo=maximo):
+                self.assertEqual(
+                    self.recuperar([regra(1, "*/10 * * * *", politica, maximo)]), [(1, h) for h in esperado]
+                )
+
+    def test_minuto_corrente_e_tick_nao_sao_perdidos(self):
+        self.assertEqual(self.recuperar([regra(1, "*/5 * * * *", "UMA_VEZ")]), [(1, minutos((10, 30))[0])])
+        self.assertEqual(self.recuperar([regra(1, "0 10 * * *", "TODOS", 5)]), [])
+
+    def test_ja_registrados_nao_repetem(self):
+        conn = conectar(self.db_path)
+        conn.execute(
+            "INSERT INTO execucoes (id_agendamento, estado, horario_previsto) VALUES (1, 'FINALIZADA', ?)",
+            (datetime.datetime(2026, 10, 17, 10, 20).strftime(FORMATO_DATA),)
+        )
+        conn.commit()
+        conn.close()
+        self.assertEqual(
+            self.recuperar([regra(1, "*/10 * * * *", "TODOS", 5), regra(2, "*/10 * * * *", "TODOS", 5)]),
+            [(1, minutos((10, 10))[0]), (2, minutos((10, 10))[0]), (2, minutos((10, 20))[0]),
+             (1, minutos((10, 30))[0]), (2, minutos((10, 30))[0])],
+        )
+
+    def test_sem_parada(self):
+        regras = [regra(1, "* * * * *", "TODOS", 5)]
+        self.assertEqual(self.recuperar(regras, ultimo_tick=None), [])
+        self.assertEqual(self.recuperar(regras, ultimo_tick=AGORA.replace(second=0)), [])
+        self.assertEqual(self.recuperar(regras, ultimo_tick=AGORA + datetime.timedelta(hours=1)), [])
+
+    def test_regras_ignoradas(self):
+        # Após término recomeça sozinha; dependente dispara pelas dependências
+        regras = [
+            regra(1, "*/10 * * * *", "TODOS", 5, intervalo_seg=600, modo_intervalo="APOS_TERMINO"),
+            regra(2, "*/10 * * * *", "TODOS", 5, dependencias="1"),
+        ]
+        self.assertEqual(self.recuperar(regras), [])
+
+    def test_parada_maior_que_a_janela(self):
+        ultimo_tick = ULTIMO_TICK - datetime.timedelta(days=3)
+        with self.assertLogs("scheduler.perdidos", level="WARNING"):
+            recuperados = self.recuperar([regra(1, "0 * * * *", "TODOS", 1000)], ultimo_tick=ultimo_tick)
+        self.assertEqual(len(recuperados), int(perdidos.JANELA_RECUPERACAO))
+        self.assertEqual(recuperados[-1], (1, minutos((10, 0))[0]))
+        self.assertGreater(recuperados[0][1], AGORA - datetime.timedelta(hours=perdidos.JANELA_RECUPERACAO))
+
+    def test_ultimo_tick(self):
+        self.assertIsNone(ler_ultimo_tick(self.db_path))
+        gravar_ultimo_tick(self.db_path, ULTIMO_TICK)
+        gravar_ultimo_tick(self.db_path, ULTIMO_TICK + datetime.timedelta(minutes=1))
+        self.assertEqual(ler_ultimo_tick(self.db_path), ULTIMO_TICK + datetime.timedelta(minutes=1))
+
+
+if __name__ == "__main__":
+    unittest.main()
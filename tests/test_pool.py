@@ -0,0 +1,216 @@
+# Copyright 2025 Thiago Luis de Lima
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import collections
+import threading
+import time
+import types
+import unittest
+
+from scheduler.pool import PedidoExecucao, PoolExecucao
+
+ESPERA = 2.0
+
+
+def regra(arquivo, ferramenta='TERMINAL', grupo=None, prioridade=0):
+    return types.SimpleNamespace(
+        arquivo=arquivo, ferramenta_etl=ferramenta, projeto=None, grupo_recurso=grupo, prioridade=prioridade
+    )
+
+
+class HandleFalso:
+    """Execução simulada: termina quando o teste chama encerrar()"""
+
+    def __init__(self, pedido):
+        self.pedido = pedido
+        self.pid = id(pedido)
+        self.vivo = True
+
+    def is_alive(self):
+        return self.vivo
+
+    def encerrar(self):
+        self.vivo = False
+
+
+def esperar(condicao):
+    """Aguarda até ESPERA segundos a condição ficar verdadeira"""
+    limite = time.monotonic() + ESPERA
+    while not condicao():
+        if time.monotonic() > limite:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def em_outra_thread(funcao):
+    """Executa `funcao` em outra thread; True se ela terminou dentro de ESPERA"""
+    thread = threading.Thread(target=funcao, daemon=True)
+    thread.start()
+    thread.join(ESPERA)
+    return not thread.is_alive()
+
+
+class TestPoolSemLock(unittest.TestCase):
+    """Os callbacks (admitir, iniciar, finalizar) gravam no banco: não podem rodar com o lock do pool"""
+
+    def setUp(self):
+        self.iniciados = []
+        self.finalizados = []
+        self.admitir = lambda pedido: True
+        self.pool = PoolExecucao(
+            self._iniciar, limite_global=1, limites={}, grupos={},
+            admitir=lambda pedido: self.admitir(pedido), finalizar=self._finalizar
+        )
+
+    def tearDown(self):
+        self.pool.parar()
+
+    def _iniciar(self, pedido):
+        handle = HandleFalso(pedido)
+        self.iniciados.append(pedido)
+        return handle
+
+    def _finalizar(self, pedido):
+        self.finalizados.append(pedido)
+
+    def test_submeter_nao_espera_a_admissao(self):
+        liberar, admitindo = threading.Event(), threading.Event()
+
+        def admitir(pedido):
+            admitindo.set()
+            liberar.wait(ESPERA * 5)
+            return True
+
+        self.admitir = admitir
+        self.pool.iniciar()
+        self.assertTrue(em_outra_thread(lambda: self.pool.submeter(PedidoExecucao(regra("a")))))
+        self.assertTrue(admitindo.wait(ESPERA))
+
+        # Com a admissão travada (banco ocupado), o loop principal continua submetendo
+        self.assertTrue(em_outra_thread(lambda: self.pool.submeter(PedidoExecucao(regra("b")))))
+        self.assertTrue(em_outra_thread(self.pool.estado))
+        # O slot reservado conta no limite global enquanto a admissão não termina
+        self.assertEqual(self.pool.estado()['pool_em_execucao'], 1)
+
+        liberar.set()
+        self.assertTrue(esperar(lambda: self.pool.em_execucao()))
+        self.assertEqual([p.regra.arquivo for p in self.iniciados], ["a"])
+
+    def test_finalizar_sem_lock_e_submissao_do_callback_na_mesma_rodada(self):
+        bloqueios = []
+
+        def finalizar(pedido):
+            bloqueios.append(not em_outra_thread(self.pool.estado))
+            if pedido.regra.arquivo == "a":
+                # Como um dependente disparado ao fim da execução
+                self.pool.submeter(PedidoExecucao(regra("dependente")))
+
+        self.pool._finalizar = finalizar
+        self.pool.iniciar()
+        self.pool.submeter(PedidoExecucao(regra("a")))
+        self.assertTrue(esperar(lambda: self.iniciados))
+        self.iniciados[0].handle.encerrar()
+        self.pool.acordar()
+
+        self.assertTrue(esperar(lambda: len(self.iniciados) == 2))
+        self.assertEqual(bloqueios, [False])
+        self.assertEqual([p.regra.arquivo for p in self.iniciados], ["a", "dependente"])
+
+    def test_admissao_recusada_volta_para_a_fila(self):
+        self.admitir = lambda pedido: pedido.regra.arquivo != "a"
+        self.pool.submeter(PedidoExecucao(regra("a")))
+        self.pool.submeter(PedidoExecucao(regra("b")))
+        self.pool._despachar()
+
+        # O slot recusado por "a" fica para "b" na mesma rodada
+        self.assertEqual([p.regra.arquivo for p in self.iniciados], ["b"])
+        self.assertEqual([p.regra.arquivo for p in self.pool.pedidos()], ["b", "a"])
+        self.assertEqual(self.finalizados, [])
+
+    def test_descartado_e_falha_ao_iniciar_sao_finalizados(self):
+        self.admitir = lambda pedido: None if pedido.regra.arquivo == "descartado" else True
+        self.pool._iniciar = lambda pedido: None
+        self.pool.submeter(PedidoExecucao(regra("descartado")))
+        self.pool.submeter(PedidoExecucao(regra("falhou")))
+        self.pool._despachar()
+
+        self.assertEqual(sorted(p.regra.arquivo for p in self.finalizados), ["descartado", "falhou"])
+        self.assertEqual(self.pool.pedidos(), [])
+        self.assertEqual(self.pool.estado()['pool_em_execucao'], 0)
+
+
+class TestDivisaoJusta(unittest.TestCase):
+    """Cada slot livre vai para o grupo com menos execuções em relação ao seu peso"""
+
+    def criar(self, limite_global, grupos):
+        self.iniciados = []
+        self.pool = PoolExecucao(
+            lambda pedido: self.iniciados.append(pedido) or HandleFalso(pedido),
+            limite_global=limite_global, limites={}, grupos=grupos
+        )
+
+    def submeter(self, grupo, quantidade, prioridade=0):
+        for indice in range(quantidade):
+            self.pool.submeter(PedidoExecucao(regra(f"{grupo}{indice}", grupo=grupo, prioridade=prioridade)))
+
+    def iniciados_por_grupo(self):
+        return collections.Counter(p.grupo for p in self.iniciados)
+
+    def test_slots_proporcionais_ao_peso(self):
+        self.criar(6, {"etl": (0, 2.0), "bi": (0, 1.0)})
+        self.submeter("bi", 6)
+        self.submeter("etl", 6)
+        self.pool._despachar()
+        self.assertEqual(self.iniciados_por_grupo(), {"etl": 4, "bi": 2})
+
+    def test_execucoes_em_andamento_contam_na_divisao(self):
+        self.criar(4, {})
+        for indice in range(2):
+            pedido = PedidoExecucao(regra(f"a{indice}", grupo="a"))
+            pedido.handle = HandleFalso(pedido)
+            self.pool.adotar(pedido)
+        self.submeter("a", 3)
+        self.submeter("b", 3)
+        self.pool._despachar()
+        self.assertEqual(self.iniciados_por_grupo(), {"b": 2})
+
+    def test_limite_do_grupo_cede_os_slots(self):
+        self.criar(4, {"etl": (1, 10.0)})
+        self.submeter("etl", 3)
+        self.submeter("bi", 3)
+        self.pool._despachar()
+        self.assertEqual(self.iniciados_por_grupo(), {"etl": 1, "bi": 3})
+
+    def test_slot_liberado_vai_para_o_grupo_menos_servido(self):
+        self.criar(2, {})
+        self.submeter("a", 3)
+        self.pool._despachar()
+        self.submeter("b", 1)
+        self.iniciados[0].handle.encerrar()
+        self.pool._despachar()
+        self.assertEqual([p.regra.arquivo for p in self.iniciados], ["a0", "a1", "b0"])
+
+    def test_prioridade_dentro_do_grupo_e_no_empate(self):
+        self.criar(3, {})
+        self.submeter("a", 2)
+        self.pool.submeter(PedidoExecucao(regra("urgente", grupo="a", prioridade=5)))
+        self.pool.submeter(PedidoExecucao(regra("b0", grupo="b", prioridade=1)))
+        self.pool._despachar()
+        # Empate (nenhum em execução): o grupo com o pedido mais prioritário começa
+        self.assertEqual([p.regra.arquivo for p in self.iniciados], ["urgente", "b0", "a0"])
+
+
+if __name__ == "__main__":
+    unittest.main()
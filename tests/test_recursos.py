@@ -0,0 +1,121 @@
+# Copyright 2025 Thiago Luis de Lima
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import threading
+import time
+import types
+import unittest
+
+from scheduler import recursos
+from scheduler.configuracao import ConfiguracaoExecucao
+from scheduler.recursos import ControleAdmissao, aguardar_recursos, motivo_adiamento, opcoes_heap_java
+
+
+def regra(ferramenta='PENTAHO', memoria_mb=None):
+    return types.SimpleNamespace(arquivo='job.kjb', ferramenta_etl=ferramenta, memoria_mb=memoria_mb)
+
+
+def medidor(uso):
+    return types.SimpleNamespace(uso=lambda: uso)
+
+
+class ConstantesFixas(unittest.TestCase):
+    """Fixa os limites lidos do ambiente e restaura a medição de memória ao final"""
+
+    def setUp(self):
+        self.globais = (
+            recursos.HEAP_PADRAO_MB, recursos.MEMORIA_RESERVA_MB, recursos.CPU_MAX_PERCENT,
+            recursos.INTERVALO_ADMISSAO, recursos.memoria_livre_mb
+        )
+        recursos.HEAP_PADRAO_MB, recursos.MEMORIA_RESERVA_MB, recursos.CPU_MAX_PERCENT = 2048, 512, 90
+        recursos.INTERVALO_ADMISSAO = 0.01
+
+    def tearDown(self):
+        (recursos.HEAP_PADRAO_MB, recursos.MEMORIA_RESERVA_MB, recursos.CPU_MAX_PERCENT,
+         recursos.INTERVALO_ADMISSAO, recursos.memoria_livre_mb) = self.globais
+
+
+class TestMotivoAdiamento(ConstantesFixas):
+
+    def test_heap_java(self):
+        self.assertEqual(opcoes_heap_java(None), "-Xms1024m -Xmx2048m")
+        self.assertEqual(opcoes_heap_java(512), "-Xms512m -Xmx512m")
+
+    def test_memoria(self):
+        # JVM sem memoria_mb: HEAP_PADRAO_MB + reserva
+        self.assertEqual(motivo_adiamento(regra(), 2500, None)[0], 'memoria')
+        self.assertIsNone(motivo_adiamento(regra(), 2600, None))
+        self.assertEqual(motivo_adiamento(regra(), 2600, None, lambda: 100)[0], 'memoria')
+        self.assertEqual(motivo_adiamento(regra(memoria_mb=4096), 4000, None)[0], 'memoria')
+        # Terminal sem memória configurada, ou memória desconhecida: só a CPU conta
+        self.assertIsNone(motivo_adiamento(regra('TERMINAL'), 100, None))
+        self.assertIsNone(motivo_adiamento(regra(), None, None))
+
+    def test_cpu(self):
+        self.assertEqual(motivo_adiamento(regra('TERMINAL'), None, 95.0)[0], 'cpu')
+        self.assertIsNone(motivo_adiamento(regra('TERMINAL'), None, 90.0))
+
+    def test_reserva_das_execucoes_em_aquecimento(self):
+        controle = ControleAdmissao()
+        pedido = types.SimpleNamespace(regra=regra())
+        recente = types.SimpleNamespace(regra=regra(memoria_mb=1024), iniciado_em=time.monotonic())
+        antiga = types.SimpleNamespace(regra=regra(memoria_mb=1024), iniciado_em=time.monotonic() - 3600)
+        self.assertIsNone(controle.avaliar(pedido, [antiga], 3000, None))
+        self.assertEqual(controle.avaliar(pedido, [recente], 3000, None)[0], 'memoria')
+
+
+class TestAguardarRecursos(ConstantesFixas):
+    """Execuções fora do serviço (manual, bot, monitor, reprocessamento)"""
+
+    def livre(self, *valores):
+        """Memória livre devolvida a cada medição; a última se repete"""
+        medicoes = list(valores)
+        recursos.memoria_livre_mb = lambda: medicoes.pop(0) if len(medicoes) > 1 else medicoes[0]
+
+    def test_aguarda_a_memoria_ser_liberada(self):
+        self.livre(1000, 1000, 4000)
+        self.assertTrue(aguardar_recursos(regra(), lambda: 1, medidor=medidor(10.0)))
+        self.assertEqual(recursos.memoria_livre_mb(), 4000)
+
+    def test_aguarda_a_cpu(self):
+        self.livre(None)
+        usos = [99.0, 99.0, 20.0]
+        cpu = types.SimpleNamespace(uso=lambda: usos.pop(0))
+        self.assertTrue(aguardar_recursos(regra('TERMINAL'), lambda: 1, medidor=cpu))
+        self.assertEqual(usos, [])
+
+    def test_sem_outras_execucoes_inicia_mesmo_assim(self):
+        self.livre(1000)
+        self.assertTrue(aguardar_recursos(regra(), lambda: 0, medidor=medidor(10.0)))
+
+    def test_configuracao_do_agendamento(self):
+        self.livre(3000)
+        configuracao = ConfiguracaoExecucao(arquivo='job.hwf', ferramenta_etl='APACHE_HOP', memoria_mb=4096)
+        parar = threading.Event()
+        parar.set()
+        self.assertFalse(aguardar_recursos(configuracao, lambda: 1, parar=parar, medidor=medidor(10.0)))
+        configuracao.memoria_mb = 1024
+        self.assertTrue(aguardar_recursos(configuracao, lambda: 1, parar=parar, medidor=medidor(10.0)))
+
+    def test_parar_durante_a_espera(self):
+        self.livre(1000)
+        parar = threading.Event()
+        threading.Timer(0.1, parar.set).start()
+        inicio = time.monotonic()
+        self.assertFalse(aguardar_recursos(regra(), lambda: 1, parar=parar, medidor=medidor(10.0)))
+        self.assertLess(time.monotonic() - inicio, 5)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,193 @@
+# Copyright 2025 Thiago Luis de Lima
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import datetime
+import os
+import shutil
+import tempfile
+import unittest
+
+import executaReprocessamento
+from executaReprocessamento import limitar_paralelo
+from scheduler.db import conectar, garantir_esquema
+from scheduler.locks import ler_politica
+from scheduler.reprocessamentos import (
+    ESTADO_CONCLUIDO, ESTADO_EM_ANDAMENTO, ESTADO_INCOMPLETO, PARTICAO_EXECUTANDO, PARTICAO_FALHA,
+    PARTICAO_PENDENTE, PARTICAO_SUCESSO, criar_reprocessamento, finalizar_reprocessamento,
+    ler_reprocessamento, registrar_fim_particao, registrar_inicio_particao, retomar_reprocessamento
+)
+
+INICIO = datetime.date(2025, 1, 30)
+FIM = datetime.date(2025, 2, 2)
+DATAS = [datetime.date(2025, 1, 30), datetime.date(2025, 1, 31), datetime.date(2025, 2, 1), datetime.date(2025, 2, 2)]
+
+
+class BancoTemporario(unittest.TestCase):
+
+    def setUp(self):
+        self.pasta = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.pasta, "agendador.db")
+        conn = conectar(self.db_path)
+        conn.execute(
+            """
+            CREATE TABLE agendamentos (
+                id INTEGER PRIMARY KEY AUTOINCREMENT, arquivo TEXT NOT NULL, ferramenta_etl TEXT
+            )
+            """
+        )
+        conn.execute("INSERT INTO agendamentos (id, arquivo, ferramenta_etl) VALUES (1, 'job.kjb', 'PENTAHO')")
+        conn.commit()
+        conn.close()
+        garantir_esquema(self.db_path)
+
+    def tearDown(self):
+        shutil.rmtree(self.pasta, ignore_errors=True)
+
+
+class TestParticoes(BancoTemporario):
+
+    def criar(self):
+        return criar_reprocessamento(self.db_path, 1, INICIO, FIM, "DATA_REFERENCIA", "%Y-%m-%d", 2)
+
+    def particoes(self, id_reprocessamento):
+        conn = conectar(self.db_path)
+        try:
+            return conn.execute(
+                "SELECT data, estado FROM reprocessamento_particoes WHERE id_reprocessamento = ? ORDER BY data",
+                (id_reprocessamento,)
+            ).fetchall()
+        finally:
+            conn.close()
+
+    def test_uma_particao_pendente_por_data(self):
+        id_reprocessamento = self.criar()
+        self.assertEqual(
+            self.particoes(id_reprocessamento),
+            [(data.isoformat(), PARTICAO_PENDENTE) for data in DATAS]
+        )
+        self.assertEqual(
+            ler_reprocessamento(self.db_path, id_reprocessamento),
+            (1, "2025-01-30", "2025-02-02", "DATA_REFERENCIA", "%Y-%m-%d", 2, ESTADO_EM_ANDAMENTO)
+        )
+
+    def test_retomar_repete_so_as_que_nao_terminaram_com_sucesso(self):
+        id_reprocessamento = self.criar()
+        for data in DATAS[:3]:
+            registrar_inicio_particao(self.db_path, id_reprocessamento, data)
+        registrar_fim_particao(self.db_path, id_reprocessamento, DATAS[0], True, 1.0)
+        registrar_fim_particao(self.db_path, id_reprocessamento, DATAS[1], False, 1.0)
+        # DATAS[2] interrompida em execução, DATAS[3] nunca iniciada
+        self.assertEqual(
+            [estado for _, estado in self.particoes(id_reprocessamento)],
+            [PARTICAO_SUCESSO, PARTICAO_FALHA, PARTICAO_EXECUTANDO, PARTICAO_PENDENTE]
+        )
+        finalizar_reprocessamento(self.db_path, id_reprocessamento)
+
+        self.assertEqual(retomar_reprocessamento(self.db_path, id_reprocessamento), DATAS[1:])
+        self.assertEqual(
+            [estado for _, estado in self.particoes(id_reprocessamento)],
+            [PARTICAO_SUCESSO, PARTICAO_PENDENTE, PARTICAO_PENDENTE, PARTICAO_PENDENTE]
+        )
+        self.assertEqual(ler_reprocessamento(self.db_path, id_reprocessamento)[6], ESTADO_EM_ANDAMENTO)
+
+    def test_finalizar(self):
+        id_reprocessamento = self.criar()
+        for data in DATAS:
+            registrar_inicio_particao(self.db_path, id_reprocessamento, data)
+            registrar_fim_particao(self.db_path, id_reprocessamento, data, data != DATAS[2], 1.0)
+
+        contagem = finalizar_reprocessamento(self.db_path, id_reprocessamento)
+        self.assertEqual(contagem, {PARTICAO_SUCESSO: 3, PARTICAO_FALHA: 1})
+        self.assertEqual(ler_reprocessamento(self.db_path, id_reprocessamento)[6], ESTADO_INCOMPLETO)
+
+        self.assertEqual(retomar_reprocessamento(self.db_path, id_reprocessamento), [DATAS[2]])
+        registrar_inicio_particao(self.db_path, id_reprocessamento, DATAS[2])
+        registrar_fim_particao(self.db_path, id_reprocessamento, DATAS[2], True, 1.0)
+        self.assertEqual(finalizar_reprocessamento(self.db_path, id_reprocessamento), {PARTICAO_SUCESSO: 4})
+        self.assertEqual(ler_reprocessamento(self.db_path, id_reprocessamento)[6], ESTADO_CONCLUIDO)
+
+    def test_interrompido_fica_incompleto(self):
+        id_reprocessamento = self.criar()
+        registrar_inicio_particao(self.db_path, id_reprocessamento, DATAS[0])
+        registrar_fim_particao(self.db_path, id_reprocessamento, DATAS[0], True, 1.0)
+        registrar_inicio_particao(self.db_path, id_reprocessamento, DATAS[1])
+        finalizar_reprocessamento(self.db_path, id_reprocessamento)
+        self.assertEqual(ler_reprocessamento(self.db_path, id_reprocessamento)[6], ESTADO_INCOMPLETO)
+
+
+class TestLimitarParalelo(unittest.TestCase):
+
+    def setUp(self):
+        self.limite_global = executaReprocessamento.LIMITE_GLOBAL
+        self.limites = executaReprocessamento.LIMITES_FERRAMENTA
+
+    def tearDown(self):
+        executaReprocessamento.LIMITE_GLOBAL = self.limite_global
+        executaReprocessamento.LIMITES_FERRAMENTA = self.limites
+
+    def limites_pool(self, limite_global, **limites):
+        executaReprocessamento.LIMITE_GLOBAL = limite_global
+        executaReprocessamento.LIMITES_FERRAMENTA = {'PENTAHO': 0, 'APACHE_HOP': 0, 'TERMINAL': 0, **limites}
+
+    def test_limites_do_pool(self):
+        # (limite global, limites por ferramenta, paralelo pedido, ferramenta, esperado)
+        casos = [
+            (8, {'PENTAHO': 4}, 2, 'PENTAHO', 2),
+            (8, {'PENTAHO': 4}, 6, 'PENTAHO', 4),
+            (3, {'PENTAHO': 4}, 6, 'PENTAHO', 3),
+            (8, {'PENTAHO': 4}, 10, 'APACHE_HOP', 8),  # APACHE_HOP sem limite próprio
+            (0, {'PENTAHO': 4}, 10, 'PENTAHO', 4),     # sem limite global
+            (0, {}, 10, 'PENTAHO', 10),                # sem limite algum
+            (8, {'TERMINAL': 2}, 6, 'PYTHON', 2),      # desconhecida conta como TERMINAL
+            (8, {'TERMINAL': 2}, 6, None, 2),
+        ]
+        for limite_global, limites, paralelo, ferramenta, esperado in casos:
+            with self.subTest(limite_global=limite_global, limites=limites, paralelo=paralelo, ferramenta=ferramenta):
+                self.limites_pool(limite_global, **limites)
+                self.assertEqual(limitar_paralelo(paralelo, ferramenta), esperado)
+
+
+class TestSlotsDoAgendamento(BancoTemporario):
+    """O reprocessamento ocupa no máximo os slots que a política de sobreposição permite"""
+
+    def politica(self, politica, max_paralelo):
+        conn = conectar(self.db_path)
+        conn.execute(
+            "UPDATE agendamentos SET politica_sobreposicao = ?, max_paralelo = ? WHERE id = 1",
+            (politica, max_paralelo)
+        )
+        conn.commit()
+        conn.close()
+        return ler_politica(self.db_path, 1)
+
+    def test_slots(self):
+        # (politica, max_paralelo, esperado)
+        casos = [
+            ('PULAR', 4, ('PULAR', 1)),
+            ('ENFILEIRAR', 4, ('ENFILEIRAR', 1)),
+            ('PARALELO', 3, ('PARALELO', 3)),
+            ('PARALELO', 0, ('PARALELO', 1)),
+            ('PARALELO', None, ('PARALELO', 1)),
+            (None, None, ('PULAR', 1)),
+        ]
+        for politica, max_paralelo, esperado in casos:
+            with self.subTest(politica=politica, max_paralelo=max_paralelo):
+                self.assertEqual(self.politica(politica, max_paralelo), esperado)
+
+    def test_agendamento_inexistente(self):
+        self.assertEqual(ler_politica(self.db_path, 99), ('PULAR', 1))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,379 @@
+# Copyright 2025 Thiago Luis de Lima
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import datetime
+import unicodedata
+import unittest
+
+from scheduler import rules
+from scheduler.engine import FilaAgendamentos
+from scheduler.rules import COLUNAS_REGRA, compilar_regra, deslocamento_inicio
+
+# De quarta 28/01/2026 a segunda 16/02/2026: viradas de mês, todos os dias da semana e uma sexta-feira 13
+INICIO = datetime.datetime(2026, 1, 28)
+FIM = datetime.datetime(2026, 2, 17)
+
+DIAS_SEMANA = ('seg', 'ter', 'qua', 'qui', 'sex', 'sab', 'dom')
+
+
+def regra(id_agendamento=1, dependencias=None, **campos):
+    campos = dict(id=id_agendamento, arquivo=f"job{id_agendamento}.kjb", **campos)
+    return compilar_regra(tuple(campos.get(coluna) for coluna in COLUNAS_REGRA) + (dependencias,))
+
+
+def sem_acento(texto):
+    return ''.join(c for c in unicodedata.normalize('NFD', texto) if not unicodedata.combining(c))
+
+
+def dispara_legado(campos, agora):
+    """
+    Avaliação minuto a minuto feita pelo serviço antes da fila de disparos
+    (_processar_agendamento). Única diferença: os dias da semana cadastrados
+    também têm a acentuação removida, como o dia atual ('Sáb' = 'sab').
+    """
+    horario = campos.get('horario')
+    intervalo = campos.get('intervalo')
+    hora_inicio, hora_fim = campos.get('hora_inicio'), campos.get('hora_fim')
+    hora_atual = agora.strftime("%H:%M")
+    intervalo = int(intervalo) if intervalo and str(intervalo).isdigit() else 0
+    dias_semana = [sem_acento(d.strip().lower()) for d in campos['dias_semana'].split(",")] \
+        if campos.get('dias_semana') else []
+    dias_mes = [d.strip() for d in campos['dias_mes'].split(",")] if campos.get('dias_mes') else []
+
+    deve_executar = False
+    if horario and horario.strip():
+        if horario != hora_atual:
+            return False
+        deve_executar = True
+    if dias_semana and DIAS_SEMANA[agora.weekday()] not in dias_semana:
+        return False
+    if dias_mes and str(agora.day) not in dias_mes:
+        return False
+    if hora_inicio and hora_fim:
+        if not hora_inicio <= hora_atual <= hora_fim:
+            return False
+        if intervalo > 0:
+            horas, minutos = hora_inicio.split(':')
+            delta = agora.hour * 60 + agora.minute - (int(horas) * 60 + int(minutos))
+            if delta >= 0 and delta % intervalo == 0:
+                deve_executar = True
+    elif intervalo > 0:
+        if agora.minute % intervalo == 0:
+            deve_executar = True
+    else:
+        deve_executar = True
+    return deve_executar
+
+
+# Linhas como cadastradas pela interface antes das expressões cron e intervalos em segundos
+LINHAS_LEGADAS = (
+    dict(horario='08:30'),
+    dict(horario='08:30', hora_inicio='09:00', hora_fim='18:00'),
+    dict(horario='10:00', intervalo='30', hora_inicio='09:00', hora_fim='18:00'),
+    dict(intervalo='15'),
+    dict(intervalo='7'),
+    dict(intervalo='45', hora_inicio='08:00', hora_fim='10:00'),
+    dict(intervalo='0', hora_inicio='08:00', hora_fim='10:00'),
+    dict(intervalo='abc'),
+    dict(),
+    dict(horario='07:00', dias_semana='Seg, Qua'),
+    dict(intervalo='60', dias_semana='Sáb,Dom'),
+    dict(horario='06:00', dias_mes='1,15,31'),
+    dict(horario='12:00', dias_semana='sex', dias_mes='13'),
+    dict(intervalo='20', hora_inicio='22:00', hora_fim='23:59', dias_semana='Ter,Qui', dias_mes='29,3'),
+)
+
+
+class TestEquivalenciaLegada(unittest.TestCase):
+    """A agenda compilada dispara exatamente nos minutos em que o serviço antigo disparava"""
+
+    def test_mesmos_minutos(self):
+        for campos in LINHAS_LEGADAS:
+            with self.subTest(**campos):
+                compilada = regra(**campos)
+                esperados = []
+                minuto = INICIO
+                while minuto < FIM:
+                    if dispara_legado(campos, minuto):
+                        esperados.append(minuto)
+                    minuto += datetime.timedelta(minutes=1)
+
+                obtidos = []
+                quando = compilada.proxima_execucao(INICIO - datetime.timedelta(microseconds=1))
+                while quando is not None and quando < FIM:
+                    obtidos.append(quando)
+                    quando = compilada.proxima_execucao(quando)
+
+                self.assertEqual(obtidos, esperados)
+                self.assertTrue(all(compilada.cumpre(m) for m in esperados))
+
+
+class TestProximaExecucao(unittest.TestCase):
+
+    def test_proximos_disparos(self):
+        # (campos, após, próximo disparo)
+        casos = [
+            (dict(horario='08:30'), datetime.datetime(2026, 2, 2, 8, 29, 59), datetime.datetime(2026, 2, 2, 8, 30)),
+            (dict(horario='08:30'), datetime.datetime(2026, 2, 2, 8, 30), datetime.datetime(2026, 2, 3, 8, 30)),
+            (dict(intervalo='15'), datetime.datetime(2026, 2, 2, 23, 50), datetime.datetime(2026, 2, 3, 0, 0)),
+            (dict(intervalo='7'), datetime.datetime(2026, 2, 2, 10, 56), datetime.datetime(2026, 2, 2, 11, 0)),
+            (dict(intervalo='45', hora_inicio='08:00', hora_fim='10:00'),
+             datetime.datetime(2026, 2, 2, 9, 30), datetime.datetime(2026, 2, 3, 8, 0)),
+            # Segunda 02/02 às 07:00 já passou: próxima é quarta
+            (dict(horario='07:00', dias_semana='Seg, Qua'),
+             datetime.datetime(2026, 2, 2, 7, 0), datetime.datetime(2026, 2, 4, 7, 0)),
+            (dict(horario='00:00', dias_semana='Sáb'),
+             datetime.datetime(2026, 2, 2, 12, 0), datetime.datetime(2026, 2, 7, 0, 0)),
+            # Fevereiro não tem dia 31
+            (dict(horario='06:00', dias_mes='31'),
+             datetime.datetime(2026, 2, 1, 0, 0), datetime.datetime(2026, 3, 31, 6, 0)),
+            (dict(horario='12:00', dias_semana='sex', dias_mes='13'),
+             datetime.datetime(2026, 2, 14), datetime.datetime(2026, 3, 13, 12, 0)),
+        ]
+        for campos, apos, esperado in casos:
+            with self.subTest(apos=apos, **campos):
+                self.assertEqual(regra(**campos).proxima_execucao(apos), esperado)
+
+    def test_nunca_dispara(self):
+        for campos in (
+            dict(intervalo='0', hora_inicio='08:00', hora_fim='10:00'),
+            dict(horario='08:30', hora_inicio='09:00', hora_fim='18:00'),
+            dict(horario='25:00'),
+            dict(horario='08:00', dias_semana='Xyz'),
+        ):
+            with self.subTest(**campos):
+                self.assertIsNone(regra(**campos).proxima_execucao(INICIO))
+
+    def test_dependentes_nao_disparam_pelo_relogio(self):
+        self.assertIsNone(regra(horario='08:30', dependencias='2').proxima_execucao(INICIO))
+
+
+class TestRetentativas(unittest.TestCase):
+
+    def setUp(self):
+        self.atraso_max = rules.RETRY_ATRASO_MAX
+
+    def tearDown(self):
+        rules.RETRY_ATRASO_MAX = self.atraso_max
+
+    def test_backoff_exponencial(self):
+        compilada = regra(retry_atraso_seg='60', retry_fator='2', retry_jitter='0')
+        self.assertEqual([compilada.atraso_retentativa(t) for t in (1, 2, 3, 4)], [60, 120, 240, 480])
+        # Fator abaixo de 1 não encurta o atraso
+        compilada = regra(retry_atraso_seg='30', retry_fator='0,5', retry_jitter='0')
+        self.assertEqual([compilada.atraso_retentativa(t) for t in (1, 2, 3)], [30, 30, 30])
+
+    def test_teto(self):
+        rules.RETRY_ATRASO_MAX = 300
+        compilada = regra(retry_atraso_seg='60', retry_fator='3', retry_jitter='0')
+        self.assertEqual([compilada.atraso_retentativa(t) for t in (1, 2, 3, 10, 200)], [60, 180, 300, 300, 300])
+
+    def test_variacao_aleatoria(self):
+        rules.RETRY_ATRASO_MAX = 1000
+        compilada = regra(retry_atraso_seg='100', retry_fator='2', retry_jitter='0.25')
+        for tentativa, base in ((1, 100), (2, 200), (10, 1000)):
+            with self.subTest(tentativa=tentativa):
+                atrasos = [compilada.atraso_retentativa(tentativa) for _ in range(500)]
+                self.assertTrue(all(base * 0.75 <= a <= base * 1.25 for a in atrasos))
+                self.assertGreater(len(set(atrasos)), 1)
+        # Variação limitada a ±100%: o atraso nunca fica negativo
+        compilada = regra(retry_atraso_seg='100', retry_jitter='5')
+        self.assertEqual(compilada.retry_jitter, 1.0)
+        self.assertTrue(all(0 <= compilada.atraso_retentativa(1) <= 200 for _ in range(500)))
+
+
+class TestDeslocamentoInicio(unittest.TestCase):
+
+    def test_estavel_por_agendamento(self):
+        deslocamentos = [deslocamento_inicio(id_agendamento, 120) for id_agendamento in range(1, 201)]
+        self.assertEqual(deslocamentos, [deslocamento_inicio(id_agendamento, 120) for id_agendamento in range(1, 201)])
+        self.assertTrue(all(0 <= d < 120 for d in deslocamentos))
+        # Agendamentos que vencem no mesmo minuto ficam espalhados pela janela
+        self.assertGreater(len(set(deslocamentos)), 50)
+
+    def test_sem_janela(self):
+        for janela in (0, None, '', 'abc', -30):
+            with self.subTest(janela=janela):
+                self.assertEqual(deslocamento_inicio(7, janela), 0)
+
+    def test_limitado_ao_intervalo_entre_disparos(self):
+        # (campos, maior deslocamento possível)
+        casos = [
+            (dict(horario='08:00'), 600),
+            (dict(intervalo='5'), 300),
+            (dict(intervalo='45', hora_inicio='08:00', hora_fim='10:00'), 600),
+            (dict(cron='*/2 * * * *'), 120),
+            (dict(intervalo_seg='10'), 10),
+        ]
+        for campos, limite in casos:
+            with self.subTest(**campos):
+                for id_agendamento in range(1, 101):
+                    compilada = regra(id_agendamento, escalonar_seg='600', **campos)
+                    self.assertLess(compilada.deslocamento, limite)
+                    self.assertEqual(compilada.deslocamento, deslocamento_inicio(id_agendamento, min(600, limite)))
+
+
+class TestIntervaloSegundos(unittest.TestCase):
+
+    def disparos(self, compilada, apos, ate):
+        quando, obtidos = compilada.proxima_execucao(apos), []
+        while quando is not None and quando < ate:
+            obtidos.append(quando.strftime("%d %H:%M:%S"))
+            quando = compilada.proxima_execucao(quando)
+        return obtidos
+
+    def test_cadencia_de_10_segundos(self):
+        compilada = regra(intervalo_seg='10')
+        self.assertEqual(
+            self.disparos(compilada, datetime.datetime(2026, 2, 2, 8, 0, 3), datetime.datetime(2026, 2, 2, 8, 0, 45)),
+            ["02 08:00:10", "02 08:00:20", "02 08:00:30", "02 08:00:40"]
+        )
+        self.assertTrue(compilada.cumpre(datetime.datetime(2026, 2, 2, 8, 0, 20)))
+        self.assertFalse(compilada.cumpre(datetime.datetime(2026, 2, 2, 8, 0, 25)))
+        self.assertFalse(compilada.cumpre(datetime.datetime(2026, 2, 2, 8, 0, 20, 500)))
+
+    def test_horario_fixo_e_ignorado(self):
+        compilada = regra(horario='08:30', intervalo='15', intervalo_seg='30')
+        self.assertEqual(compilada.proxima_execucao(datetime.datetime(2026, 2, 2, 8, 0, 5)),
+                         datetime.datetime(2026, 2, 2, 8, 0, 30))
+
+    def test_contagem_recomeca_a_meia_noite(self):
+        # 86400 não é múltiplo de 7: o último disparo do dia é 23:59:54 e o seguinte é a meia-noite
+        self.assertEqual(
+            self.disparos(regra(intervalo_seg='7'), datetime.datetime(2026, 2, 2, 23, 59, 40),
+                          datetime.datetime(2026, 2, 3, 0, 0, 10)),
+            ["02 23:59:47", "02 23:59:54", "03 00:00:00", "03 00:00:07"]
+        )
+
+    def test_janela(self):
+        compilada = regra(intervalo_seg='10', hora_inicio='08:00', hora_fim='08:01')
+        obtidos = self.disparos(compilada, datetime.datetime(2026, 2, 2, 7, 0), datetime.datetime(2026, 2, 3, 8, 0, 15))
+        self.assertEqual(len(obtidos), 12 + 2)
+        self.assertEqual((obtidos[0], obtidos[11], obtidos[12]), ("02 08:00:00", "02 08:01:50", "03 08:00:00"))
+
+    def test_minuto_sem_multiplo_fica_fora(self):
+        # Múltiplos de 90 s: 08:00:00, 08:01:30 e 08:03:00; o minuto 08:02 da janela não tem disparo
+        compilada = regra(intervalo_seg='90', hora_inicio='08:00', hora_fim='08:02')
+        self.assertEqual(
+            self.disparos(compilada, datetime.datetime(2026, 2, 2, 7, 0), datetime.datetime(2026, 2, 3, 8, 0, 1)),
+            ["02 08:00:00", "02 08:01:30", "03 08:00:00"]
+        )
+
+
+class TestAposTermino(unittest.TestCase):
+    """O próximo início conta do fim da execução anterior; o serviço rearma a fila ao finalizar cada execução"""
+
+    def setUp(self):
+        self.regra = regra(intervalo_seg='300', modo_intervalo='APOS_TERMINO', hora_inicio='08:00', hora_fim='09:00')
+        self.fila = FilaAgendamentos()
+        self.fila.adicionar(self.regra, datetime.datetime(2026, 2, 2, 7, 50))
+
+    def test_primeiro_inicio_e_o_inicio_da_janela(self):
+        self.assertTrue(self.regra.apos_termino)
+        self.assertEqual(self.fila.proximo_disparo(), datetime.datetime(2026, 2, 2, 8, 0))
+
+    def test_disparo_nao_se_repete_ate_o_fim(self):
+        self.assertEqual(len(self.fila.retirar_vencidos(datetime.datetime(2026, 2, 2, 8, 0))), 1)
+        self.assertIsNone(self.fila.proximo_disparo())
+        self.assertEqual(self.fila.retirar_vencidos(datetime.datetime(2026, 2, 2, 8, 30)), [])
+
+    def test_rearma_a_partir_do_fim(self):
+        self.fila.retirar_vencidos(datetime.datetime(2026, 2, 2, 8, 0))
+        self.fila.reagendar_apos_termino(1, datetime.datetime(2026, 2, 2, 8, 7, 13))
+        self.assertEqual(self.fila.proximo_disparo(), datetime.datetime(2026, 2, 2, 8, 12, 13))
+
+        self.fila.retirar_vencidos(datetime.datetime(2026, 2, 2, 8, 12, 13))
+        # Fim + intervalo cai fora da janela: próximo início é a abertura da janela seguinte
+        self.fila.reagendar_apos_termino(1, datetime.datetime(2026, 2, 2, 8, 58))
+        self.assertEqual(self.fila.proximo_disparo(), datetime.datetime(2026, 2, 3, 8, 0))
+
+    def test_ignora_regras_fixas_e_removidas(self):
+        fixa = regra(2, intervalo_seg='300')
+        self.fila.adicionar(fixa, datetime.datetime(2026, 2, 2, 7, 50))
+        self.fila.retirar_vencidos(datetime.datetime(2026, 2, 2, 8, 0))
+        self.assertEqual(self.fila.proximo_disparo(), datetime.datetime(2026, 2, 2, 8, 5))
+        self.fila.reagendar_apos_termino(2, datetime.datetime(2026, 2, 2, 8, 1))
+        self.assertEqual(self.fila.proximo_disparo(), datetime.datetime(2026, 2, 2, 8, 5))
+
+        self.fila.remover(1)
+        self.fila.reagendar_apos_termino(1, datetime.datetime(2026, 2, 2, 8, 1))
+        self.assertNotIn(1, self.fila)
+        self.assertEqual(self.fila.proximo_disparo(), datetime.datetime(2026, 2, 2, 8, 5))
+
+
+class TestFilaAgendamentos(unittest.TestCase):
+
+    AGORA = datetime.datetime(2026, 2, 2, 8, 0, 20)
+
+    def test_ordem_dos_disparos(self):
+        fila = FilaAgendamentos()
+        fila.adicionar(regra(1, horario='08:30'), self.AGORA)
+        fila.adicionar(regra(2, horario='08:10'), self.AGORA)
+        fila.adicionar(regra(3, intervalo='60', hora_inicio='08:00', hora_fim='09:00'), self.AGORA)
+        # O minuto corrente ainda é elegível
+        self.assertEqual(fila.proximo_disparo(), datetime.datetime(2026, 2, 2, 8, 0))
+        vencidos = fila.retirar_vencidos(datetime.datetime(2026, 2, 2, 8, 30))
+        self.assertEqual(
+            [(r.id, q.strftime("%H:%M")) for r, q in vencidos],
+            [(3, "08:00"), (2, "08:10"), (1, "08:30")]
+        )
+        self.assertEqual(fila.proximo_disparo(), datetime.datetime(2026, 2, 2, 9, 0))
+
+    def test_disparos_atrasados_uma_vez(self):
+        fila = FilaAgendamentos()
+        fila.adicionar(regra(1, intervalo='15'), self.AGORA)
+        vencidos = fila.retirar_vencidos(datetime.datetime(2026, 2, 2, 9, 5))
+        self.assertEqual([q for _, q in vencidos], [datetime.datetime(2026, 2, 2, 8, 0)])
+        self.assertEqual(fila.proximo_disparo(), datetime.datetime(2026, 2, 2, 9, 15))
+
+    def test_regra_alterada_invalida_a_entrada_anterior(self):
+        fila = FilaAgendamentos()
+        fila.adicionar(regra(1, horario='08:10'), self.AGORA)
+        fila.adicionar(regra(1, horario='08:40'), self.AGORA)
+        self.assertEqual(len(fila), 1)
+        self.assertEqual(fila.proximo_disparo(), datetime.datetime(2026, 2, 2, 8, 40))
+        # A entrada das 08:10 ficou obsoleta e não dispara
+        self.assertEqual(fila.retirar_vencidos(datetime.datetime(2026, 2, 2, 8, 30)), [])
+
+    def test_reagendar(self):
+        fila = FilaAgendamentos()
+        fila.adicionar(regra(1, horario='08:10'), self.AGORA)
+        fila.reagendar(1, datetime.datetime(2026, 2, 2, 8, 5, 30))
+        self.assertEqual(fila.proximo_disparo(), datetime.datetime(2026, 2, 2, 8, 5, 30))
+        fila.reagendar(1, None)
+        self.assertIsNone(fila.proximo_disparo())
+        # Regras removidas não voltam ao heap
+        fila.remover(1)
+        fila.reagendar(1, datetime.datetime(2026, 2, 2, 9, 0))
+        self.assertIsNone(fila.proximo_disparo())
+
+    def test_regra_removida(self):
+        fila = FilaAgendamentos()
+        fila.adicionar(regra(1, horario='08:10'), self.AGORA)
+        fila.remover(1)
+        self.assertNotIn(1, fila)
+        self.assertIsNone(fila.proximo_disparo())
+        self.assertEqual(fila.retirar_vencidos(datetime.datetime(2026, 2, 3)), [])
+
+    def test_recarga_nao_repete_o_minuto_ja_disparado(self):
+        fila = FilaAgendamentos()
+        fila.adicionar(regra(1, intervalo='1'), self.AGORA)
+        self.assertEqual(len(fila.retirar_vencidos(self.AGORA)), 1)
+        # Regra recarregada (por exemplo, editada) no mesmo minuto
+        fila.adicionar(regra(1, intervalo='1'), self.AGORA)
+        self.assertEqual(fila.proximo_disparo(), datetime.datetime(2026, 2, 2, 8, 1))
+
+
+if __name__ == "__main__":
+    unittest.main()
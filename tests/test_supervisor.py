@@ -0,0 +1,137 @@
+# Copyright 2025 Thiago Luis de Lima
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+from scheduler import processos, supervisor
+from scheduler.memoria import MOTIVO_MEMORIA
+from scheduler.supervisor import Comando, SupervisorProcessos
+
+PRAZO_TESTE = 30
+
+# Ignora o pedido de término: só sai com o kill forçado após o prazo
+TEIMOSO = "import signal, time\nsignal.signal(signal.SIGTERM, signal.SIG_IGN)\nprint('pronto', flush=True)\ntime.sleep(60)\n"
+
+
+def python(codigo):
+    return Comando([sys.executable, "-c", codigo])
+
+
+class Conclusao:
+    """ao_terminar que guarda a execução e sinaliza o término"""
+
+    def __init__(self):
+        self.execucao = None
+        self.evento = threading.Event()
+
+    def __call__(self, execucao):
+        self.execucao = execucao
+        self.evento.set()
+
+    def aguardar(self, prazo=PRAZO_TESTE):
+        return self.evento.wait(prazo)
+
+
+class TestSupervisor(unittest.TestCase):
+
+    def setUp(self):
+        self.pasta = tempfile.mkdtemp()
+        self.log = os.path.join(self.pasta, "execucoes.log")
+        self.globais = (supervisor.MAX_ENCERRAMENTOS, supervisor.INTERVALO_MEMORIA, processos.PRAZO_ENCERRAMENTO)
+
+    def tearDown(self):
+        self.supervisor.parar(timeout=10)
+        supervisor.MAX_ENCERRAMENTOS, supervisor.INTERVALO_MEMORIA, processos.PRAZO_ENCERRAMENTO = self.globais
+        shutil.rmtree(self.pasta, ignore_errors=True)
+
+    def iniciar(self):
+        self.supervisor = SupervisorProcessos(lambda: self.log)
+        self.supervisor.iniciar()
+
+    def test_saida_e_conclusao(self):
+        self.iniciar()
+        linhas, conclusao = [], Conclusao()
+        execucao = self.supervisor.executar(
+            python("print('inicio'); print('ERROR falhou'); raise SystemExit(2)"),
+            analisar=lambda _, linha: linhas.append(linha), ao_terminar=conclusao
+        )
+        self.assertTrue(conclusao.aguardar())
+        self.assertIs(conclusao.execucao, execucao)
+        self.assertEqual((execucao.exitcode, execucao.motivo), (2, None))
+        self.assertFalse(execucao.is_alive())
+        self.assertEqual(linhas, ["inicio", "ERROR falhou"])
+
+        self.supervisor.parar()
+        with open(self.log, encoding="utf-8") as arquivo:
+            self.assertIn(f"[PID {execucao.pid}] ERROR falhou\n", arquivo.read())
+
+    def test_timeout_encerra_a_arvore(self):
+        self.iniciar()
+        conclusao = Conclusao()
+        inicio = time.monotonic()
+        execucao = self.supervisor.executar(python("import time; time.sleep(60)"), timeout=0.5, ao_terminar=conclusao)
+        self.assertTrue(conclusao.aguardar())
+        self.assertEqual(execucao.motivo, "timeout")
+        self.assertNotEqual(execucao.exitcode, 0)
+        self.assertLess(time.monotonic() - inicio, processos.PRAZO_ENCERRAMENTO)
+
+    def test_limite_de_memoria(self):
+        supervisor.INTERVALO_MEMORIA = 0.2
+        self.iniciar()
+        conclusao = Conclusao()
+        execucao = self.supervisor.executar(
+            python("import time\nocupada = b'x' * (300 * 1024 * 1024)\ntime.sleep(60)\n"),
+            ao_terminar=conclusao, limite_memoria_mb=100
+        )
+        self.assertTrue(conclusao.aguardar())
+        self.assertEqual(execucao.motivo, MOTIVO_MEMORIA)
+        self.assertGreater(execucao.memoria.pico_mb, 100)
+
+    @unittest.skipIf(processos.WINDOWS, "SIGTERM não pode ser ignorado no Windows")
+    def test_encerramentos_lentos_nao_atrasam_conclusoes(self):
+        # Um único encerramento por vez, cada um preso 3 s até o kill forçado
+        supervisor.MAX_ENCERRAMENTOS = 1
+        processos.PRAZO_ENCERRAMENTO = 3
+        self.iniciar()
+        teimosos = []
+        for _ in range(2):
+            pronto, conclusao = threading.Event(), Conclusao()
+            execucao = self.supervisor.executar(
+                python(TEIMOSO), timeout=0.3, ao_terminar=conclusao, analisar=lambda *_, p=pronto: p.set()
+            )
+            self.assertTrue(pronto.wait(PRAZO_TESTE))
+            teimosos.append((execucao, conclusao))
+
+        time.sleep(0.5)
+        conclusao = Conclusao()
+        inicio = time.monotonic()
+        rapida = self.supervisor.executar(python("pass"), ao_terminar=conclusao)
+        self.assertTrue(conclusao.aguardar())
+        self.assertEqual(rapida.exitcode, 0)
+        self.assertLess(time.monotonic() - inicio, 2)
+        self.assertTrue(all(execucao.is_alive() for execucao, _ in teimosos))
+
+        for execucao, conclusao in teimosos:
+            self.assertTrue(conclusao.aguardar())
+            self.assertEqual(execucao.motivo, "timeout")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,148 @@
+# Copyright 2025 Thiago Luis de Lima
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import datetime
+import threading
+import unittest
+
+from scheduler.ticker import MAX_MINUTOS_RECUPERACAO, RelogioMinutos
+
+
+class RelogioFalso:
+    """Relógio de parede e monotônico controlados pelo teste"""
+
+    def __init__(self, inicio):
+        self.parede = inicio
+        self.mono = 1000.0
+        self.esperas = 0
+
+    def agora(self):
+        return self.parede
+
+    def monotonic(self):
+        return self.mono
+
+    def avancar(self, segundos):
+        """Passagem real do tempo: os dois relógios andam juntos"""
+        self.parede += datetime.timedelta(seconds=segundos)
+        self.mono += segundos
+
+    def saltar(self, segundos):
+        """Ajuste do relógio de parede (horário de verão, NTP): o monotônico não muda"""
+        self.parede += datetime.timedelta(seconds=segundos)
+
+
+class SinalFalso:
+    """Substitui o Event da espera: cada espera avança o relógio falso em vez de dormir"""
+
+    def __init__(self, relogio):
+        self.relogio = relogio
+
+    def wait(self, timeout):
+        self.relogio.esperas += 1
+        self.relogio.avancar(timeout)
+        return False
+
+    def set(self):
+        pass
+
+    def clear(self):
+        pass
+
+
+def minuto(hora, minuto_):
+    return datetime.datetime(2025, 10, 26, hora, minuto_)
+
+
+class TestRelogioMinutos(unittest.TestCase):
+
+    def criar(self, inicio):
+        falso = RelogioFalso(inicio)
+        relogio = RelogioMinutos(threading.Event(), agora=falso.agora, monotonic=falso.monotonic)
+        relogio._sinal = SinalFalso(falso)
+        return falso, relogio
+
+    def test_primeiro_tick_retorna_o_minuto_corrente(self):
+        _, relogio = self.criar(minuto(10, 0) + datetime.timedelta(seconds=30))
+        self.assertEqual(relogio.proximo_tick(), [minuto(10, 0)])
+
+    def test_tick_na_virada_do_minuto(self):
+        falso, relogio = self.criar(minuto(10, 0) + datetime.timedelta(seconds=30))
+        relogio.proximo_tick()
+        self.assertEqual(relogio.proximo_tick(), [minuto(10, 1)])
+        self.assertEqual(relogio.proximo_tick(), [minuto(10, 2)])
+        self.assertEqual(relogio.ticks_atrasados, 0)
+        self.assertLessEqual(falso.esperas, 2)
+
+    def test_acorda_antes_da_virada_no_prazo(self):
+        falso, relogio = self.criar(minuto(10, 0))
+        relogio.proximo_tick()
+        self.assertEqual(relogio.proximo_tick(ate=minuto(10, 0) + datetime.timedelta(seconds=15)), [])
+        self.assertEqual(falso.parede, minuto(10, 0) + datetime.timedelta(seconds=15))
+        self.assertEqual(relogio.proximo_tick(), [minuto(10, 1)])
+
+    def test_tick_atrasado_avalia_os_minutos_perdidos(self):
+        falso, relogio = self.criar(minuto(10, 0) + datetime.timedelta(seconds=30))
+        relogio.proximo_tick()
+        # O loop demorou além da virada de dois minutos
+        falso.avancar(140)
+        self.assertEqual(relogio.proximo_tick(), [minuto(10, 1), minuto(10, 2), minuto(10, 3)])
+        self.assertEqual(relogio.ticks_atrasados, 1)
+        self.assertEqual(relogio.minutos_recuperados, 2)
+
+    def test_tick_atrasado_descarta_acima_do_limite(self):
+        falso, relogio = self.criar(minuto(10, 0))
+        relogio.proximo_tick()
+        falso.avancar((MAX_MINUTOS_RECUPERACAO + 5) * 60 + 30)
+        minutos = relogio.proximo_tick()
+        self.assertEqual(len(minutos), MAX_MINUTOS_RECUPERACAO + 1)
+        self.assertEqual(minutos[-1], minuto(10, MAX_MINUTOS_RECUPERACAO + 6))
+        self.assertEqual(relogio.minutos_descartados, 5)
+
+    def test_relogio_adiantado(self):
+        falso, relogio = self.criar(minuto(10, 0) + datetime.timedelta(seconds=30))
+        relogio.proximo_tick()
+        falso.saltar(300)
+        self.assertEqual(relogio.proximo_tick(), [minuto(10, m) for m in range(1, 7)])
+        self.assertEqual(relogio.minutos_recuperados, 5)
+
+    def test_relogio_atrasado_retoma_sem_esperar_alcancar(self):
+        falso, relogio = self.criar(minuto(1, 59) + datetime.timedelta(seconds=30))
+        relogio.proximo_tick()
+        # Fim do horário de verão: o relógio de parede volta uma hora
+        falso.saltar(-3600)
+        with self.assertLogs('scheduler.ticker', level='WARNING'):
+            self.assertEqual(relogio.proximo_tick(), [minuto(1, 0)])
+        self.assertLessEqual(falso.esperas, 2)
+        self.assertEqual(relogio.proximo_tick(), [minuto(1, 1)])
+        self.assertEqual(relogio.ultimo_minuto, minuto(1, 1))
+
+    def test_relogio_atrasado_com_prazo_de_disparo(self):
+        falso, relogio = self.criar(minuto(1, 59) + datetime.timedelta(seconds=50))
+        relogio.proximo_tick()
+        falso.saltar(-3600)
+        # O próximo disparo (relógio de parede) ficou uma hora à frente
+        with self.assertLogs('scheduler.ticker', level='WARNING'):
+            self.assertEqual(relogio.proximo_tick(ate=minuto(2, 0)), [minuto(1, 0)])
+        self.assertLessEqual(falso.esperas, 2)
+
+    def test_parada_interrompe_a_espera(self):
+        _, relogio = self.criar(minuto(10, 0))
+        relogio.proximo_tick()
+        relogio.stop_event.set()
+        self.assertIsNone(relogio.proximo_tick())
+
+
+if __name__ == '__main__':
+    unittest.main()